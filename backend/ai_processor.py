@@ -20,6 +20,7 @@ from confidence_calculator import (
     validate_extracted_data
 )
 from pdf_chunker import pdf_chunker
+from instrumentation import DocumentTrace, current_rss_mb, span, trace_document
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,7 @@ except ImportError as e:
 # Global instances — lazy-initialized to avoid heavy imports at startup
 ocr_processor: RealOCRProcessor | None = None
 parser: IndonesianTaxDocumentParser | None = None
+tiered_extractor = None
 
 
 def get_ocr_processor() -> RealOCRProcessor:
@@ -67,6 +69,23 @@ def get_parser() -> IndonesianTaxDocumentParser:
     return parser
 
 
+def get_tiered_extractor():
+    """Lazy-init tiered rekening koran extractor (bank adapters + saldo gating + Smart Mapper)"""
+    global tiered_extractor
+    if tiered_extractor is None:
+        from processors import TieredRekeningKoranExtractor
+        tiered_extractor = TieredRekeningKoranExtractor(smart_mapper=smart_mapper_service)
+    return tiered_extractor
+
+
+def _rekening_fast_path_enabled() -> bool:
+    try:
+        from config import settings
+        return settings.rekening_koran_fast_path
+    except Exception:
+        return True
+
+
 async def process_with_chunking(file_path: str, document_type: str) -> tuple:
     """
     Process large PDF file with chunking strategy
@@ -100,124 +119,118 @@ async def process_with_chunking(file_path: str, document_type: str) -> tuple:
         logger.info(f"📦 Chunk size: {chunk_size} pages")
         logger.info(f"🔢 Expected chunks: {(page_count + chunk_size - 1) // chunk_size}")
 
-        # Split PDF into chunks
-        chunk_dir = str(Path(file_path).parent / "chunks")
-        chunks = pdf_chunker.split_pdf_to_chunks(file_path, output_dir=chunk_dir)
+        # Page-range views over one opened document (no shared chunks/ dir, no chunk files with PyMuPDF);
+        # the document and scratch files are released when the block exits, also on errors
+        with pdf_chunker.open_page_ranges(file_path) as page_ranges:
+            chunks = page_ranges.ranges
 
-        if not chunks:
-            raise Exception("Failed to split PDF into chunks")
+            if not chunks:
+                raise Exception("Failed to split PDF into chunks")
 
-        logger.info(f"✅ Successfully created {len(chunks)} chunks")
-        logger.info("=" * 80)
+            logger.info(f"✅ Successfully created {len(chunks)} chunks")
+            logger.info("=" * 80)
 
-        # Process each chunk
-        chunk_results = []
+            # Process each chunk
+            chunk_results = []
 
-        for i, chunk_info in enumerate(chunks, 1):
-            logger.info(f"")
-            logger.info(f"{'=' * 40} CHUNK {i}/{len(chunks)} {'=' * 40}")
-            logger.info(f"📄 Pages: {chunk_info['start_page']}-{chunk_info['end_page']}")
-            logger.info(f"📁 File: {Path(chunk_info['path']).name}")
+            for i, page_range in enumerate(chunks, 1):
+                chunk_info = page_range.to_chunk_info()
+                logger.info(f"")
+                logger.info(f"{'=' * 40} CHUNK {i}/{len(chunks)} {'=' * 40}")
+                logger.info(f"📄 Pages: {chunk_info['start_page']}-{chunk_info['end_page']}")
 
-            try:
-                # ✅ MEMORY MONITORING: Log memory before chunk processing
-                import psutil
-                process = psutil.Process()
-                mem_before = process.memory_info().rss / (1024 * 1024)  # MB
-                logger.info(f"💾 Memory before chunk {i}: {mem_before:.1f} MB")
+                try:
+                    # ✅ MEMORY MONITORING: Log memory before chunk processing
+                    mem_before = current_rss_mb() or 0.0
+                    logger.info(f"💾 Memory before chunk {i}: {mem_before:.1f} MB")
                 
-                # Extract text from chunk using OCR
-                chunk_text = await ocr_processor.extract_text(chunk_info['path'])
+                    # Extract text from chunk using OCR
+                    chunk_text = await ocr_processor.extract_page_range(page_range)
 
-                if not chunk_text:
-                    logger.warning(f"⚠️ Chunk {i} returned no text")
-                    continue
+                    if not chunk_text:
+                        logger.warning(f"⚠️ Chunk {i} returned no text")
+                        continue
 
-                logger.info(f"✅ Extracted {len(chunk_text)} characters from chunk {i}")
+                    logger.info(f"✅ Extracted {len(chunk_text)} characters from chunk {i}")
                 
-                # ✅ MEMORY MONITORING: Log memory after OCR
-                mem_after_ocr = process.memory_info().rss / (1024 * 1024)  # MB
-                logger.info(f"💾 Memory after OCR: {mem_after_ocr:.1f} MB (delta: +{mem_after_ocr - mem_before:.1f} MB)")
+                    # ✅ MEMORY MONITORING: Log memory after OCR
+                    mem_after_ocr = current_rss_mb() or 0.0
+                    logger.info(f"💾 Memory after OCR: {mem_after_ocr:.1f} MB (delta: +{mem_after_ocr - mem_before:.1f} MB)")
 
-                # Get OCR metadata for this chunk
-                chunk_ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                    # Get OCR metadata for this chunk
+                    chunk_ocr_metadata = ocr_processor.get_last_ocr_metadata()
 
-                # Build OCR result for this chunk (needed for enhanced_bank_processor)
-                tables = []
-                raw_response_data = {}
+                    # Build OCR result for this chunk (needed for enhanced_bank_processor)
+                    tables = []
+                    raw_response_data = {}
                 
-                if chunk_ocr_metadata:
-                    raw_response = chunk_ocr_metadata.get('raw_response')
-                    if raw_response and isinstance(raw_response, dict):
-                        raw_response_data = raw_response  # ✅ Store for chunk_result
-                        pages = raw_response.get('pages', [])
-                        logger.info(f"   📊 Chunk {i}: raw_response has {len(pages)} pages")
+                    if chunk_ocr_metadata:
+                        raw_response = chunk_ocr_metadata.get('raw_response')
+                        if raw_response and isinstance(raw_response, dict):
+                            raw_response_data = raw_response  # ✅ Store for chunk_result
+                            pages = raw_response.get('pages', [])
+                            logger.info(f"   📊 Chunk {i}: raw_response has {len(pages)} pages")
                         
-                        for page in pages:
-                            if isinstance(page, dict) and 'tables' in page:
-                                page_tables = page.get('tables', [])
-                                if isinstance(page_tables, list):
-                                    tables.extend(page_tables)
+                            for page in pages:
+                                if isinstance(page, dict) and 'tables' in page:
+                                    page_tables = page.get('tables', [])
+                                    if isinstance(page_tables, list):
+                                        tables.extend(page_tables)
 
-                        logger.info(f"   📊 Chunk {i}: Extracted {len(tables)} tables from {len(pages)} pages")
+                            logger.info(f"   📊 Chunk {i}: Extracted {len(tables)} tables from {len(pages)} pages")
+                        else:
+                            logger.warning(f"   ⚠️ Chunk {i}: No valid raw_response from OCR")
                     else:
-                        logger.warning(f"   ⚠️ Chunk {i}: No valid raw_response from OCR")
-                else:
-                    logger.warning(f"   ⚠️ Chunk {i}: No OCR metadata available")
-
-                # Create chunk result with proper structure
-                chunk_result = {
-                    'raw_text': chunk_text,
-                    'extracted_text': chunk_text,
-                    'extracted_data': {
-                        'raw_response': raw_response_data  # ✅ Use validated raw_response
-                    },
-                    'chunk_info': chunk_info,
-                    'tables': tables
-                }
+                        logger.warning(f"   ⚠️ Chunk {i}: No OCR metadata available")
+
+                    # Create chunk result with proper structure
+                    chunk_result = {
+                        'raw_text': chunk_text,
+                        'extracted_text': chunk_text,
+                        'extracted_data': {
+                            'raw_response': raw_response_data  # ✅ Use validated raw_response
+                        },
+                        'chunk_info': chunk_info,
+                        'tables': tables
+                    }
                 
-                # ✅ DEBUG: Verify chunk_result structure
-                logger.info(f"   🔍 Chunk {i}: chunk_result has extracted_data.raw_response = {bool(raw_response_data)}")
-                if raw_response_data and isinstance(raw_response_data, dict):
-                    logger.info(f"   🔍 Chunk {i}: raw_response_data has {len(raw_response_data.get('pages', []))} pages")
-
-                chunk_results.append(chunk_result)
-
-                # ✅ CRITICAL: Clear large variables after processing chunk
-                del chunk_text
-                # ✅ FIX: Do NOT delete raw_response here - it's needed for Claude AI
-                # The raw_response is stored in chunk_result['extracted_data']['raw_response']
-                # and will be merged in pdf_chunker.merge_extracted_data()
-                logger.info(f"📦 Chunk {i} raw_response preserved for Claude AI merge")
+                    # ✅ DEBUG: Verify chunk_result structure
+                    logger.info(f"   🔍 Chunk {i}: chunk_result has extracted_data.raw_response = {bool(raw_response_data)}")
+                    if raw_response_data and isinstance(raw_response_data, dict):
+                        logger.info(f"   🔍 Chunk {i}: raw_response_data has {len(raw_response_data.get('pages', []))} pages")
+
+                    chunk_results.append(chunk_result)
+
+                    # ✅ CRITICAL: Clear large variables after processing chunk
+                    del chunk_text
+                    # ✅ FIX: Do NOT delete raw_response here - it's needed for Claude AI
+                    # The raw_response is stored in chunk_result['extracted_data']['raw_response']
+                    # and will be merged in pdf_chunker.merge_extracted_data()
+                    logger.info(f"📦 Chunk {i} raw_response preserved for Claude AI merge")
                 
-                # ✅ CRITICAL: Force garbage collection after each chunk
-                import gc
-                gc.collect()
+                    # ✅ CRITICAL: Force garbage collection after each chunk
+                    import gc
+                    gc.collect()
                 
-                # ✅ MEMORY MONITORING: Log memory after cleanup
-                mem_after_cleanup = process.memory_info().rss / (1024 * 1024)  # MB
-                logger.info(f"💾 Memory after cleanup: {mem_after_cleanup:.1f} MB (freed: {mem_after_ocr - mem_after_cleanup:.1f} MB)")
-                logger.info(f"📊 Chunk {i}/{len(chunks)} complete - continuing...")
-
-            except Exception as e:
-                logger.error(f"❌ Chunk {i} processing failed: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                # ✅ Clean up on error too
-                import gc
-                gc.collect()
-                # Continue with other chunks
+                    # ✅ MEMORY MONITORING: Log memory after cleanup
+                    mem_after_cleanup = current_rss_mb() or 0.0
+                    logger.info(f"💾 Memory after cleanup: {mem_after_cleanup:.1f} MB (freed: {mem_after_ocr - mem_after_cleanup:.1f} MB)")
+                    logger.info(f"📊 Chunk {i}/{len(chunks)} complete - continuing...")
+
+                except Exception as e:
+                    logger.error(f"❌ Chunk {i} processing failed: {e}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+                    # ✅ Clean up on error too
+                    import gc
+                    gc.collect()
+                    # Continue with other chunks
 
         logger.info("")
         logger.info("=" * 80)
         logger.info("🔗 MERGING CHUNK RESULTS")
         logger.info("=" * 80)
 
-        # Cleanup chunk files
-        logger.info("🧹 Cleaning up temporary chunk files...")
-        pdf_chunker.cleanup_chunks([c['path'] for c in chunks])
-        logger.info("✅ Cleanup complete")
-
         if not chunk_results:
             raise Exception("All chunks failed to process - no valid data extracted")
 
@@ -273,8 +286,17 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
         document_type: Type of document (faktur_pajak, pph21, pph23, rekening_koran, invoice)
 
     Returns:
-        Dictionary with extracted_data, confidence, raw_text, processing_time
+        Dictionary with extracted_data, confidence, raw_text, processing_time,
+        timings (per-stage durations, RSS deltas, pages, LLM tokens) and, for
+        Faktur Pajak, canonical_fields (typed values persisted for exports)
     """
+    with trace_document(document_type, Path(file_path).name) as trace:
+        result = await _process_document(file_path, document_type, trace)
+        result["timings"] = trace.to_dict()
+        return result
+
+
+async def _process_document(file_path: str, document_type: str, trace: DocumentTrace) -> Dict[str, Any]:
     # Ensure globals are initialized
     get_ocr_processor()
     get_parser()
@@ -292,6 +314,7 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
             detected_type = detect_document_type_from_filename(document_type)
             logger.info(f"🔍 Auto-detected document type: {detected_type}")
             document_type = detected_type
+            trace.document_type = document_type
 
         # STEP 1: Extract text using OCR (with smart chunking for large rekening koran)
         # Check if file needs chunking (only for rekening_koran with many pages)
@@ -330,13 +353,19 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
                 import traceback
                 logger.error(traceback.format_exc())
 
-        if needs_chunking:
-            logger.info(f"📚 Processing with CHUNKING: {page_count} pages")
-            extracted_text, ocr_metadata = await process_with_chunking(file_path, document_type)
+        with span("ocr", chunked=needs_chunking):
+            if needs_chunking:
+                logger.info(f"📚 Processing with CHUNKING: {page_count} pages")
+                extracted_text, ocr_metadata = await process_with_chunking(file_path, document_type)
+            else:
+                logger.info("📄 Processing as SINGLE DOCUMENT (no chunking needed)")
+                extracted_text = await ocr_processor.extract_text(file_path)
+                ocr_metadata = ocr_processor.get_last_ocr_metadata()
+
+        if file_path.lower().endswith('.pdf'):
+            trace.add_pages(page_count or pdf_chunker.get_page_count(file_path))
         else:
-            logger.info("📄 Processing as SINGLE DOCUMENT (no chunking needed)")
-            extracted_text = await ocr_processor.extract_text(file_path)
-            ocr_metadata = ocr_processor.get_last_ocr_metadata()
+            trace.add_pages(1)
         
         if not extracted_text:
             raise Exception("OCR failed to extract any text from the document. The file might be blank, corrupted, or unsupported.")
@@ -345,223 +374,252 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
         logger.info(f"📝 Sample text: {extracted_text[:200]}...")
         
         # STEP 2: Parse document based on type
-        if document_type == 'faktur_pajak':
-            extracted_data = parser.parse_faktur_pajak(extracted_text, file_path=file_path)
-            # Merge structured fields from Google Document AI if available
-            ocr_metadata = ocr_processor.get_last_ocr_metadata()
-            if ocr_metadata:
-                cloud_fields = ocr_metadata.get('extracted_fields', {})
-                if cloud_fields:
-                    logger.info("✅ Merging structured data from Google Document AI")
-                    extracted_data['extracted_content']['structured_fields'] = cloud_fields
-            if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
-                template = smart_mapper_service.load_template(document_type)
+        with span("parsing"):
+            if document_type == 'faktur_pajak':
+                extracted_data = parser.parse_faktur_pajak(extracted_text, file_path=file_path)
+                # Merge structured fields from Google Document AI if available
                 ocr_metadata = ocr_processor.get_last_ocr_metadata()
-                ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
-                raw_response = ocr_meta_dict.get('raw_response')
-                if template and raw_response:
-                    mapped = smart_mapper_service.map_document(
-                        doc_type=document_type,
-                        document_json=raw_response,
-                        template=template,
-                        extracted_fields=ocr_meta_dict.get('extracted_fields'),
-                        fallback_fields=extracted_data.get('structured_data'),
-                    )
-                    if mapped:
-                        extracted_data.setdefault('structured_data', {})
-                        extracted_data['structured_data']['smart_mapper'] = mapped
-                        extracted_data['smart_mapped'] = mapped
-        elif document_type == 'pph21':
-            extracted_data = parser.parse_pph21(extracted_text)
-            # Merge structured fields from Google Document AI if available
-            ocr_metadata = ocr_processor.get_last_ocr_metadata()
-            if ocr_metadata:
-                cloud_fields = ocr_metadata.get('extracted_fields', {})
-                if cloud_fields:
-                    logger.info("✅ Merging structured data from Google Document AI for PPh 21")
-                    extracted_data['extracted_content']['structured_fields'] = cloud_fields
-            # Apply Smart Mapper for PPh 21
-            if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
-                template = smart_mapper_service.load_template(document_type)
+                if ocr_metadata:
+                    cloud_fields = ocr_metadata.get('extracted_fields', {})
+                    if cloud_fields:
+                        logger.info("✅ Merging structured data from Google Document AI")
+                        extracted_data['extracted_content']['structured_fields'] = cloud_fields
+                if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
+                    template = smart_mapper_service.load_template(document_type)
+                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                    ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
+                    raw_response = ocr_meta_dict.get('raw_response')
+                    if template and raw_response:
+                        mapped = await asyncio.to_thread(
+                            smart_mapper_service.map_document,
+                            doc_type=document_type,
+                            document_json=raw_response,
+                            template=template,
+                            extracted_fields=ocr_meta_dict.get('extracted_fields'),
+                            fallback_fields=extracted_data.get('structured_data'),
+                        )
+                        if mapped:
+                            extracted_data.setdefault('structured_data', {})
+                            extracted_data['structured_data']['smart_mapper'] = mapped
+                            extracted_data['smart_mapped'] = mapped
+            elif document_type == 'pph21':
+                extracted_data = parser.parse_pph21(extracted_text)
+                # Merge structured fields from Google Document AI if available
                 ocr_metadata = ocr_processor.get_last_ocr_metadata()
-                ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
-                raw_response = ocr_meta_dict.get('raw_response')
-                if template and raw_response:
-                    logger.info("🤖 Applying Smart Mapper GPT-4o for PPh 21")
-                    mapped = smart_mapper_service.map_document(
-                        doc_type=document_type,
-                        document_json=raw_response,
-                        template=template,
-                        extracted_fields=ocr_meta_dict.get('extracted_fields'),
-                        fallback_fields=extracted_data.get('structured_data'),
-                    )
-                    if mapped:
-                        logger.info("✅ Smart Mapper PPh 21 successful!")
-                        extracted_data.setdefault('structured_data', {})
-                        extracted_data['structured_data']['smart_mapper'] = mapped
-                        extracted_data['smart_mapped'] = mapped
+                if ocr_metadata:
+                    cloud_fields = ocr_metadata.get('extracted_fields', {})
+                    if cloud_fields:
+                        logger.info("✅ Merging structured data from Google Document AI for PPh 21")
+                        extracted_data['extracted_content']['structured_fields'] = cloud_fields
+                # Apply Smart Mapper for PPh 21
+                if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
+                    template = smart_mapper_service.load_template(document_type)
+                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                    ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
+                    raw_response = ocr_meta_dict.get('raw_response')
+                    if template and raw_response:
+                        logger.info("🤖 Applying Smart Mapper GPT-4o for PPh 21")
+                        mapped = await asyncio.to_thread(
+                            smart_mapper_service.map_document,
+                            doc_type=document_type,
+                            document_json=raw_response,
+                            template=template,
+                            extracted_fields=ocr_meta_dict.get('extracted_fields'),
+                            fallback_fields=extracted_data.get('structured_data'),
+                        )
+                        if mapped:
+                            logger.info("✅ Smart Mapper PPh 21 successful!")
+                            extracted_data.setdefault('structured_data', {})
+                            extracted_data['structured_data']['smart_mapper'] = mapped
+                            extracted_data['smart_mapped'] = mapped
+                        else:
+                            logger.warning("⚠️ Smart Mapper PPh 21 returned no data")
                     else:
-                        logger.warning("⚠️ Smart Mapper PPh 21 returned no data")
-                else:
-                    if not template:
-                        logger.warning(f"⚠️ No template found for {document_type}")
-                    if not raw_response:
-                        logger.warning("⚠️ No raw OCR response available for Smart Mapper")
-        elif document_type == 'pph23':
-            extracted_data = parser.parse_pph23(extracted_text)
-            # Merge structured fields from Google Document AI if available
-            ocr_metadata = ocr_processor.get_last_ocr_metadata()
-            if ocr_metadata:
-                cloud_fields = ocr_metadata.get('extracted_fields', {})
-                if cloud_fields:
-                    logger.info("✅ Merging structured data from Google Document AI for PPh 23")
-                    extracted_data['extracted_content']['structured_fields'] = cloud_fields
-            # Apply Smart Mapper for PPh 23
-            if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
-                template = smart_mapper_service.load_template(document_type)
+                        if not template:
+                            logger.warning(f"⚠️ No template found for {document_type}")
+                        if not raw_response:
+                            logger.warning("⚠️ No raw OCR response available for Smart Mapper")
+            elif document_type == 'pph23':
+                extracted_data = parser.parse_pph23(extracted_text)
+                # Merge structured fields from Google Document AI if available
                 ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                if ocr_metadata:
+                    cloud_fields = ocr_metadata.get('extracted_fields', {})
+                    if cloud_fields:
+                        logger.info("✅ Merging structured data from Google Document AI for PPh 23")
+                        extracted_data['extracted_content']['structured_fields'] = cloud_fields
+                # Apply Smart Mapper for PPh 23
+                if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
+                    template = smart_mapper_service.load_template(document_type)
+                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                    ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
+                    raw_response = ocr_meta_dict.get('raw_response')
+                    if template and raw_response:
+                        logger.info("🤖 Applying Smart Mapper GPT-4o for PPh 23")
+                        mapped = await asyncio.to_thread(
+                            smart_mapper_service.map_document,
+                            doc_type=document_type,
+                            document_json=raw_response,
+                            template=template,
+                            extracted_fields=ocr_meta_dict.get('extracted_fields'),
+                            fallback_fields=extracted_data.get('structured_data'),
+                        )
+                        if mapped:
+                            logger.info("✅ Smart Mapper PPh 23 successful!")
+                            extracted_data.setdefault('structured_data', {})
+                            extracted_data['structured_data']['smart_mapper'] = mapped
+                            extracted_data['smart_mapped'] = mapped
+                        else:
+                            logger.warning("⚠️ Smart Mapper PPh 23 returned no data")
+                    else:
+                        if not template:
+                            logger.warning(f"⚠️ No template found for {document_type}")
+                        if not raw_response:
+                            logger.warning("⚠️ No raw OCR response available for Smart Mapper")
+            elif document_type == 'rekening_koran':
+                # ============================================================
+                # TIERED REKENING KORAN PROCESSING
+                # ============================================================
+                # FLOW: Google Document AI (OCR) → bank adapters / rule-based parser
+                #       → Claude AI only for pages whose saldo chain breaks → Excel
+                # Whole-document Claude AI is the fallback if tiered extraction fails
+                # ============================================================
+
+                logger.info("=" * 60)
+                logger.info("🏦 REKENING KORAN - TIERED EXTRACTION (ADAPTERS + CLAUDE AI)")
+                logger.info("=" * 60)
+
+                # ✅ FIX: For chunked processing, ocr_metadata is already set from merged chunks
+                # For non-chunked processing, get from ocr_processor
+                # DO NOT override ocr_metadata if it's already set (from chunking)
+                if ocr_metadata is None or not isinstance(ocr_metadata, dict):
+                    logger.info("📄 Non-chunked processing - getting OCR metadata from processor")
+                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                else:
+                    logger.info("📚 Chunked processing - using merged OCR metadata")
+
+                # Get raw_response for Smart Mapper
                 ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
                 raw_response = ocr_meta_dict.get('raw_response')
-                if template and raw_response:
-                    logger.info("🤖 Applying Smart Mapper GPT-4o for PPh 23")
-                    mapped = smart_mapper_service.map_document(
-                        doc_type=document_type,
-                        document_json=raw_response,
-                        template=template,
-                        extracted_fields=ocr_meta_dict.get('extracted_fields'),
-                        fallback_fields=extracted_data.get('structured_data'),
-                    )
-                    if mapped:
-                        logger.info("✅ Smart Mapper PPh 23 successful!")
-                        extracted_data.setdefault('structured_data', {})
-                        extracted_data['structured_data']['smart_mapper'] = mapped
-                        extracted_data['smart_mapped'] = mapped
+
+                # 🔍 DEBUG: Check what we have
+                logger.info(f"🔍 DEBUG - ocr_metadata type: {type(ocr_metadata)}")
+                logger.info(f"🔍 DEBUG - ocr_metadata keys: {list(ocr_meta_dict.keys()) if ocr_meta_dict else 'None'}")
+                logger.info(f"🔍 DEBUG - raw_response available: {raw_response is not None}")
+                if raw_response and isinstance(raw_response, dict):
+                    logger.info(f"🔍 DEBUG - raw_response has {len(raw_response.get('pages', []))} pages")
+                logger.info(f"🔍 DEBUG - HAS_SMART_MAPPER: {HAS_SMART_MAPPER}")
+
+                # Parse rekening koran (now returns raw text for Smart Mapper)
+                extracted_data = await parser.parse_rekening_koran(extracted_text)
+
+                # Smart Mapper path: tiered extraction, Claude AI fills the gaps
+                if HAS_SMART_MAPPER and smart_mapper_service:
+                    logger.info("🤖 Using tiered extraction with Claude AI (Smart Mapper) fallback")
+                    template = smart_mapper_service.load_template(document_type)
+                    logger.info(f"🔍 DEBUG - template loaded: {template is not None}")
+
+                    if template and raw_response:
+                        mapped = None
+                        if _rekening_fast_path_enabled():
+                            # ⚡ Adapters/rule parser first - Claude only sees pages whose saldo chain breaks
+                            try:
+                                mapped = await asyncio.to_thread(
+                                    get_tiered_extractor().extract, raw_response, template=template, doc_type=document_type
+                                )
+                            except Exception as e:
+                                logger.warning(f"⚠️ Tiered extraction failed, using Claude for whole document: {e}")
+                                mapped = None
+
+                        if not mapped:
+                            logger.info("📋 Template loaded, calling Claude AI...")
+                            mapped = await asyncio.to_thread(
+                                smart_mapper_service.map_document,
+                                doc_type=document_type,
+                                document_json=raw_response,
+                                template=template,
+                                extracted_fields=ocr_meta_dict.get('extracted_fields'),
+                                fallback_fields=extracted_data.get('structured_data'),
+                            )
+                        if mapped:
+                            logger.info("✅ Claude AI extraction successful!")
+                            extracted_data.setdefault('structured_data', {})
+                            extracted_data['structured_data']['smart_mapper'] = mapped
+                            extracted_data['smart_mapped'] = mapped
+                            logger.info(f"🔍 DEBUG - smart_mapped added to extracted_data, keys now: {list(extracted_data.keys())}")
+
+                            # Update transactions if extracted
+                            if mapped.get('transactions'):
+                                extracted_data['transactions'] = mapped['transactions']
+                                logger.info(f"   📊 Extracted {len(mapped['transactions'])} transactions")
+                        else:
+                            logger.warning("⚠️ Claude AI returned no data (mapped is None/empty)")
                     else:
-                        logger.warning("⚠️ Smart Mapper PPh 23 returned no data")
+                        if not template:
+                            logger.warning(f"⚠️ No template found for {document_type}")
+                        if not raw_response:
+                            logger.warning("⚠️ No raw OCR response available - CANNOT CALL CLAUDE AI!")
                 else:
-                    if not template:
-                        logger.warning(f"⚠️ No template found for {document_type}")
-                    if not raw_response:
-                        logger.warning("⚠️ No raw OCR response available for Smart Mapper")
-        elif document_type == 'rekening_koran':
-            # ============================================================
-            # SIMPLIFIED REKENING KORAN PROCESSING
-            # ============================================================
-            # NEW FLOW: Google Document AI (OCR) → Claude AI → Excel
-            # NO MORE: Bank detection, bank adapters, rule-based parsing
-            # ============================================================
-
-            logger.info("=" * 60)
-            logger.info("🏦 REKENING KORAN - SIMPLIFIED CLAUDE AI PROCESSING")
-            logger.info("=" * 60)
-
-            # ✅ FIX: For chunked processing, ocr_metadata is already set from merged chunks
-            # For non-chunked processing, get from ocr_processor
-            # DO NOT override ocr_metadata if it's already set (from chunking)
-            if ocr_metadata is None or not isinstance(ocr_metadata, dict):
-                logger.info("📄 Non-chunked processing - getting OCR metadata from processor")
+                    logger.warning("⚠️ Smart Mapper not available, returning raw OCR text only")
+
+                # 🔍 DEBUG: Final check before returning
+                logger.info(f"🔍 DEBUG - FINAL extracted_data keys: {list(extracted_data.keys())}")
+                logger.info(f"🔍 DEBUG - FINAL has smart_mapped: {'smart_mapped' in extracted_data}")
+            elif document_type == 'invoice':
+                extracted_data = parser.parse_invoice(extracted_text)
+                # Merge structured fields from Google Document AI if available
                 ocr_metadata = ocr_processor.get_last_ocr_metadata()
-            else:
-                logger.info("📚 Chunked processing - using merged OCR metadata")
-
-            # Get raw_response for Smart Mapper
-            ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
-            raw_response = ocr_meta_dict.get('raw_response')
-
-            # 🔍 DEBUG: Check what we have
-            logger.info(f"🔍 DEBUG - ocr_metadata type: {type(ocr_metadata)}")
-            logger.info(f"🔍 DEBUG - ocr_metadata keys: {list(ocr_meta_dict.keys()) if ocr_meta_dict else 'None'}")
-            logger.info(f"🔍 DEBUG - raw_response available: {raw_response is not None}")
-            if raw_response and isinstance(raw_response, dict):
-                logger.info(f"🔍 DEBUG - raw_response has {len(raw_response.get('pages', []))} pages")
-            logger.info(f"🔍 DEBUG - HAS_SMART_MAPPER: {HAS_SMART_MAPPER}")
-
-            # Parse rekening koran (now returns raw text for Smart Mapper)
-            extracted_data = await parser.parse_rekening_koran(extracted_text)
-
-            # ALWAYS use Smart Mapper (Claude AI) for Rekening Koran
-            if HAS_SMART_MAPPER and smart_mapper_service:
-                logger.info("🤖 Using Claude AI (Smart Mapper) for universal bank statement extraction")
-                template = smart_mapper_service.load_template(document_type)
-                logger.info(f"🔍 DEBUG - template loaded: {template is not None}")
-
-                if template and raw_response:
-                    logger.info("📋 Template loaded, calling Claude AI...")
-                    mapped = smart_mapper_service.map_document(
-                        doc_type=document_type,
-                        document_json=raw_response,
-                        template=template,
-                        extracted_fields=ocr_meta_dict.get('extracted_fields'),
-                        fallback_fields=extracted_data.get('structured_data'),
-                    )
-                    if mapped:
-                        logger.info("✅ Claude AI extraction successful!")
-                        extracted_data.setdefault('structured_data', {})
-                        extracted_data['structured_data']['smart_mapper'] = mapped
-                        extracted_data['smart_mapped'] = mapped
-                        logger.info(f"🔍 DEBUG - smart_mapped added to extracted_data, keys now: {list(extracted_data.keys())}")
-
-                        # Update transactions if extracted
-                        if mapped.get('transactions'):
-                            extracted_data['transactions'] = mapped['transactions']
-                            logger.info(f"   📊 Extracted {len(mapped['transactions'])} transactions")
+                if ocr_metadata:
+                    cloud_fields = ocr_metadata.get('extracted_fields', {})
+                    if cloud_fields:
+                        logger.info("✅ Merging structured data from Google Document AI for Invoice")
+                        extracted_data['extracted_content']['structured_fields'] = cloud_fields
+                # Apply Smart Mapper for Invoice
+                if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
+                    template = smart_mapper_service.load_template(document_type)
+                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                    ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
+                    raw_response = ocr_meta_dict.get('raw_response')
+                    if template and raw_response:
+                        logger.info("🤖 Applying Smart Mapper GPT-4o for Invoice")
+                        mapped = await asyncio.to_thread(
+                            smart_mapper_service.map_document,
+                            doc_type=document_type,
+                            document_json=raw_response,
+                            template=template,
+                            extracted_fields=ocr_meta_dict.get('extracted_fields'),
+                            fallback_fields=extracted_data.get('structured_data'),
+                        )
+                        if mapped:
+                            logger.info("✅ Smart Mapper Invoice successful!")
+                            extracted_data.setdefault('structured_data', {})
+                            extracted_data['structured_data']['smart_mapper'] = mapped
+                            extracted_data['smart_mapped'] = mapped
+                        else:
+                            logger.warning("⚠️ Smart Mapper Invoice returned no data")
                     else:
-                        logger.warning("⚠️ Claude AI returned no data (mapped is None/empty)")
-                else:
-                    if not template:
-                        logger.warning(f"⚠️ No template found for {document_type}")
-                    if not raw_response:
-                        logger.warning("⚠️ No raw OCR response available - CANNOT CALL CLAUDE AI!")
+                        if not template:
+                            logger.warning(f"⚠️ No template found for {document_type}")
+                        if not raw_response:
+                            logger.warning("⚠️ No raw OCR response available for Smart Mapper")
             else:
-                logger.warning("⚠️ Smart Mapper not available, returning raw OCR text only")
-
-            # 🔍 DEBUG: Final check before returning
-            logger.info(f"🔍 DEBUG - FINAL extracted_data keys: {list(extracted_data.keys())}")
-            logger.info(f"🔍 DEBUG - FINAL has smart_mapped: {'smart_mapped' in extracted_data}")
-        elif document_type == 'invoice':
-            extracted_data = parser.parse_invoice(extracted_text)
-            # Merge structured fields from Google Document AI if available
-            ocr_metadata = ocr_processor.get_last_ocr_metadata()
-            if ocr_metadata:
-                cloud_fields = ocr_metadata.get('extracted_fields', {})
-                if cloud_fields:
-                    logger.info("✅ Merging structured data from Google Document AI for Invoice")
-                    extracted_data['extracted_content']['structured_fields'] = cloud_fields
-            # Apply Smart Mapper for Invoice
-            if HAS_SMART_MAPPER and smart_mapper_service and isinstance(extracted_data, dict):
-                template = smart_mapper_service.load_template(document_type)
-                ocr_metadata = ocr_processor.get_last_ocr_metadata()
-                ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
-                raw_response = ocr_meta_dict.get('raw_response')
-                if template and raw_response:
-                    logger.info("🤖 Applying Smart Mapper GPT-4o for Invoice")
-                    mapped = smart_mapper_service.map_document(
-                        doc_type=document_type,
-                        document_json=raw_response,
-                        template=template,
-                        extracted_fields=ocr_meta_dict.get('extracted_fields'),
-                        fallback_fields=extracted_data.get('structured_data'),
-                    )
-                    if mapped:
-                        logger.info("✅ Smart Mapper Invoice successful!")
-                        extracted_data.setdefault('structured_data', {})
-                        extracted_data['structured_data']['smart_mapper'] = mapped
-                        extracted_data['smart_mapped'] = mapped
-                    else:
-                        logger.warning("⚠️ Smart Mapper Invoice returned no data")
-                else:
-                    if not template:
-                        logger.warning(f"⚠️ No template found for {document_type}")
-                    if not raw_response:
-                        logger.warning("⚠️ No raw OCR response available for Smart Mapper")
-        else:
-            logger.warning(f"⚠️ Unknown document type: {document_type}, defaulting to faktur_pajak")
-            extracted_data = parser.parse_faktur_pajak(extracted_text, file_path=file_path)
+                logger.warning(f"⚠️ Unknown document type: {document_type}, defaulting to faktur_pajak")
+                extracted_data = parser.parse_faktur_pajak(extracted_text, file_path=file_path)
+
+        # Canonical Faktur Pajak fields: normalized once here so exports never re-parse raw_text
+        canonical_fields = None
+        if document_type == 'faktur_pajak' and HAS_EXPORTERS and isinstance(extracted_data, dict):
+            with span("canonicalize"):
+                try:
+                    canonical_fields = ExportFactory.get_exporter(document_type).canonicalize(extracted_data)
+                except Exception as e:
+                    logger.warning(f"⚠️ Faktur canonicalization failed, exports will recompute: {e}")
         
         # STEP 3: Validate extracted data
-        if not validate_extracted_data(extracted_data, document_type):
-            logger.warning(f"⚠️ Limited data extracted from {document_type} document")
-            # Don't raise exception - let it proceed with whatever data we have
+        with span("validation"):
+            if not validate_extracted_data(extracted_data, document_type):
+                logger.warning(f"⚠️ Limited data extracted from {document_type} document")
+                # Don't raise exception - let it proceed with whatever data we have
         
         # Debug log
         logger.info(f"📊 EXTRACTED DATA for {document_type}:")
@@ -577,6 +635,7 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
 
         # STEP 4: Calculate confidence
         confidence = calculate_confidence(extracted_text, document_type)
+        trace.confidence = confidence
         logger.info(f"🎯 Final confidence for {document_type}: {confidence:.2%}")
         
         # Low confidence warning
@@ -608,6 +667,8 @@ async def process_document_ai(file_path: str, document_type: str) -> Dict[str, A
             "raw_ocr_result": raw_ocr_json,  # Add raw OCR JSON
             "processing_time": processing_time
         }
+        if canonical_fields:
+            result["canonical_fields"] = canonical_fields
         
         logger.info(f"✅ Successfully processed {document_type} with {confidence:.2%} confidence in {processing_time:.2f}s")
         logger.info(f"✅ Extracted data keys: {list(extracted_data.keys()) if isinstance(extracted_data, dict) else 'N/A'}")
@@ -729,124 +790,122 @@ async def _process_document_chunked(file_path: str, document_type: str, start_ti
         page_count = pdf_chunker.get_page_count(file_path)
         logger.info(f"📚 Processing {page_count}-page rekening koran in chunks")
 
-        # Split PDF into chunks
-        chunks = pdf_chunker.split_pdf_to_chunks(file_path)
-
-        if not chunks:
-            raise Exception("Failed to split PDF into chunks")
+        # Page-range views over one opened document (no chunk files with PyMuPDF), released on exit
+        with pdf_chunker.open_page_ranges(file_path) as page_ranges:
+            chunks = page_ranges.ranges
 
-        logger.info(f"✅ Split into {len(chunks)} chunks")
+            if not chunks:
+                raise Exception("Failed to split PDF into chunks")
 
-        # Process each chunk
-        chunk_results = []
+            logger.info(f"✅ Split into {len(chunks)} chunks")
 
-        for i, chunk_info in enumerate(chunks, 1):
-            logger.info(f"🔄 Processing chunk {i}/{len(chunks)}: pages {chunk_info['start_page']}-{chunk_info['end_page']}")
+            # Process each chunk
+            chunk_results = []
 
-            try:
-                # Extract text from chunk WITH full OCR result
-                chunk_text = await ocr_processor.extract_text(chunk_info['path'])
+            for i, page_range in enumerate(chunks, 1):
+                chunk_info = page_range.to_chunk_info()
+                logger.info(f"🔄 Processing chunk {i}/{len(chunks)}: pages {chunk_info['start_page']}-{chunk_info['end_page']}")
 
-                if not chunk_text:
-                    logger.warning(f"⚠️ Chunk {i} extraction failed - skipping")
-                    continue
-
-                # Get OCR metadata and result for hybrid processor
-                chunk_ocr_metadata = ocr_processor.get_last_ocr_metadata()
-
-                # ✅ CRITICAL FIX: Build proper ocr_result structure (same as normal processing path)
-                # The hybrid processor expects: {'text': ..., 'tables': ..., 'raw_response': ...}
-                # Extract tables from raw_response (Google Document AI format)
-                tables = []
-                raw_response = chunk_ocr_metadata.get('raw_response') if chunk_ocr_metadata else None
-
-                logger.info(f"   🔍 DEBUG CHUNKED: chunk_ocr_metadata exists = {chunk_ocr_metadata is not None}")
-                logger.info(f"   🔍 DEBUG CHUNKED: raw_response type = {type(raw_response)}")
-
-                if raw_response and isinstance(raw_response, dict):
-                    # Tables might be in raw_response.pages[].tables
-                    pages = raw_response.get('pages', [])
-                    logger.info(f"   🔍 DEBUG CHUNKED: Found {len(pages)} pages in raw_response")
-                    for idx, page in enumerate(pages, 1):
-                        if isinstance(page, dict) and 'tables' in page:
-                            page_tables = page.get('tables', [])
-                            logger.info(f"   🔍 DEBUG CHUNKED: Page {idx} has {len(page_tables)} tables")
-                            if isinstance(page_tables, list):
-                                tables.extend(page_tables)
-                        else:
-                            page_keys = list(page.keys())[:5] if isinstance(page, dict) else 'not a dict'
-                            logger.info(f"   🔍 DEBUG CHUNKED: Page {idx} - no 'tables' key (keys: {page_keys})")
-
-                    logger.info(f"   📊 CHUNKED: Extracted {len(tables)} tables from Google Document AI response")
-                else:
-                    logger.warning(f"   ⚠️ CHUNKED: raw_response is None or not a dict")
-
-                chunk_ocr_result = {
-                    'text': chunk_text,
-                    'tables': tables,  # ← Now has actual tables!
-                    'raw_response': raw_response
-                }
-
-                # Calculate page offset for this chunk (page 1 = offset 0, page 4 = offset 3)
-                page_offset = chunk_info['start_page'] - 1
-                if page_offset > 0:
-                    logger.info(f"   📄 Applying page offset: {page_offset} (chunk starts at page {chunk_info['start_page']})")
-
-                # Parse chunk (rekening_koran specific) WITH OCR result for Hybrid Processor
-                chunk_extracted_data = await parser.parse_rekening_koran(
-                    chunk_text,
-                    ocr_result=chunk_ocr_result,
-                    ocr_metadata=chunk_ocr_metadata,
-                    page_offset=page_offset
-                )
-
-                # ✨ NEW STRATEGY: ALWAYS refine with GPT-4o (Option A)
-                # Bank adapter runs first (fast, free), then GPT refines (cheap, accurate)
-                if HAS_SMART_MAPPER and smart_mapper_service:
-                    ocr_metadata = ocr_processor.get_last_ocr_metadata()
-                    ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
-                    raw_response = ocr_meta_dict.get('raw_response')
-
-                    if raw_response:
-                        logger.info(f"✨ Refining chunk {i} with GPT-4o (Always Refine Strategy)")
+                try:
+                    # Extract text from chunk WITH full OCR result
+                    chunk_text = await ocr_processor.extract_page_range(page_range)
 
-                        # Use lightweight refinement instead of full extraction
-                        refined = smart_mapper_service.refine_adapter_result(
-                            adapter_result=chunk_extracted_data,
-                            ocr_json=raw_response,
-                            doc_type=document_type
-                        )
+                    if not chunk_text:
+                        logger.warning(f"⚠️ Chunk {i} extraction failed - skipping")
+                        continue
 
-                        if refined:
-                            # Replace with refined result
-                            chunk_extracted_data = refined
-                            logger.info(f"✨ Chunk {i} refined successfully")
-                        else:
-                            logger.warning(f"⚠️ Chunk {i} refinement failed - using adapter result")
+                    # Get OCR metadata and result for hybrid processor
+                    chunk_ocr_metadata = ocr_processor.get_last_ocr_metadata()
 
-                # ✅ FIX: Store raw_ocr_result for this chunk
-                chunk_raw_ocr = chunk_ocr_metadata.get('raw_response') if chunk_ocr_metadata else None
+                    # ✅ CRITICAL FIX: Build proper ocr_result structure (same as normal processing path)
+                    # The hybrid processor expects: {'text': ..., 'tables': ..., 'raw_response': ...}
+                    # Extract tables from raw_response (Google Document AI format)
+                    tables = []
+                    raw_response = chunk_ocr_metadata.get('raw_response') if chunk_ocr_metadata else None
 
-                # Store chunk result
-                chunk_result = {
-                    'extracted_data': chunk_extracted_data,
-                    'raw_text': chunk_text,
-                    'extracted_text': chunk_text,
-                    'chunk_number': i,
-                    'pages': f"{chunk_info['start_page']}-{chunk_info['end_page']}",
-                    'raw_ocr_result': chunk_raw_ocr  # Include raw OCR for split view
-                }
+                    logger.info(f"   🔍 DEBUG CHUNKED: chunk_ocr_metadata exists = {chunk_ocr_metadata is not None}")
+                    logger.info(f"   🔍 DEBUG CHUNKED: raw_response type = {type(raw_response)}")
 
-                chunk_results.append(chunk_result)
-                logger.info(f"✅ Chunk {i} processed successfully")
+                    if raw_response and isinstance(raw_response, dict):
+                        # Tables might be in raw_response.pages[].tables
+                        pages = raw_response.get('pages', [])
+                        logger.info(f"   🔍 DEBUG CHUNKED: Found {len(pages)} pages in raw_response")
+                        for idx, page in enumerate(pages, 1):
+                            if isinstance(page, dict) and 'tables' in page:
+                                page_tables = page.get('tables', [])
+                                logger.info(f"   🔍 DEBUG CHUNKED: Page {idx} has {len(page_tables)} tables")
+                                if isinstance(page_tables, list):
+                                    tables.extend(page_tables)
+                            else:
+                                page_keys = list(page.keys())[:5] if isinstance(page, dict) else 'not a dict'
+                                logger.info(f"   🔍 DEBUG CHUNKED: Page {idx} - no 'tables' key (keys: {page_keys})")
 
-            except Exception as e:
-                logger.error(f"❌ Error processing chunk {i}: {e}")
-                # Continue with other chunks
+                        logger.info(f"   📊 CHUNKED: Extracted {len(tables)} tables from Google Document AI response")
+                    else:
+                        logger.warning(f"   ⚠️ CHUNKED: raw_response is None or not a dict")
+
+                    chunk_ocr_result = {
+                        'text': chunk_text,
+                        'tables': tables,  # ← Now has actual tables!
+                        'raw_response': raw_response
+                    }
+
+                    # Calculate page offset for this chunk (page 1 = offset 0, page 4 = offset 3)
+                    page_offset = chunk_info['start_page'] - 1
+                    if page_offset > 0:
+                        logger.info(f"   📄 Applying page offset: {page_offset} (chunk starts at page {chunk_info['start_page']})")
+
+                    # Parse chunk (rekening_koran specific) WITH OCR result for Hybrid Processor
+                    chunk_extracted_data = await parser.parse_rekening_koran(
+                        chunk_text,
+                        ocr_result=chunk_ocr_result,
+                        ocr_metadata=chunk_ocr_metadata,
+                        page_offset=page_offset
+                    )
 
-        # Cleanup chunk files
-        chunk_paths = [c['path'] for c in chunks]
-        pdf_chunker.cleanup_chunks(chunk_paths)
+                    # ✨ NEW STRATEGY: ALWAYS refine with GPT-4o (Option A)
+                    # Bank adapter runs first (fast, free), then GPT refines (cheap, accurate)
+                    if HAS_SMART_MAPPER and smart_mapper_service:
+                        ocr_metadata = ocr_processor.get_last_ocr_metadata()
+                        ocr_meta_dict = ocr_metadata if isinstance(ocr_metadata, dict) else {}
+                        raw_response = ocr_meta_dict.get('raw_response')
+
+                        if raw_response:
+                            logger.info(f"✨ Refining chunk {i} with GPT-4o (Always Refine Strategy)")
+
+                            # Use lightweight refinement instead of full extraction
+                            refined = smart_mapper_service.refine_adapter_result(
+                                adapter_result=chunk_extracted_data,
+                                ocr_json=raw_response,
+                                doc_type=document_type
+                            )
+
+                            if refined:
+                                # Replace with refined result
+                                chunk_extracted_data = refined
+                                logger.info(f"✨ Chunk {i} refined successfully")
+                            else:
+                                logger.warning(f"⚠️ Chunk {i} refinement failed - using adapter result")
+
+                    # ✅ FIX: Store raw_ocr_result for this chunk
+                    chunk_raw_ocr = chunk_ocr_metadata.get('raw_response') if chunk_ocr_metadata else None
+
+                    # Store chunk result
+                    chunk_result = {
+                        'extracted_data': chunk_extracted_data,
+                        'raw_text': chunk_text,
+                        'extracted_text': chunk_text,
+                        'chunk_number': i,
+                        'pages': f"{chunk_info['start_page']}-{chunk_info['end_page']}",
+                        'raw_ocr_result': chunk_raw_ocr  # Include raw OCR for split view
+                    }
+
+                    chunk_results.append(chunk_result)
+                    logger.info(f"✅ Chunk {i} processed successfully")
+
+                except Exception as e:
+                    logger.error(f"❌ Error processing chunk {i}: {e}")
+                    # Continue with other chunks
 
         if not chunk_results:
             raise Exception("All chunks failed to process")
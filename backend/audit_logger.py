@@ -1,10 +1,25 @@
 """
 Audit Logging System for Security Events
 Tracks authentication attempts, admin actions, and security events
+
+Request handlers only enqueue records (QueueHandler on a bounded queue); a QueueListener
+thread formats them and writes in batches:
+- logs/audit.log: JSON lines appended by every worker process, one write() per batch;
+  rotation is left to logrotate (the handler reopens the file when it is moved away),
+  since size-based rollover from several processes loses records
+- optional SQLite sink (audit_sqlite_path) for queryable history, see query_audit_events()
+When the queue is full the caller waits at most audit_enqueue_timeout before the event is
+dropped and counted, so request latency stays decoupled from disk I/O.
 """
+import atexit
 import logging
+import os
+import logging.handlers
+import queue
+import sqlite3
+import threading
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pathlib import Path
 import json
 
@@ -12,41 +27,306 @@ import json
 LOGS_DIR = Path(__file__).parent / "logs"
 LOGS_DIR.mkdir(exist_ok=True)
 
-# Configure audit logger
-audit_logger = logging.getLogger("audit")
-audit_logger.setLevel(logging.INFO)
-
-# File handler for audit logs
 audit_log_file = LOGS_DIR / "audit.log"
-file_handler = logging.FileHandler(audit_log_file)
-file_handler.setLevel(logging.INFO)
+
+
+def _audit_settings() -> Dict[str, Any]:
+    try:
+        from config import settings
+        return {
+            "queue_size": settings.audit_queue_size,
+            "batch_size": settings.audit_batch_size,
+            "enqueue_timeout": settings.audit_enqueue_timeout,
+            "sqlite_path": settings.audit_sqlite_path,
+        }
+    except Exception:
+        return {
+            "queue_size": 10000,
+            "batch_size": 200,
+            "enqueue_timeout": 0.05,
+            "sqlite_path": None,
+        }
+
 
 # JSON formatter for structured logs
 class JSONFormatter(logging.Formatter):
     """Format logs as JSON for easy parsing"""
     
     def format(self, record):
-        log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "level": record.levelname,
-            "event_type": getattr(record, "event_type", "unknown"),
-            "actor": getattr(record, "actor", "system"),
-            "action": getattr(record, "action", "unknown"),
-            "target": getattr(record, "target", None),
-            "ip_address": getattr(record, "ip_address", None),
-            "details": getattr(record, "details", {}),
-            "status": getattr(record, "status", "unknown"),
-            "message": record.getMessage()
-        }
-        return json.dumps(log_data)
+        return json.dumps(record_to_event(record))
+
+
+def record_to_event(record: logging.LogRecord) -> Dict[str, Any]:
+    """Audit fields of a record; the timestamp is when the event happened, not when it was written"""
+    return {
+        "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
+        "level": record.levelname,
+        "event_type": getattr(record, "event_type", "unknown"),
+        "actor": getattr(record, "actor", "system"),
+        "action": getattr(record, "action", "unknown"),
+        "target": getattr(record, "target", None),
+        "ip_address": getattr(record, "ip_address", None),
+        "details": getattr(record, "details", {}),
+        "status": getattr(record, "status", "unknown"),
+        "message": record.getMessage()
+    }
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler with bounded backpressure: wait briefly for space, then drop and count"""
+
+    def __init__(self, log_queue: queue.Queue, enqueue_timeout: float):
+        super().__init__(log_queue)
+        self.enqueue_timeout = enqueue_timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put(record, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def take_dropped(self) -> int:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class BatchedWatchedFileHandler(logging.handlers.WatchedFileHandler):
+    """WatchedFileHandler that buffers formatted lines and appends them in one write() per batch"""
+
+    def __init__(self, filename, batch_size: int):
+        super().__init__(filename, encoding="utf-8")
+        self.batch_size = batch_size
+        self._buffer: List[str] = []
+
+    def emit(self, record):
+        try:
+            self._buffer.append(self.format(record) + self.terminator)
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if not self._buffer:
+                return
+            data = "".join(self._buffer).encode("utf-8")
+            self._buffer = []
+            # Reopen if logrotate moved the file; then one O_APPEND write, so batches from
+            # different worker processes never interleave mid-line
+            self.reopenIfNeeded()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.flush()
+            os.write(self.stream.fileno(), data)
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class SQLiteAuditHandler(logging.Handler):
+    """Batched audit sink into SQLite (connection is owned by the listener thread)"""
+
+    def __init__(self, db_path: str, batch_size: int):
+        super().__init__()
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._rows: List[tuple] = []
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # Written from the listener thread; the final flush at shutdown runs on the main thread
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            _create_audit_table(self._conn)
+        return self._conn
+
+    def emit(self, record):
+        try:
+            event = record_to_event(record)
+            self._rows.append((
+                event["timestamp"], event["level"], event["event_type"], event["actor"], event["action"],
+                event["target"], event["ip_address"], event["status"],
+                json.dumps(event["details"], default=str), event["message"]
+            ))
+            if len(self._rows) >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        try:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO audit_events (timestamp, level, event_type, actor, action, target, ip_address, "
+                "status, details, message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).error(f"❌ Audit SQLite sink write failed ({len(rows)} events): {e}")
 
-file_handler.setFormatter(JSONFormatter())
-audit_logger.addHandler(file_handler)
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        super().close()
+
+
+def _create_audit_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audit_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            level TEXT,
+            event_type TEXT,
+            actor TEXT,
+            action TEXT,
+            target TEXT,
+            ip_address TEXT,
+            status TEXT,
+            details TEXT,
+            message TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_events_timestamp ON audit_events(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_events_actor ON audit_events(actor)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_events_type ON audit_events(event_type, action)")
+    conn.commit()
+
+
+class AuditQueueListener(logging.handlers.QueueListener):
+    """Flushes handler buffers whenever the queue drains, so batches stay small when traffic is light"""
+
+    def __init__(self, log_queue, *handlers, queue_handler: BoundedQueueHandler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.queue_handler = queue_handler
+
+    def enqueue_sentinel(self):
+        # Blocking put: at shutdown the queue may be full and every queued event must still be written
+        self.queue.put(self._sentinel)
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            self.flush()
+
+    def flush(self):
+        """Record events dropped under backpressure, then write out every handler's batch"""
+        dropped = self.queue_handler.take_dropped()
+        if dropped:
+            super().handle(logging.makeLogRecord({
+                "name": "audit", "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"AUDIT: {dropped} events dropped (queue full)",
+                "event_type": "audit", "action": "events_dropped", "status": "dropped",
+                "details": {"dropped": dropped}
+            }))
+        for handler in self.handlers:
+            handler.flush()
+
+
+def _build_pipeline():
+    config = _audit_settings()
+    log_queue: queue.Queue = queue.Queue(maxsize=config["queue_size"])
+    queue_handler = BoundedQueueHandler(log_queue, config["enqueue_timeout"])
+
+    file_handler = BatchedWatchedFileHandler(audit_log_file, config["batch_size"])
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(JSONFormatter())
+    handlers: List[logging.Handler] = [file_handler]
+    if config["sqlite_path"]:
+        sqlite_handler = SQLiteAuditHandler(config["sqlite_path"], config["batch_size"])
+        sqlite_handler.setLevel(logging.INFO)
+        handlers.append(sqlite_handler)
+
+    listener = AuditQueueListener(log_queue, *handlers, queue_handler=queue_handler)
+    return queue_handler, listener, config["sqlite_path"]
+
+
+# Configure audit logger
+audit_logger = logging.getLogger("audit")
+audit_logger.setLevel(logging.INFO)
+
+queue_handler, audit_listener, audit_sqlite_path = _build_pipeline()
+audit_logger.addHandler(queue_handler)
+audit_listener.start()
+
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+
+def shutdown_audit_logging():
+    """Drain the queue and flush every sink (registered with atexit)"""
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    audit_listener.stop()
+    audit_listener.flush()
+    for handler in audit_listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown_audit_logging)
 
 # Prevent propagation to root logger
 audit_logger.propagate = False
 
 
+def query_audit_events(
+    event_type: Optional[str] = None,
+    actor: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Newest-first audit history from the SQLite sink (empty if the sink is disabled)
+    Events still queued or buffered are not visible yet.
+    """
+    if not audit_sqlite_path or not Path(audit_sqlite_path).exists():
+        return []
+    clauses, params = [], []
+    for column, value in (("event_type", event_type), ("actor", actor), ("action", action)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since.isoformat())
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+
+    conn = sqlite3.connect(audit_sqlite_path, timeout=10)
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"SELECT timestamp, level, event_type, actor, action, target, ip_address, status, details, message "
+            f"FROM audit_events {where} ORDER BY id DESC LIMIT ?",
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{**dict(row), "details": json.loads(row["details"] or "{}")} for row in rows]
+
 class AuditLogger:
     """Centralized audit logging for security events"""
     
@@ -11,6 +11,21 @@ from typing import List, Dict, Any, Optional
 import re
 import logging
 
+from docai_index import DocAIDocumentIndex
+from format_inference import AmountFormatLock, FormatLock, date_format_lock
+
+# Format default parse_date (urutan dicoba saat sampling)
+DEFAULT_DATE_FORMATS = (
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%Y-%m-%d',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%d/%m/%y',
+    '%d-%m-%y',
+)
+
 
 @dataclass
 class StandardizedTransaction:
@@ -133,6 +148,10 @@ class BaseBankAdapter(ABC):
         self.raw_ocr_data = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # Format inference per dokumen (satu adapter instance = satu dokumen)
+        self._amount_format = AmountFormatLock(self._clean_amount_heuristic)
+        self._date_formats: Dict[tuple, FormatLock] = {}
+
     @abstractmethod
     def parse(self, ocr_result: Dict[str, Any]) -> List[StandardizedTransaction]:
         """
@@ -183,10 +202,17 @@ class BaseBankAdapter(ABC):
         """
         Clean dan convert string amount ke Decimal
         Handle berbagai format: 1.000,00 atau 1,000.00
+
+        Konvensi pemisah ribuan/desimal dikunci dari N nilai pertama dokumen;
+        heuristik penuh hanya dipakai kalau nilai tidak cocok dengan konvensi itu.
         """
         if not amount_str or amount_str.strip() == '':
             return Decimal('0.00')
 
+        return self._amount_format.parse(amount_str)
+
+    def _clean_amount_heuristic(self, amount_str: str) -> Decimal:
+        """Deteksi format per nilai (fallback dari clean_amount)"""
         # Remove currency symbols
         amount_str = re.sub(r'[Rp$€£¥]', '', amount_str)
         amount_str = amount_str.strip()
@@ -242,25 +268,36 @@ class BaseBankAdapter(ABC):
         if not date_str or date_str.strip() == '':
             return None
 
-        if formats is None:
-            formats = [
-                '%d/%m/%Y',
-                '%d-%m-%Y',
-                '%d.%m.%Y',
-                '%Y-%m-%d',
-                '%d %b %Y',
-                '%d %B %Y',
-                '%d/%m/%y',
-                '%d-%m-%y',
-            ]
-
-        date_str = date_str.strip()
-
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
+        key = tuple(formats) if formats is not None else DEFAULT_DATE_FORMATS
+        lock = self._date_formats.get(key)
+        if lock is None:
+            # Format yang menang di N tanggal pertama dikunci jadi parser regex tunggal
+            lock = self._date_formats[key] = date_format_lock(key)
+
+        return lock.parse(date_str.strip())
+
+    def get_tables(self, ocr_result: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ambil tabel dalam format adapter: {'rows': [{'cells': [{'text': ...}]}]}
+
+        Urutan sumber:
+        1. ocr_result['tables'] (sudah dalam format adapter)
+        2. Tabel Document AI di ocr_result['pages'] / ocr_result['raw_response'],
+           di-resolve sekali lewat DocAIDocumentIndex (text anchor tidak di-scan ulang)
+
+        Returns:
+            List tabel, atau None kalau tidak ada tabel (adapter pakai text parsing)
+        """
+        tables = ocr_result.get('tables')
+        if tables:
+            return tables
+
+        for source in (ocr_result, ocr_result.get('raw_response')):
+            if source is None or (isinstance(source, dict) and not source.get('pages')):
                 continue
+            index_tables = DocAIDocumentIndex(source).adapter_tables()
+            if index_tables:
+                return index_tables
 
         return None
 
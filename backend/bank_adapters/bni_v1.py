@@ -37,8 +37,9 @@ class BniV1Adapter(BaseBankAdapter):
         self.account_info = self.extract_account_info(ocr_result)
 
         # Parse transactions
-        if 'tables' in ocr_result:
-            self._parse_from_tables(ocr_result['tables'])
+        tables = self.get_tables(ocr_result)
+        if tables is not None:
+            self._parse_from_tables(tables)
         else:
             self._parse_from_text(ocr_result)
 
@@ -60,13 +60,14 @@ class CimbNiagaAdapter(BaseBankAdapter):
         self.account_info = self.extract_account_info(ocr_result)
 
         # Parse transactions based on detected format
-        if 'tables' in ocr_result and ocr_result['tables']:
+        tables = self.get_tables(ocr_result)
+        if tables:
             # If format not detected but we have tables, skip (shouldn't happen)
             if not self.detected_format:
                 self.logger.warning("⚠️ Tables found but format not detected - falling back to text extraction")
                 self._parse_from_text(ocr_result)
             else:
-                self._parse_from_tables(ocr_result['tables'])
+                self._parse_from_tables(tables)
         else:
             # No tables - use text extraction (will auto-infer format)
             self._parse_from_text(ocr_result)
@@ -92,8 +93,9 @@ class CimbNiagaAdapter(BaseBankAdapter):
             return 'format_2'
 
         # Fallback: check table structure
-        if 'tables' in ocr_result:
-            for table in ocr_result['tables']:
+        tables = self.get_tables(ocr_result)
+        if tables:
+            for table in tables:
                 rows = table.get('rows', [])
                 if rows:
                     header = ' '.join([cell.get('text', '') for cell in rows[0].get('cells', [])]).upper()
@@ -56,12 +56,13 @@ class BatchProcessor:
         """
         batch_id = str(uuid.uuid4())
         
-        # Count total pages for PDFs
-        total_pages = 0
-        for file_path in file_paths:
-            if str(file_path).lower().endswith('.pdf'):
-                page_count = get_pdf_page_count(file_path)
-                total_pages += page_count
+        # Count total pages for PDFs (one probe per file, reused below and by OCR)
+        page_counts = {
+            file_path: get_pdf_page_count(file_path)
+            for file_path in file_paths
+            if str(file_path).lower().endswith('.pdf')
+        }
+        total_pages = sum(page_counts.values())
 
         batch_info = {
             "batch_id": batch_id,
@@ -85,10 +86,7 @@ class BatchProcessor:
             filename = Path(file_path).name
             detected_type = detect_document_type_from_filename(filename) if document_type == 'auto' else document_type
 
-            # Get page count for PDFs
-            page_count = 0
-            if str(file_path).lower().endswith('.pdf'):
-                page_count = get_pdf_page_count(file_path)
+            page_count = page_counts.get(file_path, 0)
 
             batch_info["files"].append({
                 "file_path": file_path,
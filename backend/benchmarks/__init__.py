@@ -0,0 +1,32 @@
+"""
+Offline Throughput Benchmarks
+End-to-end timing of the pipeline with recorded OCR and a fake LLM server
+
+Run from backend/:
+    python -m benchmarks --sizes 100,1000,10000 --output results/benchmark.json
+    python -m benchmarks --baseline results/benchmark_prev.json --output results/benchmark.json
+"""
+
+from .fake_llm import FakeLLMServer
+from .replay import ReplayOCREngine, load_fixture, load_fixture_dir
+from .runner import (
+    SCENARIOS,
+    BenchmarkConfig,
+    BenchmarkRunner,
+    compare_reports,
+    run_benchmarks,
+    write_report,
+)
+
+__all__ = [
+    "FakeLLMServer",
+    "ReplayOCREngine",
+    "load_fixture",
+    "load_fixture_dir",
+    "SCENARIOS",
+    "BenchmarkConfig",
+    "BenchmarkRunner",
+    "compare_reports",
+    "run_benchmarks",
+    "write_report",
+]
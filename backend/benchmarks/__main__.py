@@ -0,0 +1,92 @@
+"""
+Benchmark CLI
+
+    python -m benchmarks [--sizes 100,1000] [--scenarios document_ai,batch] \
+        [--llm-latency-ms 800] [--output results/benchmark.json] [--baseline old.json]
+
+Exits with status 1 when --baseline is given and a regression beyond --threshold is found.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime
+
+from .runner import SCENARIOS, BenchmarkConfig, BenchmarkRunner, compare_reports, write_report
+from .synthetic import split_sizes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline throughput benchmarks")
+    parser.add_argument("--sizes", default="100,1000", help="Comma-separated row counts (e.g. 1e2,1e3,1e4,1e5)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--ocr-latency-ms", type=float, default=0.0, help="Simulated Document AI round trip")
+    parser.add_argument("--batch-files", type=int, default=10)
+    parser.add_argument("--max-concurrent", type=int, default=5)
+    parser.add_argument("--max-documents", type=int, default=100)
+    parser.add_argument("--reconciliation-limit", type=int, default=10_000)
+    parser.add_argument("--fixtures", dest="fixtures_dir", help="Directory of recorded Document AI *.json responses")
+    parser.add_argument("--output", help="Report path (default: results/benchmark_<timestamp>.json)")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold (fraction)")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline logs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger("benchmarks").setLevel(logging.INFO)
+
+    config = BenchmarkConfig(
+        sizes=split_sizes(args.sizes),
+        scenarios=[s.strip() for s in args.scenarios.split(",") if s.strip()],
+        repeat=args.repeat,
+        seed=args.seed,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        ocr_latency_ms=args.ocr_latency_ms,
+        batch_files=args.batch_files,
+        max_concurrent=args.max_concurrent,
+        max_documents=args.max_documents,
+        reconciliation_limit=args.reconciliation_limit,
+        fixtures_dir=args.fixtures_dir,
+    )
+    report = asyncio.run(BenchmarkRunner(config).run())
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.threshold)
+        report["baseline"] = {"path": args.baseline, "git_commit": baseline.get("git_commit"), "regressions": regressions}
+
+    output = args.output or f"results/benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    write_report(report, output)
+
+    for result in report["results"]:
+        if "skipped" in result:
+            print(f"{result['scenario']:<20} {result['label']:<24} {result['size']:>7}  skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['scenario']:<20} {result['label']:<24} {result['size']:>7}  "
+            f"{result['throughput_items_per_s'] or 0:>10.1f} items/s  "
+            f"p50 {result['latency_ms']['p50']:>9.1f} ms  p95 {result['latency_ms']['p95']:>9.1f} ms  "
+            f"rss {result['peak_rss_mb']:>7.1f} MB  tok/doc {result['llm']['tokens_per_document']:>8.1f}"
+            + (f"  errors {result['errors']}" if result["errors"] else "")
+        )
+    print(f"\n📄 Report written to {output}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) vs {args.baseline}:")
+        for r in regressions:
+            print(f"   {r['scenario']}/{r['label']} @ {r['size']}: {r['metric']} {r['baseline']} → {r['current']} ({r['change']:+.1%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
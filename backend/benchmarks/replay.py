@@ -0,0 +1,101 @@
+"""
+Recorded Document AI Replay
+Serve recorded (or synthetic) Document AI raw_response dicts in place of the live API
+
+ReplayOCREngine exposes the same `process_with_google(file_path, content=None)`
+coroutine as CloudAIProcessor and returns a CloudOCRResult built from a fixture,
+so everything after OCR (adapters, rule parser, saldo validation, smart mapper,
+exporters) runs unchanged. Fixtures are looked up by the input file's stem and
+kept serialized: each call decodes a fresh dict, which stands in for the proto
+→ dict conversion of a live response and keeps pipeline mutations out of the fixture.
+"""
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from cloud_ai_processor import CloudOCRResult
+
+logger = logging.getLogger(__name__)
+
+
+def load_fixture(path: str) -> Dict[str, Any]:
+    """
+    Load a recorded response
+
+    Accepts a bare Document AI dict ({'text', 'pages', ...}) or a saved OCR
+    metadata / result dict carrying it under 'raw_response'.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get("raw_response"), dict):
+        return data["raw_response"]
+    return data
+
+
+def load_fixture_dir(directory: str) -> Dict[str, Dict[str, Any]]:
+    """All *.json fixtures in a directory, keyed by file stem"""
+    fixtures = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            fixtures[path.stem] = load_fixture(str(path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Skipping fixture {path.name}: {e}")
+    return fixtures
+
+
+class ReplayOCREngine:
+    """Drop-in for CloudAIProcessor that answers from fixtures"""
+
+    def __init__(self, fixtures: Optional[Dict[str, Dict[str, Any]]] = None, latency_ms: float = 0.0):
+        """
+        Args:
+            fixtures: {file stem: Document AI raw_response dict}
+            latency_ms: Simulated Document AI round trip per call
+        """
+        self.fixtures: Dict[str, str] = {}
+        self.latency_ms = latency_ms
+        self.calls = 0
+        for name, raw_response in (fixtures or {}).items():
+            self.add(name, raw_response)
+
+    def add(self, name: str, raw_response: Dict[str, Any]) -> None:
+        self.fixtures[name] = json.dumps(raw_response)
+
+    async def process_with_google(self, file_path: str, content: Optional[bytes] = None) -> CloudOCRResult:
+        self.calls += 1
+        stem = Path(file_path).stem
+        serialized = self.fixtures.get(stem)
+        if serialized is None:
+            raise Exception(f"No recorded Document AI response for '{stem}'")
+
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        raw_response = json.loads(serialized)
+
+        entities = raw_response.get("entities") or []
+        extracted_fields = {
+            str(e.get("type_") or e.get("type", "")).replace("/", "_"): {
+                "value": e.get("mention_text") or e.get("mentionText", ""),
+                "confidence": round(float(e.get("confidence", 0.0)), 4),
+            }
+            for e in entities if isinstance(e, dict)
+        }
+        return CloudOCRResult(
+            raw_text=raw_response.get("text", ""),
+            confidence=95.0,
+            service_used="Google Document AI (replay)",
+            processing_time=self.latency_ms / 1000,
+            extracted_fields=extracted_fields,
+            raw_response=raw_response,
+            document_type="unknown",
+            language_detected="id",
+        )
+
+    def install(self, ocr_processor) -> None:
+        """Route a RealOCRProcessor's Google engine to this replay (text layer off)"""
+        ocr_processor.cloud_processor = self
+        ocr_processor.text_layer = None
+        ocr_processor.initialized = True
@@ -0,0 +1,512 @@
+"""
+Benchmark Runner
+Time the document pipeline, batches, exporters and reconciliation engines offline
+
+Each scenario runs at every requested size (transactions / fakturs) and reports:
+- throughput (items/s and operations/s)
+- p50 / p95 / max latency per operation
+- peak RSS during the scenario
+- LLM requests and tokens per document (counted by the fake LLM server)
+
+OCR is replayed from Document AI fixtures and the OpenAI/Anthropic SDKs are routed
+to FakeLLMServer, so runs need no credentials or network and are reproducible.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .fake_llm import FakeLLMServer
+from .replay import ReplayOCREngine, load_fixture_dir
+from .synthetic import (
+    COMPANY_NPWP,
+    faktur_to_docai,
+    generate_bukti_potong,
+    generate_fakturs,
+    generate_statement,
+    statement_for_fakturs,
+    statement_result,
+    statement_to_docai,
+)
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("document_ai", "batch", "exporters", "matching_engine", "ppn_reconciliation")
+REPORT_VERSION = 1
+
+# Placeholder input: exists on disk for the pipeline's checks, probes as 0 pages (no chunking)
+_PLACEHOLDER_PDF = b"%PDF-1.4\n%EOF\n"
+
+
+@dataclass
+class BenchmarkConfig:
+    """What to run and how hard"""
+    sizes: List[int] = field(default_factory=lambda: [100, 1000])
+    scenarios: List[str] = field(default_factory=lambda: list(SCENARIOS))
+    repeat: int = 3
+    seed: int = 42
+    llm_latency_ms: float = 0.0
+    llm_jitter_ms: float = 0.0
+    ocr_latency_ms: float = 0.0
+    batch_files: int = 10
+    max_concurrent: int = 5
+    max_documents: int = 100  # Cap on per-document runs (faktur pages) per size
+    reconciliation_limit: int = 10_000  # Reconciliation engines are O(n·m) - skip larger sizes
+    fixtures_dir: Optional[str] = None  # Recorded Document AI responses (*.json)
+    workdir: Optional[str] = None
+
+
+# ----------------------------------------------------------------------
+# Measurement helpers
+# ----------------------------------------------------------------------
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux); False when unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size (VmHWM on Linux, else ru_maxrss since process start)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).parent,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def prepare_environment(llm_server: FakeLLMServer) -> None:
+    """
+    Route SDKs to the fake LLM server and OCR to the replay engine
+
+    Must run before ai_processor / smart_mapper are imported: engine mode, API keys
+    and base URLs are read at import or client construction time.
+    """
+    os.environ.update(llm_server.env())
+    os.environ["OCR_ENGINE_MODE"] = "google_only"
+    os.environ["PDF_TEXT_LAYER_ENABLED"] = "false"
+    # Every run must pay the (fake) LLM round trip - and canned responses must never
+    # land in the production Smart Mapper response cache
+    os.environ["SMART_MAPPER_CACHE_ENABLED"] = "false"
+
+
+class BenchmarkRunner:
+    """Runs the configured scenarios and builds the JSON report"""
+
+    def __init__(self, config: BenchmarkConfig, llm_server: Optional[FakeLLMServer] = None):
+        self.config = config
+        self.llm = llm_server
+        self.replay = ReplayOCREngine(latency_ms=config.ocr_latency_ms)
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+        self.workdir = Path(config.workdir) if config.workdir else None
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+    async def run(self) -> Dict[str, Any]:
+        owns_server = self.llm is None
+        if owns_server:
+            self.llm = FakeLLMServer(self.config.llm_latency_ms, self.config.llm_jitter_ms, seed=self.config.seed)
+            self.llm.start()
+        prepare_environment(self.llm)
+
+        if self.workdir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="benchmark_")
+            self.workdir = Path(self._tmp.name)
+        self.workdir.mkdir(parents=True, exist_ok=True)
+
+        results: List[Dict[str, Any]] = []
+        try:
+            self._install_replay()
+            for scenario in self.config.scenarios:
+                handler = getattr(self, f"_scenario_{scenario}", None)
+                if handler is None:
+                    raise ValueError(f"Unknown scenario '{scenario}' (available: {', '.join(SCENARIOS)})")
+                for size in self.config.sizes:
+                    logger.info(f"⏱️ {scenario} @ {size}")
+                    results.extend(await handler(size))
+                if scenario == "document_ai" and self.config.fixtures_dir:
+                    results.extend(await self._recorded_fixtures())
+        finally:
+            if owns_server:
+                self.llm.stop()
+            if self._tmp is not None:
+                self._tmp.cleanup()
+
+        return {
+            "version": REPORT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": asdict(self.config),
+            "results": results,
+        }
+
+    def _install_replay(self) -> None:
+        from ai_processor import get_ocr_processor
+        self.replay.install(get_ocr_processor())
+
+    def _placeholder(self, name: str, raw_response: Dict[str, Any]) -> str:
+        """Register a fixture and create the input file the pipeline will open"""
+        self.replay.add(name, raw_response)
+        path = self.workdir / f"{name}.pdf"
+        path.write_bytes(_PLACEHOLDER_PDF)
+        return str(path)
+
+    # ------------------------------------------------------------------
+    # Measurement
+    # ------------------------------------------------------------------
+    async def _measure(
+        self,
+        scenario: str,
+        size: int,
+        label: str,
+        operation: Callable[[], Any],
+        items_per_op: int,
+        documents_per_op: int = 1,
+        operations: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Run operation `operations` (default: repeat) times; sync or async callables"""
+        runs = operations or self.config.repeat
+        latencies: List[float] = []
+        errors = 0
+        self.llm.reset_stats()
+        rss_reset = reset_peak_rss()
+
+        wall_start = time.perf_counter()
+        for _ in range(runs):
+            start = time.perf_counter()
+            try:
+                outcome = operation()
+                if inspect.isawaitable(outcome):
+                    outcome = await outcome
+                if outcome is False:
+                    errors += 1
+            except Exception as e:
+                errors += 1
+                logger.warning(f"⚠️ {scenario}/{label} @ {size} failed: {e}")
+            latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - wall_start
+
+        llm = self.llm.snapshot()
+        documents = max(1, runs * documents_per_op)
+        return {
+            "scenario": scenario,
+            "label": label,
+            "size": size,
+            "operations": runs,
+            "errors": errors,
+            "wall_s": round(wall, 4),
+            "throughput_items_per_s": round(runs * items_per_op / wall, 2) if wall > 0 else None,
+            "throughput_ops_per_s": round(runs / wall, 3) if wall > 0 else None,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "max": round(max(latencies) * 1000, 2),
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            },
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_scope": "scenario" if rss_reset else "process",
+            "llm": {
+                **llm,
+                "tokens_per_document": round((llm["prompt_tokens"] + llm["completion_tokens"]) / documents, 1),
+            },
+        }
+
+    def _skipped(self, scenario: str, size: int, label: str, reason: str) -> Dict[str, Any]:
+        return {"scenario": scenario, "label": label, "size": size, "skipped": reason}
+
+    # ------------------------------------------------------------------
+    # Scenarios
+    # ------------------------------------------------------------------
+    async def _scenario_document_ai(self, size: int) -> List[Dict[str, Any]]:
+        """process_document_ai on one statement of `size` rows and on faktur pages"""
+        from ai_processor import process_document_ai
+
+        statement = generate_statement(size, seed=self.config.seed)
+        statement_path = self._placeholder(f"rekening_koran_{size}", statement_to_docai(statement))
+        results = [await self._measure(
+            "document_ai", size, "rekening_koran",
+            lambda: process_document_ai(statement_path, "rekening_koran"),
+            items_per_op=size,
+        )]
+
+        fakturs = generate_fakturs(min(size, self.config.max_documents), seed=self.config.seed)
+        faktur_paths = [
+            self._placeholder(f"faktur_pajak_{size}_{i}", faktur_to_docai(faktur))
+            for i, faktur in enumerate(fakturs)
+        ]
+        faktur_iter = iter(faktur_paths * self.config.repeat)
+        results.append(await self._measure(
+            "document_ai", size, "faktur_pajak",
+            lambda: process_document_ai(next(faktur_iter), "faktur_pajak"),
+            items_per_op=1,
+            operations=len(faktur_paths) * self.config.repeat,
+        ))
+        return results
+
+    async def _recorded_fixtures(self) -> List[Dict[str, Any]]:
+        """process_document_ai on each recorded Document AI response"""
+        from ai_processor import process_document_ai
+        from confidence_calculator import detect_document_type_from_filename
+
+        results = []
+        for name, raw_response in load_fixture_dir(self.config.fixtures_dir).items():
+            path = self._placeholder(f"recorded_{name}", raw_response)
+            document_type = detect_document_type_from_filename(f"{name}.pdf")
+            results.append(await self._measure(
+                "document_ai", len(raw_response.get("pages", [])), f"recorded:{name}",
+                lambda: process_document_ai(path, document_type),
+                items_per_op=1,
+            ))
+        return results
+
+    async def _scenario_batch(self, size: int) -> List[Dict[str, Any]]:
+        """BatchProcessor create + process over batch_files statements totalling `size` rows"""
+        from batch_processor import BatchProcessor
+
+        files = max(1, self.config.batch_files)
+        rows_per_file = max(10, size // files)
+        paths = [
+            self._placeholder(
+                f"batch_{size}_{i}",
+                statement_to_docai(generate_statement(rows_per_file, seed=self.config.seed + i)),
+            )
+            for i in range(files)
+        ]
+        processor = BatchProcessor(max_concurrent_tasks=self.config.max_concurrent)
+
+        async def run_batch():
+            batch_id = await processor.create_batch(paths, "rekening_koran")
+            summary = await processor.process_batch(batch_id)
+            processor.batches.pop(batch_id, None)
+            return summary
+
+        return [await self._measure(
+            "batch", size, f"rekening_koran x{files}", run_batch,
+            items_per_op=rows_per_file * files,
+            documents_per_op=files,
+        )]
+
+    async def _scenario_exporters(self, size: int) -> List[Dict[str, Any]]:
+        """Rekening koran Excel/PDF export of one statement and a batch export"""
+        from exporters.export_factory import ExportFactory
+
+        exporter = ExportFactory.get_exporter("rekening_koran")
+        if exporter is None:
+            return [self._skipped("exporters", size, "rekening_koran", "no exporter registered")]
+
+        result = statement_result(generate_statement(size, seed=self.config.seed))
+        files = max(1, self.config.batch_files)
+        batch_results = [
+            statement_result(generate_statement(max(10, size // files), seed=self.config.seed + i))
+            for i in range(files)
+        ]
+        out = self.workdir
+
+        return [
+            await self._measure(
+                "exporters", size, "excel",
+                lambda: exporter.export_to_excel(result, str(out / f"export_{size}.xlsx")),
+                items_per_op=size,
+            ),
+            await self._measure(
+                "exporters", size, "pdf",
+                lambda: exporter.export_to_pdf(result, str(out / f"export_{size}.pdf")),
+                items_per_op=size,
+            ),
+            await self._measure(
+                "exporters", size, f"batch_excel x{files}",
+                lambda: exporter.batch_export_to_excel("benchmark", batch_results, str(out / f"batch_{size}.xlsx")),
+                items_per_op=max(10, size // files) * files,
+                documents_per_op=files,
+            ),
+        ]
+
+    async def _scenario_matching_engine(self, size: int) -> List[Dict[str, Any]]:
+        """MatchingEngine.find_matches: faktur masukan vs bank payments"""
+        if size > self.config.reconciliation_limit:
+            return [self._skipped("matching_engine", size, "find_matches", "size above reconciliation_limit")]
+
+        from matching_engine import MatchCandidate, MatchingEngine
+
+        fakturs = generate_fakturs(size, seed=self.config.seed)
+        incoming = [f for f in fakturs if f["npwp_pembeli"] == COMPANY_NPWP]
+        payments = statement_for_fakturs(fakturs, seed=self.config.seed)
+        faktur_candidates = [
+            MatchCandidate("faktur_pajak", "benchmark", i, f["tanggal_faktur"], f["total"], f["nama_penjual"],
+                           f["nomor_faktur"], f)
+            for i, f in enumerate(incoming)
+        ]
+        rekening_candidates = [
+            MatchCandidate("rekening_koran", "benchmark", i, p["tanggal"], p["nominal"], p["vendor"],
+                           p["keterangan"], p)
+            for i, p in enumerate(payments)
+        ]
+        engine = MatchingEngine()
+        return [await self._measure(
+            "matching_engine", size, "find_matches",
+            lambda: engine.find_matches(faktur_candidates, rekening_candidates),
+            items_per_op=len(faktur_candidates) + len(rekening_candidates),
+        )]
+
+    async def _scenario_ppn_reconciliation(self, size: int) -> List[Dict[str, Any]]:
+        """Rule-based and AI (fake LLM) PPN reconciliation, Point A vs C and B vs E"""
+        if size > self.config.reconciliation_limit:
+            return [self._skipped("ppn_reconciliation", size, "rule_based", "size above reconciliation_limit")]
+
+        import pandas as pd
+        from services.ppn_ai_reconciliation_service import AIReconciliationService
+        from services.ppn_reconciliation_service import (
+            match_point_a_vs_c,
+            match_point_b_vs_e,
+            split_faktur_pajak,
+        )
+
+        fakturs = generate_fakturs(size, seed=self.config.seed)
+        df_faktur = pd.DataFrame([{
+            "Nomor Faktur": f["nomor_faktur"],
+            "Tanggal Faktur": f["tanggal_faktur"],
+            "NPWP Penjual": f["npwp_penjual"],
+            "Nama Penjual": f["nama_penjual"],
+            "NPWP Pembeli": f["npwp_pembeli"],
+            "Nama Pembeli": f["nama_pembeli"],
+            "DPP (Rp)": float(f["dpp"]),
+            "PPN (Rp)": float(f["ppn"]),
+            "Total (Rp)": float(f["total"]),
+        } for f in fakturs])
+        df_bukti = pd.DataFrame([{
+            "Nomor Bukti Potong": b["nomor_bukti_potong"],
+            "Tanggal Bukti Potong": b["tanggal_bukti_potong"],
+            "NPWP Pemotong": b["npwp_pemotong"],
+            "Nama Pemotong": b["nama_pemotong"],
+            "Jumlah Penghasilan Bruto (Rp)": float(b["jumlah_penghasilan_bruto"]),
+            "PPh Dipotong (Rp)": float(b["pph_dipotong"]),
+        } for b in generate_bukti_potong(fakturs, seed=self.config.seed)])
+        df_rekening = pd.DataFrame([{
+            "Tanggal": p["tanggal"],
+            "Keterangan": p["keterangan"],
+            "Debet (Rp)": float(p["nominal"]),
+            "Kredit (Rp)": 0.0,
+        } for p in statement_for_fakturs(fakturs, seed=self.config.seed)])
+
+        point_a, point_b = split_faktur_pajak(df_faktur, COMPANY_NPWP)
+        items = len(df_faktur) + len(df_bukti) + len(df_rekening)
+
+        def rule_based():
+            match_point_a_vs_c(point_a, df_bukti)
+            return match_point_b_vs_e(point_b, df_rekening)
+
+        ai_service = AIReconciliationService()
+
+        def ai_enhanced():
+            ai_service.match_point_a_vs_c_ai(point_a, df_bukti, use_fallback=False)
+            return ai_service.match_point_b_vs_e_ai(point_b, df_rekening, use_fallback=False)
+
+        return [
+            await self._measure("ppn_reconciliation", size, "rule_based", rule_based, items_per_op=items),
+            await self._measure("ppn_reconciliation", size, "ai_fake_llm", ai_enhanced, items_per_op=items),
+        ]
+
+
+# ----------------------------------------------------------------------
+# Reports
+# ----------------------------------------------------------------------
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Path):
+        return str(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=_json_default)
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10,
+) -> List[Dict[str, Any]]:
+    """
+    Regressions of `current` against `baseline`
+
+    A result regresses when its p95 latency grows, or its item throughput drops,
+    by more than `threshold` (fraction) for the same scenario/label/size.
+    """
+    def key(result):
+        return (result["scenario"], result["label"], result["size"])
+
+    previous = {key(r): r for r in baseline.get("results", []) if "skipped" not in r}
+    regressions = []
+    for result in current.get("results", []):
+        before = previous.get(key(result))
+        if before is None or "skipped" in result:
+            continue
+
+        old_p95, new_p95 = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if old_p95 > 0 and (new_p95 - old_p95) / old_p95 > threshold:
+            regressions.append({
+                "scenario": result["scenario"], "label": result["label"], "size": result["size"],
+                "metric": "latency_ms.p95", "baseline": old_p95, "current": new_p95,
+                "change": round((new_p95 - old_p95) / old_p95, 3),
+            })
+
+        old_tp, new_tp = before.get("throughput_items_per_s"), result.get("throughput_items_per_s")
+        if old_tp and new_tp is not None and (old_tp - new_tp) / old_tp > threshold:
+            regressions.append({
+                "scenario": result["scenario"], "label": result["label"], "size": result["size"],
+                "metric": "throughput_items_per_s", "baseline": old_tp, "current": new_tp,
+                "change": round((new_tp - old_tp) / old_tp, 3),
+            })
+    return regressions
+
+
+def run_benchmarks(config: BenchmarkConfig) -> Dict[str, Any]:
+    """Synchronous wrapper around BenchmarkRunner.run()"""
+    return asyncio.run(BenchmarkRunner(config).run())
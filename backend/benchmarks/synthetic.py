@@ -0,0 +1,281 @@
+"""
+Synthetic Benchmark Data
+Deterministic, scalable rekening koran / faktur pajak / bukti potong generators
+
+Every generator takes a row count (10² … 10⁵) and a seed, so two runs with the
+same arguments produce byte-identical inputs and their timings are comparable.
+Rekening koran transactions can also be rendered as a Google Document AI
+`raw_response` dict (text + text-anchored lines and tables) in BCA layout, which
+the bank adapters, rule parser and smart mapper consume like a real OCR result.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+COMPANY_NPWP = "01.234.567.8-901.000"
+COMPANY_NAME = "PT MAJU BERSAMA SEJAHTERA"
+
+_VENDORS = [
+    "PT SUMBER MAKMUR", "CV KARYA ABADI", "PT TEKNOLOGI NUSANTARA", "PT LOGISTIK PRIMA",
+    "CV MITRA SENTOSA", "PT DUTA INFORMATIKA", "PT SINAR JAYA", "PT GRAHA MANDIRI",
+    "CV BERKAH UTAMA", "PT INDO KONSTRUKSI",
+]
+_DESCRIPTIONS = [
+    "TRSF E-BANKING CR", "TRSF E-BANKING DB", "KR OTOMATIS", "BIAYA ADM",
+    "SETORAN TUNAI", "TARIKAN ATM", "BUNGA", "PAJAK BUNGA", "KLIRING", "BI-FAST CR",
+]
+
+
+@dataclass
+class SyntheticStatement:
+    """Generated rekening koran with its ground truth"""
+    transactions: List[Dict[str, Any]]
+    opening_balance: Decimal
+    closing_balance: Decimal
+    account_number: str
+    account_holder: str
+    period: str
+
+
+def _npwp(rng: random.Random) -> str:
+    digits = "".join(str(rng.randint(0, 9)) for _ in range(15))
+    return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}.{digits[8]}-{digits[9:12]}.{digits[12:15]}"
+
+
+def _us_amount(value: Decimal) -> str:
+    return f"{value:,.2f}"
+
+
+def _id_amount(value: Decimal) -> str:
+    return _us_amount(value).translate(str.maketrans(",.", ".,"))
+
+
+def generate_statement(rows: int, seed: int = 42, start: Optional[datetime] = None) -> SyntheticStatement:
+    """Rekening koran with a consistent saldo chain (every row reconciles)"""
+    rng = random.Random(seed)
+    start = start or datetime(2024, 1, 1)
+    balance = Decimal(rng.randint(50_000_000, 500_000_000))
+    opening = balance
+    transactions = []
+
+    for i in range(rows):
+        date = start + timedelta(days=i * 365 // max(rows, 1))
+        amount = Decimal(rng.randint(10_000, 25_000_000)) + Decimal(rng.randint(0, 99)) / 100
+        is_credit = rng.random() < 0.45 or balance < amount
+        balance = balance + amount if is_credit else balance - amount
+        vendor = rng.choice(_VENDORS)
+        transactions.append({
+            "tanggal": date.strftime("%d/%m/%Y"),
+            "keterangan": f"{rng.choice(_DESCRIPTIONS)} {vendor}",
+            "cbg": f"{rng.randint(0, 9999):04d}",
+            "debet": "" if is_credit else _us_amount(amount),
+            "kredit": _us_amount(amount) if is_credit else "",
+            "saldo": _us_amount(balance),
+            "vendor": vendor,
+        })
+
+    end = start + timedelta(days=365)
+    return SyntheticStatement(
+        transactions=transactions,
+        opening_balance=opening,
+        closing_balance=balance,
+        account_number=f"{rng.randint(10**9, 10**10 - 1)}",
+        account_holder=COMPANY_NAME,
+        period=f"{start:%d/%m/%Y} - {end:%d/%m/%Y}",
+    )
+
+
+def generate_fakturs(rows: int, seed: int = 42, company_npwp: str = COMPANY_NPWP) -> List[Dict[str, Any]]:
+    """Faktur pajak rows; roughly half issued by the company (Point A), half received (Point B)"""
+    rng = random.Random(seed)
+    fakturs = []
+    for i in range(rows):
+        dpp = Decimal(rng.randint(1_000_000, 500_000_000))
+        ppn = (dpp * Decimal("0.11")).quantize(Decimal("1"))
+        counterparty_npwp, counterparty = _npwp(rng), rng.choice(_VENDORS)
+        outgoing = rng.random() < 0.5
+        fakturs.append({
+            "nomor_faktur": f"010.{rng.randint(0, 999):03d}-24.{i:08d}",
+            "tanggal_faktur": (datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 364))).strftime("%d/%m/%Y"),
+            "npwp_penjual": company_npwp if outgoing else counterparty_npwp,
+            "nama_penjual": COMPANY_NAME if outgoing else counterparty,
+            "npwp_pembeli": counterparty_npwp if outgoing else company_npwp,
+            "nama_pembeli": counterparty if outgoing else COMPANY_NAME,
+            "dpp": dpp,
+            "ppn": ppn,
+            "total": dpp + ppn,
+        })
+    return fakturs
+
+
+def generate_bukti_potong(fakturs: List[Dict[str, Any]], match_rate: float = 0.8, seed: int = 42) -> List[Dict[str, Any]]:
+    """Bukti potong for a share of outgoing fakturs (Point C)"""
+    rng = random.Random(seed + 1)
+    rows = []
+    for faktur in fakturs:
+        if faktur["npwp_penjual"] != COMPANY_NPWP or rng.random() > match_rate:
+            continue
+        date = datetime.strptime(faktur["tanggal_faktur"], "%d/%m/%Y") + timedelta(days=rng.randint(0, 5))
+        rows.append({
+            "nomor_bukti_potong": f"BP-{len(rows):08d}",
+            "tanggal_bukti_potong": date.strftime("%d/%m/%Y"),
+            "npwp_pemotong": faktur["npwp_pembeli"],
+            "nama_pemotong": faktur["nama_pembeli"],
+            "npwp_dipotong": COMPANY_NPWP,
+            "nama_dipotong": COMPANY_NAME,
+            "jumlah_penghasilan_bruto": faktur["dpp"],
+            "tarif_pph": Decimal("2"),
+            "pph_dipotong": (faktur["dpp"] * Decimal("0.02")).quantize(Decimal("1")),
+        })
+    return rows
+
+
+def statement_for_fakturs(fakturs: List[Dict[str, Any]], match_rate: float = 0.8, seed: int = 42) -> List[Dict[str, Any]]:
+    """Bank payments for a share of incoming fakturs (Point E)"""
+    rng = random.Random(seed + 2)
+    rows = []
+    for faktur in fakturs:
+        if faktur["npwp_pembeli"] != COMPANY_NPWP or rng.random() > match_rate:
+            continue
+        date = datetime.strptime(faktur["tanggal_faktur"], "%d/%m/%Y") + timedelta(days=rng.randint(0, 5))
+        rows.append({
+            "tanggal": date.strftime("%d/%m/%Y"),
+            "keterangan": f"TRSF E-BANKING DB {faktur['nama_penjual']}",
+            "nominal": faktur["total"],
+            "jenis_transaksi": "debit",
+            "vendor": faktur["nama_penjual"],
+        })
+    return rows
+
+
+# ----------------------------------------------------------------------
+# Document AI rendering
+# ----------------------------------------------------------------------
+class _AnchoredText:
+    """Accumulates document text and hands out Document AI text anchors"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.length = 0
+
+    def add(self, text: str) -> Dict[str, Any]:
+        start = self.length
+        self.parts.append(text)
+        self.length += len(text)
+        return {"text_anchor": {"text_segments": [{"start_index": start, "end_index": self.length}]}}
+
+    def span(self, start: int) -> Dict[str, Any]:
+        return {"text_anchor": {"text_segments": [{"start_index": start, "end_index": self.length}]}}
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def statement_to_docai(statement: SyntheticStatement, rows_per_page: int = 30) -> Dict[str, Any]:
+    """Render a statement as a Document AI raw_response dict (BCA layout, US number format)"""
+    doc = _AnchoredText()
+    header_cells = ["TANGGAL", "KETERANGAN", "CBG", "MUTASI", "SALDO"]
+    pages = []
+    rows = statement.transactions
+    page_total = max(1, (len(rows) + rows_per_page - 1) // rows_per_page)
+
+    for page_idx in range(page_total):
+        page_start = doc.length
+        lines = []
+        if page_idx == 0:
+            for line in (
+                "PT BANK CENTRAL ASIA Tbk",
+                "REKENING GIRO",
+                f"NAMA: {statement.account_holder}",
+                f"NO REKENING: {statement.account_number}",
+                f"PERIODE: {statement.period}",
+                f"SALDO AWAL: {_us_amount(statement.opening_balance)}",
+            ):
+                lines.append({"layout": doc.add(line + "\n")})
+
+        header_row = {"cells": []}
+        for cell in header_cells:
+            header_row["cells"].append({"layout": doc.add(cell)})
+            doc.add(" ")
+        doc.add("\n")
+
+        body_rows = []
+        for trans in rows[page_idx * rows_per_page:(page_idx + 1) * rows_per_page]:
+            mutasi = f"{trans['kredit']} CR" if trans["kredit"] else f"{trans['debet']} DB"
+            line_start = doc.length
+            cells = []
+            for value in (trans["tanggal"], trans["keterangan"], trans["cbg"], mutasi, trans["saldo"]):
+                cells.append({"layout": doc.add(value)})
+                doc.add(" ")
+            doc.add("\n")
+            lines.append({"layout": doc.span(line_start)})
+            body_rows.append({"cells": cells})
+
+        if page_idx == page_total - 1:
+            lines.append({"layout": doc.add(f"SALDO AKHIR: {_us_amount(statement.closing_balance)}\n")})
+
+        pages.append({
+            "page_number": page_idx + 1,
+            "layout": doc.span(page_start),
+            "lines": lines,
+            "tables": [{"header_rows": [header_row], "body_rows": body_rows}],
+        })
+
+    return {"text": doc.text, "pages": pages, "entities": []}
+
+
+def faktur_to_docai(faktur: Dict[str, Any]) -> Dict[str, Any]:
+    """Single faktur pajak page as a Document AI raw_response dict"""
+    doc = _AnchoredText()
+    lines = [
+        "FAKTUR PAJAK",
+        f"Kode dan Nomor Seri Faktur Pajak: {faktur['nomor_faktur']}",
+        "Pengusaha Kena Pajak:",
+        f"Nama: {faktur['nama_penjual']}",
+        f"NPWP: {faktur['npwp_penjual']}",
+        "Pembeli Barang Kena Pajak / Penerima Jasa Kena Pajak:",
+        f"Nama: {faktur['nama_pembeli']}",
+        f"NPWP: {faktur['npwp_pembeli']}",
+        f"Dasar Pengenaan Pajak: {_id_amount(faktur['dpp'])}",
+        f"Total PPN: {_id_amount(faktur['ppn'])}",
+        f"Tanggal: {faktur['tanggal_faktur']}",
+    ]
+    page_lines = [{"layout": doc.add(line + "\n")} for line in lines]
+    return {
+        "text": doc.text,
+        "pages": [{"page_number": 1, "layout": doc.span(0), "lines": page_lines, "tables": []}],
+        "entities": [],
+    }
+
+
+def statement_result(statement: SyntheticStatement) -> Dict[str, Any]:
+    """Processed-result shape (flat bank_info/saldo_info/transactions) used by the exporters"""
+    return {
+        "document_type": "rekening_koran",
+        "extracted_data": {
+            "bank_info": {
+                "nama_bank": "Bank BCA",
+                "nomor_rekening": statement.account_number,
+                "nama_pemilik": statement.account_holder,
+                "periode": statement.period,
+            },
+            "saldo_info": {
+                "saldo_awal": _us_amount(statement.opening_balance),
+                "saldo_akhir": _us_amount(statement.closing_balance),
+            },
+            "transactions": [
+                {k: v for k, v in t.items() if k != "vendor"} for t in statement.transactions
+            ],
+        },
+        "confidence": 1.0,
+    }
+
+
+def split_sizes(spec: str) -> List[int]:
+    """'100,1e3,10000' → [100, 1000, 10000]"""
+    return [int(float(part)) for part in spec.split(",") if part.strip()]
+
@@ -162,8 +162,14 @@ class CloudAIProcessor:
                 language_detected="unknown"
             )
     
-    async def process_with_google(self, file_path: str) -> CloudOCRResult:
-        """Process document with Google Document AI"""
+    async def process_with_google(self, file_path: str, content: Optional[bytes] = None) -> CloudOCRResult:
+        """Process document with Google Document AI
+
+        Args:
+            file_path: Document path (also used for MIME type detection)
+            content: Document bytes already in memory (e.g. an in-memory page range PDF);
+                     the file is not read when given
+        """
         try:
             from google.cloud import documentai_v1 as documentai
 
@@ -188,7 +194,7 @@ class CloudAIProcessor:
             logger.info(f"📄 Processing with Google Document AI: {name}")
             
             # ✅ CRITICAL FIX: Check file size before reading to prevent OOM
-            file_size_bytes = os.path.getsize(file_path)
+            file_size_bytes = len(content) if content is not None else os.path.getsize(file_path)
             file_size_mb = file_size_bytes / (1024 * 1024)
             logger.info(f"📊 File size: {file_size_mb:.1f} MB")
             
@@ -201,10 +207,13 @@ class CloudAIProcessor:
                 raise Exception(f"File too large: {file_size_mb:.1f}MB. Chunking required.")
             
             # Read document
-            logger.info(f"📄 Reading file into memory: {file_size_mb:.1f}MB")
-            with open(file_path, "rb") as document:
-                document_content = document.read()
-            logger.info(f"✅ File read complete: {len(document_content)} bytes")
+            if content is not None:
+                document_content = content
+            else:
+                logger.info(f"📄 Reading file into memory: {file_size_mb:.1f}MB")
+                with open(file_path, "rb") as document:
+                    document_content = document.read()
+                logger.info(f"✅ File read complete: {len(document_content)} bytes")
                 
             # Infer the MIME type
             mime_type, _ = mimetypes.guess_type(file_path)
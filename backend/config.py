@@ -40,16 +40,39 @@ class Settings(BaseSettings):
     smart_mapper_timeout: int = 60
     smart_mapper_temperature: float = 0.1
     smart_mapper_max_tokens: int = 16000
-    
+
+    # Smart Mapper LLM response cache (skip identical GPT/Claude calls)
+    smart_mapper_cache_enabled: bool = True
+    smart_mapper_cache_path: Optional[str] = None  # Default: backend/cache/smart_mapper_responses.db
+    smart_mapper_cache_ttl: int = 7 * 24 * 3600  # 7 days
+    smart_mapper_cache_max_entries: int = 5000
+
+    # Smart Mapper payload compiler (prompt size control)
+    smart_mapper_token_budget: int = 60000  # Max estimated input tokens per LLM request
+    smart_mapper_table_encoding: str = "tsv"  # tsv (compact) or json
+    smart_mapper_prompt_caching: bool = True  # Static instructions as a provider-cached prefix (Anthropic cache_control)
+
+    # Smart Mapper template registry (compiled once, re-read when the file's mtime changes)
+    template_reload_interval: float = 2.0  # Seconds between mtime checks; 0 disables hot reload
+
     # Batch processing
     batch_processing_enabled: bool = True
     max_concurrent_jobs: int = 3
     
     # Logging
     log_level: str = "INFO"
+    # Audit events are queued and written by a background listener in batches
+    audit_queue_size: int = 10000
+    audit_batch_size: int = 200
+    audit_enqueue_timeout: float = 0.05  # Seconds a full queue may block the caller before the event is dropped
+    audit_sqlite_path: Optional[str] = None  # e.g. ./logs/audit.db for queryable audit history
     
     # Export formats
     export_formats: list = ["excel", "pdf"]
+    # Worker processes rendering per-type partitions of mixed batch exports
+    export_process_workers: int = 4
+    # Threads decompressing ZIP upload members while earlier members are already in OCR
+    zip_extract_workers: int = 4
     
     # Frontend URL (for CORS)
     frontend_url: str = "http://localhost:3000"
@@ -57,6 +80,8 @@ class Settings(BaseSettings):
     # Performance settings
     enable_caching: bool = True
     cache_ttl: int = 3600  # 1 hour
+    # Admin dashboard counters are re-aggregated at most this often (incremental updates in between)
+    admin_stats_snapshot_ttl: int = 60
     
     # ✅ CRITICAL FIX: Reduced chunk size for better memory management
     # OLD: 15 pages = ~2250 transactions = potential OOM
@@ -68,6 +93,22 @@ class Settings(BaseSettings):
     smart_mapper_page_threshold: int = 5  # Process 5 pages max per Claude request (5 × 150 = 750 txns)
     smart_mapper_chunk_overlap: int = 1  # Overlap 1 page between chunks for continuity
 
+    # Rekening koran fast path: bank adapters/rule parser first, LLM only for pages whose saldo chain breaks
+    rekening_koran_fast_path: bool = True
+
+    # Worker processes serving the app (uvicorn --workers); per-process limits are only exact with 1
+    web_concurrency: int = 1
+
+    # Request rate limits (slowapi): Redis shares them across workers; falls back to memory:// (per process)
+    # with a warning when the server is unreachable at startup
+    rate_limit_storage_uri: str = "redis://localhost:6379/1"
+
+    # LLM scheduler: global token budget and fair queuing for Smart Mapper / reconciliation calls
+    llm_scheduler_backend: str = "redis"  # redis (shared with redis_cache, per-process fallback) | memory
+    llm_tokens_per_minute: int = 400_000  # 0 disables the scheduler
+    llm_max_concurrency: int = 8  # Concurrent LLM calls per worker process
+    llm_max_queue_wait_seconds: float = 600.0
+
     # Security settings (used by security.py)
     # NOTE: Extensions WITHOUT dots - security.py extracts extension without dot
     allowed_extensions_list: List[str] = ["pdf", "png", "jpg", "jpeg", "tiff", "tif"]
@@ -81,6 +122,11 @@ class Settings(BaseSettings):
     # Batch processing settings
     max_concurrent_processing: int = 3
 
+    # Instrumentation: minimum seconds between persisted SystemMetrics rows
+    metrics_persist_interval: int = 60
+    # Bearer token Prometheus sends to GET /metrics (admin JWTs are accepted too); unset = admins only
+    metrics_scrape_token: Optional[str] = None
+
     # CORS settings
     cors_origins_list: List[str] = ["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000"]
 
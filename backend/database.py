@@ -5,10 +5,10 @@ Production-grade database with comprehensive models
 from sqlalchemy import create_engine, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import Column, String, Integer, Text, DateTime, JSON, Float, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, BigInteger, Text, Date, DateTime, JSON, Float, Boolean, ForeignKey
 from sqlalchemy.dialects.mysql import LONGTEXT
 import os
-from datetime import datetime
+from datetime import date, datetime
 from typing import Generator
 import logging
 from dotenv import load_dotenv
@@ -105,6 +105,9 @@ class Batch(Base):
     processing_end = Column(DateTime, nullable=True)
     total_processing_time = Column(Float, nullable=True)  # seconds
 
+    # Bumped in the same transaction as every in-place result edit (part of the export version)
+    results_revision = Column(Integer, nullable=False, default=0)
+
 class DocumentFile(Base):
     """Document file model"""
     __tablename__ = "document_files"
@@ -164,6 +167,73 @@ class ScanResult(Base):
     exported_pdf = Column(Boolean, default=False)
     export_count = Column(Integer, default=0)
 
+class FakturCanonicalFields(Base):
+    """Faktur Pajak fields normalized once at ingest (one row per scan result)"""
+    __tablename__ = "faktur_canonical_fields"
+
+    scan_result_id = Column(String(36), primary_key=True, index=True)
+    batch_id = Column(String(36), index=True)
+    canonical_version = Column(Integer, nullable=False, default=1)
+    source = Column(String(20))  # smart_mapper | parser
+
+    # Parties
+    nama_seller = Column(String(255))
+    alamat_seller = Column(Text)
+    npwp_seller = Column(String(20), index=True)
+    nama_buyer = Column(String(255))
+    alamat_buyer = Column(Text)
+    npwp_buyer = Column(String(20), index=True)
+    email_buyer = Column(String(255))
+
+    # Invoice
+    nomor_faktur = Column(String(100), index=True)
+    tanggal = Column(Date, index=True)
+    invoice = Column(String(255))
+
+    # Amount fields (whole Rupiah)
+    harga_jual = Column(BigInteger)
+    uang_muka = Column(BigInteger)
+    dpp = Column(BigInteger)
+    ppn = Column(BigInteger)
+    total = Column(BigInteger)
+
+    # Display values and line items exactly as exporters render them
+    fields = Column(JSON, nullable=True)
+    items = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def from_canonical(cls, scan_result_id: str, batch_id: str, canonical: dict) -> "FakturCanonicalFields":
+        """Map canonical Faktur Pajak fields (FakturPajakExporter.canonicalize) onto their table row"""
+        def _text(key: str, length: int):
+            value = canonical.get(key)
+            return str(value)[:length] if value else None
+
+        tanggal = canonical.get("tanggal")
+        return cls(
+            scan_result_id=scan_result_id,
+            batch_id=batch_id,
+            canonical_version=canonical.get("version", 1),
+            source=canonical.get("source"),
+            nama_seller=_text("nama_seller", 255),
+            alamat_seller=canonical.get("alamat_seller"),
+            npwp_seller=_text("npwp_seller", 20),
+            nama_buyer=_text("nama_buyer", 255),
+            alamat_buyer=canonical.get("alamat_buyer"),
+            npwp_buyer=_text("npwp_buyer", 20),
+            email_buyer=_text("email_buyer", 255),
+            nomor_faktur=_text("nomor_faktur", 100),
+            tanggal=date.fromisoformat(tanggal) if tanggal else None,
+            invoice=_text("invoice", 255),
+            harga_jual=canonical.get("harga_jual"),
+            uang_muka=canonical.get("uang_muka"),
+            dpp=canonical.get("dpp"),
+            ppn=canonical.get("ppn"),
+            total=canonical.get("total"),
+            fields=canonical.get("fields"),
+            items=canonical.get("items"),
+        )
+
 class ProcessingLog(Base):
     """Comprehensive processing logs"""
     __tablename__ = "processing_logs"
@@ -0,0 +1,297 @@
+"""
+Document AI Text Anchor Index
+One-time index over a Google Document AI document (dict or proto)
+
+Document AI stores every paragraph, line, block and table cell as text anchors
+(start/end offsets) into one shared `text` string, with snake_case or camelCase
+keys depending on how the response was serialized. Walking that tree with
+isinstance checks for every lookup is slow and repeats the same work for
+paragraphs, lines and tables covering the same spans.
+
+DocAIDocumentIndex walks the tree ONCE, normalizes key casing and stores:
+- per-page paragraph / line / block spans as flat (start, end) lists
+- per-table header/body cell strings (already sliced from the text)
+- per-table cell spans (for deduplicating table text out of previews)
+
+All mapper, hybrid processor and bank adapter text lookups go through it. Build
+one index per document and pass it along (the index= parameters); there is no
+process-wide cache, so an index and its document are freed with the request.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+
+
+# ----------------------------------------------------------------------
+# Span helpers
+# ----------------------------------------------------------------------
+def _key(obj: Dict[str, Any], snake: str, camel: str, default: Any = None) -> Any:
+    """Dual snake/camel key lookup"""
+    value = obj.get(snake)
+    if value is None:
+        value = obj.get(camel, default)
+    return value
+
+
+def layout_spans(layout: Any) -> List[Span]:
+    """Return (start, end) text anchor segments of a Document AI layout dict"""
+    if not isinstance(layout, dict):
+        return []
+    text_anchor = _key(layout, "text_anchor", "textAnchor", {})
+    if not isinstance(text_anchor, dict):
+        return []
+    segments = _key(text_anchor, "text_segments", "textSegments", [])
+    if not isinstance(segments, list):
+        return []
+
+    spans: List[Span] = []
+    for segment in segments:
+        if not isinstance(segment, dict):
+            continue
+        try:
+            # Proto → dict drops zero-valued start_index, so missing start means 0
+            start = int(_key(segment, "start_index", "startIndex", 0) or 0)
+            end = int(_key(segment, "end_index", "endIndex", 0) or 0)
+        except (TypeError, ValueError):
+            continue
+        if end > start >= 0:
+            spans.append((start, end))
+    return spans
+
+
+def merge_spans(spans: Iterable[Span]) -> List[Span]:
+    """Merge overlapping/adjacent spans into a sorted disjoint list"""
+    merged: List[Span] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_spans(base: List[Span], remove: List[Span]) -> List[Span]:
+    """Return parts of (merged) base spans not covered by (merged) remove spans"""
+    result: List[Span] = []
+    j = 0
+    for start, end in base:
+        cursor = start
+        while j < len(remove) and remove[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(remove) and remove[k][0] < end:
+            r_start, r_end = remove[k]
+            if r_start > cursor:
+                result.append((cursor, r_start))
+            cursor = max(cursor, r_end)
+            if r_end >= end:
+                break
+            k += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+# ----------------------------------------------------------------------
+# Index structures
+# ----------------------------------------------------------------------
+@dataclass
+class IndexedTable:
+    """Table with cell strings resolved once"""
+    page_number: int
+    table_index: int
+    header_rows: List[List[str]] = field(default_factory=list)
+    body_rows: List[List[str]] = field(default_factory=list)
+    cell_spans: List[Span] = field(default_factory=list)
+
+    def to_adapter_format(self) -> Dict[str, Any]:
+        """
+        Bank adapter table shape: {'rows': [{'cells': [{'text': ...}]}]}
+
+        Adapters skip row 0 as the header, so a placeholder row is inserted
+        when Document AI detected no header row.
+        """
+        header = self.header_rows or [[]]
+        return {
+            "page_number": self.page_number,
+            "rows": [{"cells": [{"text": c} for c in row]} for row in (*header, *self.body_rows)],
+        }
+
+
+@dataclass
+class IndexedPage:
+    """Flat span arrays for one page"""
+    page_number: int
+    page_spans: List[Span] = field(default_factory=list)
+    paragraph_spans: List[Span] = field(default_factory=list)
+    line_spans: List[Span] = field(default_factory=list)
+    block_spans: List[Span] = field(default_factory=list)
+    tables: List[IndexedTable] = field(default_factory=list)
+
+    @property
+    def text_spans(self) -> List[Span]:
+        """Best non-overlapping reading-order spans (paragraphs > lines > blocks > page)"""
+        return self.paragraph_spans or self.line_spans or self.block_spans or self.page_spans
+
+
+class DocAIDocumentIndex:
+    """Offset index over one Document AI document"""
+
+    def __init__(self, document: Any):
+        self.document = document
+        doc = self.as_dict(document)
+        text = doc.get("text", "") if isinstance(doc, dict) else ""
+        self.text: str = text if isinstance(text, str) else ""
+        self.pages: List[IndexedPage] = []
+
+        pages = doc.get("pages", []) if isinstance(doc, dict) else []
+        if isinstance(pages, list):
+            for page_idx, page in enumerate(pages):
+                self.pages.append(self._index_page(page, page_idx))
+
+    @staticmethod
+    def as_dict(document: Any) -> Dict[str, Any]:
+        """Document AI response as a dict (protos converted with snake_case keys)"""
+        if isinstance(document, dict):
+            return document
+        if hasattr(document, "DESCRIPTOR"):
+            try:
+                from google.protobuf.json_format import MessageToDict
+                return MessageToDict(document._pb if hasattr(document, "_pb") else document,
+                                     preserving_proto_field_name=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not convert Document AI proto for indexing: {e}")
+        return {}
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+    def _index_page(self, page: Any, page_idx: int) -> IndexedPage:
+        if not isinstance(page, dict):
+            return IndexedPage(page_number=page_idx + 1)
+
+        page_number = _key(page, "page_number", "pageNumber", page_idx + 1)
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            page_number = page_idx + 1
+
+        indexed = IndexedPage(
+            page_number=page_number,
+            page_spans=layout_spans(page.get("layout")),
+            paragraph_spans=self._element_spans(page.get("paragraphs")),
+            line_spans=self._element_spans(page.get("lines")),
+            block_spans=self._element_spans(page.get("blocks")),
+        )
+
+        tables = page.get("tables", [])
+        if isinstance(tables, list):
+            for table_idx, table in enumerate(tables):
+                if isinstance(table, dict):
+                    indexed.tables.append(self._index_table(table, page_number, table_idx + 1))
+        return indexed
+
+    @staticmethod
+    def _element_spans(elements: Any) -> List[Span]:
+        spans: List[Span] = []
+        if isinstance(elements, list):
+            for element in elements:
+                if isinstance(element, dict):
+                    spans.extend(layout_spans(element.get("layout")))
+        return spans
+
+    def _index_table(self, table: Dict[str, Any], page_number: int, table_index: int) -> IndexedTable:
+        indexed = IndexedTable(page_number=page_number, table_index=table_index)
+        indexed.header_rows = self._index_rows(_key(table, "header_rows", "headerRows", []), indexed.cell_spans)
+        indexed.body_rows = self._index_rows(_key(table, "body_rows", "bodyRows", []), indexed.cell_spans)
+        return indexed
+
+    def _index_rows(self, rows: Any, cell_spans: List[Span]) -> List[List[str]]:
+        resolved: List[List[str]] = []
+        if not isinstance(rows, list):
+            return resolved
+        text = self.text
+        text_len = len(text)
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            cells = row.get("cells", [])
+            if not isinstance(cells, list):
+                continue
+            row_cells = []
+            for cell in cells:
+                if not isinstance(cell, dict):
+                    continue
+                spans = [(s, e) for s, e in layout_spans(cell.get("layout")) if e <= text_len]
+                cell_spans.extend(spans)
+                row_cells.append("".join(text[s:e] for s, e in spans).strip())
+            if row_cells:
+                resolved.append(row_cells)
+        return resolved
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def span_text(self, spans: Sequence[Span], separator: str = "") -> str:
+        text_len = len(self.text)
+        return separator.join(self.text[s:e] for s, e in spans if e <= text_len).strip()
+
+    def layout_text(self, layout: Any) -> str:
+        """Resolve any layout dict against the indexed text"""
+        return self.span_text(layout_spans(layout))
+
+    def _select_pages(self, page_indices: Optional[Iterable[int]]) -> List[IndexedPage]:
+        if page_indices is None:
+            return self.pages
+        return [self.pages[i] for i in page_indices if 0 <= i < len(self.pages)]
+
+    def tables(self, page_indices: Optional[Iterable[int]] = None) -> List[IndexedTable]:
+        return [t for page in self._select_pages(page_indices) for t in page.tables]
+
+    def table_cell_spans(self, page_indices: Optional[Iterable[int]] = None) -> List[Span]:
+        return merge_spans(s for t in self.tables(page_indices) for s in t.cell_spans)
+
+    def adapter_tables(self, page_indices: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Tables in the {'rows': [{'cells': [{'text'}]}]} shape used by bank adapters"""
+        return [t.to_adapter_format() for t in self.tables(page_indices)]
+
+    def page_text(self, page_idx: int, include_tables: bool = True) -> str:
+        """
+        Text belonging to one page
+
+        Reading-order text from paragraphs (or lines/blocks/page layout), followed by
+        table rows joined with ' | ' when include_tables is set.
+        """
+        if not (0 <= page_idx < len(self.pages)):
+            return ""
+        page = self.pages[page_idx]
+        text_len = len(self.text)
+        parts = [self.text[s:e].strip() for s, e in page.text_spans if e <= text_len]
+        if include_tables:
+            for table in page.tables:
+                for row in (*table.header_rows, *table.body_rows):
+                    cells = [c for c in row if c]
+                    if cells:
+                        parts.append(" | ".join(cells))
+        return "\n".join(p for p in parts if p)
+
+    def block_texts(self, page_idx: int) -> List[str]:
+        if not (0 <= page_idx < len(self.pages)):
+            return []
+        return [self.span_text([s]) for s in self.pages[page_idx].block_spans]
+
+
+__all__ = [
+    "DocAIDocumentIndex",
+    "IndexedPage",
+    "IndexedTable",
+    "layout_spans",
+    "merge_spans",
+    "subtract_spans",
+]
@@ -0,0 +1,135 @@
+"""
+Export Artifact Manager
+Content-versioned export files with atomic publish and build coalescing
+
+- Artifact path = <exports dir>/<key>_<version>.<ext>; the version hashes the inputs,
+  so a repeat request for unchanged data is a single stat() and the file is served as-is
+- Builds write to a hidden temp file and are published with os.replace (readers never
+  see a partial file), then older versions of the same key are removed
+- A per-key lock (threading.Lock in-process, flock across worker processes) makes
+  concurrent identical requests wait for one build instead of racing on the same path
+"""
+
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows: in-process locking only
+    HAS_FCNTL = False
+
+# Bump when exporter layouts change so existing artifacts are rebuilt
+ARTIFACT_FORMAT_VERSION = 1
+
+
+class ExportArtifactManager:
+    """Builds each (key, version) artifact at most once and serves it afterwards"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock_refs: Dict[str, int] = {}
+        self._registry_lock = threading.Lock()
+
+    def artifact_path(self, key: str, version: str, extension: str) -> Path:
+        return self.root / f"{key}_{version}.{extension}"
+
+    def get_or_build(self, key: str, version: str, extension: str, build: Callable[[str], bool]) -> Optional[Path]:
+        """
+        Return the artifact for key/version, building it with build(temp_path) if missing
+
+        Returns:
+            Path of the published artifact, or None if the build failed
+        """
+        path = self.artifact_path(key, version, extension)
+        if path.exists():
+            return path
+
+        with self._key_lock(f"{key}.{extension}"):
+            # Another request may have published it while we waited
+            if path.exists():
+                logger.info(f"♻️ Export artifact built by concurrent request: {path.name}")
+                return path
+
+            temp_path = path.with_name(f".{key}_{version}.{uuid.uuid4().hex[:8]}.tmp.{extension}")
+            try:
+                if not build(str(temp_path)) or not temp_path.exists():
+                    return None
+                os.replace(temp_path, path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+            self._prune(key, extension, keep=path)
+            logger.info(f"✅ Export artifact published: {path.name}")
+            return path
+
+    def invalidate(self, key: str) -> int:
+        """Remove every published version of key (e.g. when its batch is deleted)"""
+        removed = 0
+        for stale in self.root.glob(f"{key}_*.*"):
+            try:
+                stale.unlink()
+                removed += 1
+            except OSError as e:
+                logger.warning(f"⚠️ Could not remove export artifact {stale.name}: {e}")
+        for lock_file in self.root.glob(f".{key}.*.lock"):
+            try:
+                lock_file.unlink()
+            except OSError:
+                pass
+        return removed
+
+    def _prune(self, key: str, extension: str, keep: Path) -> None:
+        for stale in self.root.glob(f"{key}_*.{extension}"):
+            if stale != keep:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass  # Still being served; the next publish retries
+
+    @contextmanager
+    def _key_lock(self, name: str) -> Iterator[None]:
+        with self._registry_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+            self._lock_refs[name] = self._lock_refs.get(name, 0) + 1
+        try:
+            with lock:
+                if not HAS_FCNTL:
+                    yield
+                    return
+                with open(self.root / f".{name}.lock", "w") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._registry_lock:
+                self._lock_refs[name] -= 1
+                if not self._lock_refs[name]:
+                    del self._lock_refs[name]
+                    del self._locks[name]
+
+
+_manager: Optional[ExportArtifactManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_artifact_manager() -> ExportArtifactManager:
+    """Process-wide manager rooted at the configured exports directory"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            from config import get_exports_dir
+            _manager = ExportArtifactManager(Path(get_exports_dir()))
+        return _manager
@@ -0,0 +1,167 @@
+"""
+Batch Export Loader
+Streams column-projected scan results into the batch exporters
+
+- Only the scalar columns the exporters render are selected (never extracted_text)
+- extracted_data is reduced to the top-level JSON keys the exporter declares
+  (BaseExporter.export_data_keys), so raw_ocr_result / extracted_content stay in the DB
+- Rows are fetched with yield_per and converted one at a time; BatchExportRows is
+  sized and re-iterable, so exporters keep using len() and for-loops unchanged
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import Batch, DocumentFile, FakturCanonicalFields, ScanResult
+from export_artifacts import ARTIFACT_FORMAT_VERSION
+from exporters.faktur_pajak_exporter import FakturPajakExporter
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while streaming
+EXPORT_YIELD_PER = 200
+
+# Keys read by the generic table templates (excel_template / pdf_template) for mixed batches
+GENERIC_EXPORT_DATA_KEYS: Tuple[str, ...] = (
+    'smart_mapped', 'structured_data', 'raw_text',
+    'nomor', 'masa_pajak', 'identitas_penerima_penghasilan', 'penghasilan_bruto', 'pph',
+    'tanggal', 'nilai_uang_masuk', 'nilai_uang_keluar', 'saldo',
+)
+
+
+def batch_document_type_counts(db: Session, batch_id: str) -> Dict[str, int]:
+    """Document counts per (lower-cased) type, without loading any result payloads"""
+    counts: Dict[str, int] = {}
+    rows = (
+        db.query(ScanResult.document_type, func.count(ScanResult.id))
+        .filter(ScanResult.batch_id == batch_id)
+        .group_by(ScanResult.document_type)
+        .all()
+    )
+    for document_type, count in rows:
+        key = (document_type or 'Unknown').lower()
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def batch_results_version(db: Session, batch_id: str) -> str:
+    """
+    Short hash identifying the current export inputs of a batch
+    Count + newest created_at (of results and canonical rows) changes when results are
+    added or removed; Batch.results_revision changes on in-place edits (PATCH /results/{id}
+    bumps it in the edit's transaction), so a build that started before an edit publishes
+    under the old version and is never served for the new one.
+    """
+    results_revision = db.query(Batch.results_revision).filter(Batch.id == batch_id).scalar()
+    result_count, newest_result = (
+        db.query(func.count(ScanResult.id), func.max(ScanResult.created_at))
+        .filter(ScanResult.batch_id == batch_id)
+        .one()
+    )
+    canonical_count, newest_canonical = (
+        db.query(func.count(FakturCanonicalFields.scan_result_id), func.max(FakturCanonicalFields.created_at))
+        .filter(FakturCanonicalFields.batch_id == batch_id)
+        .one()
+    )
+    fingerprint = (
+        f"{ARTIFACT_FORMAT_VERSION}|{results_revision}|{result_count}|{newest_result}|{canonical_count}|{newest_canonical}"
+    )
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+class BatchExportRows:
+    """Sized, re-iterable stream of export result dicts for one batch"""
+
+    def __init__(
+        self,
+        db: Session,
+        batch_id: str,
+        exporter: Any = None,
+        count: Optional[int] = None,
+        chunk_size: int = EXPORT_YIELD_PER,
+        document_types: Optional[Sequence[str]] = None,
+    ):
+        self.db = db
+        self.batch_id = batch_id
+        # Lower-cased keys from batch_document_type_counts(); None streams the whole batch
+        self.document_types = tuple(document_types) if document_types else None
+        if exporter is None:
+            self.data_keys: Optional[Tuple[str, ...]] = GENERIC_EXPORT_DATA_KEYS
+            self.with_canonical = False
+        else:
+            self.data_keys = getattr(exporter, 'export_data_keys', None)
+            self.with_canonical = getattr(exporter, 'uses_canonical_fields', False)
+        self.chunk_size = chunk_size
+        self._count = count
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self._filter(self.db.query(func.count(ScanResult.id))).scalar() or 0
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in self._query().yield_per(self.chunk_size):
+            yield self._to_result(row)
+
+    def _query(self):
+        columns = [
+            ScanResult.id,
+            ScanResult.batch_id,
+            ScanResult.document_type,
+            ScanResult.confidence,
+            ScanResult.created_at,
+            ScanResult.total_processing_time,
+            ScanResult.ocr_engine_used,
+            DocumentFile.name.label('filename'),
+        ]
+        if self.data_keys is None:
+            columns.append(ScanResult.extracted_data)
+        else:
+            columns.extend(
+                ScanResult.extracted_data[key].label(f'data_{idx}') for idx, key in enumerate(self.data_keys)
+            )
+
+        query = self.db.query(*columns).outerjoin(DocumentFile, DocumentFile.id == ScanResult.document_file_id)
+        if self.with_canonical:
+            query = query.add_entity(FakturCanonicalFields).outerjoin(
+                FakturCanonicalFields, FakturCanonicalFields.scan_result_id == ScanResult.id
+            )
+        return self._filter(query).order_by(ScanResult.created_at, ScanResult.id)
+
+    def _filter(self, query):
+        query = query.filter(ScanResult.batch_id == self.batch_id)
+        if self.document_types:
+            query = query.filter(func.lower(func.coalesce(ScanResult.document_type, 'Unknown')).in_(self.document_types))
+        return query
+
+    def _to_result(self, row) -> Dict[str, Any]:
+        if self.data_keys is None:
+            extracted_data = row.extracted_data or {}
+        else:
+            # Absent keys come back as NULL - leave them out so `'key' in extracted_data` checks still work
+            extracted_data = {}
+            for idx, key in enumerate(self.data_keys):
+                value = getattr(row, f'data_{idx}')
+                if value is not None:
+                    extracted_data[key] = value
+
+        filename = row.filename or 'Unknown'
+        result = {
+            'id': row.id,
+            'batch_id': row.batch_id,
+            'filename': filename,
+            'original_filename': filename,
+            'document_type': row.document_type or 'Unknown',
+            'confidence': row.confidence or 0,
+            'extracted_data': extracted_data,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'processing_time': row.total_processing_time or 0.0,
+            'ocr_engine': row.ocr_engine_used or 'Unknown',
+        }
+        if self.with_canonical and row.FakturCanonicalFields is not None:
+            result['canonical_fields'] = FakturPajakExporter.canonical_from_row(row.FakturCanonicalFields)
+        return result
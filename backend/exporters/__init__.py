@@ -9,6 +9,7 @@ from .pph21_exporter import PPh21Exporter
 from .pph23_exporter import PPh23Exporter
 from .rekening_koran_exporter import RekeningKoranExporter
 from .invoice_exporter import InvoiceExporter
+from .composite_exporter import CompositeExporter
 
 __all__ = [
     'ExportFactory',
@@ -16,5 +17,6 @@ __all__ = [
     'PPh21Exporter',
     'PPh23Exporter',
     'RekeningKoranExporter',
-    'InvoiceExporter'
+    'InvoiceExporter',
+    'CompositeExporter'
 ]
@@ -4,17 +4,32 @@ Abstract base class for all document exporters
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
 class BaseExporter(ABC):
     """Base class for document exporters"""
+
+    # Top-level extracted_data keys the batch exports read. The batch export loader
+    # (export_loader.BatchExportRows) selects only these JSON paths; None loads everything.
+    export_data_keys: Optional[Tuple[str, ...]] = None
+    # Whether batch exports read ingest-time canonical fields (faktur_canonical_fields)
+    uses_canonical_fields: bool = False
     
     def __init__(self, document_type: str):
         self.document_type = document_type
     
+    @property
+    def column_plan(self) -> tuple:
+        """
+        Field columns of this type's Smart Mapper template (section, field, label), in template order
+        Precompiled by the template registry and refreshed when the template file changes
+        """
+        from template_registry import get_template_registry
+        return get_template_registry().column_plan(self.document_type)
+    
     @abstractmethod
     def export_to_excel(self, result: Dict[str, Any], output_path: str) -> bool:
         """
@@ -50,7 +65,7 @@ class BaseExporter(ABC):
         
         Args:
             batch_id: Unique identifier for the batch
-            results: List of document result dictionaries
+            results: Sized iterable of document result dictionaries (list or BatchExportRows)
             output_path: Path where Excel file will be saved
             
         Returns:
@@ -65,7 +80,7 @@ class BaseExporter(ABC):
         
         Args:
             batch_id: Unique identifier for the batch
-            results: List of document result dictionaries
+            results: Sized iterable of document result dictionaries (list or BatchExportRows)
             output_path: Path where PDF file will be saved
             
         Returns:
@@ -0,0 +1,218 @@
+"""
+Composite Exporter
+Exports batches that mix document types without falling back to the generic table:
+each document type is rendered by its specialized exporter in a worker process,
+then merged into one multi-sheet workbook (Excel) or a ZIP of per-type PDFs
+"""
+
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from copy import copy
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .export_factory import ExportFactory
+from .faktur_pajak_exporter import FakturPajakExporter
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.cell.cell import MergedCell
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+# Partition for document types without a specialized exporter (rendered by the generic template)
+GENERIC_PARTITION = "other"
+
+SHEET_TITLES = {
+    "faktur_pajak": "Faktur Pajak",
+    "pph21": "PPh 21",
+    "pph23": "PPh 23",
+    "rekening_koran": "Rekening Koran",
+    "invoice": "Invoice",
+    GENERIC_PARTITION: "Lainnya",
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Shared worker pool; spawn (not fork) because the API process runs threads"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def plan_partitions(type_counts: Dict[str, int]) -> List[Tuple[str, Tuple[str, ...], int]]:
+    """
+    Group lower-cased document types by exporter
+    Returns [(partition, document_types, count)], e.g. ("pph23", ("pph23", "pph 23"), 12)
+    """
+    groups: Dict[str, Tuple[Tuple[str, ...], int]] = {}
+    for document_type, count in type_counts.items():
+        exporter_class = ExportFactory.get_exporter_class(document_type)
+        partition = exporter_class().document_type if exporter_class else GENERIC_PARTITION
+        keys, total = groups.get(partition, ((), 0))
+        groups[partition] = (keys + (document_type,), total + count)
+    return [(partition, keys, total) for partition, (keys, total) in groups.items()]
+
+
+def render_partition(batch_id: str, partition: str, document_types: Sequence[str], count: int,
+                     format: str, output_path: str) -> bool:
+    """Worker entry point: stream one partition from the database and render it to output_path"""
+    # Imported here: workers are spawned and only need the DB layer once they run
+    from database import SessionLocal
+    from export_loader import BatchExportRows
+
+    exporter_class = None if partition == GENERIC_PARTITION else ExportFactory.get_exporter_class(partition)
+    exporter = exporter_class() if exporter_class else None
+
+    db = SessionLocal()
+    try:
+        rows = BatchExportRows(db, batch_id, exporter=exporter, count=count, document_types=document_types)
+        if exporter is None:
+            from excel_template import create_batch_excel_export
+            from pdf_template import create_batch_pdf_export
+            render = create_batch_excel_export if format == "excel" else create_batch_pdf_export
+            document_type = document_types[0] if len(document_types) == 1 else "mixed"
+            return render(batch_results=rows, output_path=output_path, document_type=document_type)
+        if format == "excel":
+            return exporter.batch_export_to_excel(batch_id, rows, output_path)
+        if isinstance(exporter, FakturPajakExporter):
+            # Same professional document template export_batch uses for single-type Faktur batches
+            return exporter.export_batch_to_pdf(rows, output_path)
+        return exporter.batch_export_to_pdf(batch_id, rows, output_path)
+    finally:
+        db.close()
+
+
+class CompositeExporter:
+    """Renders every document-type partition of a batch concurrently and merges the outputs"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            from config import settings
+            max_workers = settings.export_process_workers
+        self.max_workers = max(1, max_workers)
+
+    def export_batch(self, batch_id: str, type_counts: Dict[str, int], format: str, output_path: str) -> bool:
+        """
+        Export a mixed batch
+
+        Args:
+            batch_id: Batch to export
+            type_counts: Document counts per lower-cased type (export_loader.batch_document_type_counts)
+            format: 'excel' (one sheet per type) or 'pdf' (ZIP with one PDF per type)
+            output_path: Target .xlsx or .zip path
+
+        Returns:
+            bool: True if every partition rendered and the output was written
+        """
+        if format == "excel" and not HAS_OPENPYXL:
+            logger.error("❌ openpyxl not available for composite Excel export")
+            return False
+
+        partitions = plan_partitions(type_counts)
+        extension = "xlsx" if format == "excel" else "pdf"
+
+        with tempfile.TemporaryDirectory(prefix="composite_export_") as work_dir:
+            pool = _get_pool(self.max_workers)
+            futures = []
+            for partition, document_types, count in partitions:
+                part_path = os.path.join(work_dir, f"{partition}.{extension}")
+                future = pool.submit(render_partition, batch_id, partition, document_types, count, format, part_path)
+                futures.append((partition, count, part_path, future))
+
+            rendered: List[Tuple[str, str]] = []
+            for partition, count, part_path, future in futures:
+                try:
+                    ok = future.result()
+                except BrokenProcessPool as e:
+                    logger.error(f"❌ Export worker pool broke while rendering {partition}: {e}")
+                    _reset_pool()
+                    return False
+                except Exception as e:
+                    logger.error(f"❌ Composite export partition {partition} failed: {e}", exc_info=True)
+                    ok = False
+                if not ok or not os.path.exists(part_path):
+                    logger.error(f"❌ Composite export partition {partition} ({count} documents) produced no output")
+                    return False
+                rendered.append((partition, part_path))
+
+            if format == "excel":
+                self._merge_workbooks(rendered, output_path)
+            else:
+                self._zip_pdfs(batch_id, rendered, output_path)
+
+        logger.info(f"✅ Composite {format} export created: {output_path} ({', '.join(p for p, _ in rendered)})")
+        return True
+
+    def _merge_workbooks(self, parts: List[Tuple[str, str]], output_path: str) -> None:
+        merged = Workbook()
+        merged.remove(merged.active)
+        for partition, part_path in parts:
+            source = load_workbook(part_path)
+            label = SHEET_TITLES.get(partition, partition.replace("_", " ").title())
+            for ws in source.worksheets:
+                title = label if len(source.worksheets) == 1 else f"{label} - {ws.title}"
+                self._copy_worksheet(ws, merged.create_sheet(self._sheet_title(title, merged.sheetnames)))
+            source.close()
+        merged.save(output_path)
+
+    def _zip_pdfs(self, batch_id: str, parts: List[Tuple[str, str]], output_path: str) -> None:
+        with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for partition, part_path in parts:
+                archive.write(part_path, arcname=f"batch_{batch_id[:8]}_{partition}.pdf")
+
+    @staticmethod
+    def _sheet_title(title: str, existing: List[str]) -> str:
+        # Excel sheet names: max 31 chars, no []:*?/\ and unique within the workbook
+        base = re.sub(r"[\[\]:*?/\\]", "", title)[:31] or "Sheet"
+        candidate, suffix = base, 2
+        while candidate in existing:
+            candidate = f"{base[:31 - len(str(suffix)) - 1]} {suffix}"
+            suffix += 1
+        return candidate
+
+    @staticmethod
+    def _copy_worksheet(source, target) -> None:
+        for row in source.iter_rows():
+            for cell in row:
+                if isinstance(cell, MergedCell):
+                    continue
+                new_cell = target.cell(row=cell.row, column=cell.column, value=cell.value)
+                if cell.has_style:
+                    new_cell.font = copy(cell.font)
+                    new_cell.fill = copy(cell.fill)
+                    new_cell.border = copy(cell.border)
+                    new_cell.alignment = copy(cell.alignment)
+                    new_cell.protection = copy(cell.protection)
+                    new_cell.number_format = cell.number_format
+        for merged_range in source.merged_cells.ranges:
+            target.merge_cells(str(merged_range))
+        for key, dimension in source.column_dimensions.items():
+            if dimension.width:
+                target.column_dimensions[key].width = dimension.width
+        for idx, dimension in source.row_dimensions.items():
+            if dimension.height:
+                target.row_dimensions[idx].height = dimension.height
+        target.freeze_panes = source.freeze_panes
@@ -16,7 +16,7 @@ from .invoice_exporter import InvoiceExporter
 
 logger = logging.getLogger(__name__)
 
-from typing import Optional
+from typing import Dict, Optional
 import logging
 
 from .base_exporter import BaseExporter
@@ -58,6 +58,9 @@ class ExportFactory:
         "bill": InvoiceExporter,
     }
     
+    # Exporter instances, created on first use
+    _instances: Dict[type, BaseExporter] = {}
+    
     @classmethod
     def get_exporter(cls, document_type: str) -> Optional[BaseExporter]:
         """
@@ -77,12 +80,25 @@ class ExportFactory:
         
         if exporter_class:
             logger.info(f"✅ Found exporter for document type: {document_type}")
-            return exporter_class()
+            return cls._instance(exporter_class)
         else:
             logger.warning(f"⚠️ No exporter found for document type: {document_type}")
             # Return default Faktur Pajak exporter as fallback
             logger.info("Using Faktur Pajak exporter as fallback")
-            return FakturPajakExporter()
+            return cls._instance(FakturPajakExporter)
+    
+    @classmethod
+    def _instance(cls, exporter_class) -> BaseExporter:
+        """Shared exporter per class - column layouts are built once, exports keep no per-call state"""
+        exporter = cls._instances.get(exporter_class)
+        if exporter is None:
+            exporter = cls._instances.setdefault(exporter_class, exporter_class())
+        return exporter
+    
+    @classmethod
+    def get_exporter_class(cls, document_type: str) -> Optional[type]:
+        """Registered exporter class for document type, or None (no Faktur Pajak fallback)"""
+        return cls._exporters.get((document_type or "").lower().strip())
     
     @classmethod
     def register_exporter(cls, document_type: str, exporter_class):
@@ -98,6 +114,7 @@ class ExportFactory:
         
         normalized_type = document_type.lower().strip()
         cls._exporters[normalized_type] = exporter_class
+        cls._instances.pop(exporter_class, None)
         logger.info(f"✅ Registered exporter for document type: {document_type}")
     
     @classmethod
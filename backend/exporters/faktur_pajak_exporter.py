@@ -32,9 +32,20 @@ except ImportError:
     HAS_REPORTLAB = False
     logger.warning("⚠️ reportlab not installed - PDF export disabled")
 
+# Bump when canonicalize() output changes; rows with an older version are recomputed at export
+CANONICAL_VERSION = 1
+CANONICAL_AMOUNT_FIELDS = ('harga_jual', 'uang_muka', 'dpp', 'ppn', 'total')
+CANONICAL_TEXT_FIELDS = (
+    'nama_seller', 'alamat_seller', 'nama_buyer', 'alamat_buyer',
+    'email_buyer', 'nomor_faktur', 'invoice',
+)
+
 
 class FakturPajakExporter(BaseExporter):
     """Exporter for Faktur Pajak (Indonesian Tax Invoice) documents"""
+
+    export_data_keys = ('smart_mapped', 'structured_data', 'raw_text')
+    uses_canonical_fields = True
     
     def __init__(self):
         super().__init__("faktur_pajak")
@@ -804,6 +815,101 @@ class FakturPajakExporter(BaseExporter):
 
         return cleaned
     
+    # ------------------------------------------------------------------
+    # Canonical fields (computed once at ingest, see ai_processor)
+    def canonicalize(self, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Resolve the fields every Faktur Pajak export needs: display values, line items
+        and typed values (integer Rupiah, ISO date, formatted NPWP).
+        This is the only place that falls back to regex scans over raw_text.
+        """
+        extracted_data = extracted_data if isinstance(extracted_data, dict) else {}
+        smart_mapped = extracted_data.get('smart_mapped', {})
+
+        if smart_mapped:
+            source = 'smart_mapper'
+            structured = self._convert_smart_mapped_to_structured(smart_mapped)
+            items = smart_mapped.get('items', []) or []
+        else:
+            source = 'parser'
+            structured = self._prepare_structured_fields(
+                extracted_data.get('structured_data', {}),
+                extracted_data.get('raw_text', '') or '',
+            )
+            items = []
+
+        canonical: Dict[str, Any] = {
+            'version': CANONICAL_VERSION,
+            'source': source,
+            'fields': structured,
+            'items': [item for item in items if isinstance(item, dict)],
+        }
+        for key in CANONICAL_TEXT_FIELDS:
+            canonical[key] = self._clean_text_value(structured.get(key))
+        # The legacy parser only knows the seller as nama/alamat/npwp
+        canonical['nama_seller'] = canonical['nama_seller'] or self._clean_text_value(structured.get('nama'))
+        canonical['alamat_seller'] = canonical['alamat_seller'] or self._clean_text_value(structured.get('alamat'))
+        canonical['npwp_seller'] = self._canonical_npwp(structured.get('npwp_seller') or structured.get('npwp'))
+        canonical['npwp_buyer'] = self._canonical_npwp(structured.get('npwp_buyer'))
+        canonical['tanggal'] = self._iso_date(structured.get('tanggal'))
+        for key in CANONICAL_AMOUNT_FIELDS:
+            amount = self._parse_amount(structured.get(key))
+            canonical[key] = int(amount) if isinstance(amount, (int, float)) else None
+        return canonical
+
+    @staticmethod
+    def canonical_from_row(row: Any) -> Dict[str, Any]:
+        """Rebuild the canonicalize() dict from a FakturCanonicalFields row"""
+        canonical: Dict[str, Any] = {
+            'version': row.canonical_version,
+            'source': row.source,
+            'fields': row.fields or {},
+            'items': row.items or [],
+            'npwp_seller': row.npwp_seller,
+            'npwp_buyer': row.npwp_buyer,
+            'tanggal': row.tanggal.isoformat() if row.tanggal else None,
+        }
+        for key in CANONICAL_TEXT_FIELDS + CANONICAL_AMOUNT_FIELDS:
+            canonical[key] = getattr(row, key)
+        return canonical
+
+    def _resolve_canonical(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Use the canonical fields stored at ingest; recompute only for older results"""
+        canonical = result.get('canonical_fields')
+        if isinstance(canonical, dict) and canonical.get('version') == CANONICAL_VERSION:
+            return canonical
+        return self.canonicalize(result.get('extracted_data', {}))
+
+    def _canonical_amount(self, canonical: Dict[str, Any], key: str) -> Any:
+        value = canonical.get(key)
+        if value is not None:
+            return value
+        return self._parse_amount(canonical.get('fields', {}).get(key))
+
+    def _canonical_date(self, canonical: Dict[str, Any]) -> str:
+        return self._format_date(canonical.get('tanggal') or canonical.get('fields', {}).get('tanggal')) or 'N/A'
+
+    @staticmethod
+    def _clean_text_value(value: Any) -> Any:
+        if value is None:
+            return None
+        text = str(value).strip()
+        return text if text and text.upper() != 'N/A' else None
+
+    def _canonical_npwp(self, value: Any) -> Any:
+        text = self._clean_text_value(value)
+        if not text:
+            return None
+        formatted = self._format_npwp(text)
+        return formatted[:20] if formatted else None
+
+    def _iso_date(self, value: Any) -> Any:
+        formatted = self._format_date(value)
+        try:
+            return datetime.strptime(formatted, '%d/%m/%Y').date().isoformat()
+        except (TypeError, ValueError):
+            return None
+
     def export_to_excel(self, result: Dict[str, Any], output_path: str) -> bool:
         """Export single Faktur Pajak to Excel with 9-column standardized format"""
         try:
@@ -841,32 +947,10 @@ class FakturPajakExporter(BaseExporter):
         left_align = Alignment(horizontal='left', vertical='center', wrap_text=True)
         right_align = Alignment(horizontal='right', vertical='center')
 
-        # Get structured data
-        extracted_data = result.get('extracted_data', {})
-        raw_text = extracted_data.get('raw_text', '')
-
-        # PRIORITY 1: Use Smart Mapper data if available
-        smart_mapped = extracted_data.get('smart_mapped', {})
-        items = []  # Store items for nested table
-        if smart_mapped:
-            logger.info("✅ Using Smart Mapper GPT data for Excel export (CLEAN, NO POST-PROCESSING)")
-            # Smart Mapper data is already clean from GPT-4o, no need for _prepare_structured_fields()
-            structured = self._convert_smart_mapped_to_structured(smart_mapped)
-            items = smart_mapped.get('items', [])  # Get items for nested table
-        else:
-            # FALLBACK: Use legacy structured_data
-            logger.info("⚠️ Smart Mapper not available, using legacy parser with post-processing")
-            structured = extracted_data.get('structured_data', {})
-
-            # If no structured data, try to extract from text
-            if not structured or not any(structured.values()):
-                if raw_text:
-                    from ai_processor import IndonesianTaxDocumentParser
-                    temp_parser = IndonesianTaxDocumentParser()
-                    structured = temp_parser.extract_structured_fields(raw_text, "faktur_pajak")
-
-            # ONLY apply heavy post-processing for legacy data (not for Smart Mapper)
-            structured = self._prepare_structured_fields(structured, raw_text)
+        # Canonical fields are materialized at ingest; older results are canonicalized here
+        canonical = self._resolve_canonical(result)
+        structured = canonical['fields']
+        items = list(canonical['items'])  # Items for nested table
 
         row = 1
 
@@ -901,21 +985,21 @@ class FakturPajakExporter(BaseExporter):
 
             # Columns 1-15: Main faktur data (REPEATED for each item)
             main_data = [
-                structured.get('nama_seller') or 'N/A',           # Col 1
-                structured.get('alamat_seller') or 'N/A',         # Col 2
-                structured.get('npwp_seller') or 'N/A',           # Col 3
-                structured.get('nama_buyer') or 'N/A',            # Col 4
-                structured.get('alamat_buyer') or 'N/A',          # Col 5
-                structured.get('npwp_buyer') or 'N/A',            # Col 6
-                structured.get('email_buyer') or 'N/A',           # Col 7
-                self._format_date(structured.get('tanggal')) or 'N/A',  # Col 8
-                structured.get('nomor_faktur') or 'N/A',          # Col 9
-                self._parse_amount(structured.get('harga_jual')), # Col 10 - NUMBER format
-                self._parse_amount(structured.get('uang_muka')),  # Col 11 - NUMBER format
-                self._parse_amount(structured.get('dpp')),        # Col 12 - NUMBER format
-                self._parse_amount(structured.get('ppn')),        # Col 13 - NUMBER format
-                self._parse_amount(structured.get('total')),      # Col 14 - NUMBER format
-                structured.get('invoice') or 'N/A',               # Col 15
+                canonical.get('nama_seller') or 'N/A',            # Col 1
+                canonical.get('alamat_seller') or 'N/A',          # Col 2
+                canonical.get('npwp_seller') or 'N/A',            # Col 3
+                canonical.get('nama_buyer') or 'N/A',             # Col 4
+                canonical.get('alamat_buyer') or 'N/A',           # Col 5
+                canonical.get('npwp_buyer') or 'N/A',             # Col 6
+                canonical.get('email_buyer') or 'N/A',            # Col 7
+                self._canonical_date(canonical),                  # Col 8
+                canonical.get('nomor_faktur') or 'N/A',           # Col 9
+                self._canonical_amount(canonical, 'harga_jual'),  # Col 10 - NUMBER format
+                self._canonical_amount(canonical, 'uang_muka'),   # Col 11 - NUMBER format
+                self._canonical_amount(canonical, 'dpp'),         # Col 12 - NUMBER format
+                self._canonical_amount(canonical, 'ppn'),         # Col 13 - NUMBER format
+                self._canonical_amount(canonical, 'total'),       # Col 14 - NUMBER format
+                canonical.get('invoice') or 'N/A',                # Col 15
             ]
 
             # Write main data (columns 1-15) - NO MERGE, repeated per row
@@ -1101,31 +1185,14 @@ class FakturPajakExporter(BaseExporter):
             row += 1
             
             # ===== FLAT TABLE: ALL DATA REPEATED PER ITEM ROW (NO MERGE) =====
-            from ai_processor import IndonesianTaxDocumentParser
-            temp_parser = IndonesianTaxDocumentParser()
-
             grand_total_fill = PatternFill(start_color="93c5fd", end_color="93c5fd", fill_type="solid")
             grand_total_font = Font(bold=True, size=10)
 
             for idx, result_dict in enumerate(results):
-                # Get structured data
-                extracted_data = result_dict.get('extracted_data', {})
-                raw_text = extracted_data.get('raw_text', '')
-
-                # PRIORITY: Use Smart Mapper data if available
-                smart_mapped = extracted_data.get('smart_mapped', {})
-                items = []
-                if smart_mapped:
-                    structured = self._convert_smart_mapped_to_structured(smart_mapped)
-                    items = smart_mapped.get('items', [])
-                    logger.info(f"📋 BATCH EXPORT - Doc #{idx+1}: {len(items)} items found")
-                else:
-                    logger.warning(f"⚠️ BATCH EXPORT - Doc #{idx+1}: No smart_mapped data, using fallback")
-                    structured = extracted_data.get('structured_data', {})
-                    if not structured or not any(structured.values()):
-                        if raw_text:
-                            structured = temp_parser.extract_structured_fields(raw_text, "faktur_pajak")
-                    structured = self._prepare_structured_fields(structured, raw_text)
+                canonical = self._resolve_canonical(result_dict)
+                structured = canonical['fields']
+                items = list(canonical['items'])
+                logger.debug(f"📋 BATCH EXPORT - Doc #{idx+1}: {len(items)} items ({canonical['source']})")
 
                 # If no items, create one row with N/A for item columns
                 if not items or len(items) == 0:
@@ -1142,21 +1209,21 @@ class FakturPajakExporter(BaseExporter):
 
                     # Columns 1-15: Main faktur data (REPEATED for each item)
                     main_data = [
-                        structured.get('nama_seller') or 'N/A',
-                        structured.get('alamat_seller') or 'N/A',
-                        structured.get('npwp_seller') or 'N/A',
-                        structured.get('nama_buyer') or 'N/A',
-                        structured.get('alamat_buyer') or 'N/A',
-                        structured.get('npwp_buyer') or 'N/A',
-                        structured.get('email_buyer') or 'N/A',
-                        self._format_date(structured.get('tanggal')) or 'N/A',
-                        structured.get('nomor_faktur') or 'N/A',
-                        self._parse_amount(structured.get('harga_jual')),  # NUMBER format
-                        self._parse_amount(structured.get('uang_muka')),   # NUMBER format
-                        self._parse_amount(structured.get('dpp')),         # NUMBER format
-                        self._parse_amount(structured.get('ppn')),         # NUMBER format
-                        self._parse_amount(structured.get('total')),       # NUMBER format
-                        structured.get('invoice') or 'N/A',
+                        canonical.get('nama_seller') or 'N/A',
+                        canonical.get('alamat_seller') or 'N/A',
+                        canonical.get('npwp_seller') or 'N/A',
+                        canonical.get('nama_buyer') or 'N/A',
+                        canonical.get('alamat_buyer') or 'N/A',
+                        canonical.get('npwp_buyer') or 'N/A',
+                        canonical.get('email_buyer') or 'N/A',
+                        self._canonical_date(canonical),
+                        canonical.get('nomor_faktur') or 'N/A',
+                        self._canonical_amount(canonical, 'harga_jual'),  # NUMBER format
+                        self._canonical_amount(canonical, 'uang_muka'),   # NUMBER format
+                        self._canonical_amount(canonical, 'dpp'),         # NUMBER format
+                        self._canonical_amount(canonical, 'ppn'),         # NUMBER format
+                        self._canonical_amount(canonical, 'total'),       # NUMBER format
+                        canonical.get('invoice') or 'N/A',
                     ]
 
                     # Write main data (columns 1-15) - NO MERGE, repeated per row
@@ -1331,36 +1398,24 @@ class FakturPajakExporter(BaseExporter):
                 ["Nama", "Tgl", "NPWP", "Nomor Faktur", "Alamat", "DPP", "PPN", "Total", "Invoice", "Nama Barang/Jasa"]
             ]
             
-            # Extract structured data for all documents
-            from ai_processor import IndonesianTaxDocumentParser
-            temp_parser = IndonesianTaxDocumentParser()
-            
             for result_dict in results:
-                # Get structured data
-                extracted_data = result_dict.get('extracted_data', {})
-                structured = extracted_data.get('structured_data', {})
-                raw_text = extracted_data.get('raw_text', '')
-                
-                # If no structured data, try to extract
-                if not structured or not any(structured.values()):
-                    if raw_text:
-                        structured = temp_parser.extract_structured_fields(raw_text, "faktur_pajak")
-                
-                structured = self._prepare_structured_fields(structured, raw_text)
+                canonical = self._resolve_canonical(result_dict)
+                nama = canonical.get('nama_seller') or 'N/A'
+                alamat = canonical.get('alamat_seller') or 'N/A'
+                barang_jasa = self._format_barang_jasa(canonical['fields'].get('nama_barang_jasa')) or 'N/A'
 
                 # Add data row with truncation for PDF
                 table_data.append([
-                    structured.get('nama', 'N/A')[:25] if len(structured.get('nama', 'N/A')) > 25 else structured.get('nama', 'N/A'),
-                    structured.get('tanggal', 'N/A'),
-                    structured.get('npwp', 'N/A'),
-                    structured.get('nomor_faktur', 'N/A'),
-                    structured.get('alamat', 'N/A')[:35] if len(structured.get('alamat', 'N/A')) > 35 else structured.get('alamat', 'N/A'),
-                    structured.get('dpp', 'N/A'),
-                    structured.get('ppn', 'N/A'),
-                    structured.get('total', 'N/A'),
-                    structured.get('invoice', 'N/A'),
-                    (structured.get('nama_barang_jasa', 'N/A')[:60]
-                     if structured.get('nama_barang_jasa', 'N/A') != "N/A" else "N/A")
+                    nama[:25],
+                    self._canonical_date(canonical),
+                    canonical.get('npwp_seller') or 'N/A',
+                    canonical.get('nomor_faktur') or 'N/A',
+                    alamat[:35],
+                    self._standardize_amount(self._canonical_amount(canonical, 'dpp')) or 'N/A',
+                    self._standardize_amount(self._canonical_amount(canonical, 'ppn')) or 'N/A',
+                    self._standardize_amount(self._canonical_amount(canonical, 'total')) or 'N/A',
+                    canonical.get('invoice') or 'N/A',
+                    barang_jasa[:60] if barang_jasa != "N/A" else "N/A"
                 ])
             
             # Column widths (total = 7.5 inches for A4 with 0.5" margins)
@@ -1471,9 +1526,10 @@ class FakturPajakExporter(BaseExporter):
             
             # PRIORITY: Use Smart Mapper data
             smart_mapped = extracted_data.get('smart_mapped', {})
+            canonical = self._resolve_canonical(result)
+            structured = canonical['fields']
             if smart_mapped:
                 logger.info("✅ Using Smart Mapper GPT data for PDF document export")
-                structured = self._convert_smart_mapped_to_structured(smart_mapped)
                 seller = smart_mapped.get('seller', {})
                 buyer = smart_mapped.get('buyer', {})
                 invoice = smart_mapped.get('invoice', {})
@@ -1481,12 +1537,9 @@ class FakturPajakExporter(BaseExporter):
                 items = smart_mapped.get('items', [])
             else:
                 logger.info("⚠️ Smart Mapper not available, using legacy parser")
-                structured_data = extracted_data.get('structured_data', {})
-                raw_text = extracted_data.get('raw_text', '')
-                structured = self._prepare_structured_fields(structured_data, raw_text)
-                seller = {'name': structured.get('nama', ''), 'npwp': structured.get('npwp', ''), 'address': structured.get('alamat', '')}
+                seller = {'name': canonical.get('nama_seller') or '', 'npwp': canonical.get('npwp_seller') or '', 'address': canonical.get('alamat_seller') or ''}
                 buyer = {}
-                invoice = {'number': structured.get('nomor_faktur', ''), 'issue_date': structured.get('tanggal', '')}
+                invoice = {'number': canonical.get('nomor_faktur') or '', 'issue_date': structured.get('tanggal', '')}
                 financials = {'dpp': structured.get('dpp', ''), 'ppn': structured.get('ppn', ''), 'total': structured.get('total', '')}
                 items = []
             
@@ -35,6 +35,8 @@ except ImportError:
 class InvoiceExporter(BaseExporter):
     """Exporter for Standard Invoice documents"""
 
+    export_data_keys = ('smart_mapped', 'structured_data')
+
     def __init__(self):
         super().__init__("invoice")
         # Columns specific to Invoice
@@ -23,6 +23,8 @@ except ImportError:
 class PPh21Exporter(BaseExporter):
     """Exporter for PPh 21 (Indonesian Income Tax Withholding Certificate) documents"""
 
+    export_data_keys = ('smart_mapped', 'structured_data')
+
     def __init__(self):
         super().__init__("pph21")
         self.columns = [
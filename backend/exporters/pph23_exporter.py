@@ -23,6 +23,8 @@ except ImportError:
 class PPh23Exporter(BaseExporter):
     """Exporter for PPh 23 (Indonesian Tax Withholding Certificate) documents"""
 
+    export_data_keys = ('smart_mapped', 'structured_data')
+
     def __init__(self):
         super().__init__("pph23")
         self.columns = [
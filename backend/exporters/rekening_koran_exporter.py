@@ -35,6 +35,13 @@ except ImportError:
 class RekeningKoranExporter(BaseExporter):
     """Exporter for Bank Statement (Rekening Koran) documents"""
 
+    export_data_keys = (
+        'smart_mapped', 'structured_data', 'transactions', 'transaksi', 'bank_info', 'saldo_info',
+        'nama_bank', 'bank_name', 'nomor_rekening', 'account_number', 'nama_pemilik', 'account_holder',
+        'periode', 'period', 'saldo_awal', 'opening_balance', 'saldo_akhir', 'closing_balance',
+        'total_kredit', 'total_debet',
+    )
+
     def __init__(self):
         super().__init__("rekening_koran")
         # Columns specific to Rekening Koran (with Quality indicator)
@@ -0,0 +1,257 @@
+"""
+Per-Document Format Inference for Dates and Amounts
+Lock in a statement's date format and thousands/decimal convention from the first rows
+
+A statement uses one date format and one number convention throughout, yet the
+generic parsers try every strptime format / separator heuristic on every cell.
+FormatLock votes on which candidate parser wins for the first N values, then:
+- keeps the candidate order: candidates ahead of the winner are still tried first,
+  since several can match the same text differently (re.search patterns hitting a
+  different substring, "%d/%m/%Y" vs "%m/%d/%Y")
+- runs the winner through a precompiled single-format parser and skips the
+  candidates after it whenever that matches
+- memoizes results per raw string (saldo "0,00", dates and empty debit cells repeat a lot)
+
+A locked parse therefore returns what the full in-order scan would; the winner is
+usually the first candidate, so the common case is a single fast parser call.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+Parser = Callable[[str], Any]
+
+_MISS = object()
+
+# strptime directive -> regex group for numeric formats (mirrors strptime's own widths)
+_NUMERIC_DIRECTIVES = {
+    "%d": r"(?P<d>\d{1,2})",
+    "%m": r"(?P<m>\d{1,2})",
+    "%Y": r"(?P<Y>\d{4})",
+    "%y": r"(?P<y>\d{2})",
+}
+_DIRECTIVE_RE = re.compile(r"%.")
+
+# Amounts with an unambiguous separator layout; decimals are exactly 2 digits
+_AMOUNT_PATTERNS = {
+    "id": re.compile(r"-?(?:\d{1,3}(?:\.\d{3})+(?:,\d{2})?|\d+,\d{2})"),  # 1.000.000,00
+    "us": re.compile(r"-?(?:\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2})"),  # 1,000,000.00
+}
+_AMOUNT_SEPARATORS = {"id": (".", ","), "us": (",", ".")}  # (thousands, decimal)
+
+
+class FormatLock:
+    """Vote on the winning candidate parser for the first N values, then skip the ones after it"""
+
+    def __init__(
+        self,
+        candidates: Sequence[Tuple[str, Parser]],
+        fallback: Optional[Parser] = None,
+        fast_parsers: Optional[Dict[str, Parser]] = None,
+        sample_size: int = 20,
+        cache_size: int = 8192,
+    ):
+        """
+        Args:
+            candidates: (name, parser) pairs tried in order; a parser returns None on no match
+            fallback: Heuristic used when no candidate matches
+            fast_parsers: Optional faster equivalent of a candidate, used once it is locked
+            sample_size: Values to observe before locking
+            cache_size: Max memoized strings (cache is cleared when full)
+        """
+        self.candidates = list(candidates)
+        self.fallback = fallback
+        self.fast_parsers = fast_parsers or {}
+        self.sample_size = sample_size
+        self.cache_size = cache_size
+        self.reset()
+
+    def reset(self) -> None:
+        self.locked: Optional[str] = None
+        self._locked_parser: Optional[Parser] = None
+        self._locked_index = 0
+        self._rescan_from = 0
+        self._votes: Counter = Counter()
+        self._mismatch_streak = 0
+        self._cache: Dict[str, Any] = {}
+        self.mismatches = 0
+
+    def parse(self, text: str) -> Any:
+        cached = self._cache.get(text, _MISS)
+        if cached is not _MISS:
+            return cached
+
+        result = self._resolve(text)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[text] = result
+        return result
+
+    def _resolve(self, text: str) -> Any:
+        """Uncached parse: in-order scan, cut short at the locked candidate once locked"""
+        if self._locked_parser is not None:
+            index = self._locked_index
+            result, winner = self._scan(text, stop=index)
+            if winner is None:
+                result = self._locked_parser(text)
+                if result is not None:
+                    self._mismatch_streak = 0
+                    return result
+                result = self._scan(text, start=self._rescan_from)[0]
+
+            self.mismatches += 1
+            self._mismatch_streak += 1
+            if self._mismatch_streak >= self.sample_size:
+                # Format changed mid-document (e.g. appended statement) - vote again
+                self.locked = self._locked_parser = None
+                self._votes.clear()
+                self._mismatch_streak = 0
+            return result
+
+        result, winner = self._scan(text)
+        if winner is not None:
+            self._votes[winner] += 1
+            if sum(self._votes.values()) >= self.sample_size:
+                self.lock(self._votes.most_common(1)[0][0])
+        return result
+
+    def lock(self, name: str) -> None:
+        """Lock a candidate explicitly (e.g. from a bank's known format)"""
+        for index, (candidate_name, parser) in enumerate(self.candidates):
+            if candidate_name == name:
+                self.locked = name
+                self._locked_parser = self.fast_parsers.get(name, parser)
+                self._locked_index = index
+                # A fast parser may reject text its strptime original accepts - retry the original
+                self._rescan_from = index if name in self.fast_parsers else index + 1
+                return
+
+    def _scan(self, text: str, start: int = 0, stop: Optional[int] = None) -> Tuple[Any, Optional[str]]:
+        """
+        Try candidates[start:stop] in order
+
+        A partial scan (stop set) returns (None, None) on no match; the fallback
+        only runs when the scan reaches the end of the candidate list.
+        """
+        for name, parser in self.candidates[start:stop]:
+            result = parser(text)
+            if result is not None:
+                return result, name
+        if stop is not None:
+            return None, None
+        return (self.fallback(text) if self.fallback else None), None
+
+
+# ----------------------------------------------------------------------
+# Dates
+# ----------------------------------------------------------------------
+def _strptime_parser(fmt: str) -> Parser:
+    def parse(text: str) -> Optional[datetime]:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            return None
+    return parse
+
+
+def compile_date_format(fmt: str) -> Parser:
+    """
+    Single-format date parser
+
+    Numeric formats (%d %m %Y %y plus literal separators) become one compiled regex
+    and a datetime() call; anything else (month names) uses strptime with that format.
+    """
+    directives = _DIRECTIVE_RE.findall(fmt)
+    if not directives or any(d not in _NUMERIC_DIRECTIVES for d in directives):
+        return _strptime_parser(fmt)
+
+    pattern = "".join(
+        _NUMERIC_DIRECTIVES[piece] if piece in _NUMERIC_DIRECTIVES else re.escape(piece)
+        for piece in re.split(r"(%.)", fmt) if piece
+    )
+    regex = re.compile(pattern)
+
+    def parse(text: str) -> Optional[datetime]:
+        match = regex.fullmatch(text)
+        if not match:
+            return None
+        parts = match.groupdict()
+        if "Y" in parts:
+            year = int(parts["Y"])
+        else:
+            # strptime %y pivot: 69-99 -> 1900s, 00-68 -> 2000s
+            short = int(parts["y"])
+            year = short + (1900 if short >= 69 else 2000)
+        try:
+            return datetime(year, int(parts["m"]), int(parts["d"]))
+        except ValueError:
+            return None
+    return parse
+
+
+def date_format_lock(formats: Sequence[str], sample_size: int = 20) -> FormatLock:
+    """FormatLock over strptime formats (tried in the given order while sampling)"""
+    return FormatLock(
+        [(fmt, _strptime_parser(fmt)) for fmt in formats],
+        fast_parsers={fmt: compile_date_format(fmt) for fmt in formats},
+        sample_size=sample_size,
+    )
+
+
+# ----------------------------------------------------------------------
+# Amounts
+# ----------------------------------------------------------------------
+def _amount_parser(convention: str, convert: Callable[[str], Any]) -> Parser:
+    pattern = _AMOUNT_PATTERNS[convention]
+    thousands, decimal = _AMOUNT_SEPARATORS[convention]
+
+    def parse(text: str) -> Any:
+        if not pattern.fullmatch(text):
+            return None
+        return convert(text.replace(thousands, "").replace(decimal, "."))
+    return parse
+
+
+class AmountFormatLock(FormatLock):
+    """
+    Thousands/decimal convention lock for amount strings
+
+    Separator-free values ('150000') convert directly; values with separators go
+    through the locked convention's pattern and fall back to `heuristic` otherwise.
+    The memo cache is keyed by the raw cell text, before currency stripping.
+    """
+
+    def __init__(
+        self,
+        heuristic: Parser,
+        convert: Callable[[str], Any] = Decimal,
+        strip_chars: str = "Rp$€£¥ ",
+        sample_size: int = 20,
+    ):
+        self.convert = convert
+        self._strip = str.maketrans("", "", strip_chars)
+        super().__init__(
+            [(name, _amount_parser(name, convert)) for name in ("id", "us")],
+            fallback=heuristic,
+            sample_size=sample_size,
+        )
+
+    def _resolve(self, text: str) -> Any:
+        cleaned = text.translate(self._strip)
+        if cleaned.isdigit():
+            try:
+                return self.convert(cleaned)
+            except (InvalidOperation, ValueError):
+                pass
+        return super()._resolve(cleaned)
+
+
+__all__ = [
+    "FormatLock",
+    "AmountFormatLock",
+    "compile_date_format",
+    "date_format_lock",
+]
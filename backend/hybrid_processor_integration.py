@@ -9,6 +9,8 @@ with 90-96% token savings!
 import logging
 from typing import Dict, Any, Optional
 
+from docai_index import DocAIDocumentIndex
+
 logger = logging.getLogger(__name__)
 
 # Initialize hybrid processor components
@@ -270,77 +272,20 @@ def _format_ocr_result(
     elif ocr_metadata and 'raw_response' in ocr_metadata:
         raw_response = ocr_metadata['raw_response']
 
-        if hasattr(raw_response, 'pages'):
-            # Document AI format
-            for i, doc_page in enumerate(raw_response.pages):
+        if raw_response is not None and (isinstance(raw_response, dict) or hasattr(raw_response, 'pages')):
+            # Document AI format (proto or dict) - anchors resolved once by the index
+            index = DocAIDocumentIndex(raw_response)
+            for i in range(len(index.pages)):
                 page = {
                     'page_number': i + 1,
-                    'tables': [],
-                    'text_blocks': []
+                    'tables': index.adapter_tables([i]),
+                    'text_blocks': [{'text': text} for text in index.block_texts(i)]
                 }
-
-                # Extract tables
-                if hasattr(doc_page, 'tables'):
-                    for table in doc_page.tables:
-                        formatted_table = _format_document_ai_table(table)
-                        page['tables'].append(formatted_table)
-
-                # Extract text blocks
-                if hasattr(doc_page, 'blocks'):
-                    for block in doc_page.blocks:
-                        if hasattr(block, 'layout') and hasattr(block.layout, 'text_anchor'):
-                            text = _extract_text_from_layout(block.layout, raw_response.text)
-                            page['text_blocks'].append({'text': text})
-
                 formatted['pages'].append(page)
 
     return formatted
 
 
-def _format_document_ai_table(table) -> Dict:
-    """
-    Format Document AI table to our format
-    """
-    formatted_table = {
-        'rows': []
-    }
-
-    if hasattr(table, 'body_rows'):
-        for row in table.body_rows:
-            formatted_row = {
-                'cells': []
-            }
-
-            if hasattr(row, 'cells'):
-                for cell in row.cells:
-                    cell_text = _extract_text_from_layout(cell.layout, '')
-                    formatted_row['cells'].append({'text': cell_text})
-
-            formatted_table['rows'].append(formatted_row)
-
-    return formatted_table
-
-
-def _extract_text_from_layout(layout, full_text: str) -> str:
-    """
-    Extract text from Document AI layout
-    """
-    if hasattr(layout, 'text_anchor') and hasattr(layout.text_anchor, 'text_segments'):
-        text_segments = layout.text_anchor.text_segments
-        text_parts = []
-
-        for segment in text_segments:
-            start = int(segment.start_index) if hasattr(segment, 'start_index') else 0
-            end = int(segment.end_index) if hasattr(segment, 'end_index') else 0
-
-            if full_text and start < len(full_text) and end <= len(full_text):
-                text_parts.append(full_text[start:end])
-
-        return ''.join(text_parts)
-
-    return ''
-
-
 def _fallback_to_legacy(
     ocr_result: Dict[str, Any],
     ocr_metadata: Optional[Dict[str, Any]]
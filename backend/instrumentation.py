@@ -0,0 +1,456 @@
+"""
+Pipeline Instrumentation
+Per-document stage spans (duration, RSS delta), page counts and LLM token usage
+
+    with trace_document("rekening_koran", filename) as trace:
+        with span("ocr"):
+            ...
+        trace.to_dict()  # {'total_s', 'pages', 'stages': {'ocr': {...}}, 'llm': {...}}
+
+Every span also feeds the process-wide `metrics` registry, which is rendered in
+the Prometheus text format at GET /metrics (scrape token or admin only) and periodically persisted as a
+SystemMetrics row. The current trace lives in a ContextVar, so it follows awaits
+and asyncio.to_thread; wrap callables with propagate() before handing them to a
+ThreadPoolExecutor (it carries every ContextVar, including the LLM scheduler
+identity). RSS is process-wide, so deltas are approximate while several
+documents are processed concurrently.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HAS_PSUTIL = False
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    psutil = None  # type: ignore
+
+# Stage names used across the pipeline
+STAGES = ("ocr", "parsing", "mapping", "llm", "validation", "export", "db")
+
+# Histogram buckets (seconds) - Document AI calls and LLM mapping dominate the upper range
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (None when unavailable)"""
+    if HAS_PSUTIL:
+        try:
+            return psutil.Process().memory_info().rss / _MB
+        except Exception:
+            return None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / _MB
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class SpanRecord:
+    """One finished stage"""
+    name: str
+    duration_s: float
+    rss_delta_mb: Optional[float] = None
+    error: bool = False
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Span:
+    """Timed stage - use as a context manager or call start()/end() explicitly"""
+
+    def __init__(self, name: str, trace: Optional["DocumentTrace"] = None, document_type: Optional[str] = None, **attributes):
+        self.name = name
+        self.trace = trace
+        self.document_type = document_type or (trace.document_type if trace else "unknown")
+        self.attributes = attributes
+        self.record: Optional[SpanRecord] = None
+        self._started: Optional[float] = None
+        self._rss_before: Optional[float] = None
+
+    def start(self) -> "Span":
+        self._rss_before = current_rss_mb()
+        self._started = time.perf_counter()
+        return self
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: bool = False) -> Optional[SpanRecord]:
+        """Close the span (idempotent) and report it to the trace and registry"""
+        if self._started is None or self.record is not None:
+            return self.record
+        duration = time.perf_counter() - self._started
+        rss_after = current_rss_mb()
+        rss_delta = rss_after - self._rss_before if rss_after is not None and self._rss_before is not None else None
+
+        self.record = SpanRecord(self.name, duration, rss_delta, error, dict(self.attributes))
+        if self.trace is not None:
+            self.trace.add_span(self.record)
+        metrics.observe_stage(self.name, self.document_type, duration, rss_delta, error)
+        return self.record
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end(error=exc_type is not None)
+        return False
+
+
+class DocumentTrace:
+    """Spans, pages and LLM usage collected while processing one document"""
+
+    def __init__(self, document_type: str, filename: str = ""):
+        self.document_type = document_type or "unknown"
+        self.filename = filename
+        self.started = time.perf_counter()
+        self.duration_s: Optional[float] = None
+        self.pages = 0
+        self.confidence: Optional[float] = None
+        self.spans: List[SpanRecord] = []
+        # prompt_tokens includes cached_tokens (prompt-cache reads) and cache_write_tokens
+        self.llm = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attributes) -> Span:
+        return Span(name, trace=self, **attributes)
+
+    def add_span(self, record: SpanRecord) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def add_pages(self, count: int) -> None:
+        with self._lock:
+            self.pages += max(0, int(count or 0))
+
+    def add_llm_usage(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+                      cache_write_tokens: int = 0) -> None:
+        with self._lock:
+            self.llm["requests"] += 1
+            self.llm["prompt_tokens"] += prompt_tokens
+            self.llm["completion_tokens"] += completion_tokens
+            self.llm["cached_tokens"] += cached_tokens
+            self.llm["cache_write_tokens"] += cache_write_tokens
+
+    def stage_seconds(self, name: str) -> Optional[float]:
+        """Total time spent in a stage (None if it never ran)"""
+        with self._lock:
+            durations = [s.duration_s for s in self.spans if s.name == name]
+        return sum(durations) if durations else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+            llm = dict(self.llm)
+        stages: Dict[str, Dict[str, Any]] = {}
+        for record in spans:
+            stage = stages.setdefault(record.name, {"count": 0, "seconds": 0.0, "rss_delta_mb": 0.0, "errors": 0})
+            stage["count"] += 1
+            stage["seconds"] += record.duration_s
+            stage["rss_delta_mb"] += record.rss_delta_mb or 0.0
+            stage["errors"] += int(record.error)
+        for stage in stages.values():
+            stage["seconds"] = round(stage["seconds"], 4)
+            stage["rss_delta_mb"] = round(stage["rss_delta_mb"], 2)
+        total = self.duration_s if self.duration_s is not None else time.perf_counter() - self.started
+        return {
+            "document_type": self.document_type,
+            "total_s": round(total, 4),
+            "pages": self.pages,
+            "stages": stages,
+            "llm": llm,
+        }
+
+
+# ==================== Metrics registry ====================
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float, buckets: Tuple[float, ...]) -> None:
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+def _empty_window() -> Dict[str, float]:
+    return {
+        "documents": 0, "failures": 0, "seconds": 0.0,
+        "confidence_sum": 0.0, "confidence_count": 0,
+        "ocr_count": 0, "ocr_errors": 0, "ocr_seconds": 0.0,
+    }
+
+
+class MetricsRegistry:
+    """Thread-safe counters/histograms with Prometheus text rendering"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stage_seconds: Dict[Tuple[str, str], _Histogram] = {}
+            self._stage_errors: Dict[Tuple[str, str], int] = {}
+            self._stage_rss: Dict[Tuple[str, str], List[float]] = {}  # [sum, count]
+            self._document_seconds: Dict[Tuple[str], _Histogram] = {}
+            self._documents: Dict[Tuple[str, str], int] = {}
+            self._pages: Dict[Tuple[str], int] = {}
+            self._llm_requests: Dict[Tuple[str, str], int] = {}
+            self._llm_tokens: Dict[Tuple[str, str, str], int] = {}
+            self._window = _empty_window()
+
+    def observe_stage(self, stage: str, document_type: str, seconds: float, rss_delta_mb: Optional[float], error: bool) -> None:
+        key = (stage, document_type)
+        with self._lock:
+            self._stage_seconds.setdefault(key, _Histogram(len(self.buckets))).observe(seconds, self.buckets)
+            if error:
+                self._stage_errors[key] = self._stage_errors.get(key, 0) + 1
+            if rss_delta_mb is not None:
+                rss = self._stage_rss.setdefault(key, [0.0, 0])
+                rss[0] += rss_delta_mb
+                rss[1] += 1
+            if stage == "ocr":
+                self._window["ocr_count"] += 1
+                self._window["ocr_errors"] += int(error)
+                self._window["ocr_seconds"] += seconds
+
+    def observe_document(self, trace: DocumentTrace, success: bool) -> None:
+        key = (trace.document_type,)
+        seconds = trace.duration_s or 0.0
+        with self._lock:
+            self._document_seconds.setdefault(key, _Histogram(len(self.buckets))).observe(seconds, self.buckets)
+            status_key = (trace.document_type, "success" if success else "failed")
+            self._documents[status_key] = self._documents.get(status_key, 0) + 1
+            self._pages[key] = self._pages.get(key, 0) + trace.pages
+            self._window["documents"] += 1
+            self._window["failures"] += int(not success)
+            self._window["seconds"] += seconds
+            if success and trace.confidence is not None:
+                self._window["confidence_sum"] += trace.confidence
+                self._window["confidence_count"] += 1
+
+    def observe_llm(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+                    cached_tokens: int = 0, cache_write_tokens: int = 0) -> None:
+        with self._lock:
+            key = (provider, model)
+            self._llm_requests[key] = self._llm_requests.get(key, 0) + 1
+            for kind, value in (("prompt", prompt_tokens), ("completion", completion_tokens),
+                                ("cached", cached_tokens), ("cache_write", cache_write_tokens)):
+                token_key = (provider, model, kind)
+                self._llm_tokens[token_key] = self._llm_tokens.get(token_key, 0) + value
+
+    def drain_window(self) -> Dict[str, float]:
+        """Aggregates since the previous drain (used for SystemMetrics rows)"""
+        with self._lock:
+            window, self._window = self._window, _empty_window()
+        return window
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, label_names: Tuple[str, ...], series: Dict[Tuple, _Histogram]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for values, hist in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist.counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{_labels(label_names, values, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_labels(label_names, values, inf)} {hist.count}")
+                lines.append(f"{name}_sum{_labels(label_names, values)} {hist.total:.6f}")
+                lines.append(f"{name}_count{_labels(label_names, values)} {hist.count}")
+
+        def counter(name: str, help_text: str, label_names: Tuple[str, ...], series: Dict[Tuple, int]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for values, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(label_names, values)} {value}")
+
+        with self._lock:
+            histogram("docscan_stage_duration_seconds", "Time spent per pipeline stage",
+                      ("stage", "document_type"), self._stage_seconds)
+            counter("docscan_stage_errors_total", "Pipeline stages that raised",
+                    ("stage", "document_type"), self._stage_errors)
+            lines.append("# HELP docscan_stage_rss_delta_megabytes Resident memory change across a stage")
+            lines.append("# TYPE docscan_stage_rss_delta_megabytes summary")
+            for values, (total, count) in sorted(self._stage_rss.items()):
+                labels = _labels(("stage", "document_type"), values)
+                lines.append(f"docscan_stage_rss_delta_megabytes_sum{labels} {total:.3f}")
+                lines.append(f"docscan_stage_rss_delta_megabytes_count{labels} {count}")
+            histogram("docscan_document_duration_seconds", "End-to-end document processing time",
+                      ("document_type",), self._document_seconds)
+            counter("docscan_documents_total", "Processed documents",
+                    ("document_type", "status"), self._documents)
+            counter("docscan_pages_total", "Processed pages", ("document_type",), self._pages)
+            counter("docscan_llm_requests_total", "LLM completions", ("provider", "model"), self._llm_requests)
+            counter("docscan_llm_tokens_total", "LLM tokens billed (cached and cache_write are part of prompt)", ("provider", "model", "kind"), self._llm_tokens)
+
+        rss = current_rss_mb()
+        if rss is not None:
+            lines.append("# HELP docscan_process_resident_memory_megabytes Resident memory of this worker")
+            lines.append("# TYPE docscan_process_resident_memory_megabytes gauge")
+            lines.append(f"docscan_process_resident_memory_megabytes {rss:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# ==================== Trace context ====================
+
+_current_trace: contextvars.ContextVar[Optional[DocumentTrace]] = contextvars.ContextVar("document_trace", default=None)
+
+
+def current_trace() -> Optional[DocumentTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_document(document_type: str, filename: str = "") -> Iterator[DocumentTrace]:
+    """Collect spans for one document; counted as failed if the block raises"""
+    trace = DocumentTrace(document_type, filename)
+    token = _current_trace.set(trace)
+    success = False
+    try:
+        yield trace
+        success = True
+    finally:
+        _current_trace.reset(token)
+        trace.duration_s = time.perf_counter() - trace.started
+        metrics.observe_document(trace, success)
+
+
+def span(name: str, **attributes) -> Span:
+    """Span attached to the current document trace (registry only outside a trace)"""
+    return Span(name, trace=_current_trace.get(), **attributes)
+
+
+def record_pages(count: int) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_pages(count)
+
+
+def record_llm_usage(provider: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                     cached_tokens: Optional[int] = None, cache_write_tokens: Optional[int] = None) -> None:
+    """
+    Token usage reported by the provider for one completion
+    prompt_tokens is the full prompt; cached_tokens / cache_write_tokens are the parts of it
+    served from / written to the provider's prompt cache
+    """
+    prompt_tokens = int(prompt_tokens or 0)
+    completion_tokens = int(completion_tokens or 0)
+    cached_tokens = int(cached_tokens or 0)
+    cache_write_tokens = int(cache_write_tokens or 0)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_usage(prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens)
+    metrics.observe_llm(provider, model or "unknown", prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind the caller's context (trace, LLM identity, ...) to a callable that will run on another thread
+    Each call runs in its own copy, so the wrapper can be mapped over a pool concurrently.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+# ==================== Persistence ====================
+
+_persist_lock = threading.Lock()
+_last_persist = 0.0
+
+
+def persist_system_metrics(db, active_batches: int = 0, force: bool = False) -> bool:
+    """
+    Write the aggregates collected since the last call as a SystemMetrics row
+
+    Throttled to one row per settings.metrics_persist_interval seconds unless
+    force is set; windows without processed documents are not written.
+    """
+    global _last_persist
+    from config import settings, get_upload_dir
+
+    interval = getattr(settings, "metrics_persist_interval", 60) or 0
+    now = time.monotonic()
+    with _persist_lock:
+        if not force and _last_persist and now - _last_persist < interval:
+            return False
+        _last_persist = now
+
+    window = metrics.drain_window()
+    if not window["documents"] and not force:
+        return False
+
+    try:
+        from database import SystemMetrics
+
+        try:
+            disk_usage_mb = shutil.disk_usage(get_upload_dir()).used / _MB
+        except OSError:
+            disk_usage_mb = None
+        row = SystemMetrics(
+            total_documents_processed=int(window["documents"]),
+            average_confidence=(window["confidence_sum"] / window["confidence_count"]) if window["confidence_count"] else None,
+            average_processing_time=(window["seconds"] / window["documents"]) if window["documents"] else None,
+            memory_usage_mb=current_rss_mb(),
+            disk_usage_mb=disk_usage_mb,
+            active_batches=active_batches,
+            ocr_success_rate=(1 - window["ocr_errors"] / window["ocr_count"]) if window["ocr_count"] else None,
+            ocr_average_time=(window["ocr_seconds"] / window["ocr_count"]) if window["ocr_count"] else None,
+        )
+        db.add(row)
+        db.commit()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to persist system metrics: {e}")
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return False
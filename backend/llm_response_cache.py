@@ -0,0 +1,285 @@
+"""
+LLM Response Cache for Smart Mapper
+Persists parsed GPT/Claude mapping results so identical requests skip the LLM round trip
+
+Cache key = sha256(provider, model, temperature, instructions, canonical payload)
+- Canonical payload: json.dumps(sort_keys=True, compact separators)
+- Entries expire after TTL and are evicted least-recently-used beyond max_entries
+- Entries are tagged with doc_type + template fingerprint so template edits invalidate them
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def canonicalize_payload(payload: Any) -> str:
+    """Serialize payload deterministically (key order and whitespace independent)"""
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def file_fingerprint(path: Path) -> Optional[str]:
+    """Fingerprint a template file by content hash (None if missing)"""
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache with TTL, LRU eviction and hit/miss metrics"""
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        enabled: bool = True,
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._metrics = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+        if self.enabled:
+            try:
+                Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+                # Smart Mapper pages run in a ThreadPoolExecutor - share one connection behind a lock
+                self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS llm_responses (
+                        cache_key TEXT PRIMARY KEY,
+                        doc_type TEXT,
+                        template_fingerprint TEXT,
+                        provider TEXT,
+                        model TEXT,
+                        response_json TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL,
+                        hit_count INTEGER DEFAULT 0
+                    )
+                    """
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_doc_type ON llm_responses(doc_type)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_access ON llm_responses(last_access)")
+                self._conn.commit()
+                logger.info(f"🗄️ LLM response cache ready: {db_path} (ttl={ttl_seconds}s, max_entries={max_entries})")
+            except Exception as e:
+                logger.error(f"❌ LLM response cache unavailable: {e}")
+                self._conn = None
+                self.enabled = False
+
+    # ------------------------------------------------------------------
+    # Key helpers
+    # ------------------------------------------------------------------
+    @staticmethod
+    def build_key(
+        *,
+        provider: str,
+        model: str,
+        temperature: float,
+        instructions: str,
+        payload: Any,
+    ) -> str:
+        """Hash (provider, model, temperature, instructions, canonical payload) into a cache key"""
+        hasher = hashlib.sha256()
+        for part in (provider, model, f"{temperature:.4f}", instructions, canonicalize_payload(payload)):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\x1f")  # Field separator so ("ab", "c") != ("a", "bc")
+        return hasher.hexdigest()
+
+    # ------------------------------------------------------------------
+    # Get / set
+    # ------------------------------------------------------------------
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return cached parsed JSON, or None on miss/expiry"""
+        if not self.enabled or not self._conn:
+            return None
+
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response_json, created_at FROM llm_responses WHERE cache_key = ?",
+                    (cache_key,),
+                ).fetchone()
+
+                if row is None:
+                    self._metrics["misses"] += 1
+                    return None
+
+                response_json, created_at = row
+                if now - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (cache_key,))
+                    self._conn.commit()
+                    self._metrics["expired"] += 1
+                    self._metrics["misses"] += 1
+                    return None
+
+                self._conn.execute(
+                    "UPDATE llm_responses SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                    (now, cache_key),
+                )
+                self._conn.commit()
+                self._metrics["hits"] += 1
+
+            logger.info(f"⚡ LLM cache HIT: {cache_key[:12]}...")
+            return json.loads(response_json)
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache read failed: {e}")
+            return None
+
+    def set(
+        self,
+        cache_key: str,
+        response: Dict[str, Any],
+        *,
+        doc_type: str = "",
+        template_fingerprint: Optional[str] = None,
+        provider: str = "",
+        model: str = "",
+    ) -> bool:
+        """Store parsed JSON response, evicting least-recently-used entries beyond max_entries"""
+        if not self.enabled or not self._conn:
+            return False
+
+        now = time.time()
+        try:
+            response_json = json.dumps(response, ensure_ascii=False, default=str)
+            with self._lock:
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_responses
+                        (cache_key, doc_type, template_fingerprint, provider, model, response_json, created_at, last_access, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+                    """,
+                    (cache_key, doc_type, template_fingerprint, provider, model, response_json, now, now),
+                )
+                self._metrics["stores"] += 1
+                self._evict_locked()
+                self._conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache write failed: {e}")
+            return False
+
+    def _evict_locked(self) -> None:
+        """Drop expired rows, then LRU rows beyond max_entries (caller holds lock)"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (cutoff,)).rowcount
+        self._metrics["expired"] += max(expired, 0)
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            evicted = self._conn.execute(
+                """
+                DELETE FROM llm_responses WHERE cache_key IN (
+                    SELECT cache_key FROM llm_responses ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (overflow,),
+            ).rowcount
+            self._metrics["evictions"] += max(evicted, 0)
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+    def invalidate_template(self, doc_type: str, current_fingerprint: Optional[str]) -> int:
+        """Remove entries for doc_type produced with a different template version"""
+        if not self.enabled or not self._conn:
+            return 0
+
+        try:
+            with self._lock:
+                deleted = self._conn.execute(
+                    "DELETE FROM llm_responses WHERE doc_type = ? AND (template_fingerprint IS NULL OR template_fingerprint != ?)",
+                    (doc_type, current_fingerprint or ""),
+                ).rowcount
+                self._conn.commit()
+                self._metrics["invalidations"] += max(deleted, 0)
+            if deleted:
+                logger.info(f"🗑️ Invalidated {deleted} cached LLM responses for {doc_type} (template changed)")
+            return deleted
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache invalidation failed: {e}")
+            return 0
+
+    def clear(self) -> bool:
+        """Remove all cached responses"""
+        if not self.enabled or not self._conn:
+            return False
+
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_responses")
+                self._conn.commit()
+            logger.warning("🗑️ LLM response cache cleared")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error clearing LLM response cache: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current size"""
+        stats: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            **self._metrics,
+        }
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        stats["hit_rate"] = round(self._metrics["hits"] / lookups, 4) if lookups else 0.0
+
+        if self.enabled and self._conn:
+            try:
+                with self._lock:
+                    (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+                stats["entries"] = count
+            except Exception as e:
+                stats["error"] = str(e)
+        return stats
+
+
+def _default_cache_path() -> str:
+    cache_dir = Path(__file__).resolve().parent / "cache"
+    return str(cache_dir / "smart_mapper_responses.db")
+
+
+def create_llm_response_cache() -> LLMResponseCache:
+    """Build the cache from SMART_MAPPER_CACHE_* settings"""
+    try:
+        from config import settings
+        enabled = settings.smart_mapper_cache_enabled
+        ttl = settings.smart_mapper_cache_ttl
+        max_entries = settings.smart_mapper_cache_max_entries
+        path = settings.smart_mapper_cache_path
+    except Exception:
+        enabled, ttl, max_entries, path = True, 7 * 24 * 3600, 5000, None
+
+    enabled = os.getenv("SMART_MAPPER_CACHE_ENABLED", str(enabled)).lower() in {"1", "true", "yes"}
+    return LLMResponseCache(
+        db_path=os.getenv("SMART_MAPPER_CACHE_PATH") or path or _default_cache_path(),
+        ttl_seconds=int(os.getenv("SMART_MAPPER_CACHE_TTL", str(ttl))),
+        max_entries=int(os.getenv("SMART_MAPPER_CACHE_MAX_ENTRIES", str(max_entries))),
+        enabled=enabled,
+    )
+
+
+__all__ = ["LLMResponseCache", "create_llm_response_cache", "canonicalize_payload", "file_fingerprint"]
@@ -0,0 +1,398 @@
+"""
+LLM Scheduler
+Global token budget, concurrency cap and weighted fair queuing for GPT/Claude calls
+
+    with llm_identity(user_id, priority="batch"):          # set once per request/batch
+        ...
+        with get_llm_scheduler().reserve(estimate_tokens(prompt) + max_tokens) as reservation:
+            response = client.chat.completions.create(...)
+            reservation.settle(usage_total_tokens(response.usage))
+
+- Budget: a token bucket of llm_tokens_per_minute shared by every worker process through
+  the backend (Redis by default, in-process for tests/single worker). Reservations
+  charge an estimate up front; settle() refunds or charges the difference.
+- Fairness: waiters are ordered by weighted-fair-queuing finish tags per (user, priority),
+  so one large upload cannot starve other users; interactive work outweighs batch work.
+  Ordering is per process; the budget is global.
+- Provider 429s: throttle(retry_after) pauses the shared bucket, so every caller queues
+  behind the pause instead of each thread retrying on its own backoff schedule.
+"""
+
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Relative share of the budget while several priorities are waiting
+PRIORITY_WEIGHTS = {"interactive": 4.0, "batch": 1.0, "background": 0.5}
+DEFAULT_PRIORITY = "batch"
+BUDGET_KEY = "llm:budget"
+
+_identity: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "llm_identity", default=("anonymous", DEFAULT_PRIORITY)
+)
+
+
+@contextmanager
+def llm_identity(user_id: Any, priority: str = DEFAULT_PRIORITY) -> Iterator[None]:
+    """Attribute LLM calls made in this context (follows awaits and asyncio.to_thread)"""
+    token = _identity.set((str(user_id) if user_id is not None else "anonymous", priority))
+    try:
+        yield
+    finally:
+        _identity.reset(token)
+
+
+def current_identity() -> Tuple[str, str]:
+    return _identity.get()
+
+
+def usage_total_tokens(usage: Any) -> Optional[int]:
+    """Total tokens from an OpenAI or Anthropic usage object (None if not reported)"""
+    if usage is None:
+        return None
+    total = getattr(usage, "total_tokens", None)
+    if total is not None:
+        return total
+    prompt = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None) or 0
+    return (prompt + completion) or None
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    if getattr(exc, "status_code", None) in (429, 529):
+        return True
+    message = str(exc).lower()
+    return "rate_limit" in message or "429" in message or "overloaded" in message
+
+
+def retry_after_seconds(exc: Exception, default: float) -> float:
+    """Retry-After header of a provider error when present, else default"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return max(0.0, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+# ==================== Budget backends ====================
+
+class InMemoryBudgetBackend:
+    """Token buckets in this process (tests, single-worker deployments, Redis fallback)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def _bucket(self, key: str, capacity: float, now: float) -> Dict[str, float]:
+        return self._buckets.setdefault(key, {"tokens": capacity, "ts": now, "paused_until": 0.0})
+
+    def try_consume(self, key: str, amount: float, capacity: float, rate: float) -> float:
+        """Take amount tokens; returns 0 when granted, else seconds until it could be"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, capacity, now)
+            if bucket["paused_until"] > now:
+                return bucket["paused_until"] - now
+            bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["ts"]) * rate)
+            bucket["ts"] = now
+            if bucket["tokens"] >= amount:
+                bucket["tokens"] -= amount
+                return 0.0
+            return (amount - bucket["tokens"]) / rate
+
+    def adjust(self, key: str, delta: float, capacity: float) -> None:
+        """Refund (positive) or charge (negative) tokens after the real usage is known"""
+        with self._lock:
+            bucket = self._bucket(key, capacity, time.monotonic())
+            bucket["tokens"] = min(capacity, bucket["tokens"] + delta)
+
+    def pause(self, key: str, seconds: float, capacity: float) -> None:
+        with self._lock:
+            bucket = self._bucket(key, capacity, time.monotonic())
+            bucket["paused_until"] = max(bucket["paused_until"], time.monotonic() + seconds)
+
+
+_CONSUME_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'paused_until')
+local paused = tonumber(state[3]) or 0
+if paused > now then
+    return tostring(paused - now)
+end
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= amount then
+    tokens = tokens - amount
+else
+    wait = (amount - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+_ADJUST_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens == nil then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[2]), tokens + tonumber(ARGV[1])))
+return 1
+"""
+
+_PAUSE_SCRIPT = """
+local t = redis.call('TIME')
+local until_ts = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0
+if until_ts > current then
+    redis.call('HSET', KEYS[1], 'paused_until', until_ts)
+end
+if redis.call('TTL', KEYS[1]) < math.ceil(tonumber(ARGV[1])) + 60 then
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])) + 60)
+end
+return 1
+"""
+
+
+class RedisBudgetBackend:
+    """
+    Token buckets shared by every worker process (atomic Lua scripts, Redis server clock)
+    Falls back to an in-process bucket while Redis is unreachable.
+    """
+
+    def __init__(self, redis_client, fallback: Optional[InMemoryBudgetBackend] = None):
+        self.redis_client = redis_client
+        self.fallback = fallback or InMemoryBudgetBackend()
+        self._consume = redis_client.register_script(_CONSUME_SCRIPT)
+        self._adjust = redis_client.register_script(_ADJUST_SCRIPT)
+        self._pause = redis_client.register_script(_PAUSE_SCRIPT)
+        self._degraded = False
+
+    def _run(self, script, keys, args):
+        import redis
+        try:
+            result = script(keys=keys, args=args)
+        except redis.RedisError as e:
+            if not self._degraded:
+                logger.warning(f"⚠️ LLM budget backend unavailable, using per-process budget: {e}")
+                self._degraded = True
+            return None
+        if self._degraded:
+            logger.info("✅ LLM budget backend restored")
+            self._degraded = False
+        return result
+
+    def try_consume(self, key: str, amount: float, capacity: float, rate: float) -> float:
+        result = self._run(self._consume, [key], [capacity, rate, amount])
+        if result is None:
+            return self.fallback.try_consume(key, amount, capacity, rate)
+        return float(result)
+
+    def adjust(self, key: str, delta: float, capacity: float) -> None:
+        if self._run(self._adjust, [key], [delta, capacity]) is None:
+            self.fallback.adjust(key, delta, capacity)
+
+    def pause(self, key: str, seconds: float, capacity: float) -> None:
+        if self._run(self._pause, [key], [seconds]) is None:
+            self.fallback.pause(key, seconds, capacity)
+
+
+# ==================== Scheduler ====================
+
+class Reservation:
+    """Budget held by one LLM call; settle() with the provider-reported usage"""
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        if self.settled or actual_tokens is None:
+            return
+        self.settled = True
+        delta = self.tokens - actual_tokens
+        if delta:
+            self.scheduler.backend.adjust(BUDGET_KEY, delta, self.scheduler.capacity)
+
+
+class LLMScheduler:
+    """Admits LLM calls in weighted-fair order within the global budget and concurrency cap"""
+
+    def __init__(self, backend, tokens_per_minute: int, max_concurrency: int,
+                 max_wait_seconds: float = 600.0, enabled: bool = True):
+        self.backend = backend
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_wait_seconds = max_wait_seconds
+        self.enabled = enabled and tokens_per_minute > 0
+
+        self._cond = threading.Condition()
+        self._queue: list = []  # (finish_tag, seq, ticket)
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self._active = 0
+        self._stats = {"admitted": 0, "queued": 0, "wait_seconds": 0.0, "throttled": 0, "timeouts": 0}
+
+    def _finish_tag(self, flow: Tuple[str, str], tokens: int) -> float:
+        weight = PRIORITY_WEIGHTS.get(flow[1], 1.0)
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + tokens / weight
+        self._last_finish[flow] = finish
+        return finish
+
+    @contextmanager
+    def reserve(self, estimated_tokens: int) -> Iterator[Reservation]:
+        """
+        Block until this call may run, then hold a concurrency slot for its duration
+
+        Raises:
+            TimeoutError: waited longer than max_wait_seconds
+        """
+        tokens = int(min(max(estimated_tokens, 1), self.capacity)) if self.enabled else 0
+        if not self.enabled:
+            yield Reservation(self, 0)
+            return
+
+        flow = current_identity()
+        waited_from = time.monotonic()
+        deadline = waited_from + self.max_wait_seconds
+        with self._cond:
+            ticket = object()
+            entry = (self._finish_tag(flow, tokens), next(self._seq), ticket)
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0][2] is ticket and self._active < self.max_concurrency:
+                        wait = self.backend.try_consume(BUDGET_KEY, tokens, self.capacity, self.rate)
+                        if wait <= 0:
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise TimeoutError(f"LLM budget wait exceeded {self.max_wait_seconds:.0f}s")
+                    # Head of the queue polls the budget; everyone else waits for a dispatch
+                    self._cond.wait(timeout=min(remaining, wait if wait is not None else 1.0, 1.0))
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._virtual_time = entry[0]
+            if not self._queue:
+                # Every finish tag is <= virtual time now, so per-flow history carries no information
+                self._last_finish.clear()
+            self._active += 1
+            waited = time.monotonic() - waited_from
+            self._stats["admitted"] += 1
+            self._stats["wait_seconds"] += waited
+            if waited > 0.05:
+                self._stats["queued"] += 1
+            self._cond.notify_all()
+
+        if waited > 1.0:
+            logger.info(f"⏳ LLM call for {flow[0]} ({flow[1]}) queued {waited:.1f}s for budget ({tokens} tokens)")
+        try:
+            yield Reservation(self, tokens)
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def throttle(self, seconds: float) -> None:
+        """Provider signalled 429/overload: pause the shared budget so callers queue instead of retrying"""
+        if not self.enabled:
+            time.sleep(seconds)
+            return
+        self._stats["throttled"] += 1
+        self.backend.pause(BUDGET_KEY, seconds, self.capacity)
+        logger.warning(f"⚠️ LLM provider throttled - budget paused for {seconds:.1f}s")
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "waiting": len(self._queue),
+                "active": self._active,
+                "tokens_per_minute": int(self.capacity),
+                "max_concurrency": self.max_concurrency,
+            }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def _create_backend(name: str, workers: int = 1):
+    if name == "redis":
+        try:
+            from redis_cache import cache
+            if cache.redis_client is not None:
+                if not cache.is_connected():
+                    logger.warning("⚠️ Redis unreachable at startup - LLM budget is per-process until it recovers")
+                # Degrades to an in-process bucket per call and recovers on its own
+                return RedisBudgetBackend(cache.redis_client)
+            logger.warning("⚠️ Redis client unavailable - falling back to per-process LLM budget")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis LLM budget backend failed ({e}) - falling back to per-process LLM budget")
+    if workers > 1:
+        logger.warning(
+            f"⚠️ LLM budget is per process with {workers} workers - up to {workers}x llm_tokens_per_minute "
+            f"can reach the provider; set LLM_SCHEDULER_BACKEND=redis with a reachable Redis"
+        )
+    return InMemoryBudgetBackend()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler configured from LLM_* settings"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            try:
+                from config import settings
+                backend_name = settings.llm_scheduler_backend
+                tokens_per_minute = settings.llm_tokens_per_minute
+                max_concurrency = settings.llm_max_concurrency
+                max_wait = settings.llm_max_queue_wait_seconds
+                workers = settings.web_concurrency
+            except Exception:
+                backend_name, tokens_per_minute, max_concurrency, max_wait, workers = "memory", 400_000, 8, 600.0, 1
+            _scheduler = LLMScheduler(
+                _create_backend(backend_name, workers),
+                tokens_per_minute=tokens_per_minute,
+                max_concurrency=max_concurrency,
+                max_wait_seconds=max_wait,
+            )
+            logger.info(
+                f"🚦 LLM scheduler ready: backend={backend_name}, {tokens_per_minute} tokens/min, "
+                f"concurrency={max_concurrency}"
+            )
+        return _scheduler
+
+
+__all__ = [
+    "LLMScheduler", "Reservation", "InMemoryBudgetBackend", "RedisBudgetBackend",
+    "get_llm_scheduler", "llm_identity", "current_identity", "usage_total_tokens", "is_rate_limit_error", "retry_after_seconds",
+]
@@ -6,8 +6,7 @@ Minimal entry point that registers all routers
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 import uvicorn
 import logging
@@ -16,10 +15,12 @@ from pathlib import Path
 # Import config first
 try:  # Support running as package (`backend.main`) and as script (`python main.py`)
     from config import settings, get_upload_dir, get_results_dir, get_exports_dir
+    from rate_limiting import limiter
     from routers import auth, admin, health, documents, batches, exports, reconciliation_ppn
     from database import Base, engine
 except ModuleNotFoundError:  # pragma: no cover - fallback for package context
     from .config import settings, get_upload_dir, get_results_dir, get_exports_dir
+    from .rate_limiting import limiter
     from .routers import auth, admin, health, documents, batches, exports, reconciliation_ppn
     from .database import Base, engine
 
@@ -38,8 +39,7 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="AI Document Scanner API", version="2.0.0")
 
-# Rate Limiting Setup
-limiter = Limiter(key_func=get_remote_address)
+# Rate Limiting Setup (shared limiter, keyed per user / IP)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -177,6 +177,7 @@ async def root():
 app.include_router(auth.router)
 app.include_router(admin.router)
 app.include_router(health.router)
+app.include_router(health.metrics_router)
 app.include_router(documents.router)
 app.include_router(batches.router)
 app.include_router(exports.router)
@@ -0,0 +1,44 @@
+-- Migration: Create faktur_canonical_fields table
+-- Purpose: Persist Faktur Pajak fields normalized once at ingest so exports never re-parse OCR text
+-- Date: 2026-10-18
+
+CREATE TABLE IF NOT EXISTS faktur_canonical_fields (
+    scan_result_id VARCHAR(36) PRIMARY KEY,
+    batch_id VARCHAR(36),
+    canonical_version INTEGER NOT NULL DEFAULT 1,
+    source VARCHAR(20),  -- smart_mapper | parser
+
+    -- Parties
+    nama_seller VARCHAR(255),
+    alamat_seller TEXT,
+    npwp_seller VARCHAR(20),  -- formatted 00.000.000.0-000.000
+    nama_buyer VARCHAR(255),
+    alamat_buyer TEXT,
+    npwp_buyer VARCHAR(20),
+    email_buyer VARCHAR(255),
+
+    -- Invoice
+    nomor_faktur VARCHAR(100),
+    tanggal DATE,
+    invoice VARCHAR(255),
+
+    -- Amount fields (whole Rupiah)
+    harga_jual BIGINT,
+    uang_muka BIGINT,
+    dpp BIGINT,
+    ppn BIGINT,
+    total BIGINT,
+
+    -- Display values and line items as rendered by exporters
+    fields JSONB,
+    items JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_faktur_canonical_batch_id ON faktur_canonical_fields(batch_id);
+CREATE INDEX IF NOT EXISTS idx_faktur_canonical_npwp_seller ON faktur_canonical_fields(npwp_seller);
+CREATE INDEX IF NOT EXISTS idx_faktur_canonical_npwp_buyer ON faktur_canonical_fields(npwp_buyer);
+CREATE INDEX IF NOT EXISTS idx_faktur_canonical_nomor_faktur ON faktur_canonical_fields(nomor_faktur);
+CREATE INDEX IF NOT EXISTS idx_faktur_canonical_tanggal ON faktur_canonical_fields(tanggal);
+
+COMMENT ON TABLE faktur_canonical_fields IS 'Faktur Pajak fields canonicalized at ingest (integer Rupiah, ISO dates, formatted NPWP)';
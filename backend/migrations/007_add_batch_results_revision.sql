@@ -0,0 +1,5 @@
+-- Migration: Add batches.results_revision
+-- Purpose: Change marker for in-place result edits, part of the batch export artifact version
+-- Date: 2026-10-18
+
+ALTER TABLE batches ADD COLUMN IF NOT EXISTS results_revision INTEGER NOT NULL DEFAULT 0;
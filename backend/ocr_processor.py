@@ -1,15 +1,20 @@
 """
 OCR Processor Module - Hybrid Version
+Fast path: PDF text layer (PyMuPDF, digitally generated PDFs - no OCR at all)
 Primary: Surya OCR (free, local)
 Fallback: Google Document AI (paid, cloud)
 Smart Mapper GPT handles field extraction from raw OCR text
 """
 
 import os
+import asyncio
+import tempfile
 from pathlib import Path
 from typing import Dict, Any, Optional
 import logging
 
+from pdf_probe import probe_text_layer
+
 logger = logging.getLogger(__name__)
 
 # OCR Engine configuration
@@ -29,6 +34,20 @@ except Exception:
 if not HAS_SURYA:
     logger.warning("Surya OCR not available (pip install surya-ocr)")
 
+# PDF text layer fast path (PyMuPDF) - only pages without a usable text layer go to OCR
+PDF_TEXT_LAYER_ENABLED = os.environ.get('PDF_TEXT_LAYER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+try:
+    from pdf_text_layer import (
+        HAS_FITZ as HAS_TEXT_LAYER,
+        PDFTextLayerExtractor,
+        extract_pages_to_pdf,
+        splice_ocr_pages,
+    )
+except ImportError:
+    HAS_TEXT_LAYER = False
+if PDF_TEXT_LAYER_ENABLED and not HAS_TEXT_LAYER:
+    logger.warning("PDF text layer fast path not available (pip install pymupdf)")
+
 # Try to import Google Document AI (paid, cloud)
 try:
     from cloud_ai_processor import CloudAIProcessor
@@ -54,6 +73,7 @@ class RealOCRProcessor:
         self._last_ocr_result = None
         self.surya_processor = None
         self.cloud_processor = None
+        self.text_layer = PDFTextLayerExtractor() if PDF_TEXT_LAYER_ENABLED and HAS_TEXT_LAYER else None
 
         self._surya_needed = OCR_ENGINE_MODE in ('surya_primary', 'surya_only', 'google_primary') and HAS_SURYA
 
@@ -73,7 +93,8 @@ class RealOCRProcessor:
 
         self.initialized = (
             self._surya_needed or
-            self.cloud_processor is not None
+            self.cloud_processor is not None or
+            self.text_layer is not None
         )
 
         if not self.initialized:
@@ -93,7 +114,7 @@ class RealOCRProcessor:
         return self.surya_processor
 
     async def extract_text(self, file_path: str) -> str:
-        """Extract text with hybrid engine (try primary, fallback to secondary)"""
+        """Extract text: PDF text layer first, then hybrid OCR engines (primary, fallback)"""
         if not self.initialized:
             logger.error("No OCR engine initialized")
             return ""
@@ -104,33 +125,151 @@ class RealOCRProcessor:
 
         file_ext = Path(file_path).suffix.lower()
 
-        # Determine engine order based on mode (Surya loaded lazily on first use)
+        if file_ext == '.pdf' and self.text_layer is not None and self._may_have_text_layer(file_path):
+            try:
+                result = await self._extract_with_text_layer(file_path)
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed, using OCR: {e}", exc_info=True)
+                result = None
+            if result is not None:
+                self._remember_result(result)
+                return result.raw_text
+
+        result = await self._run_ocr_engines(file_path)
+        if result is not None:
+            self._remember_result(result)
+            return result.raw_text
+
+        logger.error("All OCR engines failed - no text extracted")
+        return ""
+
+    async def extract_page_range(self, page_range) -> str:
+        """
+        Extract text from a pdf_chunker.PDFPageRange without writing chunk files
+
+        Text layer and Surya read the range from the shared opened document;
+        Google DocAI receives an in-memory PDF of the range.
+        """
+        if not self.initialized:
+            logger.error("No OCR engine initialized")
+            return ""
+
+        if page_range.source is None:
+            # File-backed range (PyMuPDF unavailable) - regular file path processing
+            return await self.extract_text(page_range.path)
+
+        if self.text_layer is not None:
+            try:
+                result = await self._extract_with_text_layer(page_range=page_range)
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed, using OCR: {e}", exc_info=True)
+                result = None
+            if result is not None:
+                self._remember_result(result)
+                return result.raw_text
+
+        result = await self._run_ocr_engines(page_range=page_range)
+        if result is not None:
+            self._remember_result(result)
+            return result.raw_text
+
+        logger.error(f"All OCR engines failed for {page_range.label} - no text extracted")
+        return ""
+
+    @staticmethod
+    def _may_have_text_layer(file_path: str) -> bool:
+        """Skip the text-layer pass for scans whose first pages carry no text layer"""
+        has_text = probe_text_layer(file_path)
+        return True if has_text is None else has_text  # Unknown - let the extractor decide
+
+    async def _extract_with_text_layer(self, file_path: Optional[str] = None, page_range=None):
+        """
+        Text-layer extraction; only pages without a usable text layer are OCR'd and spliced in
+
+        Returns None (caller runs full-document OCR) when there is no text layer or the
+        OCR of the remaining pages fails - never a result with pages missing.
+        """
+        if page_range is not None:
+            def extract_range():
+                with page_range.source.lock:
+                    return self.text_layer.extract_document(page_range.source.document, page_range.page_indices)
+            result = await asyncio.to_thread(extract_range)
+        else:
+            result = await asyncio.to_thread(self.text_layer.extract, file_path)
+        if result is None:
+            return None
+        if result.complete:
+            return result
+
+        ocr_pages = result.ocr_page_indices
+        logger.info(
+            f"Text layer covers {len(result.page_profiles) - len(ocr_pages)}/{len(result.page_profiles)} pages - "
+            f"OCR for pages {[i + 1 for i in ocr_pages]}"
+        )
+
+        if page_range is not None:
+            ocr_result = await self._run_ocr_engines(page_range=page_range.subset(ocr_pages))
+        else:
+            with tempfile.TemporaryDirectory(prefix="ocr_pages_") as tmp_dir:
+                subset_path = os.path.join(tmp_dir, "ocr_pages.pdf")
+                await asyncio.to_thread(extract_pages_to_pdf, file_path, ocr_pages, subset_path)
+                ocr_result = await self._run_ocr_engines(subset_path)
+
+        if ocr_result is None or not isinstance(ocr_result.raw_response, dict) or not ocr_result.raw_response.get('pages'):
+            # A text-layer-only result would miss these pages yet look complete downstream
+            logger.warning(
+                f"OCR of pages {[i + 1 for i in ocr_pages]} failed - falling back to full-document OCR"
+            )
+            return None
+
+        merged = splice_ocr_pages(result.raw_response, ocr_result.raw_response, ocr_pages)
+        text_pages = len(result.page_profiles) - len(ocr_pages)
+        result.raw_response = merged
+        result.raw_text = merged['text']
+        result.service_used = f"pdf_text_layer+{ocr_result.service_used}"
+        result.confidence = (
+            result.confidence * text_pages + ocr_result.confidence * len(ocr_pages)
+        ) / len(result.page_profiles)
+        result.processing_time += ocr_result.processing_time
+        return result
+
+    def _engine_order(self):
+        """Engine order based on mode (Surya loaded lazily on first use)"""
         if OCR_ENGINE_MODE == 'surya_primary':
-            engines = [
+            return [
                 ('surya', self._get_surya),
                 ('google', lambda: self.cloud_processor),
             ]
-        elif OCR_ENGINE_MODE == 'google_primary':
-            engines = [
+        if OCR_ENGINE_MODE == 'google_primary':
+            return [
                 ('google', lambda: self.cloud_processor),
                 ('surya', self._get_surya),
             ]
-        elif OCR_ENGINE_MODE == 'surya_only':
-            engines = [('surya', self._get_surya)]
-        else:  # google_only
-            engines = [('google', lambda: self.cloud_processor)]
+        if OCR_ENGINE_MODE == 'surya_only':
+            return [('surya', self._get_surya)]
+        return [('google', lambda: self.cloud_processor)]  # google_only
 
-        # Try engines in order
-        for engine_name, engine_getter in engines:
+    async def _run_ocr_engines(self, file_path: Optional[str] = None, page_range=None):
+        """Try OCR engines in order on a file or an in-memory page range, return the first result with text"""
+        file_ext = Path(file_path).suffix.lower() if file_path else '.pdf'
+        label = file_path or page_range.label
+
+        for engine_name, engine_getter in self._engine_order():
             engine = engine_getter()
             if engine is None:
                 continue
 
             try:
-                logger.info(f"Processing {file_ext} file with {engine_name}: {file_path}")
+                logger.info(f"Processing {file_ext} file with {engine_name}: {label}")
 
                 if engine_name == 'surya':
-                    result = await engine.process_document(file_path)
+                    if page_range is not None:
+                        result = await engine.process_page_range(page_range)
+                    else:
+                        result = await engine.process_document(file_path)
+                elif page_range is not None:
+                    content = await asyncio.to_thread(page_range.to_pdf_bytes)
+                    result = await engine.process_with_google(f"{page_range.label}.pdf", content=content)
                 else:
                     result = await engine.process_with_google(file_path)
 
@@ -140,17 +279,7 @@ class RealOCRProcessor:
                         f"{len(result.raw_text)} chars, "
                         f"{result.confidence:.1f}% confidence"
                     )
-
-                    self._last_ocr_result = {
-                        'text': result.raw_text,
-                        'extracted_fields': result.extracted_fields,
-                        'confidence': result.confidence,
-                        'engine_used': result.service_used,
-                        'quality_score': result.confidence,
-                        'processing_time': result.processing_time,
-                        'raw_response': result.raw_response,
-                    }
-                    return result.raw_text
+                    return result
                 else:
                     logger.warning(f"{engine_name} returned no text, trying next engine...")
 
@@ -158,8 +287,18 @@ class RealOCRProcessor:
                 logger.error(f"{engine_name} OCR failed: {e}", exc_info=True)
                 continue
 
-        logger.error("All OCR engines failed - no text extracted")
-        return ""
+        return None
+
+    def _remember_result(self, result) -> None:
+        self._last_ocr_result = {
+            'text': result.raw_text,
+            'extracted_fields': result.extracted_fields,
+            'confidence': result.confidence,
+            'engine_used': result.service_used,
+            'quality_score': result.confidence,
+            'processing_time': result.processing_time,
+            'raw_response': result.raw_response,
+        }
 
     def get_last_ocr_metadata(self) -> Optional[Dict[str, Any]]:
         """Get metadata from the last OCR operation"""
@@ -171,6 +310,7 @@ class RealOCRProcessor:
             'engine_mode': OCR_ENGINE_MODE,
             'surya_available': self._surya_needed or self.surya_processor is not None,
             'google_available': self.cloud_processor is not None,
+            'text_layer_available': self.text_layer is not None,
             'initialized': self.initialized,
             'smart_mapper_enabled': True,
         }
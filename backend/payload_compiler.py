@@ -0,0 +1,320 @@
+"""
+Token-Budgeted Payload Compiler for Smart Mapper
+Turns Document AI JSON into the smallest prompt payload that still carries every fact
+
+- Tables come from the one-time DocAIDocumentIndex (no anchor re-traversal)
+- Tables are encoded as TSV strings (one line per row) instead of nested JSON arrays
+- Text already present in table cells is removed from document_preview (deduplication)
+- Payloads are serialized with compact separators (no indent whitespace)
+- Token estimation uses tiktoken when installed, otherwise a tokenizer-shaped heuristic
+- Oversized payloads are split by table rows so every request fits the token budget
+"""
+
+import json
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+from docai_index import DocAIDocumentIndex, Span, subtract_spans
+
+logger = logging.getLogger(__name__)
+
+# tiktoken is optional - gives exact counts for OpenAI models, close enough for Claude
+HAS_TIKTOKEN = False
+try:
+    import tiktoken  # type: ignore
+    HAS_TIKTOKEN = True
+except ImportError:
+    tiktoken = None  # type: ignore
+
+# Word-ish runs, digit runs and single punctuation marks - mirrors how BPE tokenizers split text
+_TOKEN_PIECE_RE = re.compile(r"\d+|[^\W\d_]+|\s+|[^\w\s]", re.UNICODE)
+_BLANK_LINES_RE = re.compile(r"\n[ \t]*(?:\n[ \t]*)+")
+_CELL_WS_RE = re.compile(r"[\t\r\n]+")
+
+
+# ----------------------------------------------------------------------
+# Token estimation
+# ----------------------------------------------------------------------
+_encoding_cache: Dict[str, Any] = {}
+
+
+def _get_encoding(model: str):
+    if not HAS_TIKTOKEN:
+        return None
+    if model not in _encoding_cache:
+        try:
+            _encoding_cache[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            _encoding_cache[model] = tiktoken.get_encoding("o200k_base")
+    return _encoding_cache[model]
+
+
+def estimate_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Estimate prompt tokens for text
+
+    Uses tiktoken when available. The fallback counts BPE-like pieces:
+    letters ~4 chars/token, digits ~3 chars/token, each punctuation mark 1 token,
+    whitespace folded into the following piece.
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    tokens = 0
+    for match in _TOKEN_PIECE_RE.finditer(text):
+        piece = match.group()
+        first = piece[0]
+        if first.isspace():
+            # Single spaces merge into the next word; runs of newlines/indent cost extra
+            tokens += max(0, len(piece) - 1) // 4
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def text_from_spans(full_text: str, spans: List[Span]) -> str:
+    """Join span texts, collapsing the blank lines left behind by removed regions"""
+    text_len = len(full_text)
+    pieces = [full_text[s:min(e, text_len)].strip() for s, e in spans if s < text_len]
+    joined = "\n".join(p for p in pieces if p)
+    return _BLANK_LINES_RE.sub("\n", joined).strip()
+
+
+# ----------------------------------------------------------------------
+# Payload compiler
+# ----------------------------------------------------------------------
+class PayloadCompiler:
+    """Build compact, deduplicated, token-budgeted Smart Mapper payloads"""
+
+    def __init__(
+        self,
+        table_encoding: str = "tsv",
+        dedupe_table_text: bool = True,
+        token_budget: int = 60000,
+        model: str = "gpt-4o",
+    ):
+        self.table_encoding = table_encoding if table_encoding in {"tsv", "json"} else "tsv"
+        self.dedupe_table_text = dedupe_table_text
+        self.token_budget = token_budget
+        self.model = model
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def build(
+        self,
+        document_json: Dict[str, Any],
+        *,
+        index: Optional[DocAIDocumentIndex] = None,
+        page_indices: Optional[List[int]] = None,
+        extracted_fields: Optional[Dict[str, Any]] = None,
+        fallback_fields: Optional[Dict[str, Any]] = None,
+        entity_limit: int = 1000,
+    ) -> Dict[str, Any]:
+        """
+        Compile Document AI JSON into a prompt payload
+
+        Args:
+            document_json: Dict providing document_preview text and entities
+            index: Pre-built index of the full document (defaults to indexing document_json)
+            page_indices: Pages whose tables are included (default: all indexed pages)
+            extracted_fields / fallback_fields: Extra field hints
+            entity_limit: Max entities forwarded
+        """
+        if index is None:
+            index = DocAIDocumentIndex(document_json)
+
+        payload: Dict[str, Any] = {}
+        indexed_tables = index.tables(page_indices)
+        tables = [
+            self.encode_table(t.page_number, t.table_index, t.header_rows, t.body_rows)
+            for t in indexed_tables
+        ]
+
+        preview = document_json.get("text", "") or ""
+        if self.dedupe_table_text and tables:
+            if preview is index.text or preview == index.text:
+                # Preview and anchors share one string - drop regions already sent as table rows
+                covered = index.table_cell_spans(page_indices)
+                preview = text_from_spans(preview, subtract_spans([(0, len(preview))], covered))
+            else:
+                preview = self._dedupe_lines(preview, tables)
+
+        payload["document_preview"] = preview
+
+        entities = document_json.get("entities")
+        if isinstance(entities, list) and entities:
+            payload["entities"] = [
+                {
+                    "type": entity.get("type_", entity.get("type")),
+                    "mention": entity.get("mention_text", entity.get("mentionText")),
+                    "normalized": (entity.get("normalized_value") or {}).get("text"),
+                    "confidence": entity.get("confidence"),
+                }
+                for entity in entities[:entity_limit]
+                if isinstance(entity, dict)
+            ]
+
+        if tables:
+            payload["tables"] = tables
+            total_rows = sum(t["row_count"] for t in tables)
+            logger.info(f"✅ Extracted {len(tables)} tables with {total_rows} total rows from Document AI ({self.table_encoding})")
+
+        if extracted_fields:
+            payload["document_ai_fields"] = extracted_fields
+        if fallback_fields:
+            payload["parser_fields"] = fallback_fields
+
+        return payload
+
+    def encode_table(
+        self,
+        page_number: int,
+        table_index: int,
+        header_rows: List[List[str]],
+        body_rows: List[List[str]],
+    ) -> Dict[str, Any]:
+        """Encode one table as TSV (default) or nested JSON arrays"""
+        table: Dict[str, Any] = {"page": page_number, "table_index": table_index, "row_count": len(body_rows)}
+        if self.table_encoding == "tsv":
+            table["headers"] = "\n".join(self._tsv_line(r) for r in header_rows)
+            table["rows"] = "\n".join(self._tsv_line(r) for r in body_rows)
+        else:
+            table["headers"] = header_rows
+            table["rows"] = body_rows
+        return table
+
+    @staticmethod
+    def _tsv_line(cells: List[str]) -> str:
+        return "\t".join(_CELL_WS_RE.sub(" ", c) for c in cells)
+
+    @staticmethod
+    def _dedupe_lines(preview: str, tables: List[Dict[str, Any]]) -> str:
+        """Line-level dedupe when preview text is not the anchor text (per-page context)"""
+        cell_values = set()
+        for table in tables:
+            for section in ("headers", "rows"):
+                value = table.get(section)
+                rows = value.split("\n") if isinstance(value, str) else [("\t".join(r)) for r in value or []]
+                for row in rows:
+                    cell_values.update(c.strip() for c in row.split("\t") if c.strip())
+                    cell_values.add(row.replace("\t", " | ").strip())
+        kept = [line for line in preview.split("\n") if line.strip() not in cell_values]
+        return _BLANK_LINES_RE.sub("\n", "\n".join(kept)).strip()
+
+    # ------------------------------------------------------------------
+    # Serialization & budgeting
+    # ------------------------------------------------------------------
+    @staticmethod
+    def serialize(payload: Any) -> str:
+        """Compact JSON - no indentation whitespace"""
+        if isinstance(payload, str):
+            return payload
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def count_tokens(self, payload: Any, instructions: str = "") -> int:
+        return estimate_tokens(self.serialize(payload), self.model) + estimate_tokens(instructions, self.model)
+
+    def fits_budget(self, payload: Any, instructions: str = "") -> bool:
+        return self.count_tokens(payload, instructions) <= self.token_budget
+
+    def split_by_budget(self, payload: Dict[str, Any], instructions: str = "") -> List[Dict[str, Any]]:
+        """
+        Split a payload into row-chunked payloads that each fit the token budget
+
+        Only table rows are split (headers repeat in every part); document_preview and
+        entities stay with the first part so page-level context is sent once.
+        """
+        if self.fits_budget(payload, instructions) or not payload.get("tables"):
+            return [payload]
+
+        base = {k: v for k, v in payload.items() if k not in ("tables", "document_preview", "entities")}
+        overhead = self.count_tokens(base, instructions)
+        row_budget = max(self.token_budget - overhead, 1)
+
+        parts: List[Dict[str, Any]] = []
+        current_tables: List[Dict[str, Any]] = []
+        current_tokens = self.count_tokens(
+            {k: payload[k] for k in ("document_preview", "entities") if k in payload}
+        )
+
+        def flush():
+            nonlocal current_tables, current_tokens
+            if current_tables:
+                part = dict(base)
+                if not parts:
+                    for key in ("document_preview", "entities"):
+                        if key in payload:
+                            part[key] = payload[key]
+                part["tables"] = current_tables
+                parts.append(part)
+            current_tables = []
+            current_tokens = 0
+
+        for table in payload["tables"]:
+            rows = self._table_rows(table)
+            chunk: List[Any] = []
+            for row in rows:
+                row_tokens = estimate_tokens(self.serialize(row), self.model) + 1
+                if chunk and current_tokens + row_tokens > row_budget:
+                    current_tables.append(self._with_rows(table, chunk))
+                    flush()
+                    chunk = []
+                chunk.append(row)
+                current_tokens += row_tokens
+            if chunk or not rows:
+                current_tables.append(self._with_rows(table, chunk))
+        flush()
+
+        logger.info(f"✂️ Payload over token budget ({self.token_budget}) - split into {len(parts)} requests")
+        return parts or [payload]
+
+    @staticmethod
+    def _table_rows(table: Dict[str, Any]) -> List[Any]:
+        rows = table.get("rows", [])
+        if isinstance(rows, str):
+            return rows.split("\n") if rows else []
+        return list(rows)
+
+    def _with_rows(self, table: Dict[str, Any], rows: List[Any]) -> Dict[str, Any]:
+        part = dict(table)
+        part["rows"] = "\n".join(rows) if isinstance(table.get("rows"), str) else rows
+        part["row_count"] = len(rows)
+        return part
+
+
+def create_payload_compiler(model: str = "gpt-4o") -> PayloadCompiler:
+    """Build compiler from SMART_MAPPER_* settings"""
+    import os
+    try:
+        from config import settings
+        budget = settings.smart_mapper_token_budget
+        encoding = settings.smart_mapper_table_encoding
+    except Exception:
+        budget, encoding = 60000, "tsv"
+
+    return PayloadCompiler(
+        table_encoding=os.getenv("SMART_MAPPER_TABLE_ENCODING", encoding).lower(),
+        dedupe_table_text=os.getenv("SMART_MAPPER_DEDUPE_TABLE_TEXT", "true").lower() in {"1", "true", "yes"},
+        token_budget=int(os.getenv("SMART_MAPPER_TOKEN_BUDGET", str(budget))),
+        model=model,
+    )
+
+
+__all__ = [
+    "PayloadCompiler",
+    "create_payload_compiler",
+    "estimate_tokens",
+    "text_from_spans",
+    "HAS_TIKTOKEN",
+]
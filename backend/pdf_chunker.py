@@ -7,17 +7,160 @@ Optimized for rekening koran / bank statements with 150+ transactions per page
 - Default chunk size: 8 pages (~1200 transactions)
 - Prevents OOM KILL for large files (50+ pages)
 - Processes chunks sequentially to manage memory
+
+✅ PAGE RANGES (no chunk files):
+- One PyMuPDF document is opened per job (PDFSource); chunks are PDFPageRange views
+- OCR engines rasterize a range or build an in-memory PDF (insert_pdf) for DocAI
+- Without PyMuPDF, chunk files are written to a per-job scratch directory
+  (never a shared chunks/ folder) and removed when the job closes
 """
 
 import os
+import shutil
+import tempfile
+import threading
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 import PyPDF2
 import gc  # ✅ NEW: Garbage collection for memory management
+from pdf_probe import get_pdf_page_count
 
 logger = logging.getLogger(__name__)
 
+HAS_FITZ = False
+try:
+    import fitz  # PyMuPDF
+    HAS_FITZ = True
+except ImportError:
+    fitz = None  # type: ignore
+
+
+class PDFSource:
+    """One opened PyMuPDF document shared by all page ranges of a job"""
+
+    def __init__(self, pdf_path: str):
+        self.path = pdf_path
+        self.document = fitz.open(pdf_path)
+        # PyMuPDF documents are not thread-safe - engines run in worker threads
+        self.lock = threading.RLock()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.document)
+
+    def close(self):
+        with self.lock:
+            if not self.document.is_closed:
+                self.document.close()
+
+
+@dataclass
+class PDFPageRange:
+    """
+    View over pages of a source PDF
+
+    Either backed by an opened PDFSource (page_indices are 0-based source pages)
+    or by a chunk file on disk (path) when PyMuPDF is unavailable.
+    """
+    source: Optional[PDFSource]
+    page_indices: List[int]
+    path: Optional[str] = None
+
+    @property
+    def start_page(self) -> int:
+        return self.page_indices[0] + 1 if self.page_indices else 0
+
+    @property
+    def end_page(self) -> int:
+        return self.page_indices[-1] + 1 if self.page_indices else 0
+
+    @property
+    def total_pages(self) -> int:
+        return len(self.page_indices)
+
+    @property
+    def label(self) -> str:
+        name = Path(self.path or (self.source.path if self.source else "")).name
+        return f"{name} pages {self.start_page}-{self.end_page}"
+
+    def to_chunk_info(self) -> Dict[str, Any]:
+        """Legacy chunk dict (path is None for in-memory ranges)"""
+        return {
+            'path': self.path,
+            'start_page': self.start_page,
+            'end_page': self.end_page,
+            'total_pages': self.total_pages,
+            'label': self.label,
+        }
+
+    def subset(self, relative_indices: Sequence[int]) -> "PDFPageRange":
+        """Range over some pages of this range (indices relative to this range)"""
+        if self.source is None:
+            raise ValueError("File-backed page ranges cannot be subset")
+        return PDFPageRange(self.source, [self.page_indices[i] for i in relative_indices])
+
+    def to_pdf_bytes(self) -> bytes:
+        """In-memory PDF of this range (for engines that need a document, e.g. DocAI)"""
+        if self.source is None:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        with self.source.lock, fitz.open() as out:
+            for page_index in self.page_indices:
+                out.insert_pdf(self.source.document, from_page=page_index, to_page=page_index)
+            return out.tobytes(garbage=3, deflate=True)
+
+    def render(self, dpi: int = 300) -> list:
+        """Rasterize the range to PIL images"""
+        from PIL import Image
+
+        if self.source is None:
+            with fitz.open(self.path) as doc:
+                return [_pixmap_to_image(doc[i], dpi, Image) for i in range(len(doc))]
+        with self.source.lock:
+            return [_pixmap_to_image(self.source.document[i], dpi, Image) for i in self.page_indices]
+
+
+def _pixmap_to_image(page, dpi: int, Image):
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    pix = page.get_pixmap(matrix=matrix, alpha=False)  # RGB samples, no PNG round-trip
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    del pix
+    return image
+
+
+@dataclass
+class PageRangeSet:
+    """Page ranges of one job plus the resources to release when it is done"""
+    ranges: List[PDFPageRange]
+    source: Optional[PDFSource] = None
+    scratch_dir: Optional[str] = None
+    closed: bool = field(default=False, repr=False)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.source is not None:
+            self.source.close()
+        if self.scratch_dir:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        gc.collect()
+
+    def __enter__(self) -> "PageRangeSet":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def job_scratch_dir(pdf_path: str, prefix: str = "chunks") -> str:
+    """Collision-free scratch directory for one job, next to the upload"""
+    parent = Path(pdf_path).parent
+    return tempfile.mkdtemp(prefix=f".{prefix}_{Path(pdf_path).stem}_", dir=str(parent))
+
+
 class PDFChunker:
     """Split large PDF files into chunks for processing"""
 
@@ -35,14 +178,11 @@ class PDFChunker:
         logger.info(f"   Estimated ~{max_pages_per_chunk * 150} transactions per chunk")
 
     def get_page_count(self, pdf_path: str) -> int:
-        """Get total page count of PDF"""
-        try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                return len(pdf_reader.pages)
-        except Exception as e:
-            logger.error(f"❌ Failed to get page count from {pdf_path}: {e}")
-            return 0
+        """Get total page count of PDF (from the cached ingest probe)"""
+        page_count = get_pdf_page_count(pdf_path)
+        if page_count == 0:
+            logger.error(f"❌ Failed to get page count from {pdf_path}")
+        return page_count
 
     def needs_chunking(self, pdf_path: str, threshold: int = 8) -> bool:  # ✅ REDUCED from 10 to 8
         """
@@ -72,7 +212,7 @@ class PDFChunker:
 
         Args:
             pdf_path: Path to source PDF
-            output_dir: Directory for chunk files (default: same as source)
+            output_dir: Directory for chunk files (default: per-job scratch dir next to source)
 
         Returns:
             List of dicts with chunk info: {
@@ -90,7 +230,7 @@ class PDFChunker:
 
             # Prepare output directory
             if output_dir is None:
-                output_dir = str(Path(pdf_path).parent / "chunks")
+                output_dir = job_scratch_dir(pdf_path)
 
             os.makedirs(output_dir, exist_ok=True)
 
@@ -142,6 +282,32 @@ class PDFChunker:
             logger.error(traceback.format_exc())
             return []
 
+    def open_page_ranges(self, pdf_path: str) -> PageRangeSet:
+        """
+        Page ranges of max_pages_per_chunk pages over one opened document
+
+        Use as a context manager (or call close()) to release the document and any
+        scratch files. Falls back to PyPDF2 chunk files in a per-job scratch dir
+        when PyMuPDF is not installed.
+        """
+        if HAS_FITZ:
+            source = PDFSource(pdf_path)
+            total_pages = source.page_count
+            ranges = [
+                PDFPageRange(source, list(range(start, min(start + self.max_pages_per_chunk, total_pages))))
+                for start in range(0, total_pages, self.max_pages_per_chunk)
+            ]
+            logger.info(f"📄 {total_pages} pages → {len(ranges)} page ranges of {self.max_pages_per_chunk} (in memory)")
+            return PageRangeSet(ranges=ranges, source=source)
+
+        scratch_dir = job_scratch_dir(pdf_path)
+        chunks = self.split_pdf_to_chunks(pdf_path, output_dir=scratch_dir)
+        ranges = [
+            PDFPageRange(None, list(range(c['start_page'] - 1, c['end_page'])), path=c['path'])
+            for c in chunks
+        ]
+        return PageRangeSet(ranges=ranges, scratch_dir=scratch_dir)
+
     def cleanup_chunks(self, chunk_paths: List[str]):
         """
         ✅ ENHANCED: Clean up temporary chunk files with memory cleanup
@@ -157,6 +323,13 @@ class PDFChunker:
             except Exception as e:
                 logger.warning(f"⚠️ Failed to remove chunk {chunk_path}: {e}")
 
+        # Remove now-empty per-job scratch directories
+        for chunk_dir in {os.path.dirname(p) for p in chunk_paths}:
+            try:
+                os.rmdir(chunk_dir)
+            except OSError:
+                pass
+
         # ✅ NEW: Force garbage collection after cleanup
         gc.collect()
         logger.info(f"🗑️ Cleaned up {len(chunk_paths)} chunk files + freed memory")
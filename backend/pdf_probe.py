@@ -0,0 +1,307 @@
+"""
+Single-Pass PDF Probe
+Open each uploaded PDF once and keep its structural metadata for every later stage
+
+Security validation, batch creation, chunking decisions, the page analyzer and
+the OCR text-layer fast path all used to open the same (up to 50 MB) PDF again
+just to count pages. The probe hashes the file in blocks (or takes the hash the
+upload computed while saving), opens the document once from its path and records:
+- page count and per-page size
+- encryption flag, producer / creator
+
+Text-layer presence needs a text pass, so it is not part of the probe: the OCR
+router asks for it (probe_text_layer) and only the first TEXT_SAMPLE_PAGES pages
+are checked.
+
+Records are keyed by SHA-256 of the content (identical uploads share one record);
+a path index keyed by (path, size, mtime) skips re-hashing unchanged files.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+HAS_FITZ = False
+try:
+    import fitz  # PyMuPDF
+    HAS_FITZ = True
+except ImportError:
+    fitz = None  # type: ignore
+
+READ_BLOCK = 1024 * 1024
+# Leading pages checked for a text layer (scans have none on page 1 either)
+TEXT_SAMPLE_PAGES = 3
+
+
+@dataclass
+class PDFPageInfo:
+    """Per-page facts gathered during the probe"""
+    width: float
+    height: float
+    has_text_layer: Optional[bool] = None  # None until probe_text_layer() sampled the page
+
+
+@dataclass
+class PDFProbe:
+    """Metadata record for one PDF (by content hash)"""
+    file_hash: str
+    size_bytes: int
+    page_count: int
+    encrypted: bool = False
+    producer: str = ""
+    creator: str = ""
+    title: str = ""
+    author: str = ""
+    pages: List[PDFPageInfo] = field(default_factory=list)
+    engine: str = ""  # pymupdf / pypdf2
+    error: Optional[str] = None
+
+    @property
+    def text_layer_sampled(self) -> bool:
+        return any(p.has_text_layer is not None for p in self.pages)
+
+    @property
+    def text_layer_pages(self) -> int:
+        """Sampled pages with a text layer (0 until probe_text_layer() ran)"""
+        return sum(1 for p in self.pages if p.has_text_layer)
+
+    @property
+    def has_text_layer(self) -> bool:
+        """Any sampled page with extractable text (worth trying the text-layer fast path)"""
+        return self.text_layer_pages > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["text_layer_pages"] = self.text_layer_pages
+        return data
+
+
+class _ProbeRegistry:
+    """Thread-safe LRU of probe records plus a (path, size, mtime) → hash index"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, PDFProbe]" = OrderedDict()
+        self._paths: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_hash: str) -> Optional[PDFProbe]:
+        with self._lock:
+            record = self._records.get(file_hash)
+            if record is not None:
+                self._records.move_to_end(file_hash)
+            return record
+
+    def put(self, record: PDFProbe, path_key: Optional[Tuple[str, int, int]] = None) -> None:
+        with self._lock:
+            self._records[record.file_hash] = record
+            self._records.move_to_end(record.file_hash)
+            if path_key is not None:
+                self._paths[path_key] = record.file_hash
+            while len(self._records) > self.max_entries:
+                evicted, _ = self._records.popitem(last=False)
+                self._paths = {k: v for k, v in self._paths.items() if v != evicted}
+
+    def remember_path(self, path_key: Tuple[str, int, int], file_hash: str) -> None:
+        with self._lock:
+            self._paths[path_key] = file_hash
+            # Paths remembered at upload but never probed must not pile up
+            while len(self._paths) > self.max_entries * 4:
+                del self._paths[next(iter(self._paths))]
+
+    def hash_for_path(self, path_key: Tuple[str, int, int]) -> Optional[str]:
+        with self._lock:
+            return self._paths.get(path_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._paths.clear()
+
+
+_registry = _ProbeRegistry()
+
+
+def _path_key(path: str) -> Optional[Tuple[str, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _parse(source: Union[str, bytes], file_hash: str, size_bytes: int) -> PDFProbe:
+    """Parse the document structure once (PyMuPDF, else PyPDF2) - no text extraction"""
+    if HAS_FITZ:
+        try:
+            opened = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+            with opened as doc:
+                metadata = doc.metadata or {}
+                encrypted = bool(doc.needs_pass)
+                pages = [] if encrypted else [PDFPageInfo(page.rect.width, page.rect.height) for page in doc]
+                return PDFProbe(
+                    file_hash=file_hash,
+                    size_bytes=size_bytes,
+                    page_count=len(doc),
+                    encrypted=encrypted,
+                    producer=metadata.get("producer", "") or "",
+                    creator=metadata.get("creator", "") or "",
+                    title=metadata.get("title", "") or "",
+                    author=metadata.get("author", "") or "",
+                    pages=pages,
+                    engine="pymupdf",
+                )
+        except Exception as e:
+            return PDFProbe(file_hash=file_hash, size_bytes=size_bytes, page_count=0, engine="pymupdf", error=str(e))
+
+    try:
+        import PyPDF2
+
+        reader = PyPDF2.PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+        encrypted = bool(reader.is_encrypted)
+        metadata = {}
+        pages = []
+        if not encrypted:
+            info = reader.metadata or {}
+            metadata = {k.lstrip("/").lower(): str(v) for k, v in info.items()}
+            for page in reader.pages:
+                box = page.mediabox
+                pages.append(PDFPageInfo(float(box.width), float(box.height)))
+        return PDFProbe(
+            file_hash=file_hash,
+            size_bytes=size_bytes,
+            page_count=len(reader.pages),
+            encrypted=encrypted,
+            producer=metadata.get("producer", ""),
+            creator=metadata.get("creator", ""),
+            title=metadata.get("title", ""),
+            author=metadata.get("author", ""),
+            pages=pages,
+            engine="pypdf2",
+        )
+    except Exception as e:
+        return PDFProbe(file_hash=file_hash, size_bytes=size_bytes, page_count=0, engine="pypdf2", error=str(e))
+
+
+def probe_pdf_bytes(content: bytes) -> PDFProbe:
+    """Probe in-memory PDF content (e.g. an upload being validated)"""
+    file_hash = hashlib.sha256(content).hexdigest()
+    record = _registry.get(file_hash)
+    if record is None:
+        record = _parse(content, file_hash, len(content))
+        _registry.put(record)
+        if record.error:
+            logger.warning(f"⚠️ PDF probe failed ({record.engine}): {record.error}")
+        else:
+            logger.info(
+                f"🔎 PDF probe: {record.page_count} pages, encrypted={record.encrypted}, producer='{record.producer}'"
+            )
+    return record
+
+
+def remember_file_hash(path: str, file_hash: str) -> None:
+    """Record the SHA-256 computed while saving path, so probing it never re-reads the file to hash"""
+    path_key = _path_key(path)
+    if path_key is not None:
+        _registry.remember_path(path_key, file_hash)
+
+
+def get_pdf_probe(path: str) -> Optional[PDFProbe]:
+    """
+    Probe record for a PDF on disk
+
+    Unchanged paths hit the (path, size, mtime) index without reading the file;
+    new paths are hashed block by block (nothing is kept in memory) and parsed
+    from the path, so a file already probed from its upload bytes is not parsed
+    again. Returns None if the file can't be read.
+    """
+    path_key = _path_key(path)
+    if path_key is None:
+        return None
+
+    file_hash = _registry.hash_for_path(path_key)
+    if file_hash is not None:
+        record = _registry.get(file_hash)
+        if record is not None:
+            return record
+    else:
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(READ_BLOCK), b""):
+                    digest.update(block)
+        except OSError as e:
+            logger.error(f"❌ Cannot read {path} for probing: {e}")
+            return None
+        file_hash = digest.hexdigest()
+
+    record = _registry.get(file_hash)
+    if record is None:
+        record = _parse(path, file_hash, path_key[1])
+        if record.error:
+            logger.warning(f"⚠️ PDF probe failed for {os.path.basename(path)} ({record.engine}): {record.error}")
+    _registry.put(record, path_key)
+    return record
+
+
+def probe_text_layer(path: str, sample_pages: int = TEXT_SAMPLE_PAGES) -> Optional[bool]:
+    """
+    Whether any of the first sample_pages pages has a text layer (None if unknown)
+
+    Runs only when the OCR router asks; the answer is stored on the probe record.
+    """
+    record = get_pdf_probe(path)
+    if record is None or record.error or record.encrypted or not record.pages:
+        return None
+    if record.text_layer_sampled:
+        return record.has_text_layer
+
+    sample = record.pages[:sample_pages]
+    try:
+        if HAS_FITZ:
+            with fitz.open(path) as doc:
+                for page_idx, info in enumerate(sample):
+                    # Cheapest text probe: any word box at all
+                    info.has_text_layer = bool(doc[page_idx].get_text("words"))
+        else:
+            import PyPDF2
+
+            reader = PyPDF2.PdfReader(path)
+            for page_idx, info in enumerate(sample):
+                # No text extraction here - a font resource is a good-enough text-layer signal
+                resources = reader.pages[page_idx].get("/Resources") or {}
+                info.has_text_layer = "/Font" in resources
+    except Exception as e:
+        logger.warning(f"⚠️ Text-layer probe failed for {os.path.basename(path)}: {e}")
+        return None
+    return record.has_text_layer
+
+
+def get_pdf_page_count(path: str) -> int:
+    """Page count from the probe record (0 when unreadable)"""
+    record = get_pdf_probe(path)
+    return record.page_count if record else 0
+
+
+def clear_probe_cache() -> None:
+    _registry.clear()
+
+
+__all__ = [
+    "PDFProbe",
+    "PDFPageInfo",
+    "probe_pdf_bytes",
+    "get_pdf_probe",
+    "remember_file_hash",
+    "probe_text_layer",
+    "get_pdf_page_count",
+    "clear_probe_cache",
+    "HAS_FITZ",
+]
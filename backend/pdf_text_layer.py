@@ -0,0 +1,422 @@
+"""
+PDF Text Layer Extractor
+Sub-second extraction for digitally generated PDFs (internet banking e-statements)
+
+Most BCA/Mandiri/BNI e-statements carry a real text layer, so rasterizing them at
+300 DPI for Surya or uploading them to Document AI is wasted work. This module:
+- classifies every page (glyph count, text-layer coverage, image coverage, broken glyphs)
+- extracts lines, blocks and tables from usable pages with PyMuPDF
+- emits the same Google Document AI compatible raw_response as
+  SuryaProcessor._build_google_compatible_response (text + text_anchor offsets)
+- reports which pages still need OCR; splice_ocr_pages() merges their OCR output back
+
+Output format: Google Document AI compatible (for Smart Mapper, DocAIDocumentIndex, adapters)
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+HAS_FITZ = False
+try:
+    import fitz  # PyMuPDF
+    HAS_FITZ = True
+except ImportError:
+    fitz = None  # type: ignore
+
+
+@dataclass
+class PageTextProfile:
+    """Text-layer classification of one PDF page"""
+    page_index: int
+    glyph_count: int
+    word_count: int
+    text_coverage: float  # Word bbox area / page area
+    image_coverage: float  # Image bbox area / page area (clipped to 1.0)
+    broken_glyph_ratio: float  # U+FFFD / private-use glyphs (fonts without ToUnicode)
+    usable: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "page": self.page_index + 1,
+            "glyphs": self.glyph_count,
+            "words": self.word_count,
+            "text_coverage": round(self.text_coverage, 4),
+            "image_coverage": round(self.image_coverage, 4),
+            "broken_glyph_ratio": round(self.broken_glyph_ratio, 4),
+            "usable": self.usable,
+        }
+
+
+@dataclass
+class TextLayerResult:
+    """Text-layer extraction result matching the SuryaOCRResult / CloudOCRResult interface"""
+    raw_text: str
+    confidence: float
+    service_used: str
+    processing_time: float
+    extracted_fields: Dict[str, Any]
+    raw_response: Dict[str, Any]
+    document_type: str
+    language_detected: str
+    page_profiles: List[PageTextProfile] = field(default_factory=list)
+
+    @property
+    def ocr_page_indices(self) -> List[int]:
+        """Pages without a usable text layer (still need OCR)"""
+        return [p.page_index for p in self.page_profiles if not p.usable]
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.page_profiles) and not self.ocr_page_indices
+
+
+def _is_broken_glyph(ch: str) -> bool:
+    return ch == "\ufffd" or "\ue000" <= ch <= "\uf8ff"
+
+
+class PDFTextLayerExtractor:
+    """Classify PDF pages and extract Google-compatible output from their text layer"""
+
+    def __init__(
+        self,
+        min_glyphs: int = 50,
+        min_text_coverage: float = 0.01,
+        max_broken_glyph_ratio: float = 0.05,
+        scanned_image_coverage: float = 0.85,
+        extract_tables: bool = True,
+    ):
+        """
+        Args:
+            min_glyphs: Minimum extractable characters for a page to count as digital
+            min_text_coverage: Minimum share of the page area covered by word boxes
+            max_broken_glyph_ratio: Max share of unmappable glyphs (garbage text layers)
+            scanned_image_coverage: Image coverage above which a page is treated as a scan
+                unless its text layer is dense (OCR'd scans carry an invisible text layer)
+            extract_tables: Use PyMuPDF table detection (find_tables) when available
+        """
+        self.min_glyphs = min_glyphs
+        self.min_text_coverage = min_text_coverage
+        self.max_broken_glyph_ratio = max_broken_glyph_ratio
+        self.scanned_image_coverage = scanned_image_coverage
+        self.extract_tables = extract_tables
+
+    # ------------------------------------------------------------------
+    # Classification
+    # ------------------------------------------------------------------
+    def classify_page(self, page, page_index: int) -> PageTextProfile:
+        page_area = max(abs(page.rect), 1.0)
+
+        words = page.get_text("words")
+        glyph_count = 0
+        broken = 0
+        text_area = 0.0
+        for x0, y0, x1, y1, word, *_ in words:
+            glyph_count += len(word)
+            broken += sum(1 for ch in word if _is_broken_glyph(ch))
+            text_area += max(x1 - x0, 0) * max(y1 - y0, 0)
+
+        image_area = 0.0
+        try:
+            for info in page.get_image_info():
+                x0, y0, x1, y1 = info.get("bbox", (0, 0, 0, 0))
+                image_area += max(x1 - x0, 0) * max(y1 - y0, 0)
+        except Exception:
+            pass
+
+        text_coverage = min(text_area / page_area, 1.0)
+        image_coverage = min(image_area / page_area, 1.0)
+        broken_ratio = broken / glyph_count if glyph_count else 0.0
+
+        usable = (
+            glyph_count >= self.min_glyphs
+            and text_coverage >= self.min_text_coverage
+            and broken_ratio <= self.max_broken_glyph_ratio
+        )
+        if usable and image_coverage >= self.scanned_image_coverage and text_coverage < 3 * self.min_text_coverage:
+            # Full-page scan with a sparse (often OCR-generated) text layer - OCR it properly
+            usable = False
+
+        return PageTextProfile(
+            page_index=page_index,
+            glyph_count=glyph_count,
+            word_count=len(words),
+            text_coverage=text_coverage,
+            image_coverage=image_coverage,
+            broken_glyph_ratio=broken_ratio,
+            usable=usable,
+        )
+
+    def classify(self, file_path: str) -> List[PageTextProfile]:
+        """Classify every page without extracting anything else"""
+        if not HAS_FITZ:
+            return []
+        with fitz.open(file_path) as doc:
+            return [self.classify_page(doc[i], i) for i in range(len(doc))]
+
+    # ------------------------------------------------------------------
+    # Extraction
+    # ------------------------------------------------------------------
+    def extract(self, file_path: str) -> Optional[TextLayerResult]:
+        """
+        Extract all pages that have a usable text layer
+
+        Returns None when PyMuPDF is missing, the file can't be opened, or no page
+        has a usable text layer. Pages that need OCR are kept as empty placeholders
+        in raw_response so page numbering stays aligned (see splice_ocr_pages).
+        """
+        if not HAS_FITZ:
+            return None
+
+        try:
+            doc = fitz.open(file_path)
+        except Exception as e:
+            logger.warning(f"⚠️ PyMuPDF could not open {file_path}: {e}")
+            return None
+
+        with doc:
+            return self.extract_document(doc)
+
+    def extract_document(self, doc, page_indices: Optional[Sequence[int]] = None) -> Optional[TextLayerResult]:
+        """
+        Extract from an already opened PyMuPDF document
+
+        Args:
+            doc: fitz.Document (caller holds any lock it needs)
+            page_indices: Source pages to extract (default: all); output pages are
+                numbered 1..n in this order, like a chunk file would be
+        """
+        start_time = time.time()
+        if doc.needs_pass:
+            logger.info("🔒 Encrypted PDF - text layer not readable, using OCR")
+            return None
+
+        if page_indices is None:
+            page_indices = range(len(doc))
+
+        builder = _ResponseBuilder()
+        profiles: List[PageTextProfile] = []
+        for position, source_index in enumerate(page_indices):
+            page = doc[source_index]
+            profile = self.classify_page(page, position)
+            profiles.append(profile)
+            if profile.usable:
+                builder.add_page(page, position, self._page_tables(page))
+            else:
+                builder.add_placeholder(position)
+
+        usable_pages = sum(1 for p in profiles if p.usable)
+        if usable_pages == 0:
+            logger.info(f"📄 No usable text layer in {len(profiles)} pages - OCR required")
+            return None
+
+        raw_response = builder.build()
+        raw_response["text_layer_pages"] = [p.to_dict() for p in profiles]
+        processing_time = time.time() - start_time
+        logger.info(
+            f"⚡ Text layer extraction: {usable_pages}/{len(profiles)} pages, "
+            f"{len(raw_response['text'])} chars, {processing_time:.2f}s"
+        )
+
+        return TextLayerResult(
+            raw_text=raw_response["text"],
+            confidence=99.0,
+            service_used="pdf_text_layer",
+            processing_time=processing_time,
+            extracted_fields={},
+            raw_response=raw_response,
+            document_type="",
+            language_detected="id",
+            page_profiles=profiles,
+        )
+
+    def _page_tables(self, page) -> List[Dict[str, List[List[str]]]]:
+        """Tables as {'header': [[...]], 'body': [[...]]} (PyMuPDF >= 1.23 find_tables)"""
+        if not self.extract_tables or not hasattr(page, "find_tables"):
+            return []
+        try:
+            found = page.find_tables()
+        except Exception as e:
+            logger.debug(f"find_tables failed on page {page.number + 1}: {e}")
+            return []
+
+        tables = []
+        for table in getattr(found, "tables", found):
+            rows = [[(cell or "").strip() for cell in row] for row in table.extract()]
+            rows = [row for row in rows if any(row)]
+            if not rows:
+                continue
+            header = getattr(table, "header", None)
+            if header is not None and getattr(header, "external", False):
+                header_rows = [[(name or "").strip() for name in header.names]]
+                body_rows = rows
+            else:
+                header_rows, body_rows = rows[:1], rows[1:]
+            tables.append({"header": header_rows, "body": body_rows})
+        return tables
+
+
+class _ResponseBuilder:
+    """Accumulates page text and text anchors into one Document AI shaped dict"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self.pages: List[Dict[str, Any]] = []
+
+    def _append(self, text: str) -> Dict[str, Any]:
+        """Append text to the shared document text, return its layout dict"""
+        if self._parts:
+            self._parts.append("\n")
+            self._length += 1
+        start = self._length
+        self._parts.append(text)
+        self._length += len(text)
+        return _layout(start, self._length)
+
+    def add_page(self, page, page_index: int, tables: List[Dict[str, List[List[str]]]]) -> None:
+        page_start = self._length + (1 if self._parts else 0)
+        blocks, lines = [], []
+
+        for block in page.get_text("dict", sort=True).get("blocks", []):
+            if block.get("type", 0) != 0:
+                continue
+            block_start = None
+            for line in block.get("lines", []):
+                line_text = "".join(span.get("text", "") for span in line.get("spans", [])).strip()
+                if not line_text:
+                    continue
+                layout = self._append(line_text)
+                lines.append({"layout": layout})
+                if block_start is None:
+                    block_start = _segment(layout)[0]
+            if block_start is not None:
+                blocks.append({"layout": _layout(block_start, self._length)})
+
+        formatted_tables = []
+        for table in tables:
+            formatted_tables.append({
+                "header_rows": [self._row(cells) for cells in table["header"]],
+                "body_rows": [self._row(cells) for cells in table["body"]],
+            })
+
+        width, height = page.rect.width, page.rect.height
+        self.pages.append({
+            "page_number": page_index + 1,
+            "dimension": {"width": width, "height": height, "unit": "points"},
+            "layout": _layout(page_start, self._length),
+            "blocks": blocks,
+            "paragraphs": blocks,
+            "lines": lines,
+            "tables": formatted_tables,
+        })
+
+    def _row(self, cells: Sequence[str]) -> Dict[str, Any]:
+        row_cells = []
+        for cell in cells:
+            layout = self._append(cell) if cell else _layout(0, 0)
+            row_cells.append({"layout": layout})
+        return {"cells": row_cells}
+
+    def add_placeholder(self, page_index: int) -> None:
+        self.pages.append({"page_number": page_index + 1, "tables": [], "needs_ocr": True})
+
+    def build(self) -> Dict[str, Any]:
+        return {
+            "text": "".join(self._parts),
+            "pages": self.pages,
+            "entities": [],
+            "source": "pdf_text_layer",
+        }
+
+
+def _layout(start: int, end: int) -> Dict[str, Any]:
+    return {"text_anchor": {"text_segments": [{"start_index": start, "end_index": end}]}}
+
+
+def _segment(layout: Dict[str, Any]):
+    segment = layout["text_anchor"]["text_segments"][0]
+    return segment["start_index"], segment["end_index"]
+
+
+# ----------------------------------------------------------------------
+# Mixed documents: merge OCR output for the pages without a text layer
+# ----------------------------------------------------------------------
+def _shift_anchors(node: Any, offset: int) -> None:
+    """Shift every text segment offset in a Document AI dict (snake or camel case)"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("text_segments", "textSegments") and isinstance(value, list):
+                for segment in value:
+                    if not isinstance(segment, dict):
+                        continue
+                    for index_key in ("start_index", "startIndex", "end_index", "endIndex"):
+                        if index_key in segment:
+                            segment[index_key] = int(segment[index_key] or 0) + offset
+                    if "start_index" not in segment and "startIndex" not in segment:
+                        # Proto → dict drops zero start offsets
+                        segment["start_index"] = offset
+            else:
+                _shift_anchors(value, offset)
+    elif isinstance(node, list):
+        for item in node:
+            _shift_anchors(item, offset)
+
+
+def splice_ocr_pages(
+    text_layer_response: Dict[str, Any],
+    ocr_response: Dict[str, Any],
+    page_indices: Sequence[int],
+) -> Dict[str, Any]:
+    """
+    Replace placeholder pages with OCR output
+
+    Args:
+        text_layer_response: raw_response from PDFTextLayerExtractor.extract
+        ocr_response: Google-compatible raw_response of a PDF containing only the OCR pages
+        page_indices: Original page index of each OCR response page, in order
+
+    OCR text is appended to the shared text and its anchors shifted accordingly,
+    so offsets of text-layer pages stay valid.
+    """
+    base_text = text_layer_response.get("text", "")
+    ocr_text = ocr_response.get("text", "") or ""
+    offset = len(base_text) + 1 if base_text else 0
+    ocr_pages = ocr_response.get("pages", []) or []
+
+    merged_pages = list(text_layer_response.get("pages", []))
+    for ocr_page, page_index in zip(ocr_pages, page_indices):
+        _shift_anchors(ocr_page, offset)
+        ocr_page["page_number"] = page_index + 1
+        if 0 <= page_index < len(merged_pages):
+            merged_pages[page_index] = ocr_page
+        else:
+            merged_pages.append(ocr_page)
+
+    merged = dict(text_layer_response)
+    merged["text"] = f"{base_text}\n{ocr_text}" if base_text else ocr_text
+    merged["pages"] = merged_pages
+    merged["source"] = f"pdf_text_layer+{ocr_response.get('source', 'ocr')}"
+    return merged
+
+
+def extract_pages_to_pdf(file_path: str, page_indices: Sequence[int], output_path: str) -> str:
+    """Write the given pages of a PDF into a new file (for OCR of the remaining pages)"""
+    with fitz.open(file_path) as src, fitz.open() as out:
+        for page_index in page_indices:
+            out.insert_pdf(src, from_page=page_index, to_page=page_index)
+        out.save(output_path)
+    return output_path
+
+
+__all__ = [
+    "PDFTextLayerExtractor",
+    "PageTextProfile",
+    "TextLayerResult",
+    "splice_ocr_pages",
+    "extract_pages_to_pdf",
+    "HAS_FITZ",
+]
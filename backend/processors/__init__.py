@@ -6,6 +6,8 @@ Components:
 - RuleBasedTransactionParser: Parse 90% without GPT (token savings!)
 - ProgressiveValidator: Validate and determine GPT need
 - HybridBankProcessor: Orchestrate hybrid pipeline
+- SaldoChainValidator: Integer-cents saldo chain check with break localization
+- TieredRekeningKoranExtractor: Adapter/rule fast path, LLM only for broken saldo chains
 
 Strategy: Structured First + Progressive Validation
 Expected Savings: 90-96% token reduction
@@ -17,7 +19,9 @@ from .progressive_validator import (
     ValidationResult,
     ChunkValidation
 )
+from .saldo_chain import SaldoChainValidator, ChainReport, SaldoBreak
 from .hybrid_bank_processor import HybridBankProcessor
+from .tiered_extractor import TieredRekeningKoranExtractor
 
 __all__ = [
     'RuleBasedTransactionParser',
@@ -25,5 +29,9 @@ __all__ = [
     'ProgressiveValidator',
     'ValidationResult',
     'ChunkValidation',
+    'SaldoChainValidator',
+    'ChainReport',
+    'SaldoBreak',
     'HybridBankProcessor',
+    'TieredRekeningKoranExtractor',
 ]
@@ -11,7 +11,9 @@ Strategy:
 
 import logging
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from .saldo_chain import ChainReport, SaldoChainValidator
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,7 @@ class ValidationResult:
     actual_saldo: Optional[float]
     error_message: Optional[str]
     needs_gpt: bool
+    breaks: List[Dict] = field(default_factory=list)  # SaldoBreak.to_dict() per broken row
 
 
 @dataclass
@@ -54,6 +57,7 @@ class ProgressiveValidator:
             tolerance: Tolerance for saldo comparison (default 1 cent)
         """
         self.tolerance = tolerance
+        self.chain_validator = SaldoChainValidator(tolerance_cents=int(round(tolerance * 100)))
         logger.info(f"🔍 ProgressiveValidator initialized (tolerance={tolerance})")
 
     def validate_transaction_saldo(
@@ -109,38 +113,48 @@ class ProgressiveValidator:
                 needs_gpt=True
             )
 
-        current_saldo = saldo_start
-        all_valid = True
-        error_messages = []
-
-        for i, txn in enumerate(transactions):
-            is_valid, calculated_saldo = self.validate_transaction_saldo(txn, current_saldo)
-
-            if not is_valid:
-                all_valid = False
-                reported = txn.get('saldo', 0)
-                error_messages.append(
-                    f"Txn {i}: Expected saldo {calculated_saldo:.2f}, got {reported:.2f}"
-                )
-
-            current_saldo = calculated_saldo
-
-        # Final saldo
-        final_transaction = transactions[-1]
-        final_saldo_reported = float(final_transaction.get('saldo', 0))
-        final_saldo_calculated = current_saldo
+        report = self.locate_saldo_breaks(transactions, saldo_start)
+        expected = report.expected_closing_cents
+        final_saldo_reported = report.closing_cents / 100 if report.closing_cents is not None else None
+        final_saldo_calculated = expected / 100 if expected is not None else None
+        saldo_match = (
+            expected is not None and report.closing_cents is not None
+            and abs(report.closing_cents - expected) <= self.chain_validator.tolerance_cents
+        )
 
-        saldo_match = abs(final_saldo_reported - final_saldo_calculated) <= self.tolerance
+        error_messages = [
+            f"Txn {b.index}: Expected saldo {b.expected:.2f}, got {b.actual:.2f} ({b.kind})"
+            for b in report.breaks
+        ]
+        error_messages.extend(f"Txn {i}: Unreadable saldo" for i in report.unparsed_rows)
 
         return ValidationResult(
-            is_valid=all_valid and saldo_match,
+            is_valid=report.is_valid,
             saldo_match=saldo_match,
             expected_saldo=final_saldo_calculated,
             actual_saldo=final_saldo_reported,
             error_message='; '.join(error_messages) if error_messages else None,
-            needs_gpt=not (all_valid and saldo_match)
+            needs_gpt=not report.is_valid,
+            breaks=[b.to_dict() for b in report.breaks]
         )
 
+    def locate_saldo_breaks(
+        self,
+        transactions: List[Dict],
+        saldo_start: Optional[float] = None
+    ) -> ChainReport:
+        """
+        Locate and classify every row where the saldo chain breaks
+
+        Args:
+            transactions: List of transaction dicts (debet, kredit, saldo)
+            saldo_start: Balance before the first row (derived from row 0 when None)
+
+        Returns:
+            ChainReport with break indices, kinds and rows to re-extract
+        """
+        return self.chain_validator.validate(transactions, saldo_start)
+
     def validate_data_completeness(self, transactions: List[Dict]) -> Tuple[bool, List[str]]:
         """
         Check if all transactions have required fields
@@ -13,6 +13,8 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+from format_inference import AmountFormatLock, FormatLock
+
 logger = logging.getLogger(__name__)
 
 
@@ -102,6 +104,20 @@ class RuleBasedTransactionParser:
             'format_2': r'(\d{2})/(\d{2})',  # DD/MM
         }
 
+        # Per-statement format inference (reset at the start of parse_transactions)
+        self._compiled_date_patterns = [re.compile(p, re.IGNORECASE) for p in self.date_patterns]
+        self._date_format = FormatLock(
+            [(str(i), self._date_pattern_parser(regex)) for i, regex in enumerate(self._compiled_date_patterns)]
+        )
+        self._amount_format = AmountFormatLock(
+            self._extract_amount_heuristic, convert=float, strip_chars='Rp$€£¥ \t\n\r\x0b\x0c'
+        )
+
+    def reset_format_inference(self):
+        """Forget the locked date/amount formats (call before a new statement)"""
+        self._date_format.reset()
+        self._amount_format.reset()
+
     def detect_cimb_format(self, header_row: List[str]) -> Optional[str]:
         """
         Detect CIMB format type based on header row
@@ -344,18 +360,18 @@ class RuleBasedTransactionParser:
         if not text:
             return None
 
-        text = text.strip()
-
-        # Try each pattern
-        for pattern in self.date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    return self._normalize_date(match.groups())
-                except:
-                    continue
+        return self._date_format.parse(text.strip())
 
-        return None
+    def _date_pattern_parser(self, regex):
+        def parse(text: str) -> Optional[str]:
+            match = regex.search(text)
+            if not match:
+                return None
+            try:
+                return self._normalize_date(match.groups())
+            except Exception:
+                return None
+        return parse
 
     def _normalize_date(self, date_parts: Tuple) -> Optional[str]:
         """
@@ -412,6 +428,14 @@ class RuleBasedTransactionParser:
         if text in ['-', '', 'N/A', 'n/a']:
             return None
 
+        # Locked thousands/decimal convention first, heuristic below on mismatch
+        return self._amount_format.parse(text)
+
+    def _extract_amount_heuristic(self, text: str) -> Optional[float]:
+        """Per-value format detection (fallback of extract_amount)"""
+        if text in ['-', '', 'N/A', 'n/a']:
+            return None
+
         # Remove currency symbols
         text = re.sub(r'[Rp\s$€£¥]', '', text)
 
@@ -542,6 +566,7 @@ class RuleBasedTransactionParser:
             List of ParsedTransaction objects
         """
         all_transactions = []
+        self.reset_format_inference()
 
         for table in tables:
             # Get page number from table if available, otherwise use parameter
@@ -0,0 +1,329 @@
+"""
+Saldo Chain Validator
+Integer-cents running balance check with break localization and classification
+
+For rows i = 0..n-1 with debit d, credit c and reported saldo s:
+    expected_i = opening + cumsum(c - d)_i
+    drift_i    = s_i - expected_i
+A break is any row where drift changes (drift_i != drift_{i-1}); the change is the
+unexplained movement of that row. Everything is integer cents - no float tolerance
+drift on large Rupiah balances.
+
+Break kinds:
+- misread_saldo: saldo glitch on one row, next row cancels it (drift returns)
+- swapped_debit_credit: movement is exactly the negated amount
+- misread_digit: movement and amount differ in a single digit (or adjacent swap)
+- missing_row: persistent drift not explained above (rows absent between i-1 and i)
+
+NumPy is used when installed (cumsum/diff over int64); otherwise a pure-Python
+loop gives identical results.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+HAS_NUMPY = False
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None  # type: ignore
+
+MISSING_ROW = "missing_row"
+SWAPPED_DEBIT_CREDIT = "swapped_debit_credit"
+MISREAD_DIGIT = "misread_digit"
+MISREAD_SALDO = "misread_saldo"
+
+
+def to_cents(value: Any) -> Optional[int]:
+    """
+    Convert an amount to integer cents
+
+    Accepts numbers, Decimal and strings in Indonesian ('1.500.000,00') or
+    US ('1,500,000.00') notation, with optional Rp/IDR and CR/DB markers.
+    Returns None for empty/unparseable values.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, (float, Decimal)):
+        return int((Decimal(str(value)) * 100).quantize(Decimal("1")))
+
+    text = str(value).upper().replace("RP", "").replace("IDR", "").replace(" ", "")
+    negative = text.startswith("-") or text.endswith("DB") or text.endswith("D")
+    text = text.rstrip("CRDB").strip("+-")
+    if not text:
+        return None
+
+    last_dot, last_comma = text.rfind("."), text.rfind(",")
+    if last_dot >= 0 and last_comma >= 0:
+        decimal_sep = "." if last_dot > last_comma else ","
+    elif last_comma >= 0:
+        # '1,500' / '1,500,000' = thousands; '1500,5' / '1500,50' = decimals
+        decimal_sep = "," if len(text) - last_comma - 1 in (1, 2) else None
+    elif last_dot >= 0:
+        decimal_sep = "." if len(text) - last_dot - 1 in (1, 2) else None
+    else:
+        decimal_sep = None
+
+    if decimal_sep:
+        integer_part, _, fraction = text.rpartition(decimal_sep)
+        integer_part = integer_part.replace(".", "").replace(",", "")
+        normalized = f"{integer_part or '0'}.{fraction}"
+    else:
+        normalized = text.replace(".", "").replace(",", "")
+
+    try:
+        cents = int((Decimal(normalized) * 100).quantize(Decimal("1")))
+    except InvalidOperation:
+        return None
+    return -cents if negative else cents
+
+
+def _single_digit_error(a: int, b: int) -> bool:
+    """True if |a| and |b| differ by one digit, or by swapping two adjacent digits"""
+    sa, sb = str(abs(a)), str(abs(b))
+    if len(sa) != len(sb):
+        return False
+    diffs = [i for i, (x, y) in enumerate(zip(sa, sb)) if x != y]
+    if len(diffs) == 1:
+        return True
+    return (
+        len(diffs) == 2
+        and diffs[1] == diffs[0] + 1
+        and sa[diffs[0]] == sb[diffs[1]]
+        and sa[diffs[1]] == sb[diffs[0]]
+    )
+
+
+@dataclass
+class SaldoBreak:
+    """One row where the running balance stops adding up"""
+    index: int
+    kind: str
+    expected_cents: int  # previous saldo + credit - debit
+    actual_cents: int  # reported saldo
+    delta_cents: int  # actual - expected
+
+    @property
+    def expected(self) -> float:
+        return self.expected_cents / 100
+
+    @property
+    def actual(self) -> float:
+        return self.actual_cents / 100
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "kind": self.kind,
+            "expected": self.expected,
+            "actual": self.actual,
+            "delta": self.delta_cents / 100,
+        }
+
+
+@dataclass
+class ChainReport:
+    """Result of validating one sequence of transactions"""
+    row_count: int
+    opening_cents: Optional[int]
+    closing_cents: Optional[int]
+    expected_closing_cents: Optional[int] = None  # opening + sum(credit - debit)
+    breaks: List[SaldoBreak] = field(default_factory=list)
+    unparsed_rows: List[int] = field(default_factory=list)  # Rows without a readable saldo
+
+    @property
+    def is_valid(self) -> bool:
+        return self.row_count > 0 and not self.breaks and not self.unparsed_rows
+
+    @property
+    def break_indices(self) -> List[int]:
+        return [b.index for b in self.breaks]
+
+    @property
+    def rows_to_reextract(self) -> List[int]:
+        """Row indices whose values should be re-read (missing rows sit just before the index)"""
+        return sorted(set(self.break_indices) | set(self.unparsed_rows))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "is_valid": self.is_valid,
+            "row_count": self.row_count,
+            "opening": self.opening_cents / 100 if self.opening_cents is not None else None,
+            "closing": self.closing_cents / 100 if self.closing_cents is not None else None,
+            "expected_closing": (
+                self.expected_closing_cents / 100 if self.expected_closing_cents is not None else None
+            ),
+            "breaks": [b.to_dict() for b in self.breaks],
+            "unparsed_rows": list(self.unparsed_rows),
+        }
+
+
+class SaldoChainValidator:
+    """Vectorized saldo chain validation over integer cents"""
+
+    def __init__(self, tolerance_cents: int = 0):
+        """
+        Args:
+            tolerance_cents: Allowed absolute difference per row (0 = exact)
+        """
+        self.tolerance_cents = tolerance_cents
+
+    def validate(
+        self,
+        transactions: Sequence[Dict[str, Any]],
+        opening_saldo: Any = None,
+        *,
+        debit_key: str = "debet",
+        credit_key: str = "kredit",
+        saldo_key: str = "saldo",
+    ) -> ChainReport:
+        """
+        Validate a transaction list
+
+        Args:
+            transactions: Dicts with debit/credit/saldo values (numbers or strings)
+            opening_saldo: Balance before the first row; derived from row 0 when None
+        """
+        if not transactions:
+            return ChainReport(row_count=0, opening_cents=to_cents(opening_saldo), closing_cents=None)
+
+        saldos = [to_cents(t.get(saldo_key)) for t in transactions]
+        unparsed = [i for i, s in enumerate(saldos) if s is None]
+        if unparsed:
+            # Carry the previous saldo forward so one unreadable cell doesn't cascade
+            last = None
+            for i, s in enumerate(saldos):
+                if s is None:
+                    saldos[i] = last if last is not None else 0
+                last = saldos[i]
+
+        report = self.validate_cents(
+            [to_cents(t.get(debit_key)) or 0 for t in transactions],
+            [to_cents(t.get(credit_key)) or 0 for t in transactions],
+            saldos,
+            to_cents(opening_saldo),
+        )
+        if unparsed:
+            # Carried-forward rows show up as saldo glitches - report them only as unparsed
+            skip = set(unparsed)
+            report.breaks = [b for b in report.breaks if b.index not in skip]
+            report.unparsed_rows = unparsed
+        return report
+
+    def validate_cents(
+        self,
+        debits: Sequence[int],
+        credits: Sequence[int],
+        saldos: Sequence[int],
+        opening_cents: Optional[int] = None,
+    ) -> ChainReport:
+        """Validate pre-converted integer-cent columns (the hot path for large statements)"""
+        if not saldos:
+            return ChainReport(row_count=0, opening_cents=opening_cents, closing_cents=None)
+
+        # Debit columns are sometimes signed ('-50.000') - magnitude is what matters
+        debits = [abs(d) for d in debits]
+        credits = [abs(c) for c in credits]
+        saldos = list(saldos)
+
+        opening = opening_cents
+        if opening is None:
+            opening = saldos[0] - credits[0] + debits[0]
+
+        steps = self._unexplained_steps(debits, credits, saldos, opening)
+        breaks = self._classify(steps, debits, credits, saldos, opening)
+        return ChainReport(
+            row_count=len(saldos),
+            opening_cents=opening,
+            closing_cents=saldos[-1],
+            expected_closing_cents=opening + sum(credits) - sum(debits),
+            breaks=breaks,
+        )
+
+    # ------------------------------------------------------------------
+    # Core computation
+    # ------------------------------------------------------------------
+    def _unexplained_steps(
+        self, debits: List[int], credits: List[int], saldos: List[int], opening: int
+    ) -> List[int]:
+        """Per-row change in drift: saldo_i - saldo_{i-1} - (credit_i - debit_i)"""
+        tol = self.tolerance_cents
+        if HAS_NUMPY:
+            d = np.asarray(debits, dtype=np.int64)
+            c = np.asarray(credits, dtype=np.int64)
+            s = np.asarray(saldos, dtype=np.int64)
+            drift = s - (opening + np.cumsum(c - d))
+            step = np.diff(drift, prepend=0)
+            step[np.abs(step) <= tol] = 0
+            return step.tolist()
+
+        steps: List[int] = []
+        running = opening
+        previous_drift = 0
+        for d, c, s in zip(debits, credits, saldos):
+            running += c - d
+            drift = s - running
+            step = drift - previous_drift
+            steps.append(step if abs(step) > tol else 0)
+            previous_drift = drift
+        return steps
+
+    def _classify(
+        self,
+        steps: List[int],
+        debits: List[int],
+        credits: List[int],
+        saldos: List[int],
+        opening: int,
+    ) -> List[SaldoBreak]:
+        breaks: List[SaldoBreak] = []
+        n = len(steps)
+        break_rows = [i for i, step in enumerate(steps) if step]
+        consumed = -1
+        for i in break_rows:
+            if i <= consumed:
+                continue
+            step = steps[i]
+
+            previous = saldos[i - 1] if i > 0 else opening
+            net = credits[i] - debits[i]
+            expected = previous + net
+            movement = saldos[i] - previous
+
+            if i + 1 < n and steps[i + 1] == -step:
+                # Glitch on this row's saldo, next row returns to the chain
+                kind = MISREAD_SALDO if not _single_digit_error(saldos[i], expected) else MISREAD_DIGIT
+                breaks.append(SaldoBreak(i, kind, expected, saldos[i], step))
+                consumed = i + 1
+                continue
+
+            if net != 0 and movement == -net:
+                kind = SWAPPED_DEBIT_CREDIT
+            elif net != 0 and movement != 0 and _single_digit_error(movement, net):
+                kind = MISREAD_DIGIT
+            else:
+                kind = MISSING_ROW
+            breaks.append(SaldoBreak(i, kind, expected, saldos[i], step))
+        return breaks
+
+
+__all__ = [
+    "SaldoChainValidator",
+    "ChainReport",
+    "SaldoBreak",
+    "to_cents",
+    "HAS_NUMPY",
+    "MISSING_ROW",
+    "SWAPPED_DEBIT_CREDIT",
+    "MISREAD_DIGIT",
+    "MISREAD_SALDO",
+]
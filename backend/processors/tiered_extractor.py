@@ -0,0 +1,321 @@
+"""
+Tiered Rekening Koran Extractor
+Deterministic extraction first, LLM only where the saldo chain breaks
+
+Tiers per page:
+1. Bank adapter (BankDetector) on the page's Document AI tables/text
+2. RuleBasedTransactionParser when the adapter yields nothing for a page with tables
+3. Saldo chain check (ProgressiveValidator.validate_chunk_saldo_continuity) anchored
+   to an external opening balance: the header saldo awal for page 1, the previous
+   verified page's closing saldo after that. Pages without an anchor stay unverified
+4. Consecutive pages whose chain breaks are sent to Smart Mapper as one segment
+   (map_page_range) and spliced back in page order
+
+Well-formatted statements finish with zero LLM calls. If no page verifies, the
+caller falls back to full Smart Mapper processing.
+"""
+
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from docai_index import DocAIDocumentIndex
+from instrumentation import propagate
+
+from .progressive_validator import ProgressiveValidator
+from .rule_based_parser import RuleBasedTransactionParser
+
+logger = logging.getLogger(__name__)
+
+# "Saldo Awal : 1.234.567,00" / "Opening Balance 1,234,567.00" in the statement header
+_OPENING_BALANCE_RE = re.compile(
+    r"(?:saldo\s+awal|saldo\s+sebelumnya|opening\s+balance|beginning\s+balance)[^\d(\-\n]{0,20}(\(?-?[\d.,]+\)?)",
+    re.IGNORECASE,
+)
+
+
+def _amount_str(value: Any) -> str:
+    """Whole-rupiah string, matching what Smart Mapper emits ('' for zero)"""
+    try:
+        amount = Decimal(str(value or 0))
+    except Exception:
+        return ""
+    return str(int(amount)) if amount else ""
+
+
+class TieredRekeningKoranExtractor:
+    """Adapter/rule fast path with saldo-chain gating before the LLM"""
+
+    def __init__(
+        self,
+        smart_mapper=None,
+        validator: Optional[ProgressiveValidator] = None,
+        rule_parser: Optional[RuleBasedTransactionParser] = None,
+        min_rule_confidence: float = 0.70,
+    ):
+        self.smart_mapper = smart_mapper
+        self.validator = validator or ProgressiveValidator()
+        self.rule_parser = rule_parser or RuleBasedTransactionParser()
+        self.min_rule_confidence = min_rule_confidence
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+    def extract(
+        self,
+        raw_response: Any,
+        *,
+        template: Optional[Dict[str, Any]] = None,
+        doc_type: str = "rekening_koran",
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Extract a rekening koran from a Document AI response
+
+        Returns Smart Mapper shaped output (bank_info, saldo_info, transactions),
+        or None when nothing could be verified deterministically.
+        """
+        start_time = time.time()
+        index = DocAIDocumentIndex(raw_response)
+        if not index.pages:
+            return None
+
+        from bank_adapters import BankDetector
+
+        adapter = BankDetector.detect({"text": index.text}, verbose=False)
+        account_info = adapter.extract_account_info({"text": index.text}) if adapter else {}
+        bank_name = adapter.BANK_NAME if adapter else ""
+        logger.info(f"⚡ Tiered extraction: {len(index.pages)} pages, adapter={bank_name or 'none (rule parser)'}")
+
+        # Tier 1/2: deterministic rows per page
+        page_rows: List[List[Dict[str, Any]]] = [
+            self._parse_page(index, page_idx, adapter) for page_idx in range(len(index.pages))
+        ]
+
+        # Tier 3: saldo chain gating
+        opening_balance = self._header_opening_balance(index)
+        if opening_balance is None:
+            logger.info("   ⚠️ No saldo awal in statement header - page 1 has no anchor")
+        verified = self._verify_pages(page_rows, opening_balance)
+        verified_count = sum(verified)
+        logger.info(f"   🔗 Saldo chain verified on {verified_count}/{len(verified)} pages")
+
+        if verified_count == 0:
+            logger.info("   ↩️ No page verified - deferring to full Smart Mapper processing")
+            return None
+
+        # Tier 4: LLM only for broken segments
+        segments = self._broken_segments(verified)
+        llm_pages = sum(len(seg) for seg in segments)
+        if segments:
+            if self.smart_mapper is None or template is None:
+                logger.warning(f"   ⚠️ {llm_pages} pages failed saldo check and no LLM is available - keeping parsed rows")
+            else:
+                self._remap_segments(
+                    segments, page_rows, raw_response, index, template, doc_type, bank_name or None
+                )
+
+        transactions = [row for rows in page_rows for row in rows]
+        result = self._build_result(transactions, account_info, bank_name, opening_balance)
+        result["processing_metadata"] = {
+            "strategy": "tiered",
+            "pages_total": len(index.pages),
+            "pages_deterministic": len(index.pages) - llm_pages,
+            "pages_llm": llm_pages,
+            "llm_requests": len(segments) if self.smart_mapper is not None and template is not None else 0,
+            "processing_time_seconds": round(time.time() - start_time, 3),
+        }
+        logger.info(
+            f"   ✅ Tiered extraction: {len(transactions)} transactions, "
+            f"{len(index.pages) - llm_pages} pages deterministic, {llm_pages} pages via LLM"
+        )
+        return result
+
+    # ------------------------------------------------------------------
+    # Deterministic parsing
+    # ------------------------------------------------------------------
+    def _parse_page(self, index: DocAIDocumentIndex, page_idx: int, adapter) -> List[Dict[str, Any]]:
+        page_number = page_idx + 1
+        tables = index.adapter_tables([page_idx])
+
+        if adapter is not None:
+            page_ocr: Dict[str, Any] = {"text": index.page_text(page_idx)}
+            if tables:
+                page_ocr["tables"] = tables
+            try:
+                rows = [self._from_adapter(txn, page_number) for txn in adapter.parse(page_ocr)]
+            except Exception as e:
+                logger.warning(f"   ⚠️ {adapter.BANK_NAME} adapter failed on page {page_number}: {e}")
+                rows = []
+            if rows:
+                return rows
+
+        if not tables:
+            return []
+
+        parsed = self.rule_parser.parse_transactions(
+            tables, adapter.BANK_CODE.lower() if adapter else None, page_number=page_number
+        )
+        return [
+            self._from_rule(txn, page_number)
+            for txn in parsed
+            if txn.confidence >= self.min_rule_confidence and txn.saldo is not None
+        ]
+
+    @staticmethod
+    def _from_adapter(txn, page_number: int) -> Dict[str, Any]:
+        return {
+            "tanggal": txn.transaction_date.strftime("%d/%m/%Y") if txn.transaction_date else "",
+            "keterangan": txn.description or "",
+            "debet": _amount_str(txn.debit),
+            "kredit": _amount_str(txn.credit),
+            "saldo": _amount_str(txn.balance) or "0",
+            "referensi": txn.reference_number or "",
+            "cabang": txn.branch_code or "",
+            "page": page_number,
+            "_chain": (float(txn.debit or 0), float(txn.credit or 0), float(txn.balance or 0)),
+        }
+
+    @staticmethod
+    def _from_rule(txn, page_number: int) -> Dict[str, Any]:
+        return {
+            "tanggal": txn.tanggal or "",
+            "keterangan": txn.keterangan or "",
+            "debet": _amount_str(txn.debet),
+            "kredit": _amount_str(txn.kredit),
+            "saldo": _amount_str(txn.saldo) or "0",
+            "referensi": txn.referensi or "",
+            "page": txn.page_number or page_number,
+            "_chain": (float(txn.debet or 0), float(txn.kredit or 0), float(txn.saldo or 0)),
+        }
+
+    # ------------------------------------------------------------------
+    # Saldo chain gating
+    # ------------------------------------------------------------------
+    def _header_opening_balance(self, index: DocAIDocumentIndex) -> Optional[float]:
+        """Saldo awal printed in the statement header (first page), None if absent"""
+        match = _OPENING_BALANCE_RE.search(index.page_text(0))
+        if not match:
+            return None
+        return self.rule_parser.extract_amount(match.group(1))
+
+    def _verify_pages(
+        self,
+        page_rows: List[List[Dict[str, Any]]],
+        opening_balance: Optional[float] = None,
+    ) -> List[bool]:
+        """
+        A page verifies when its running saldo chain holds from an external anchor:
+        the header saldo awal for page 1, the previous page's verified closing saldo
+        for later pages. A page without an anchor (no header saldo, or the previous
+        page did not verify) is never verified from its own rows.
+        """
+        verified: List[bool] = []
+        anchor: Optional[float] = opening_balance
+
+        for rows in page_rows:
+            if not rows or anchor is None:
+                verified.append(False)
+                anchor = None
+                continue
+
+            chain = [{"debet": d, "kredit": k, "saldo": s} for d, k, s in (r["_chain"] for r in rows)]
+            result = self.validator.validate_chunk_saldo_continuity(chain, anchor)
+            verified.append(result.is_valid)
+            anchor = chain[-1]["saldo"] if result.is_valid else None
+
+        return verified
+
+    @staticmethod
+    def _broken_segments(verified: List[bool]) -> List[List[int]]:
+        """Group consecutive unverified page indices"""
+        segments: List[List[int]] = []
+        for page_idx, ok in enumerate(verified):
+            if ok:
+                continue
+            if segments and segments[-1][-1] == page_idx - 1:
+                segments[-1].append(page_idx)
+            else:
+                segments.append([page_idx])
+        return segments
+
+    # ------------------------------------------------------------------
+    # LLM fallback
+    # ------------------------------------------------------------------
+    def _remap_segments(
+        self,
+        segments: List[List[int]],
+        page_rows: List[List[Dict[str, Any]]],
+        raw_response: Any,
+        index: DocAIDocumentIndex,
+        template: Dict[str, Any],
+        doc_type: str,
+        bank_name: Optional[str],
+    ) -> None:
+        """Send broken segments to Smart Mapper concurrently and splice results into page_rows"""
+        document_json = DocAIDocumentIndex.as_dict(raw_response)
+        max_workers = max(1, int(getattr(self.smart_mapper, "max_parallel_pages", 3) or 3))
+
+        def run(segment: List[int]) -> Tuple[List[int], Optional[Dict[str, Any]]]:
+            return segment, self.smart_mapper.map_page_range(
+                doc_type=doc_type,
+                document_json=document_json,
+                template=template,
+                page_indices=segment,
+                bank_context=bank_name,
+                index=index,
+            )
+
+        logger.info(f"   🤖 Sending {len(segments)} broken segments to Smart Mapper: {[s[0] + 1 for s in segments]}")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(segments))) as executor:
+            for segment, mapped in executor.map(propagate(run), segments):
+                llm_rows = (mapped or {}).get("transactions")
+                if not isinstance(llm_rows, list):
+                    logger.warning(f"   ⚠️ LLM returned nothing for pages {segment[0] + 1}-{segment[-1] + 1} - keeping parsed rows")
+                    continue
+                for page_idx in segment:
+                    page_rows[page_idx] = []
+                page_rows[segment[0]] = llm_rows
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _build_result(
+        transactions: List[Dict[str, Any]],
+        account_info: Dict[str, Any],
+        bank_name: str,
+        opening_balance: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        saldo_awal = saldo_akhir = ""
+        if opening_balance is not None:
+            saldo_awal = _amount_str(opening_balance) or "0"
+        elif transactions and "_chain" in transactions[0]:
+            debet, kredit, saldo = transactions[0]["_chain"]
+            saldo_awal = _amount_str(saldo - kredit + debet) or "0"
+        for txn in transactions:
+            txn.pop("_chain", None)
+        if transactions:
+            saldo_akhir = str(transactions[-1].get("saldo") or "")
+
+        period_start = account_info.get("period_start", "")
+        period_end = account_info.get("period_end", "")
+        return {
+            "bank_info": {
+                "nama_bank": bank_name or account_info.get("bank_name", ""),
+                "nomor_rekening": account_info.get("account_number", ""),
+                "nama_pemilik": account_info.get("account_holder", ""),
+                "periode": f"{period_start} - {period_end}" if period_start and period_end else period_start or period_end,
+            },
+            "saldo_info": {
+                "saldo_awal": saldo_awal,
+                "saldo_akhir": saldo_akhir,
+                "mata_uang": account_info.get("currency", "IDR") or "IDR",
+            },
+            "transactions": transactions,
+        }
+
+
+__all__ = ["TieredRekeningKoranExtractor"]
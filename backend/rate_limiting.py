@@ -0,0 +1,58 @@
+"""
+Rate Limiting
+One slowapi Limiter shared by every router
+
+- Keys: authenticated requests are limited per user (JWT subject), anonymous ones per IP
+- Storage: rate_limit_storage_uri - Redis by default, so limits hold across workers and
+  restarts; falls back to "memory://" (per process) when Redis is unreachable at startup
+"""
+
+import logging
+
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def rate_limit_key(request) -> str:
+    """user:<id> for a valid bearer token, else ip:<address>"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            from jose import jwt
+            from auth import ALGORITHM, SECRET_KEY
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except Exception:
+            pass  # Invalid/expired tokens are rejected by the endpoint; limit them per IP
+    return f"ip:{get_remote_address(request)}"
+
+
+def resolve_storage_uri(storage_uri: str, workers: int = 1) -> str:
+    """storage_uri if its Redis answers a ping, else memory:// (logged)"""
+    if storage_uri.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+            redis.Redis.from_url(storage_uri, socket_connect_timeout=1.0, socket_timeout=1.0).ping()
+            return storage_uri
+        except Exception as e:
+            logger.warning(f"⚠️ Rate limit storage unreachable ({e}) - falling back to per-process memory://")
+            storage_uri = "memory://"
+    if storage_uri.startswith("memory://") and workers > 1:
+        logger.warning(
+            f"⚠️ Rate limits are per process with {workers} workers - effective limits are {workers}x the "
+            f"configured ones; set RATE_LIMIT_STORAGE_URI to a reachable Redis"
+        )
+    return storage_uri
+
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=resolve_storage_uri(settings.rate_limit_storage_uri, settings.web_concurrency),
+    # Fall back to per-process counters while the shared storage is unreachable
+    in_memory_fallback_enabled=True,
+)
@@ -1,353 +1,484 @@
 """
 Redis Cache Manager for Document Processing Results
 Provides caching for OCR results, processed data, and frequently accessed data
+
+- One pooled client; health is tracked by a circuit breaker fed by real
+  operations instead of a PING before every call
+- get_many/set_many and the multi-document helpers run in one MGET or pipeline
+  (a user's list version plus the cached page, a batch's processed results)
+- Values are JSON (orjson when installed), zstd-compressed above 1 KB when
+  zstandard is installed; each payload carries a one-byte format marker
+- Stats come from INFO/DBSIZE and in-process counters; per-prefix key counts
+  use an incremental, capped SCAN and only on request
 """
 
 import redis
 import json
 import hashlib
 import logging
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
-import pickle
+import threading
+import time
+from typing import Dict, Any, Optional, List, Iterable, Tuple, Union
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+HAS_ORJSON = False
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None  # type: ignore
+
+HAS_ZSTD = False
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None  # type: ignore
+
+# Payload format markers (first byte of every serialized value)
+_FORMAT_JSON = b"j"
+_FORMAT_ZSTD = b"z"
+COMPRESS_MIN_BYTES = 1024
+ZSTD_LEVEL = 3
+
+KEY_PREFIXES = ["ocr", "processed", "batch_results", "template", "batch_status"]
+
+
+class CircuitBreaker:
+    """
+    Closed → open after `failure_threshold` consecutive connection errors;
+    after `reset_timeout` seconds the next operation is let through as a probe
+    (half-open) and its outcome closes or re-opens the circuit
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        if self._failures or self._opened_at is not None:
+            with self._lock:
+                if self._opened_at is not None:
+                    logger.info("✅ Redis connection restored")
+                self._failures = 0
+                self._opened_at = None
+
+    def trip(self) -> None:
+        """Open the circuit immediately (e.g. server unreachable at startup)"""
+        with self._lock:
+            self._failures = max(self._failures, self.failure_threshold)
+            self._opened_at = time.monotonic()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"⚠️ Redis circuit opened after {self._failures} failures (retry in {self.reset_timeout:.0f}s)")
+                self._opened_at = time.monotonic()
+
+
 class RedisCache:
     """Redis cache manager for document processing optimization"""
-    
-    def __init__(self, host='localhost', port=6379, db=0, decode_responses=False):
-        """Initialize Redis connection"""
+
+    def __init__(self, host='localhost', port=6379, db=0, decode_responses=False,
+                 max_connections: int = 32, socket_timeout: float = 1.0):
+        """Initialize the pooled Redis client (one probe at startup, none per call)"""
+        self.breaker = CircuitBreaker()
+        self._stats_lock = threading.Lock()
+        self._op_stats = {prefix: {"hits": 0, "misses": 0, "sets": 0} for prefix in KEY_PREFIXES}
+        self._zstd_local = threading.local()
         try:
-            self.redis_client = redis.Redis(
-                host=host, 
-                port=port, 
-                db=db, 
-                decode_responses=decode_responses
+            pool = redis.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                decode_responses=decode_responses,
+                max_connections=max_connections,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_timeout,
+                health_check_interval=30,
             )
-            # Test connection
+            self.redis_client = redis.Redis(connection_pool=pool)
             self.redis_client.ping()
             logger.info("✅ Redis connection established successfully")
-        except Exception as e:
+        except redis.RedisError as e:
+            # Keep the client - the breaker retries the server after reset_timeout
             logger.error(f"❌ Redis connection failed: {e}")
+            self.breaker.trip()
+        except Exception as e:
+            logger.error(f"❌ Redis client setup failed: {e}")
             self.redis_client = None
-    
+
     def is_connected(self) -> bool:
-        """Check if Redis is connected and available"""
-        if not self.redis_client:
-            return False
+        """Whether Redis is usable right now (breaker state, no round trip)"""
+        return self.redis_client is not None and self.breaker.allow()
+
+    def _call(self, operation: str, fn, default=None):
+        """Run one Redis command (or pipeline) through the circuit breaker"""
+        if not self.is_connected():
+            return default
         try:
-            self.redis_client.ping()
-            return True
-        except:
-            return False
-    
+            result = fn()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.breaker.record_failure()
+            logger.error(f"❌ Redis {operation} failed: {e}")
+            return default
+        except redis.RedisError as e:
+            logger.error(f"❌ Redis {operation} error: {e}")
+            return default
+        self.breaker.record_success()
+        return result
+
     def _generate_key(self, prefix: str, *args) -> str:
         """Generate consistent cache key"""
         key_data = ":".join(str(arg) for arg in args)
         key_hash = hashlib.md5(key_data.encode()).hexdigest()[:8]
         return f"{prefix}:{key_hash}:{key_data}"
-    
+
+    def _count(self, prefix: str, event: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._op_stats.setdefault(prefix, {"hits": 0, "misses": 0, "sets": 0})[event] += n
+
+    # ------------------------------------------------------------------
+    # Serialization
+    # ------------------------------------------------------------------
+    def _compressor(self):
+        # zstd (de)compressor objects are not safe for concurrent use - one per thread
+        local = self._zstd_local
+        if not hasattr(local, "compressor"):
+            local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            local.decompressor = zstandard.ZstdDecompressor()
+        return local.compressor, local.decompressor
+
     def _serialize_data(self, data: Any) -> bytes:
         """Serialize data for Redis storage"""
-        return pickle.dumps(data)
-    
+        if HAS_ORJSON:
+            body = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        if HAS_ZSTD and len(body) >= COMPRESS_MIN_BYTES:
+            compressor, _ = self._compressor()
+            return _FORMAT_ZSTD + compressor.compress(body)
+        return _FORMAT_JSON + body
+
     def _deserialize_data(self, data: bytes) -> Any:
-        """Deserialize data from Redis"""
-        return pickle.loads(data)
+        """Deserialize data from Redis (None for unknown/legacy formats)"""
+        marker, body = data[:1], data[1:]
+        if marker == _FORMAT_ZSTD:
+            if not HAS_ZSTD:
+                return None
+            _, decompressor = self._compressor()
+            body = decompressor.decompress(body)
+        elif marker != _FORMAT_JSON:
+            return None  # e.g. pickled entries written by older versions - treated as a miss
+        return orjson.loads(body) if HAS_ORJSON else json.loads(body)
 
-    # Generic get/set methods for simple caching
-    def get(self, key: str) -> Optional[str]:
-        """Get value from cache by key"""
-        if not self.is_connected():
-            return None
+    def _store(self, prefix: str, key: str, payload: Dict[str, Any], ttl: int) -> bool:
+        serialized = self._serialize_data(payload)
+        ok = self._call("set", lambda: self.redis_client.setex(key, ttl, serialized), default=False)
+        if ok:
+            self._count(prefix, "sets")
+        return bool(ok)
 
+    def _load(self, prefix: str, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._call("get", lambda: self.redis_client.get(key))
+        data = self._decode(raw)
+        self._count(prefix, "hits" if data is not None else "misses")
+        return data
+
+    def _decode(self, raw: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        if not raw:
+            return None
         try:
-            value = self.redis_client.get(key)
-            return value.decode('utf-8') if value else None
+            data = self._deserialize_data(raw)
         except Exception as e:
-            logger.error(f"Error getting cache key {key}: {e}")
+            logger.warning(f"⚠️ Dropping undecodable cache entry: {e}")
             return None
+        return data if isinstance(data, dict) else None
+
+    # Generic get/set methods for simple caching
+    def get(self, key: str) -> Optional[str]:
+        """Get value from cache by key"""
+        value = self._call("get", lambda: self.redis_client.get(key))
+        return value.decode('utf-8') if value else None
 
     def set(self, key: str, value: str, ttl: int = 3600) -> bool:
         """Set value in cache with TTL (seconds)"""
-        if not self.is_connected():
-            return False
+        return bool(self._call("set", lambda: self.redis_client.setex(key, ttl, value.encode('utf-8')), default=False))
 
-        try:
-            self.redis_client.setex(key, ttl, value.encode('utf-8'))
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Get several string values in one round trip (MGET)"""
+        if not keys:
+            return []
+        values = self._call("mget", lambda: self.redis_client.mget(keys)) or [None] * len(keys)
+        return [v.decode('utf-8') if v else None for v in values]
+
+    def set_many(self, items: Dict[str, Union[str, bytes]], ttl: int = 3600) -> bool:
+        """Set several values with a TTL in one pipelined round trip (SET ... EX per key)"""
+        if not items:
             return True
-        except Exception as e:
-            logger.error(f"Error setting cache key {key}: {e}")
+
+        def run():
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(key, value.encode('utf-8') if isinstance(value, str) else value, ex=ttl)
+            return pipe.execute()
+
+        return self._call("pipeline set", run) is not None
+
+    # Per-user version counters
+    # List caches store the owner's version next to the cached value; bumping it after a
+    # write turns every cached page into a miss at once (no KEYS scan), so those entries can live long
+    @staticmethod
+    def _user_version_key(scope: str, user_id: Any) -> str:
+        return f"version:{scope}:user:{user_id}"
+
+    def get_with_user_version(self, scope: str, user_id: Any, key: str) -> Tuple[int, Optional[str]]:
+        """User's view version (0 if never bumped) and the value at key, in one MGET round trip"""
+        raw_version, value = self.get_many([self._user_version_key(scope, user_id), key])
+        try:
+            version = int(raw_version) if raw_version else 0
+        except ValueError:
+            version = 0
+        return version, value
+
+    def bump_user_version(self, scope: str, user_id: Any) -> bool:
+        """Invalidate a user's cached view - call after the DB commit"""
+        if user_id is None:
             return False
+        return self._call("incr", lambda: self.redis_client.incr(self._user_version_key(scope, user_id))) is not None
 
     # OCR Results Caching
     def cache_ocr_result(self, file_hash: str, ocr_result: Dict[str, Any], ttl: int = 3600):
         """Cache OCR processing result"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            key = self._generate_key("ocr", file_hash)
-            serialized_data = self._serialize_data({
-                "result": ocr_result,
-                "cached_at": datetime.now(timezone.utc).isoformat(),
-                "file_hash": file_hash
-            })
-            
-            self.redis_client.setex(key, ttl, serialized_data)
+        key = self._generate_key("ocr", file_hash)
+        stored = self._store("ocr", key, {
+            "result": ocr_result,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "file_hash": file_hash
+        }, ttl)
+        if stored:
             logger.info(f"🔄 Cached OCR result for file hash: {file_hash[:8]}...")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error caching OCR result: {e}")
-            return False
-    
+        return stored
+
     def get_ocr_result(self, file_hash: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached OCR result"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            key = self._generate_key("ocr", file_hash)
-            cached_data = self.redis_client.get(key)
-            
-            if cached_data:
-                data = self._deserialize_data(cached_data)
-                logger.info(f"✅ Retrieved cached OCR result for file hash: {file_hash[:8]}...")
-                return data["result"]
-            
+        data = self._load("ocr", self._generate_key("ocr", file_hash))
+        if data is None:
             return None
-        except Exception as e:
-            logger.error(f"❌ Error retrieving OCR result: {e}")
-            return None
-    
+        logger.info(f"✅ Retrieved cached OCR result for file hash: {file_hash[:8]}...")
+        return data.get("result")
+
     # Processed Document Data Caching
     def cache_processed_document(self, batch_id: str, file_id: str, processed_data: Dict[str, Any], ttl: int = 7200):
         """Cache processed document data"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            key = self._generate_key("processed", batch_id, file_id)
-            serialized_data = self._serialize_data({
-                "data": processed_data,
-                "cached_at": datetime.now(timezone.utc).isoformat(),
-                "batch_id": batch_id,
-                "file_id": file_id
-            })
-            
-            self.redis_client.setex(key, ttl, serialized_data)
+        key = self._generate_key("processed", batch_id, file_id)
+        stored = self._store("processed", key, {
+            "data": processed_data,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "batch_id": batch_id,
+            "file_id": file_id
+        }, ttl)
+        if stored:
             logger.info(f"🔄 Cached processed document: {batch_id[:8]}.../{file_id[:8]}...")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error caching processed document: {e}")
-            return False
-    
+        return stored
+
     def get_processed_document(self, batch_id: str, file_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached processed document"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            key = self._generate_key("processed", batch_id, file_id)
-            cached_data = self.redis_client.get(key)
-            
-            if cached_data:
-                data = self._deserialize_data(cached_data)
-                logger.info(f"✅ Retrieved cached processed document: {batch_id[:8]}.../{file_id[:8]}...")
-                return data["data"]
-            
+        data = self._load("processed", self._generate_key("processed", batch_id, file_id))
+        if data is None:
             return None
-        except Exception as e:
-            logger.error(f"❌ Error retrieving processed document: {e}")
-            return None
-    
+        logger.info(f"✅ Retrieved cached processed document: {batch_id[:8]}.../{file_id[:8]}...")
+        return data.get("data")
+
+    def cache_processed_documents(self, batch_id: str, documents: Dict[str, Dict[str, Any]], ttl: int = 7200) -> bool:
+        """Cache several processed documents of one batch in a single pipeline"""
+        if not documents:
+            return True
+        cached_at = datetime.now(timezone.utc).isoformat()
+        entries = {
+            self._generate_key("processed", batch_id, file_id): self._serialize_data({
+                "data": data, "cached_at": cached_at, "batch_id": batch_id, "file_id": file_id
+            })
+            for file_id, data in documents.items()
+        }
+        if not self.set_many(entries, ttl):
+            return False
+        self._count("processed", "sets", len(entries))
+        logger.info(f"🔄 Cached {len(entries)} processed documents for batch {batch_id[:8]}...")
+        return True
+
+    def get_processed_documents(self, batch_id: str, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieve cached processed documents of one batch in one MGET (missing ids omitted)"""
+        if not file_ids:
+            return {}
+        keys = [self._generate_key("processed", batch_id, file_id) for file_id in file_ids]
+        values = self._call("mget", lambda: self.redis_client.mget(keys)) or [None] * len(keys)
+        found = {}
+        for file_id, raw in zip(file_ids, values):
+            data = self._decode(raw)
+            if data is not None:
+                found[file_id] = data.get("data")
+        self._count("processed", "hits", len(found))
+        self._count("processed", "misses", len(file_ids) - len(found))
+        return found
+
     # Batch Results Caching
     def cache_batch_results(self, batch_id: str, results: List[Dict[str, Any]], ttl: int = 3600):
         """Cache complete batch results"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            key = self._generate_key("batch_results", batch_id)
-            serialized_data = self._serialize_data({
-                "results": results,
-                "cached_at": datetime.now(timezone.utc).isoformat(),
-                "batch_id": batch_id,
-                "count": len(results)
-            })
-            
-            self.redis_client.setex(key, ttl, serialized_data)
+        key = self._generate_key("batch_results", batch_id)
+        stored = self._store("batch_results", key, {
+            "results": results,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "batch_id": batch_id,
+            "count": len(results)
+        }, ttl)
+        if stored:
             logger.info(f"🔄 Cached batch results: {batch_id[:8]}... ({len(results)} files)")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error caching batch results: {e}")
-            return False
-    
+        return stored
+
     def get_batch_results(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
         """Retrieve cached batch results"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            key = self._generate_key("batch_results", batch_id)
-            cached_data = self.redis_client.get(key)
-            
-            if cached_data:
-                data = self._deserialize_data(cached_data)
-                logger.info(f"✅ Retrieved cached batch results: {batch_id[:8]}... ({data['count']} files)")
-                return data["results"]
-            
+        data = self._load("batch_results", self._generate_key("batch_results", batch_id))
+        if data is None:
             return None
-        except Exception as e:
-            logger.error(f"❌ Error retrieving batch results: {e}")
-            return None
-    
+        logger.info(f"✅ Retrieved cached batch results: {batch_id[:8]}... ({data.get('count', 0)} files)")
+        return data.get("results")
+
     # Document Type Templates Caching
     def cache_document_template(self, doc_type: str, template_data: Dict[str, Any], ttl: int = 86400):
         """Cache document type processing templates"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            key = self._generate_key("template", doc_type)
-            serialized_data = self._serialize_data({
-                "template": template_data,
-                "cached_at": datetime.now(timezone.utc).isoformat(),
-                "doc_type": doc_type
-            })
-            
-            self.redis_client.setex(key, ttl, serialized_data)
+        key = self._generate_key("template", doc_type)
+        stored = self._store("template", key, {
+            "template": template_data,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "doc_type": doc_type
+        }, ttl)
+        if stored:
             logger.info(f"🔄 Cached document template: {doc_type}")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error caching document template: {e}")
-            return False
-    
+        return stored
+
     def get_document_template(self, doc_type: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached document template"""
-        if not self.is_connected():
+        data = self._load("template", self._generate_key("template", doc_type))
+        if data is None:
             return None
-        
-        try:
-            key = self._generate_key("template", doc_type)
-            cached_data = self.redis_client.get(key)
-            
-            if cached_data:
-                data = self._deserialize_data(cached_data)
-                logger.info(f"✅ Retrieved cached document template: {doc_type}")
-                return data["template"]
-            
-            return None
-        except Exception as e:
-            logger.error(f"❌ Error retrieving document template: {e}")
-            return None
-    
+        logger.info(f"✅ Retrieved cached document template: {doc_type}")
+        return data.get("template")
+
     # Batch Status Caching for Performance
     def cache_batch_status(self, batch_id: str, status_data: Dict[str, Any], ttl: int = 300):
         """Cache batch status for frequent polling"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            key = self._generate_key("batch_status", batch_id)
-            serialized_data = self._serialize_data({
-                "status": status_data,
-                "cached_at": datetime.now(timezone.utc).isoformat(),
-                "batch_id": batch_id
-            })
-            
-            self.redis_client.setex(key, ttl, serialized_data)
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error caching batch status: {e}")
-            return False
-    
+        key = self._generate_key("batch_status", batch_id)
+        return self._store("batch_status", key, {
+            "status": status_data,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "batch_id": batch_id
+        }, ttl)
+
     def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached batch status"""
-        if not self.is_connected():
-            return None
-        
-        try:
-            key = self._generate_key("batch_status", batch_id)
-            cached_data = self.redis_client.get(key)
-            
-            if cached_data:
-                data = self._deserialize_data(cached_data)
-                return data["status"]
-            
-            return None
-        except Exception as e:
-            logger.error(f"❌ Error retrieving batch status: {e}")
-            return None
-    
+        data = self._load("batch_status", self._generate_key("batch_status", batch_id))
+        return data.get("status") if data is not None else None
+
     # Cache Management
+    def _scan(self, pattern: str, limit: Optional[int] = None) -> Iterable[bytes]:
+        """Incremental SCAN (never blocks the server like KEYS), optionally capped"""
+        for i, key in enumerate(self.redis_client.scan_iter(match=pattern, count=1000)):
+            if limit is not None and i >= limit:
+                break
+            yield key
+
     def invalidate_batch_cache(self, batch_id: str):
         """Invalidate all cache entries for a specific batch"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            patterns = [
-                f"*batch_results*{batch_id}*",
-                f"*batch_status*{batch_id}*",
-                f"*processed*{batch_id}*"
+        def run():
+            # Result/status keys are derived directly; per-file entries share a key pattern
+            keys = [
+                self._generate_key("batch_results", batch_id),
+                self._generate_key("batch_status", batch_id),
             ]
-            
-            deleted_count = 0
-            for pattern in patterns:
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    deleted_count += self.redis_client.delete(*keys)
-            
-            logger.info(f"🗑️ Invalidated {deleted_count} cache entries for batch: {batch_id[:8]}...")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error invalidating batch cache: {e}")
+            keys.extend(self._scan(f"processed:*:{batch_id}:*"))
+            return self.redis_client.delete(*keys)
+
+        deleted_count = self._call("invalidate", run)
+        if deleted_count is None:
             return False
-    
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Get Redis cache statistics"""
+        logger.info(f"🗑️ Invalidated {deleted_count} cache entries for batch: {batch_id[:8]}...")
+        return True
+
+    def get_cache_stats(self, count_keys: bool = False, scan_limit: int = 100_000) -> Dict[str, Any]:
+        """
+        Get Redis cache statistics
+
+        Args:
+            count_keys: Also count keys per prefix with a capped SCAN (O(keyspace) - admin views only)
+            scan_limit: Stop counting a prefix after this many keys
+        """
         if not self.is_connected():
-            return {"connected": False}
-        
-        try:
-            info = self.redis_client.info()
-            
-            # Count keys by prefix
-            key_counts = {}
-            prefixes = ["ocr", "processed", "batch_results", "template", "batch_status"]
-            
-            for prefix in prefixes:
-                pattern = f"{prefix}:*"
-                keys = self.redis_client.keys(pattern)
-                key_counts[prefix] = len(keys)
-            
-            return {
-                "connected": True,
-                "redis_version": info.get("redis_version", "unknown"),
-                "used_memory": info.get("used_memory_human", "unknown"),
-                "total_connections": info.get("total_connections_received", 0),
-                "key_counts": key_counts,
-                "total_keys": sum(key_counts.values()),
-                "uptime_seconds": info.get("uptime_in_seconds", 0)
-            }
-        except Exception as e:
-            logger.error(f"❌ Error getting cache stats: {e}")
-            return {"connected": False, "error": str(e)}
-    
+            return {"connected": False, "circuit": self.breaker.state}
+
+        def run():
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.info()
+            pipe.dbsize()
+            return pipe.execute()
+
+        response = self._call("stats", run)
+        if response is None:
+            return {"connected": False, "circuit": self.breaker.state}
+        info, total_keys = response
+
+        with self._stats_lock:
+            operations = {prefix: dict(counts) for prefix, counts in self._op_stats.items()}
+
+        stats = {
+            "connected": True,
+            "circuit": self.breaker.state,
+            "redis_version": info.get("redis_version", "unknown"),
+            "used_memory": info.get("used_memory_human", "unknown"),
+            "total_connections": info.get("total_connections_received", 0),
+            "total_keys": total_keys,
+            "keyspace_hits": info.get("keyspace_hits", 0),
+            "keyspace_misses": info.get("keyspace_misses", 0),
+            "operations": operations,
+            "serialization": {"json": "orjson" if HAS_ORJSON else "json", "zstd": HAS_ZSTD},
+            "uptime_seconds": info.get("uptime_in_seconds", 0)
+        }
+        if count_keys:
+            key_counts = self._call(
+                "scan",
+                lambda: {prefix: sum(1 for _ in self._scan(f"{prefix}:*", scan_limit)) for prefix in KEY_PREFIXES},
+            )
+            if key_counts is not None:
+                stats["key_counts"] = key_counts
+        return stats
+
     def clear_all_cache(self):
         """Clear all cache entries (use with caution)"""
-        if not self.is_connected():
-            return False
-        
-        try:
-            self.redis_client.flushdb()
-            logger.warning("🗑️ All cache entries cleared")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error clearing cache: {e}")
+        if self._call("flushdb", lambda: self.redis_client.flushdb()) is None:
             return False
+        logger.warning("🗑️ All cache entries cleared")
+        return True
 
 # Global cache instance
-cache = RedisCache()
\ No newline at end of file
+cache = RedisCache()
+
+
+def invalidate_user_batches(user_id: Any) -> bool:
+    """Drop the cached GET /batches pages of one user (upload, processing, cancel, delete)"""
+    return cache.bump_user_version("batches", user_id)
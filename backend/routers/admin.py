@@ -5,16 +5,15 @@ Handles admin-only endpoints for user management and system statistics
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
 import secrets
 import string
 import logging
 
-from database import get_db, Batch, DocumentFile, User
+from database import get_db, User
 from auth import get_current_active_user, get_password_hash
 from audit_logger import log_user_status_change, log_password_reset
 from security import SecurityValidator
+from services.admin_reporting import query_user_batches, query_user_summaries, stats_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -51,32 +50,8 @@ async def get_all_users(
     db: Session = Depends(get_db)
 ):
     """Get all users with their activity stats (Admin only)"""
-    users = db.query(User).all()
-    
-    # Get activity stats for each user
-    user_list = []
-    for user in users:
-        # Count batches created by user
-        batch_count = db.query(Batch).filter(Batch.user_id == user.id).count()
-        
-        # Get latest batch
-        latest_batch = db.query(Batch).filter(Batch.user_id == user.id).order_by(Batch.created_at.desc()).first()
-        
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "full_name": user.full_name,
-            "is_active": user.is_active,
-            "is_admin": user.is_admin,
-            "created_at": user.created_at,
-            "last_login": user.last_login,
-            "total_batches": batch_count,
-            "last_activity": latest_batch.created_at if latest_batch else None
-        }
-        user_list.append(user_data)
-    
-    return user_list
+    # Batch totals and last activity are aggregated per user in the same query
+    return query_user_summaries(db)
 
 
 @router.get("/users/{user_id}/activities")
@@ -86,25 +61,8 @@ async def get_user_activities(
     db: Session = Depends(get_db)
 ):
     """Get detailed activity history for a specific user (Admin only)"""
-    # Get all batches by user
-    batches = db.query(Batch).filter(Batch.user_id == user.id).order_by(Batch.created_at.desc()).all()
-    
-    batch_list = []
-    for batch in batches:
-        # Get file count for this batch
-        files = db.query(DocumentFile).filter(DocumentFile.batch_id == batch.id).all()
-        
-        batch_data = {
-            "id": batch.id,
-            "status": batch.status,
-            "created_at": batch.created_at,
-            "completed_at": batch.completed_at,
-            "file_count": len(files),
-            "processed_files": batch.processed_files,
-            "file_names": [f.name for f in files[:5]],  # First 5 files
-            "processing_time": batch.total_processing_time
-        }
-        batch_list.append(batch_data)
+    # File counts and first file names come from one windowed query, not one query per batch
+    batch_list = query_user_batches(db, user.id)
     
     return {
         "user": {
@@ -212,43 +170,5 @@ async def get_dashboard_stats(
     db: Session = Depends(get_db)
 ):
     """Get overall system statistics (Admin only)"""
-    # Count users
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    admin_users = db.query(User).filter(User.is_admin == True).count()
-    
-    # Count batches
-    total_batches = db.query(Batch).count()
-    completed_batches = db.query(Batch).filter(Batch.status == "completed").count()
-    processing_batches = db.query(Batch).filter(Batch.status == "processing").count()
-    partial_batches = db.query(Batch).filter(Batch.status == "partial").count()
-    failed_batches = db.query(Batch).filter(Batch.status.in_(["failed", "error"])).count()
-    
-    # Count files
-    total_files = db.query(DocumentFile).count()
-    
-    # Recent activity (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_batches = db.query(Batch).filter(Batch.created_at >= seven_days_ago).count()
-    recent_users = db.query(User).filter(User.created_at >= seven_days_ago).count()
-    
-    return {
-        "users": {
-            "total": total_users,
-            "active": active_users,
-            "inactive": total_users - active_users,
-            "admins": admin_users,
-            "new_this_week": recent_users
-        },
-        "batches": {
-            "total": total_batches,
-            "completed": completed_batches,
-            "processing": processing_batches,
-            "partial": partial_batches,
-            "failed": failed_batches,
-            "this_week": recent_batches
-        },
-        "files": {
-            "total": total_files
-        }
-    }
+    # Served from the in-memory snapshot; re-aggregated in a single query once it expires
+    return stats_snapshot.get(db)
@@ -14,17 +14,13 @@ from models import UserRegister, UserLogin, UserResponse, Token
 from auth import get_password_hash, verify_password, create_access_token, get_current_active_user
 from audit_logger import log_registration, log_login_success, log_login_failure
 from security import SecurityValidator
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from rate_limiting import limiter
 
 logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(prefix="/api", tags=["authentication"])
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
 
 @router.post("/register", response_model=UserResponse)
 @limiter.limit("5/minute")  # Max 5 registration attempts per minute per IP
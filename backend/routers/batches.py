@@ -9,23 +9,26 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Optional
 from datetime import datetime
+from collections import defaultdict
 from pathlib import Path
 import logging
 import os
 import json
 
-from database import get_db, Batch, DocumentFile, User
+from database import get_db, Batch, DocumentFile, FakturCanonicalFields, User
 from database import ScanResult as DBScanResult
+from export_artifacts import get_artifact_manager
+from exporters.faktur_pajak_exporter import FakturPajakExporter
 from auth import get_current_active_user
 from batch_processor import batch_processor
 from websocket_manager import manager
 from config import get_upload_dir, get_results_dir
-from redis_cache import RedisCache
+from redis_cache import cache as redis_cache, invalidate_user_batches
 
 logger = logging.getLogger(__name__)
 
-# Initialize Redis cache
-redis_cache = RedisCache()
+# Batch lists are invalidated by per-user version bumps, so the TTL only bounds memory
+BATCH_LIST_CACHE_TTL = 24 * 3600
 
 # Create router
 router = APIRouter(prefix="/api", tags=["batches"])
@@ -156,6 +159,29 @@ async def get_batch_status(
         )
 
 
+def _result_response(result: DBScanResult) -> dict:
+    """API shape of one scan result (also what GET /batches/{id}/results caches)"""
+    # Expose raw_ocr_result at top level if it exists in extracted_data
+    extracted_data = result.extracted_data or {}
+    raw_ocr_result = None
+    if isinstance(extracted_data, dict) and "raw_ocr_result" in extracted_data:
+        raw_ocr_result = extracted_data.get("raw_ocr_result")
+
+    return {
+        "id": result.id,
+        "batch_id": result.batch_id,
+        "filename": result.original_filename,
+        "document_type": result.document_type,
+        "extracted_text": result.extracted_text,
+        "extracted_data": result.extracted_data,
+        "raw_ocr_result": raw_ocr_result,
+        "confidence": result.confidence,
+        "ocr_engine_used": result.ocr_engine_used,
+        "created_at": result.created_at.isoformat(),
+        "ocr_processing_time": result.ocr_processing_time
+    }
+
+
 @router.get("/batches/{batch_id}/results")
 async def get_batch_results(
     batch_id: str,
@@ -173,33 +199,30 @@ async def get_batch_results(
         if batch.user_id != current_user.id and not current_user.is_admin:
             raise HTTPException(status_code=403, detail="Not authorized to access this batch")
         
-        # Get all results for this batch
-        results = db.query(DBScanResult).filter(DBScanResult.batch_id == batch_id).all()
-        
-        # Format results for API response
+        # Result ids first; full rows (large text/JSON columns) only for results not cached yet.
+        # Cache entries are keyed by the batch's results_revision, so an edit never serves a stale row
+        result_ids = [row.id for row in db.query(DBScanResult.id).filter(DBScanResult.batch_id == batch_id)]
+        revision = batch.results_revision or 0
+        cache_ids = {result_id: f"{result_id}@r{revision}" for result_id in result_ids}
+        cached = redis_cache.get_processed_documents(batch_id, list(cache_ids.values()))
+
+        fetched = {}
+        missing = [result_id for result_id in result_ids if cache_ids[result_id] not in cached]
+        if missing:
+            for result in db.query(DBScanResult).filter(DBScanResult.id.in_(missing)):
+                fetched[result.id] = _result_response(result)
+            # All misses written back in one pipelined round trip
+            redis_cache.cache_processed_documents(
+                batch_id, {cache_ids[result_id]: data for result_id, data in fetched.items()}
+            )
+
         batch_results = []
-        for result in results:
-            # Extract raw_ocr_result if it exists in extracted_data
-            extracted_data = result.extracted_data or {}
-            raw_ocr_result = None
-            if isinstance(extracted_data, dict) and "raw_ocr_result" in extracted_data:
-                raw_ocr_result = extracted_data.get("raw_ocr_result")
+        for result_id in result_ids:
+            if cache_ids[result_id] in cached:
+                batch_results.append(cached[cache_ids[result_id]])
+            elif result_id in fetched:  # Skips rows deleted between the two queries
+                batch_results.append(fetched[result_id])
 
-            result_data = {
-                "id": result.id,
-                "batch_id": result.batch_id,
-                "filename": result.original_filename,
-                "document_type": result.document_type,
-                "extracted_text": result.extracted_text,
-                "extracted_data": result.extracted_data,
-                "raw_ocr_result": raw_ocr_result,  # Expose raw OCR at top level
-                "confidence": result.confidence,
-                "ocr_engine_used": result.ocr_engine_used,
-                "created_at": result.created_at.isoformat(),
-                "ocr_processing_time": result.ocr_processing_time
-            }
-            batch_results.append(result_data)
-        
         logger.info(f"📊 Retrieved {len(batch_results)} results for batch {batch_id}")
         return batch_results
         
@@ -225,21 +248,22 @@ async def get_all_batches(
     - **offset**: Number of batches to skip (default: 0)
     - **include_files**: Include detailed file information (default: true)
 
-    Uses Redis cache for performance (5 minute TTL)
+    Cached in Redis together with the user's batch-list version, which upload, processing,
+    cancel and delete bump after committing - a write never serves a stale list
     """
     try:
-        # Generate cache key based on user and params
+        # Version counter and cached page in one round trip; the page only counts if its version is current
         cache_key = f"batches:user:{current_user.id}:limit:{limit}:offset:{offset}:files:{include_files}"
+        version, cached_data = redis_cache.get_with_user_version("batches", current_user.id, cache_key)
 
-        # Try to get from cache first
-        if redis_cache.is_connected():
-            cached_data = redis_cache.get(cache_key)
-            if cached_data:
-                logger.info(f"⚡ Cache HIT for batches (user: {current_user.id})")
-                try:
-                    return json.loads(cached_data)
-                except:
-                    logger.warning("Failed to parse cached data, fetching from DB")
+        if cached_data:
+            try:
+                cached = json.loads(cached_data)
+                if isinstance(cached, dict) and cached.get("version") == version:
+                    logger.info(f"⚡ Cache HIT for batches (user: {current_user.id})")
+                    return cached["batches"]
+            except Exception:
+                logger.warning("Failed to parse cached data, fetching from DB")
 
         # Cache MISS - fetch from database
         logger.info(f"📊 Cache MISS - Fetching batches from database (user: {current_user.id})")
@@ -255,6 +279,26 @@ async def get_all_batches(
 
         batches = query.all()
 
+        # Files for all listed batches in one IN query (only the columns the list shows)
+        files_by_batch = defaultdict(list)
+        if include_files and batches:
+            file_rows = db.query(
+                DocumentFile.id,
+                DocumentFile.batch_id,
+                DocumentFile.name,
+                DocumentFile.type,
+                DocumentFile.file_size,
+                DocumentFile.status,
+            ).filter(DocumentFile.batch_id.in_([b.id for b in batches])).all()
+            for f in file_rows:
+                files_by_batch[f.batch_id].append({
+                    "id": f.id,
+                    "name": f.name,
+                    "type": f.type,
+                    "size": f.file_size,
+                    "status": f.status
+                })
+
         batch_list = []
         for batch in batches:
             batch_data = {
@@ -269,25 +313,17 @@ async def get_all_batches(
 
             # Include files if requested
             if include_files:
-                files = db.query(DocumentFile).filter(DocumentFile.batch_id == batch.id).all()
-                batch_data["files"] = [
-                    {
-                        "id": f.id,
-                        "name": f.name,
-                        "type": f.type,
-                        "size": f.file_size,
-                        "status": f.status
-                    }
-                    for f in files
-                ]
+                batch_data["files"] = files_by_batch.get(batch.id, [])
 
             batch_list.append(batch_data)
 
-        # Cache the result for 30 minutes (1800 seconds) for better performance
+        # Cache until the next version bump (TTL only bounds memory)
         if redis_cache.is_connected():
             try:
-                redis_cache.set(cache_key, json.dumps(batch_list), ttl=1800)
-                logger.info(f"💾 Cached batches for user {current_user.id} (TTL: 30min)")
+                redis_cache.set(
+                    cache_key, json.dumps({"version": version, "batches": batch_list}), ttl=BATCH_LIST_CACHE_TTL
+                )
+                logger.info(f"💾 Cached batches for user {current_user.id} (version {version})")
             except Exception as cache_error:
                 logger.warning(f"Failed to cache batches: {cache_error}")
 
@@ -329,6 +365,7 @@ async def cancel_batch_processing(
             # Update database status
             batch.status = "cancelled"
             db.commit()
+            invalidate_user_batches(batch.user_id)
             
             logger.info(f"✅ Cancelled batch {batch_id} by user {current_user.username}")
             
@@ -417,15 +454,19 @@ async def delete_batch(
 
         # Explicitly delete scan results first for cleaner logging
         deleted_results = db.query(DBScanResult).filter(DBScanResult.batch_id == batch_id).delete()
+        db.query(FakturCanonicalFields).filter(FakturCanonicalFields.batch_id == batch_id).delete()
+        get_artifact_manager().invalidate(f"batch_{batch_id}")
 
         # Delete document files records
         deleted_doc_files = db.query(DocumentFile).filter(DocumentFile.batch_id == batch_id).delete()
 
         # Finally delete the batch itself
+        owner_id = batch.user_id
         db.delete(batch)
 
         # Commit transaction
         db.commit()
+        invalidate_user_batches(owner_id)
 
         logger.info(
             f"✅ Successfully deleted batch {batch_id}: "
@@ -525,6 +566,22 @@ async def get_all_results(
         raise HTTPException(status_code=500, detail=f"Error retrieving results: {str(e)}")
 
 
+def _refresh_canonical_fields(db: Session, result: DBScanResult) -> None:
+    """Replace the ingest-time canonical Faktur Pajak row with one computed from the current extracted_data"""
+    db.query(FakturCanonicalFields).filter(
+        FakturCanonicalFields.scan_result_id == result.id
+    ).delete(synchronize_session=False)
+    if (result.document_type or "").lower() != "faktur_pajak":
+        return
+    try:
+        canonical = FakturPajakExporter().canonicalize(result.extracted_data or {})
+    except Exception as e:
+        # No stored row: exports recompute from extracted_data
+        logger.warning(f"⚠️ Canonicalization of edited result {result.id} failed, exports will recompute: {e}")
+        return
+    db.add(FakturCanonicalFields.from_canonical(result.id, result.batch_id, canonical))
+
+
 @router.patch("/results/{result_id}")
 async def update_result(
     result_id: str,
@@ -555,11 +612,16 @@ async def update_result(
         # Store old data for history (optional - for version control)
         old_data = result.extracted_data.copy() if result.extracted_data else {}
 
-        # Update extracted_data with edited data
-        if result.extracted_data:
-            result.extracted_data.update(updated_data)
-        else:
-            result.extracted_data = updated_data
+        # Update extracted_data with edited data (a new dict, so the JSON column is flagged as changed)
+        result.extracted_data = {**old_data, **updated_data}
+
+        # Exports prefer the stored canonical row - rebuild it from the edited data in this transaction
+        _refresh_canonical_fields(db, result)
+
+        # New export version for the batch, committed together with the edit (atomic increment)
+        db.query(Batch).filter(Batch.id == batch.id).update(
+            {Batch.results_revision: Batch.results_revision + 1}, synchronize_session=False
+        )
 
         # Update timestamp with timezone-aware datetime
         from datetime import datetime, timezone
@@ -6,31 +6,32 @@ Handles document upload and batch processing
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from typing import List
+from typing import AsyncIterator, List, Optional, Union
 from datetime import datetime, timezone
 from pathlib import Path
 import uuid
+import hashlib
 import json
 import aiofiles
 import logging
 
-from database import SessionLocal, get_db, Batch, DocumentFile, ProcessingLog, User
+from database import SessionLocal, get_db, Batch, DocumentFile, ProcessingLog, User, FakturCanonicalFields
 from database import ScanResult as DBScanResult
 from models import BatchResponse, DocumentFile as DocumentFileModel
 from auth import get_current_active_user
 from security import file_security, SecurityValidator
 from ai_processor import process_document_ai
+from llm_scheduler import llm_identity
 from batch_processor import batch_processor
-from config import get_upload_dir
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from utils.zip_handler import ZipHandler
+from config import get_upload_dir, settings
+from pdf_probe import READ_BLOCK as PROBE_READ_BLOCK, remember_file_hash
+from redis_cache import invalidate_user_batches
+from instrumentation import persist_system_metrics, span
+from rate_limiting import limiter
+from utils.zip_handler import ZipHandler, ZipMember
 
 logger = logging.getLogger(__name__)
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
 # Create router
 router = APIRouter(prefix="/api", tags=["documents"])
 
@@ -41,7 +42,7 @@ UPLOAD_DIR = Path(get_upload_dir())
 # ==================== Document Upload Endpoint ====================
 
 @router.post("/upload", response_model=BatchResponse)
-@limiter.limit("10/minute")  # Rate limit: 10 uploads per minute per IP
+@limiter.limit("10/minute")  # Rate limit: 10 uploads per minute per user (per IP when anonymous)
 async def upload_documents(
     request: Request,
     background_tasks: BackgroundTasks,
@@ -123,6 +124,7 @@ async def upload_documents(
             )
             db.add(db_batch)
             db.commit()
+            invalidate_user_batches(current_user.id)
         except Exception as e:
             logger.error(f"Database error creating batch {batch_id}: {e}")
             raise HTTPException(
@@ -199,7 +201,7 @@ async def upload_documents(
                     continue
                 
                 # Perform security validation
-                validation_result = await file_security.validate_file(file)
+                validation_result = await file_security.validate_file(file, content=content)
                 validation_result["filename"] = file.filename
                 validation_results.append(validation_result)
                 
@@ -218,12 +220,21 @@ async def upload_documents(
                 file_path = batch_dir / safe_filename
                 
                 try:
+                    # Hash in blocks while writing; the PDF probe reuses the SHA-256 instead of re-reading the file
+                    md5, sha256 = hashlib.md5(), hashlib.sha256()
+                    view = memoryview(content)
                     async with aiofiles.open(file_path, 'wb') as f:
-                        await f.write(content)
+                        for start in range(0, len(view), PROBE_READ_BLOCK):
+                            block = view[start:start + PROBE_READ_BLOCK]
+                            md5.update(block)
+                            sha256.update(block)
+                            await f.write(block)
                     
                     # Verify file was written correctly
                     if not file_path.exists() or file_path.stat().st_size == 0:
                         raise Exception("File was not saved properly")
+                    if file_path.suffix.lower() == ".pdf":
+                        remember_file_hash(str(file_path), sha256.hexdigest())
                         
                 except Exception as e:
                     logger.error(f"Failed to save file {file.filename}: {e}")
@@ -246,7 +257,7 @@ async def upload_documents(
                         type=doc_type,
                         file_size=len(content),
                         mime_type=validation_result["file_info"].get("mime_type", "unknown"),
-                        file_hash=validation_result["file_info"].get("md5", "")
+                        file_hash=validation_result["file_info"].get("md5") or md5.hexdigest()
                     )
                     db.add(db_file)
                     
@@ -289,6 +300,7 @@ async def upload_documents(
         # Commit all file records
         try:
             db.commit()
+            invalidate_user_batches(current_user.id)
         except Exception as e:
             logger.error(f"Failed to update batch {batch_id}: {e}")
             raise HTTPException(
@@ -316,6 +328,7 @@ async def upload_documents(
                 db_batch.status = "failed"
                 db_batch.error_message = "No valid files passed security validation"
                 db.commit()
+                invalidate_user_batches(current_user.id)
             except:
                 pass
             
@@ -348,6 +361,7 @@ async def upload_documents(
                 db_batch.status = "failed"
                 db_batch.error_message = f"Failed to start processing: {str(e)}"
                 db.commit()
+                invalidate_user_batches(current_user.id)
             except:
                 pass
             raise HTTPException(
@@ -405,6 +419,7 @@ async def upload_documents(
                     batch.status = "failed"
                     batch.error_message = f"System error: {str(e)}"
                     db.commit()
+                    invalidate_user_batches(batch.user_id)
                 db.close()
             except Exception as db_error:
                 logger.error(f"Failed to update failed batch status: {db_error}")
@@ -422,8 +437,28 @@ async def upload_documents(
 
 # ==================== Background Processing Function ====================
 
-async def process_batch_async(batch_id: str, file_paths: List[dict]):
-    """Background task to process documents with AI using database with real-time progress"""
+async def _aenumerate(file_paths: Union[List[dict], AsyncIterator[dict]]):
+    """enumerate() over a file list or an async stream of files that are still arriving"""
+    if hasattr(file_paths, "__aiter__"):
+        i = 0
+        async for file_info in file_paths:
+            yield i, file_info
+            i += 1
+    else:
+        for item in enumerate(file_paths):
+            yield item
+
+
+async def process_batch_async(batch_id: str, file_paths: Union[List[dict], AsyncIterator[dict]],
+                              total_files: Optional[int] = None):
+    """
+    Background task to process documents with AI using database with real-time progress
+
+    file_paths may be an async iterator (e.g. ZIP members yielded as they are extracted);
+    total_files is then the expected count used for the final batch status.
+    """
+    if total_files is None:
+        total_files = len(file_paths)
     db = SessionLocal()
     try:
         logger.info(f"Starting async processing for batch {batch_id}")
@@ -450,6 +485,7 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
             batch.status = "cancelled"
             batch.completed_at = datetime.now(timezone.utc)
             db.commit()
+            invalidate_user_batches(batch.user_id)
 
             # WebSocket removed: await manager.send_batch_complete(batch_id, {
             # "status": "cancelled",
@@ -467,12 +503,13 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
 
         processed_count = 0
         
-        for i, file_info in enumerate(file_paths):
+        async for i, file_info in _aenumerate(file_paths):
             if batch_processor.is_cancelled(batch_id):
                 logger.info(f"Batch {batch_id} cancellation detected before processing file {i + 1}")
                 batch.status = "cancelled"
                 batch.completed_at = datetime.now(timezone.utc)
                 db.commit()
+                invalidate_user_batches(batch.user_id)
 
                 # WebSocket removed: await manager.send_batch_complete(batch_id, {
                 # "status": "cancelled",
@@ -513,6 +550,7 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                 db_file.status = "processing"
                 db_file.processing_start = datetime.now(timezone.utc)
                 db.commit()
+                invalidate_user_batches(batch.user_id)
                 
                 # Log processing start
                 log_entry = ProcessingLog(
@@ -531,11 +569,12 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                 # "message": f"Running OCR and AI analysis on {db_file.name}"
                 # })
                 
-                # Process with AI
-                result = await process_document_ai(
-                    file_info["path"],
-                    file_info["document_type"]
-                )
+                # Process with AI (LLM calls are queued under the batch owner at batch priority)
+                with llm_identity(batch.user_id, priority="batch"):
+                    result = await process_document_ai(
+                        file_info["path"],
+                        file_info["document_type"]
+                    )
 
                 # Ensure extracted_data is a dictionary
                 extracted_data = result.get("extracted_data", {})
@@ -559,6 +598,14 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                     extracted_data["raw_ocr_result"] = result["raw_ocr_result"]
                     logger.info(f"✅ Including raw OCR result in extracted_data for {db_file.name}")
 
+                # Keep the per-stage trace with the result (durations, RSS deltas, pages, LLM tokens)
+                timings = result.get("timings") or {}
+                stage_timings = timings.get("stages", {})
+                if timings:
+                    processing_info = extracted_data.setdefault("processing_info", {})
+                    if isinstance(processing_info, dict):
+                        processing_info["timings"] = timings
+
                 # Persist normalized extracted data back to result payload for downstream consumers
                 result["extracted_data"] = extracted_data
 
@@ -591,9 +638,13 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                     extracted_data=extracted_data,
                     confidence=result.get("confidence", 0.0),
                     ocr_engine_used=parsing_method,
+                    ocr_processing_time=stage_timings.get("ocr", {}).get("seconds"),
+                    parsing_processing_time=stage_timings.get("parsing", {}).get("seconds"),
                     total_processing_time=result.get("processing_time", 0.0)
                 )
                 db.add(scan_result)
+                if result.get("canonical_fields"):
+                    db.add(FakturCanonicalFields.from_canonical(scan_result.id, batch_id, result["canonical_fields"]))
                 
                 # ✅ DEBUG: Confirm save
                 if file_info["document_type"] == "rekening_koran":
@@ -609,7 +660,9 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                 # Update batch progress
                 batch.processed_files = processed_count
                 
-                db.commit()
+                with span("db", document_type=db_file.type or "unknown"):
+                    db.commit()
+                invalidate_user_batches(batch.user_id)
                 
                 # Send file completion notification
                 # WebSocket removed: await manager.send_file_progress(batch_id, {
@@ -667,9 +720,10 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                 )
                 db.add(log_entry)
                 db.commit()
+                invalidate_user_batches(batch.user_id)
         
         # Update batch final status
-        if processed_count == len(file_paths):
+        if processed_count == total_files:
             batch.status = "completed"
             batch.completed_at = datetime.now(timezone.utc)
             # WebSocket removed: await manager.send_batch_complete(batch_id, {
@@ -683,7 +737,7 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
         elif processed_count > 0:
             batch.status = "partial"
             batch.completed_at = datetime.now(timezone.utc)
-            success_rate = (processed_count / len(file_paths)) * 100
+            success_rate = (processed_count / total_files) * 100
             # WebSocket removed: await manager.send_batch_complete(batch_id, {
             # "status": "partial",
             # "total_files": len(file_paths),
@@ -691,7 +745,7 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
             # "success_rate": success_rate,
             # "message": f"Partially completed: {processed_count} of {len(file_paths)} files processed ({success_rate:.1f}%)"
             # })
-            logger.info(f"Batch {batch_id} partially completed ({processed_count}/{len(file_paths)})")
+            logger.info(f"Batch {batch_id} partially completed ({processed_count}/{total_files})")
         else:
             batch.status = "failed"
             batch.error_message = "No files processed successfully"
@@ -705,7 +759,12 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
             logger.error(f"Batch {batch_id} failed - no files processed")
         
         db.commit()
+        invalidate_user_batches(batch.user_id)
         batch_processor.clear_cancel_request(batch_id)
+
+        # Roll the stage aggregates into a SystemMetrics row (throttled)
+        active_batches = db.query(Batch).filter(Batch.status == "processing").count()
+        persist_system_metrics(db, active_batches=active_batches)
         
     except Exception as e:
         logger.error(f"Batch processing error for {batch_id}: {e}")
@@ -721,6 +780,7 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
                 batch.error_message = str(e)
                 batch.completed_at = datetime.now(timezone.utc)
                 db.commit()
+                invalidate_user_batches(batch.user_id)
         except:
             pass
     finally:
@@ -728,8 +788,60 @@ async def process_batch_async(batch_id: str, file_paths: List[dict]):
         db.close()
 
 
+async def _stream_zip_members(batch_id: str, zip_path: str, members: List[ZipMember], member_paths: dict,
+                              document_type: str, zip_handler: ZipHandler) -> AsyncIterator[dict]:
+    """
+    Yield ZIP members for processing in the order they finish extracting
+    Each member is hashed and signature-checked while it is written; rejected members are
+    marked failed here and never reach OCR. The temporary ZIP is removed once all have landed.
+    """
+    db = SessionLocal()
+    try:
+        async for extracted in zip_handler.extract_members_async(
+            zip_path, members, lambda member: member_paths[member.filename]
+        ):
+            db_file = db.query(DocumentFile).filter(
+                and_(DocumentFile.batch_id == batch_id,
+                     DocumentFile.file_path == extracted.path)
+            ).first()
+            if not extracted.ok:
+                logger.warning(f"  🚫 Rejected ZIP member {extracted.member.arcname}: {extracted.error}")
+                if db_file:
+                    db_file.status = "failed"
+                    db_file.processing_end = datetime.now(timezone.utc)
+                db.add(ProcessingLog(
+                    batch_id=batch_id,
+                    level="ERROR",
+                    message=f"Rejected {extracted.member.filename}: {extracted.error}"
+                ))
+                db.commit()
+                continue
+
+            if db_file:
+                db_file.file_size = extracted.size
+                db_file.file_hash = extracted.md5
+                db_file.mime_type = extracted.mime_type
+                db.commit()
+            if extracted.path.lower().endswith(".pdf"):
+                remember_file_hash(extracted.path, extracted.sha256)
+
+            logger.info(f"  ✅ Extracted {extracted.member.filename} ({extracted.size / 1024:.0f} KB)")
+            yield {
+                "path": extracted.path,
+                "document_type": document_type,
+                "filename": Path(extracted.path).name  # For progress notifications
+            }
+    finally:
+        db.close()
+        try:
+            Path(zip_path).unlink(missing_ok=True)
+            logger.info(f"🗑️  Cleaned up temporary ZIP")
+        except Exception as e:
+            logger.warning(f"Failed to cleanup temp ZIP: {e}")
+
+
 @router.post("/upload-zip", response_model=BatchResponse)
-@limiter.limit("5/minute")  # Rate limit: 5 ZIP uploads per minute per IP
+@limiter.limit("5/minute")  # Rate limit: 5 ZIP uploads per minute per user (per IP when anonymous)
 async def upload_zip_file(
     request: Request,
     background_tasks: BackgroundTasks,
@@ -764,7 +876,6 @@ async def upload_zip_file(
     """
     batch_id = None
     temp_zip_path = None
-    extract_dir = None
 
     try:
         # Validate document type - RESTRICTED to tax documents only
@@ -846,7 +957,7 @@ async def upload_zip_file(
             )
 
         # Extract and validate ZIP
-        zip_handler = ZipHandler()
+        zip_handler = ZipHandler(max_workers=settings.zip_extract_workers, max_member_mb=settings.max_file_size_mb)
 
         # Validate ZIP
         is_valid, message = zip_handler.validate_zip_file(str(temp_zip_path))
@@ -861,26 +972,19 @@ async def upload_zip_file(
                 }
             )
 
-        # Extract ZIP
-        extract_dir = batch_dir / "extracted"
-        success, extracted_files, extract_message = zip_handler.extract_zip_file(
-            str(temp_zip_path),
-            str(extract_dir)
-        )
-
-        if not success or not extracted_files:
-            logger.warning(f"🚫 ZIP extraction failed: {extract_message}")
+        # Plan members from the central directory; extraction happens in the background
+        members = zip_handler.plan_members(str(temp_zip_path))
+        if not members:
+            logger.warning(f"🚫 ZIP contains no supported documents")
             raise HTTPException(
                 status_code=400,
                 detail={
                     "error": "Extraction failed",
-                    "message": extract_message,
+                    "message": "No valid document files found in ZIP",
                     "error_code": "ZIP_EXTRACTION_FAILED"
                 }
             )
 
-        logger.info(f"✅ Extracted {len(extracted_files)} files from ZIP")
-
         # Create database batch
         try:
             db_batch = Batch(
@@ -888,11 +992,12 @@ async def upload_zip_file(
                 status="processing",
                 created_at=datetime.now(timezone.utc),
                 user_id=current_user.id,
-                total_files=len(extracted_files),  # Set total files from extracted count
+                total_files=len(members),  # Set total files from the archive listing
                 processed_files=0
             )
             db.add(db_batch)
             db.commit()
+            invalidate_user_batches(current_user.id)
         except Exception as e:
             logger.error(f"Database error creating batch {batch_id}: {e}")
             raise HTTPException(
@@ -904,57 +1009,37 @@ async def upload_zip_file(
                 }
             )
 
-        # Process extracted files
-        file_paths = []
+        # Register every member up front; size and hash are filled in as each one lands
+        member_paths = {}
         file_objects = []
 
-        for i, file_path in enumerate(extracted_files):
-            try:
-                # Get filename
-                original_filename = Path(file_path).name
-                safe_filename = f"{i:03d}_{SecurityValidator.validate_filename(original_filename)}"
-                final_file_path = batch_dir / safe_filename
-
-                # Get file size BEFORE moving
-                file_size = Path(file_path).stat().st_size
-
-                # Move file from extract dir to batch dir
-                import shutil
-                shutil.move(file_path, final_file_path)
-
-                # Generate file ID
-                file_id = str(uuid.uuid4())
-
-                # Create DocumentFile record
-                doc_file = DocumentFile(
-                    id=file_id,
-                    batch_id=batch_id,
-                    name=original_filename,
-                    file_path=str(final_file_path),
-                    type=document_type,
-                    file_size=file_size,
-                    status="pending"
-                )
-                db.add(doc_file)
-                file_paths.append(str(final_file_path))
-
-                # Create file object for response
-                file_objects.append(DocumentFileModel(
-                    id=file_id,
-                    filename=original_filename,
-                    type=document_type,
-                    status="processing",
-                    progress=0
-                ))
+        for i, member in enumerate(members):
+            safe_filename = f"{i:03d}_{SecurityValidator.validate_filename(member.filename)}"
+            final_file_path = batch_dir / safe_filename
+            member_paths[member.filename] = str(final_file_path)
 
-                logger.info(f"  ✅ Prepared file {i+1}/{len(extracted_files)}: {original_filename}")
-
-            except Exception as e:
-                logger.error(f"Error processing extracted file {file_path}: {e}")
+            file_id = str(uuid.uuid4())
+            db.add(DocumentFile(
+                id=file_id,
+                batch_id=batch_id,
+                name=member.filename,
+                file_path=str(final_file_path),
+                type=document_type,
+                file_size=member.declared_size,
+                status="pending"
+            ))
+            file_objects.append(DocumentFileModel(
+                id=file_id,
+                filename=member.filename,
+                type=document_type,
+                status="processing",
+                progress=0
+            ))
 
         # Commit all DocumentFile records
         try:
             db.commit()
+            invalidate_user_batches(current_user.id)
         except Exception as e:
             logger.error(f"Failed to commit document files: {e}")
             db.rollback()
@@ -967,39 +1052,21 @@ async def upload_zip_file(
                 }
             )
 
-        # Cleanup temporary ZIP and extract directory
-        try:
-            if temp_zip_path and temp_zip_path.exists():
-                temp_zip_path.unlink()
-            if extract_dir and extract_dir.exists():
-                import shutil
-                shutil.rmtree(extract_dir)
-            logger.info(f"🗑️  Cleaned up temporary files")
-        except Exception as e:
-            logger.warning(f"Failed to cleanup temp files: {e}")
-
-        # Prepare file paths for background processing
-        file_paths_data = []
-        for i, file_path in enumerate(file_paths):
-            # Get filename from path
-            filename = Path(file_path).name
-            file_paths_data.append({
-                "path": file_path,
-                "document_type": document_type,
-                "filename": filename  # Add filename for progress notifications
-            })
-
-        # Start background processing
-        background_tasks.add_task(process_batch_async, batch_id, file_paths_data)
+        # Start background processing: members are decompressed on a thread pool and each one
+        # is handed to OCR as soon as it is written and verified
+        member_stream = _stream_zip_members(
+            batch_id, str(temp_zip_path), members, member_paths, document_type, zip_handler
+        )
+        background_tasks.add_task(process_batch_async, batch_id, member_stream, len(members))
 
-        logger.info(f"🚀 Started batch processing for {batch_id} with {len(file_paths)} files from ZIP")
+        logger.info(f"🚀 Started streaming batch processing for {batch_id} with {len(members)} files from ZIP")
 
         return BatchResponse(
             id=batch_id,
             files=file_objects,
             status="processing",
             created_at=datetime.now(timezone.utc).isoformat(),
-            total_files=len(file_paths),
+            total_files=len(members),
             processed_files=0,
             completed_at=None,
             error=None
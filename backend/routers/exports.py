@@ -7,14 +7,20 @@ from fastapi import APIRouter, Depends, HTTPException, Form
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from pathlib import Path
+import asyncio
 import logging
 
-from database import get_db, Batch, DocumentFile, User
+from database import get_db, Batch, DocumentFile, FakturCanonicalFields, User
 from database import ScanResult as DBScanResult
 from auth import get_current_active_user
 from config import get_exports_dir
 from excel_template import create_batch_excel_export
 from pdf_template import create_batch_pdf_export
+from instrumentation import span
+from export_artifacts import get_artifact_manager
+from export_loader import BatchExportRows, batch_document_type_counts, batch_results_version
+from exporters.composite_exporter import CompositeExporter
+from exporters.faktur_pajak_exporter import FakturPajakExporter
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +31,18 @@ router = APIRouter(prefix="/api", tags=["exports"])
 EXPORTS_DIR = Path(get_exports_dir())
 
 
+def _attach_canonical_fields(db: Session, results_data: list) -> None:
+    """Load ingest-time canonical Faktur Pajak fields for all results in one query"""
+    faktur_ids = [r['id'] for r in results_data if 'faktur' in (r.get('document_type') or '').lower()]
+    if not faktur_ids:
+        return
+    rows = db.query(FakturCanonicalFields).filter(FakturCanonicalFields.scan_result_id.in_(faktur_ids)).all()
+    canonical_map = {row.scan_result_id: FakturPajakExporter.canonical_from_row(row) for row in rows}
+    for result_data in results_data:
+        if result_data['id'] in canonical_map:
+            result_data['canonical_fields'] = canonical_map[result_data['id']]
+
+
 # ==================== Basic Export Endpoints ====================
 
 @router.get("/results/{result_id}/export/{format}")
@@ -69,6 +87,7 @@ async def export_result(
             'processing_time': result.total_processing_time or 0.0,
             'ocr_engine': result.ocr_engine_used or 'Unknown'
         }
+        _attach_canonical_fields(db, [result_data])
         
         # Create filename
         safe_filename = "".join(c for c in (file_info.name if file_info else 'document') 
@@ -77,72 +96,74 @@ async def export_result(
         export_path = EXPORTS_DIR / export_filename
         
         # Create export
-        if format == 'excel':
-            # Use specialized exporter for PPh 23
-            if result.document_type in ['pph23', 'pph 23', 'pph_23']:
-                from exporters.pph23_exporter import PPh23Exporter
-                exporter = PPh23Exporter()
-                success = exporter.export_to_excel(result_data, str(export_path))
-            # Use specialized exporter for PPh 21
-            elif result.document_type in ['pph21', 'pph 21', 'pph_21']:
-                from exporters.pph21_exporter import PPh21Exporter
-                exporter = PPh21Exporter()
-                success = exporter.export_to_excel(result_data, str(export_path))
-            # Use specialized exporter for Faktur Pajak
-            elif result.document_type in ['faktur_pajak', 'faktur pajak']:
-                from exporters.faktur_pajak_exporter import FakturPajakExporter
-                exporter = FakturPajakExporter()
-                success = exporter.export_to_excel(result_data, str(export_path))
-            # Use specialized exporter for Invoice
-            elif result.document_type in ['invoice', 'invoice document']:
-                from exporters.invoice_exporter import InvoiceExporter
-                exporter = InvoiceExporter()
-                success = exporter.export_to_excel(result_data, str(export_path))
-            # Use specialized exporter for Rekening Koran
-            elif result.document_type in ['rekening_koran', 'rekening koran']:
-                from exporters.rekening_koran_exporter import RekeningKoranExporter
-                exporter = RekeningKoranExporter()
-                success = exporter.export_to_excel(result_data, str(export_path))
-            else:
-                # Generic table format for other types
-                success = create_batch_excel_export(
-                    batch_results=[result_data],
-                    output_path=str(export_path),
-                    document_type=result.document_type
-                )
-        else:  # PDF
-            # Use specialized exporter for Faktur Pajak
-            if result.document_type == 'faktur_pajak':
-                from exporters.faktur_pajak_exporter import FakturPajakExporter
-                exporter = FakturPajakExporter()
-                success = exporter.export_to_pdf(result_data, str(export_path))
-            # Use specialized exporter for PPh 23
-            elif result.document_type in ['pph23', 'pph 23', 'pph_23']:
-                from exporters.pph23_exporter import PPh23Exporter
-                exporter = PPh23Exporter()
-                success = exporter.export_to_pdf(result_data, str(export_path))
-            # Use specialized exporter for PPh 21
-            elif result.document_type in ['pph21', 'pph 21', 'pph_21']:
-                from exporters.pph21_exporter import PPh21Exporter
-                exporter = PPh21Exporter()
-                success = exporter.export_to_pdf(result_data, str(export_path))
-            # Use specialized exporter for Rekening Koran
-            elif result.document_type in ['rekening_koran', 'rekening koran']:
-                from exporters.rekening_koran_exporter import RekeningKoranExporter
-                exporter = RekeningKoranExporter()
-                success = exporter.export_to_pdf(result_data, str(export_path))
-            # Use specialized exporter for Invoice
-            elif result.document_type in ['invoice', 'invoice document']:
-                from exporters.invoice_exporter import InvoiceExporter
-                exporter = InvoiceExporter()
-                success = exporter.export_to_pdf(result_data, str(export_path))
-            else:
-                # For other document types, use batch format (table)
-                success = create_batch_pdf_export(
-                    batch_results=[result_data],
-                    output_path=str(export_path),
-                    document_type=result.document_type
-                )
+        with span("export", document_type=result.document_type or "unknown", format=format) as export_span:
+            if format == 'excel':
+                # Use specialized exporter for PPh 23
+                if result.document_type in ['pph23', 'pph 23', 'pph_23']:
+                    from exporters.pph23_exporter import PPh23Exporter
+                    exporter = PPh23Exporter()
+                    success = exporter.export_to_excel(result_data, str(export_path))
+                # Use specialized exporter for PPh 21
+                elif result.document_type in ['pph21', 'pph 21', 'pph_21']:
+                    from exporters.pph21_exporter import PPh21Exporter
+                    exporter = PPh21Exporter()
+                    success = exporter.export_to_excel(result_data, str(export_path))
+                # Use specialized exporter for Faktur Pajak
+                elif result.document_type in ['faktur_pajak', 'faktur pajak']:
+                    from exporters.faktur_pajak_exporter import FakturPajakExporter
+                    exporter = FakturPajakExporter()
+                    success = exporter.export_to_excel(result_data, str(export_path))
+                # Use specialized exporter for Invoice
+                elif result.document_type in ['invoice', 'invoice document']:
+                    from exporters.invoice_exporter import InvoiceExporter
+                    exporter = InvoiceExporter()
+                    success = exporter.export_to_excel(result_data, str(export_path))
+                # Use specialized exporter for Rekening Koran
+                elif result.document_type in ['rekening_koran', 'rekening koran']:
+                    from exporters.rekening_koran_exporter import RekeningKoranExporter
+                    exporter = RekeningKoranExporter()
+                    success = exporter.export_to_excel(result_data, str(export_path))
+                else:
+                    # Generic table format for other types
+                    success = create_batch_excel_export(
+                        batch_results=[result_data],
+                        output_path=str(export_path),
+                        document_type=result.document_type
+                    )
+            else:  # PDF
+                # Use specialized exporter for Faktur Pajak
+                if result.document_type == 'faktur_pajak':
+                    from exporters.faktur_pajak_exporter import FakturPajakExporter
+                    exporter = FakturPajakExporter()
+                    success = exporter.export_to_pdf(result_data, str(export_path))
+                # Use specialized exporter for PPh 23
+                elif result.document_type in ['pph23', 'pph 23', 'pph_23']:
+                    from exporters.pph23_exporter import PPh23Exporter
+                    exporter = PPh23Exporter()
+                    success = exporter.export_to_pdf(result_data, str(export_path))
+                # Use specialized exporter for PPh 21
+                elif result.document_type in ['pph21', 'pph 21', 'pph_21']:
+                    from exporters.pph21_exporter import PPh21Exporter
+                    exporter = PPh21Exporter()
+                    success = exporter.export_to_pdf(result_data, str(export_path))
+                # Use specialized exporter for Rekening Koran
+                elif result.document_type in ['rekening_koran', 'rekening koran']:
+                    from exporters.rekening_koran_exporter import RekeningKoranExporter
+                    exporter = RekeningKoranExporter()
+                    success = exporter.export_to_pdf(result_data, str(export_path))
+                # Use specialized exporter for Invoice
+                elif result.document_type in ['invoice', 'invoice document']:
+                    from exporters.invoice_exporter import InvoiceExporter
+                    exporter = InvoiceExporter()
+                    success = exporter.export_to_pdf(result_data, str(export_path))
+                else:
+                    # For other document types, use batch format (table)
+                    success = create_batch_pdf_export(
+                        batch_results=[result_data],
+                        output_path=str(export_path),
+                        document_type=result.document_type
+                    )
+            export_span.end(error=not success)
         
         if not success:
             raise HTTPException(status_code=500, detail=f"Failed to create {format.upper()} export")
@@ -185,153 +206,154 @@ async def export_batch(
         if batch.user_id != current_user.id and not current_user.is_admin:
             raise HTTPException(status_code=403, detail="Not authorized to export this batch")
         
-        # Get all scan results for this batch
-        results = db.query(DBScanResult).filter(DBScanResult.batch_id == batch_id).all()
-        if not results:
+        # Only per-type counts up front; result rows are streamed into the exporter
+        type_counts = batch_document_type_counts(db, batch_id)
+        if not type_counts:
             raise HTTPException(status_code=404, detail="No scan results found for this batch")
-        
-        # Optimization: Fetch all file info in one query to avoid N+1 problem
-        file_ids = [r.document_file_id for r in results]
-        file_infos = db.query(DocumentFile).filter(DocumentFile.id.in_(file_ids)).all()
-        file_info_map = {f.id: f for f in file_infos}
+        total_results = sum(type_counts.values())
 
-        # Prepare results data for export
-        results_data = []
-        for r in results:
-            file_info = file_info_map.get(r.document_file_id)
-            result_dict = {
-                'id': r.id,
-                'batch_id': r.batch_id,
-                'filename': file_info.name if file_info else 'Unknown',
-                'original_filename': file_info.name if file_info else 'Unknown',
-                'document_type': r.document_type or 'Unknown',
-                'confidence': r.confidence or 0,
-                'extracted_data': r.extracted_data or {},
-                'extracted_text': r.extracted_text or '',
-                'created_at': r.created_at.isoformat() if r.created_at else None,
-                'processing_time': r.total_processing_time or 0.0,
-                'ocr_engine': r.ocr_engine_used or 'Unknown'
-            }
-            results_data.append(result_dict)
-        
-        # Create filename for batch export
-        export_filename = f"batch_{batch_id[:8]}_results.{format if format == 'pdf' else 'xlsx'}"
-        export_path = EXPORTS_DIR / export_filename
+        def batch_rows(exporter=None) -> BatchExportRows:
+            return BatchExportRows(db, batch_id, exporter=exporter, count=total_results)
         
         # Detect document type for specialized export
-        document_types = [r.get('document_type', '').lower() for r in results_data]
-        all_same_type = len(set(document_types)) == 1 and len(document_types) > 0
-        primary_doc_type = document_types[0] if all_same_type else None
-        
-        # Create export
+        all_same_type = len(type_counts) == 1
+        primary_doc_type = next(iter(type_counts)) if all_same_type else None
+
+        # Artifact type (mixed PDF batches are a ZIP of per-type PDFs)
         if format == 'excel':
-            # Check if we should use specialized exporter for PPh 23
-            if all_same_type and primary_doc_type in ['pph23', 'pph 23']:
-                try:
-                    # Use PPh 23 specialized exporter
-                    from exporters.pph23_exporter import PPh23Exporter
-                    exporter = PPh23Exporter()
-                    logger.info(f"📊 Using PPh23Exporter for batch {batch_id}")
-                    success = exporter.batch_export_to_excel(batch_id, results_data, str(export_path))
-                except Exception as e:
-                    logger.error(f"❌ PPh23 batch export failed: {e}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"PPh23 batch export failed: {str(e)}")
-            # Check if we should use specialized exporter for PPh 21
-            elif all_same_type and primary_doc_type in ['pph21', 'pph 21']:
-                try:
-                    # Use PPh 21 specialized exporter
-                    from exporters.pph21_exporter import PPh21Exporter
-                    exporter = PPh21Exporter()
-                    logger.info(f"📊 Using PPh21Exporter for batch {batch_id}")
-                    success = exporter.batch_export_to_excel(batch_id, results_data, str(export_path))
-                except Exception as e:
-                    logger.error(f"❌ PPh21 batch export failed: {e}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"PPh21 batch export failed: {str(e)}")
-            # Check if we should use specialized exporter for Invoice
-            elif all_same_type and primary_doc_type in ['invoice', 'invoice document']:
-                try:
-                    # Use Invoice specialized exporter
-                    from exporters.invoice_exporter import InvoiceExporter
-                    exporter = InvoiceExporter()
-                    logger.info(f"📊 Using InvoiceExporter for batch {batch_id}")
-                    success = exporter.batch_export_to_excel(batch_id, results_data, str(export_path))
-                except Exception as e:
-                    logger.error(f"❌ Invoice batch export failed: {e}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"Invoice batch export failed: {str(e)}")
-            # Check if we should use specialized exporter for Rekening Koran
-            elif all_same_type and primary_doc_type in ['rekening_koran', 'rekening koran']:
-                try:
-                    # Use Rekening Koran specialized exporter
-                    from exporters.rekening_koran_exporter import RekeningKoranExporter
-                    exporter = RekeningKoranExporter()
-                    logger.info(f"📊 Using RekeningKoranExporter for batch {batch_id}")
-                    success = exporter.batch_export_to_excel(batch_id, results_data, str(export_path))
-                except Exception as e:
-                    logger.error(f"❌ Rekening Koran batch export failed: {e}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"Rekening Koran batch export failed: {str(e)}")
-            # Check if we should use specialized exporter for Faktur Pajak
-            elif all_same_type and primary_doc_type in ['faktur_pajak', 'faktur pajak']:
-                try:
-                    # Use Faktur Pajak specialized exporter (with items support!)
-                    from exporters.faktur_pajak_exporter import FakturPajakExporter
-                    exporter = FakturPajakExporter()
-                    logger.info(f"📊 Using FakturPajakExporter for batch {batch_id}")
-                    success = exporter.batch_export_to_excel(batch_id, results_data, str(export_path))
-                except Exception as e:
-                    logger.error(f"❌ Faktur Pajak batch export failed: {e}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"Faktur Pajak batch export failed: {str(e)}")
-            else:
-                # Use generic table format for other types
-                success = create_batch_excel_export(
-                    batch_results=results_data,
-                    output_path=str(export_path),
-                    document_type=primary_doc_type if all_same_type else 'mixed'
-                )
-        else:  # PDF
-            # Use specialized batch exporters for each document type
-            if all_same_type and primary_doc_type == 'faktur_pajak' and len(results_data) > 0:
-                # Use professional document template for Faktur Pajak
-                from exporters.faktur_pajak_exporter import FakturPajakExporter
-                exporter = FakturPajakExporter()
-                success = exporter.export_batch_to_pdf(results_data, str(export_path))
-            elif all_same_type and primary_doc_type in ['pph23', 'pph 23'] and len(results_data) > 0:
-                # Use PPh 23 specialized batch exporter (formal format, no table)
-                from exporters.pph23_exporter import PPh23Exporter
-                exporter = PPh23Exporter()
-                success = exporter.batch_export_to_pdf(batch_id, results_data, str(export_path))
-            elif all_same_type and primary_doc_type in ['pph21', 'pph 21'] and len(results_data) > 0:
-                # Use PPh 21 specialized batch exporter (formal format, no table)
-                from exporters.pph21_exporter import PPh21Exporter
-                exporter = PPh21Exporter()
-                success = exporter.batch_export_to_pdf(batch_id, results_data, str(export_path))
-            elif all_same_type and primary_doc_type in ['rekening_koran', 'rekening koran'] and len(results_data) > 0:
-                # Use Rekening Koran specialized batch exporter (formal format, no table)
-                from exporters.rekening_koran_exporter import RekeningKoranExporter
-                exporter = RekeningKoranExporter()
-                success = exporter.batch_export_to_pdf(batch_id, results_data, str(export_path))
-            elif all_same_type and primary_doc_type in ['invoice', 'invoice document'] and len(results_data) > 0:
-                # Use Invoice specialized batch exporter (formal format, no table)
-                from exporters.invoice_exporter import InvoiceExporter
-                exporter = InvoiceExporter()
-                success = exporter.batch_export_to_pdf(batch_id, results_data, str(export_path))
-            else:
-                # Use table format for mixed or other document types
-                success = create_batch_pdf_export(
-                    batch_results=results_data,
-                    output_path=str(export_path),
-                    document_type=primary_doc_type if all_same_type else 'mixed'
-                )
+            extension, media_type = 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        elif all_same_type:
+            extension, media_type = 'pdf', 'application/pdf'
+        else:
+            extension, media_type = 'zip', 'application/zip'
+        
+        def build_export(export_path: str) -> bool:
+            """Render the batch into export_path (a temp file published by the artifact manager)"""
+            with span("export", document_type=primary_doc_type or "mixed", format=format, documents=total_results) as export_span:
+                if format == 'excel':
+                    # Check if we should use specialized exporter for PPh 23
+                    if all_same_type and primary_doc_type in ['pph23', 'pph 23']:
+                        try:
+                            # Use PPh 23 specialized exporter
+                            from exporters.pph23_exporter import PPh23Exporter
+                            exporter = PPh23Exporter()
+                            logger.info(f"📊 Using PPh23Exporter for batch {batch_id}")
+                            success = exporter.batch_export_to_excel(batch_id, batch_rows(exporter), export_path)
+                        except Exception as e:
+                            logger.error(f"❌ PPh23 batch export failed: {e}", exc_info=True)
+                            raise HTTPException(status_code=500, detail=f"PPh23 batch export failed: {str(e)}")
+                    # Check if we should use specialized exporter for PPh 21
+                    elif all_same_type and primary_doc_type in ['pph21', 'pph 21']:
+                        try:
+                            # Use PPh 21 specialized exporter
+                            from exporters.pph21_exporter import PPh21Exporter
+                            exporter = PPh21Exporter()
+                            logger.info(f"📊 Using PPh21Exporter for batch {batch_id}")
+                            success = exporter.batch_export_to_excel(batch_id, batch_rows(exporter), export_path)
+                        except Exception as e:
+                            logger.error(f"❌ PPh21 batch export failed: {e}", exc_info=True)
+                            raise HTTPException(status_code=500, detail=f"PPh21 batch export failed: {str(e)}")
+                    # Check if we should use specialized exporter for Invoice
+                    elif all_same_type and primary_doc_type in ['invoice', 'invoice document']:
+                        try:
+                            # Use Invoice specialized exporter
+                            from exporters.invoice_exporter import InvoiceExporter
+                            exporter = InvoiceExporter()
+                            logger.info(f"📊 Using InvoiceExporter for batch {batch_id}")
+                            success = exporter.batch_export_to_excel(batch_id, batch_rows(exporter), export_path)
+                        except Exception as e:
+                            logger.error(f"❌ Invoice batch export failed: {e}", exc_info=True)
+                            raise HTTPException(status_code=500, detail=f"Invoice batch export failed: {str(e)}")
+                    # Check if we should use specialized exporter for Rekening Koran
+                    elif all_same_type and primary_doc_type in ['rekening_koran', 'rekening koran']:
+                        try:
+                            # Use Rekening Koran specialized exporter
+                            from exporters.rekening_koran_exporter import RekeningKoranExporter
+                            exporter = RekeningKoranExporter()
+                            logger.info(f"📊 Using RekeningKoranExporter for batch {batch_id}")
+                            success = exporter.batch_export_to_excel(batch_id, batch_rows(exporter), export_path)
+                        except Exception as e:
+                            logger.error(f"❌ Rekening Koran batch export failed: {e}", exc_info=True)
+                            raise HTTPException(status_code=500, detail=f"Rekening Koran batch export failed: {str(e)}")
+                    # Check if we should use specialized exporter for Faktur Pajak
+                    elif all_same_type and primary_doc_type in ['faktur_pajak', 'faktur pajak']:
+                        try:
+                            # Use Faktur Pajak specialized exporter (with items support!)
+                            from exporters.faktur_pajak_exporter import FakturPajakExporter
+                            exporter = FakturPajakExporter()
+                            logger.info(f"📊 Using FakturPajakExporter for batch {batch_id}")
+                            success = exporter.batch_export_to_excel(batch_id, batch_rows(exporter), export_path)
+                        except Exception as e:
+                            logger.error(f"❌ Faktur Pajak batch export failed: {e}", exc_info=True)
+                            raise HTTPException(status_code=500, detail=f"Faktur Pajak batch export failed: {str(e)}")
+                    elif not all_same_type:
+                        # Mixed batch: one sheet per document type, rendered concurrently by the specialized exporters
+                        logger.info(f"📊 Using CompositeExporter for mixed batch {batch_id}: {type_counts}")
+                        success = CompositeExporter().export_batch(batch_id, type_counts, format, export_path)
+                    else:
+                        # Use generic table format for other types
+                        success = create_batch_excel_export(
+                            batch_results=batch_rows(),
+                            output_path=export_path,
+                            document_type=primary_doc_type if all_same_type else 'mixed'
+                        )
+                else:  # PDF
+                    # Use specialized batch exporters for each document type
+                    if all_same_type and primary_doc_type == 'faktur_pajak':
+                        # Use professional document template for Faktur Pajak
+                        from exporters.faktur_pajak_exporter import FakturPajakExporter
+                        exporter = FakturPajakExporter()
+                        success = exporter.export_batch_to_pdf(batch_rows(exporter), export_path)
+                    elif all_same_type and primary_doc_type in ['pph23', 'pph 23']:
+                        # Use PPh 23 specialized batch exporter (formal format, no table)
+                        from exporters.pph23_exporter import PPh23Exporter
+                        exporter = PPh23Exporter()
+                        success = exporter.batch_export_to_pdf(batch_id, batch_rows(exporter), export_path)
+                    elif all_same_type and primary_doc_type in ['pph21', 'pph 21']:
+                        # Use PPh 21 specialized batch exporter (formal format, no table)
+                        from exporters.pph21_exporter import PPh21Exporter
+                        exporter = PPh21Exporter()
+                        success = exporter.batch_export_to_pdf(batch_id, batch_rows(exporter), export_path)
+                    elif all_same_type and primary_doc_type in ['rekening_koran', 'rekening koran']:
+                        # Use Rekening Koran specialized batch exporter (formal format, no table)
+                        from exporters.rekening_koran_exporter import RekeningKoranExporter
+                        exporter = RekeningKoranExporter()
+                        success = exporter.batch_export_to_pdf(batch_id, batch_rows(exporter), export_path)
+                    elif all_same_type and primary_doc_type in ['invoice', 'invoice document']:
+                        # Use Invoice specialized batch exporter (formal format, no table)
+                        from exporters.invoice_exporter import InvoiceExporter
+                        exporter = InvoiceExporter()
+                        success = exporter.batch_export_to_pdf(batch_id, batch_rows(exporter), export_path)
+                    elif not all_same_type:
+                        # Mixed batch: ZIP with one specialized PDF per document type
+                        logger.info(f"📄 Using CompositeExporter for mixed batch {batch_id}: {type_counts}")
+                        success = CompositeExporter().export_batch(batch_id, type_counts, format, export_path)
+                    else:
+                        # Use table format for other document types
+                        success = create_batch_pdf_export(
+                            batch_results=batch_rows(),
+                            output_path=export_path,
+                            document_type=primary_doc_type if all_same_type else 'mixed'
+                        )
+                export_span.end(error=not success)
+            return success
 
-        if not success:
+        # Serve the published artifact for this results version; concurrent identical requests share one build
+        version = batch_results_version(db, batch_id)
+        artifact = await asyncio.to_thread(
+            get_artifact_manager().get_or_build, f"batch_{batch_id}", version, extension, build_export
+        )
+
+        if artifact is None:
             raise HTTPException(status_code=500, detail=f"Failed to create batch {format.upper()} export")
         
-        logger.info(f"✅ Created batch {format} export for {len(results_data)} results")
+        logger.info(f"✅ Batch {format} export ready for {total_results} results: {artifact.name}")
         
         # Return file
         return FileResponse(
-            path=str(export_path),
-            filename=export_filename,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' if format == 'excel' else 'application/pdf'
+            path=str(artifact),
+            filename=f"batch_{batch_id[:8]}_results.{extension}",
+            media_type=media_type
         )
         
     except HTTPException:
@@ -390,6 +412,7 @@ async def export_enhanced_excel(
             'processing_time': result.total_processing_time or 0.0,
             'ocr_engine': result.ocr_engine_used or 'Unknown'
         }
+        _attach_canonical_fields(db, [result_data])
         
         # Create filename
         safe_filename = "".join(c for c in (file_info.name if file_info else 'document') 
@@ -398,11 +421,12 @@ async def export_enhanced_excel(
         export_path = EXPORTS_DIR / export_filename
         
         # Generate enhanced Excel using batch export function with single result
-        success = create_batch_excel_export(
-            batch_results=[result_data],
-            output_path=str(export_path),
-            document_type=result.document_type
-        )
+        with span("export", document_type=result.document_type or "unknown", format="excel"):
+            success = create_batch_excel_export(
+                batch_results=[result_data],
+                output_path=str(export_path),
+                document_type=result.document_type
+            )
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to create enhanced Excel export")
@@ -476,6 +500,7 @@ async def export_enhanced_pdf(
             'include_watermark': include_watermark,
             'watermark_text': watermark_text
         }
+        _attach_canonical_fields(db, [result_data])
         
         # Create filename
         safe_filename = "".join(c for c in (file_info.name if file_info else 'document') 
@@ -484,11 +509,12 @@ async def export_enhanced_pdf(
         export_path = EXPORTS_DIR / export_filename
         
         # Generate enhanced PDF using batch export function with single result
-        success = create_batch_pdf_export(
-            batch_results=[result_data],
-            output_path=str(export_path),
-            document_type=result.document_type
-        )
+        with span("export", document_type=result.document_type or "unknown", format="pdf"):
+            success = create_batch_pdf_export(
+                batch_results=[result_data],
+                output_path=str(export_path),
+                document_type=result.document_type
+            )
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to create enhanced PDF export")
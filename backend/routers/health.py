@@ -4,14 +4,17 @@ Handles health checks, cache statistics, and system monitoring
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+import hmac
 import logging
 
+from config import settings
 from database import User, SessionLocal
-from auth import get_current_active_user
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from auth import get_current_active_user, get_current_user, get_db, oauth2_scheme
+from instrumentation import metrics
+from rate_limiting import limiter
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +29,8 @@ except ImportError:
 # Create router
 router = APIRouter(prefix="/api", tags=["health"])
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Prometheus scrape endpoint lives at the conventional un-prefixed path
+metrics_router = APIRouter(tags=["health"])
 
 
 # ==================== Health Check Endpoints ====================
@@ -80,6 +83,22 @@ async def health_check():
     return health_data
 
 
+async def require_metrics_access(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Dependency: bearer METRICS_SCRAPE_TOKEN (Prometheus) or an admin user's JWT"""
+    scrape_token = settings.metrics_scrape_token
+    if scrape_token and hmac.compare_digest(token.encode("utf-8"), scrape_token.encode("utf-8")):
+        return
+    user = await get_current_user(token, db)
+    if not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    """Per-stage timings, RSS deltas, pages and LLM tokens in the Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 # ==================== Cache Management Endpoints ====================
 
 @router.get("/cache/stats")
@@ -87,7 +106,17 @@ async def get_cache_statistics(current_user: User = Depends(get_current_active_u
     """Get comprehensive Redis cache statistics (requires authentication)"""
     if not REDIS_AVAILABLE or not cache:
         raise HTTPException(status_code=503, detail="Cache service not available")
-    return cache.get_cache_stats()
+    return cache.get_cache_stats(count_keys=True)
+
+
+@router.get("/cache/smart-mapper/stats")
+async def get_smart_mapper_cache_statistics(current_user: User = Depends(get_current_active_user)):
+    """Get Smart Mapper LLM response cache hit/miss statistics (requires authentication)"""
+    try:
+        from smart_mapper import smart_mapper_service
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Smart Mapper not available")
+    return smart_mapper_service.response_cache.get_stats()
 
 
 @router.post("/cache/clear")
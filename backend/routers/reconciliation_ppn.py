@@ -9,11 +9,11 @@ Comprehensive reconciliation for Indonesian tax documents:
 
 from fastapi import APIRouter, HTTPException, Depends, Body, UploadFile, File, Form, Request
 from fastapi.responses import StreamingResponse
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from rate_limiting import limiter
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
+import asyncio
 import uuid
 import logging
 import io
@@ -33,9 +33,10 @@ from excel_reader_service import excel_reader_service
 import pandas as pd
 import json
 from openai import OpenAI
+from llm_scheduler import get_llm_scheduler, llm_identity, usage_total_tokens
+from payload_compiler import estimate_tokens
 
 logger = logging.getLogger(__name__)
-limiter = Limiter(key_func=get_remote_address)
 
 # Directory for temporary file storage
 TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "temp_uploads")
@@ -506,13 +507,16 @@ async def run_reconciliation_with_files(
         try:
             if use_ai:
                 logger.info("🤖 Using AI-Enhanced Reconciliation with GPT-4o (with fallback)")
-                reconciliation_result = run_ppn_ai_reconciliation(
-                    faktur_pajak_path=faktur_pajak_path,
-                    bukti_potong_path=bukti_potong_path,
-                    rekening_koran_path=rekening_koran_path,
-                    company_npwp=project.company_npwp,
-                    use_ai=True
-                )
+                # Interactive priority in the LLM scheduler; runs off the event loop while queued
+                with llm_identity(current_user.id, priority="interactive"):
+                    reconciliation_result = await asyncio.to_thread(
+                        run_ppn_ai_reconciliation,
+                        faktur_pajak_path=faktur_pajak_path,
+                        bukti_potong_path=bukti_potong_path,
+                        rekening_koran_path=rekening_koran_path,
+                        company_npwp=project.company_npwp,
+                        use_ai=True
+                    )
             else:
                 logger.info("⚙️ Using Rule-Based Reconciliation")
                 reconciliation_result = run_ppn_reconciliation(
@@ -1293,12 +1297,21 @@ async def _chat_with_ai(prompt: str, session_id: str, db: Session) -> str:
         # Add current user prompt
         messages.append({"role": "user", "content": prompt})
 
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=messages,
-            max_tokens=2000,
-            temperature=0.7,
-        )
+        reserved_tokens = estimate_tokens("".join(m["content"] for m in messages), "gpt-4.1") + 2000
+
+        def _complete():
+            with get_llm_scheduler().reserve(reserved_tokens) as reservation:
+                response = client.chat.completions.create(
+                    model="gpt-4.1",
+                    messages=messages,
+                    max_tokens=2000,
+                    temperature=0.7,
+                )
+                reservation.settle(usage_total_tokens(getattr(response, "usage", None)))
+                return response
+
+        # Waiting for the shared LLM budget must not block the event loop
+        response = await asyncio.to_thread(_complete)
 
         return response.choices[0].message.content or "Maaf, saya tidak bisa menjawab saat ini."
 
@@ -1441,13 +1454,15 @@ async def chat_reconciliation(
 
                 try:
                     if use_ai:
-                        reconciliation_result = run_ppn_ai_reconciliation(
-                            faktur_pajak_path=faktur_pajak_path,
-                            bukti_potong_path=bukti_potong_path,
-                            rekening_koran_path=rekening_koran_path,
-                            company_npwp=company_npwp,
-                            use_ai=True
-                        )
+                        with llm_identity(current_user.id, priority="interactive"):
+                            reconciliation_result = await asyncio.to_thread(
+                                run_ppn_ai_reconciliation,
+                                faktur_pajak_path=faktur_pajak_path,
+                                bukti_potong_path=bukti_potong_path,
+                                rekening_koran_path=rekening_koran_path,
+                                company_npwp=company_npwp,
+                                use_ai=True
+                            )
                     else:
                         reconciliation_result = run_ppn_reconciliation(
                             faktur_pajak_path=faktur_pajak_path,
@@ -1496,7 +1511,8 @@ async def chat_reconciliation(
             else:
                 # No files — use OpenAI for conversational chat about reconciliation
                 if prompt.strip():
-                    assistant_content = await _chat_with_ai(prompt, session_id, db)
+                    with llm_identity(current_user.id, priority="interactive"):
+                        assistant_content = await _chat_with_ai(prompt, session_id, db)
                 else:
                     assistant_content = "Silakan upload file Excel untuk memulai rekonsiliasi, atau tanyakan sesuatu tentang rekonsiliasi pajak."
 
@@ -8,6 +8,7 @@ from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException, UploadFile
 from pathlib import Path
 from config import settings
+from pdf_probe import probe_pdf_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -56,18 +57,20 @@ class FileSecurityValidator:
                 logger.warning(f"ClamAV not available: {e}. Virus scanning disabled.")
                 self.enable_virus_scan = False
     
-    async def validate_file(self, file: UploadFile, fast_mode: bool = True) -> Dict[str, any]:
+    async def validate_file(self, file: UploadFile, fast_mode: bool = True,
+                            content: Optional[bytes] = None) -> Dict[str, any]:
         """
         File validation with two modes:
         - Fast mode (default): Only essential checks (size, extension, PDF page count)
         - Full mode: Comprehensive validation (MIME type, virus scan, integrity, advanced checks)
 
         Fast mode is 10-20x faster and recommended for trusted uploads.
+        Pass content when the caller already read the upload, so it is not read into memory twice.
         """
         try:
-            # Read file content
-            content = await file.read()
-            await file.seek(0)  # Reset file pointer
+            if content is None:
+                content = await file.read()
+                await file.seek(0)  # Reset file pointer
 
             validation_result = {
                 "filename": file.filename,
@@ -203,12 +206,11 @@ class FileSecurityValidator:
     def _validate_pdf_page_count(self, content: bytes, filename: str) -> Dict[str, any]:
         """Validate PDF page count against Google Document AI limits"""
         try:
-            import io
-            import PyPDF2
-
-            pdf_file = io.BytesIO(content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            page_count = len(pdf_reader.pages)
+            # Single-pass probe - the record is reused by batching, chunking and OCR
+            probe = probe_pdf_bytes(content)
+            if probe.error:
+                raise ValueError(probe.error)
+            page_count = probe.page_count
 
             max_pages = settings.max_pdf_pages_per_file  # 30 pages (Google Document AI imageless mode limit)
 
@@ -218,14 +220,18 @@ class FileSecurityValidator:
                     "message": f"❌ PDF has {page_count} pages. Maximum allowed: {max_pages} pages (Google Document AI limit). Please split your file into multiple parts: Part 1 (pages 1-{max_pages}), Part 2 (pages {max_pages+1}-{max_pages*2}), etc.",
                     "page_count": page_count,
                     "max_pages": max_pages,
-                    "suggestion": f"Split into {(page_count + max_pages - 1) // max_pages} files"
+                    "suggestion": f"Split into {(page_count + max_pages - 1) // max_pages} files",
+                    "file_hash": probe.file_hash,
                 }
 
             return {
                 "passed": True,
                 "message": f"PDF page count validation passed ({page_count} pages)",
                 "page_count": page_count,
-                "max_pages": max_pages
+                "max_pages": max_pages,
+                "file_hash": probe.file_hash,
+                "encrypted": probe.encrypted,
+                "producer": probe.producer,
             }
 
         except Exception as e:
@@ -0,0 +1,329 @@
+"""
+Admin Reporting Service
+Constant-query-count reads for the admin pages
+
+- dashboard: one statement, conditional aggregation (SUM(CASE ...)) per table
+- users: one statement, batches pre-aggregated with GROUP BY user_id
+- user activity: one statement, per-batch file count and first five names via window functions
+- StatsSnapshot keeps the dashboard counters in memory for a short TTL and applies
+  batch/user/file changes incrementally (SQLAlchemy mapper events) in between
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, case, event, func, inspect, true
+from sqlalchemy.orm import Session
+
+from database import Batch, DocumentFile, User
+
+logger = logging.getLogger(__name__)
+
+FAILED_STATUSES = ("failed", "error")
+RECENT_DAYS = 7
+ACTIVITY_FILE_NAMES = 5
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+# ==================== Aggregated queries ====================
+
+def query_dashboard_counters(db: Session) -> Dict[str, int]:
+    """All dashboard counters in a single round trip"""
+    since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+
+    users = db.query(
+        func.count(User.id).label("users_total"),
+        _count_if(User.is_active.is_(True)).label("users_active"),
+        _count_if(User.is_admin.is_(True)).label("users_admin"),
+        _count_if(User.created_at >= since).label("users_new_this_week"),
+    ).subquery()
+    batches = db.query(
+        func.count(Batch.id).label("batches_total"),
+        _count_if(Batch.status == "completed").label("batches_completed"),
+        _count_if(Batch.status == "processing").label("batches_processing"),
+        _count_if(Batch.status == "partial").label("batches_partial"),
+        _count_if(Batch.status.in_(FAILED_STATUSES)).label("batches_failed"),
+        _count_if(Batch.created_at >= since).label("batches_this_week"),
+    ).subquery()
+    files = db.query(func.count(DocumentFile.id).label("files_total")).subquery()
+
+    row = (
+        db.query(users, batches, files)
+        .select_from(users)
+        .join(batches, true())
+        .join(files, true())
+        .one()
+    )
+    return {key: int(value or 0) for key, value in row._mapping.items()}
+
+
+def format_dashboard(counters: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "users": {
+            "total": counters["users_total"],
+            "active": counters["users_active"],
+            "inactive": counters["users_total"] - counters["users_active"],
+            "admins": counters["users_admin"],
+            "new_this_week": counters["users_new_this_week"]
+        },
+        "batches": {
+            "total": counters["batches_total"],
+            "completed": counters["batches_completed"],
+            "processing": counters["batches_processing"],
+            "partial": counters["batches_partial"],
+            "failed": counters["batches_failed"],
+            "this_week": counters["batches_this_week"]
+        },
+        "files": {
+            "total": counters["files_total"]
+        }
+    }
+
+
+def query_user_summaries(db: Session) -> List[Dict[str, Any]]:
+    """Every user with total batches and last activity (one statement)"""
+    batch_stats = (
+        db.query(
+            Batch.user_id.label("user_id"),
+            func.count(Batch.id).label("total_batches"),
+            func.max(Batch.created_at).label("last_activity"),
+        )
+        .group_by(Batch.user_id)
+        .subquery()
+    )
+    rows = (
+        db.query(User, batch_stats.c.total_batches, batch_stats.c.last_activity)
+        .outerjoin(batch_stats, batch_stats.c.user_id == User.id)
+        .all()
+    )
+    return [
+        {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "full_name": user.full_name,
+            "is_active": user.is_active,
+            "is_admin": user.is_admin,
+            "created_at": user.created_at,
+            "last_login": user.last_login,
+            "total_batches": total_batches or 0,
+            "last_activity": last_activity
+        }
+        for user, total_batches, last_activity in rows
+    ]
+
+
+def query_user_batches(db: Session, user_id: str) -> List[Dict[str, Any]]:
+    """
+    A user's batches (newest first) with file count and first five file names (one statement)
+    Files are ranked per batch with ROW_NUMBER(); COUNT(*) OVER gives the total without a second pass
+    """
+    ranked_files = (
+        db.query(
+            DocumentFile.batch_id.label("batch_id"),
+            DocumentFile.name.label("name"),
+            func.row_number().over(
+                partition_by=DocumentFile.batch_id, order_by=(DocumentFile.created_at, DocumentFile.id)
+            ).label("file_rank"),
+            func.count(DocumentFile.id).over(partition_by=DocumentFile.batch_id).label("file_count"),
+        )
+        .join(Batch, Batch.id == DocumentFile.batch_id)
+        .filter(Batch.user_id == user_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            Batch.id,
+            Batch.status,
+            Batch.created_at,
+            Batch.completed_at,
+            Batch.processed_files,
+            Batch.total_processing_time,
+            ranked_files.c.name,
+            ranked_files.c.file_count,
+        )
+        .outerjoin(
+            ranked_files,
+            and_(ranked_files.c.batch_id == Batch.id, ranked_files.c.file_rank <= ACTIVITY_FILE_NAMES),
+        )
+        .filter(Batch.user_id == user_id)
+        .order_by(Batch.created_at.desc(), Batch.id, ranked_files.c.file_rank)
+        .all()
+    )
+
+    batches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for row in rows:
+        batch = batches.get(row.id)
+        if batch is None:
+            batch = batches[row.id] = {
+                "id": row.id,
+                "status": row.status,
+                "created_at": row.created_at,
+                "completed_at": row.completed_at,
+                "file_count": row.file_count or 0,
+                "processed_files": row.processed_files,
+                "file_names": [],  # First 5 files
+                "processing_time": row.total_processing_time
+            }
+        if row.name is not None:
+            batch["file_names"].append(row.name)
+    return list(batches.values())
+
+
+# ==================== Stats snapshot ====================
+
+class StatsSnapshot:
+    """
+    Dashboard counters cached for ttl seconds
+    Between refreshes, inserts/updates/deletes of Batch, User and DocumentFile rows adjust the
+    counters in place, so admin pages see state changes without re-aggregating. The periodic
+    refresh corrects drift (bulk query.delete(), rolled-back flushes, other worker processes,
+    rows ageing out of the 7-day window).
+    """
+
+    def __init__(self, ttl_seconds: int = 60):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._counters: Optional[Dict[str, int]] = None
+        self._refreshed_at = 0.0
+
+    def get(self, db: Session) -> Dict[str, Any]:
+        with self._lock:
+            if self._counters is not None and time.monotonic() - self._refreshed_at < self.ttl_seconds:
+                return format_dashboard(self._counters)
+        counters = query_dashboard_counters(db)
+        with self._lock:
+            self._counters = counters
+            self._refreshed_at = time.monotonic()
+        return format_dashboard(counters)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._counters = None
+
+    def _apply(self, deltas: Dict[str, int]) -> None:
+        with self._lock:
+            if self._counters is None:
+                return
+            for key, delta in deltas.items():
+                self._counters[key] = self._counters.get(key, 0) + delta
+
+    # ---- incremental updates ----
+
+    @staticmethod
+    def _batch_status_key(status: Optional[str]) -> Optional[str]:
+        status = status or "processing"
+        if status in FAILED_STATUSES:
+            return "batches_failed"
+        if status in ("completed", "processing", "partial"):
+            return f"batches_{status}"
+        return None  # cancelled and other states only count towards the total
+
+    def batch_changed(self, old_status: Optional[str], new_status: Optional[str], created: bool = False,
+                      deleted: bool = False) -> None:
+        deltas: Dict[str, int] = {}
+        old_key = None if created else self._batch_status_key(old_status)
+        new_key = None if deleted else self._batch_status_key(new_status)
+        if old_key:
+            deltas[old_key] = deltas.get(old_key, 0) - 1
+        if new_key:
+            deltas[new_key] = deltas.get(new_key, 0) + 1
+        if created:
+            deltas["batches_total"] = 1
+            deltas["batches_this_week"] = 1
+        if deleted:
+            deltas["batches_total"] = -1
+        self._apply(deltas)
+
+    def user_changed(self, created: bool = False, deleted: bool = False, active_delta: int = 0,
+                     admin_delta: int = 0) -> None:
+        deltas = {"users_active": active_delta, "users_admin": admin_delta}
+        if created:
+            deltas["users_total"] = 1
+            deltas["users_new_this_week"] = 1
+        if deleted:
+            deltas["users_total"] = -1
+        self._apply(deltas)
+
+    def files_changed(self, delta: int) -> None:
+        self._apply({"files_total": delta})
+
+
+def _snapshot_ttl() -> int:
+    try:
+        from config import settings
+        return settings.admin_stats_snapshot_ttl
+    except Exception:
+        return 60
+
+
+stats_snapshot = StatsSnapshot(ttl_seconds=_snapshot_ttl())
+
+
+def _history_change(target, attribute: str):
+    history = inspect(target).attrs[attribute].history
+    if history.added and history.deleted:
+        return history.deleted[0], history.added[0]
+    return None
+
+
+@event.listens_for(Batch, "after_insert")
+def _on_batch_insert(mapper, connection, target):
+    stats_snapshot.batch_changed(None, target.status, created=True)
+
+
+@event.listens_for(Batch, "after_update")
+def _on_batch_update(mapper, connection, target):
+    change = _history_change(target, "status")
+    if change:
+        stats_snapshot.batch_changed(*change)
+
+
+@event.listens_for(Batch, "after_delete")
+def _on_batch_delete(mapper, connection, target):
+    stats_snapshot.batch_changed(target.status, None, deleted=True)
+
+
+@event.listens_for(User, "after_insert")
+def _on_user_insert(mapper, connection, target):
+    stats_snapshot.user_changed(
+        created=True,
+        active_delta=0 if target.is_active is False else 1,
+        admin_delta=1 if target.is_admin else 0,
+    )
+
+
+@event.listens_for(User, "after_update")
+def _on_user_update(mapper, connection, target):
+    active = _history_change(target, "is_active")
+    admin = _history_change(target, "is_admin")
+    stats_snapshot.user_changed(
+        active_delta=(1 if active[1] else -1) if active else 0,
+        admin_delta=(1 if admin[1] else -1) if admin else 0,
+    )
+
+
+@event.listens_for(User, "after_delete")
+def _on_user_delete(mapper, connection, target):
+    stats_snapshot.user_changed(
+        deleted=True,
+        active_delta=0 if target.is_active is False else -1,
+        admin_delta=-1 if target.is_admin else 0,
+    )
+
+
+@event.listens_for(DocumentFile, "after_insert")
+def _on_file_insert(mapper, connection, target):
+    stats_snapshot.files_changed(1)
+
+
+@event.listens_for(DocumentFile, "after_delete")
+def _on_file_delete(mapper, connection, target):
+    stats_snapshot.files_changed(-1)
@@ -12,6 +12,8 @@ import logging
 import os
 import json
 from openai import OpenAI
+from llm_scheduler import get_llm_scheduler, usage_total_tokens
+from payload_compiler import estimate_tokens
 from services.ppn_reconciliation_service import (
     load_excel_to_dataframe,
     split_faktur_pajak,
@@ -147,22 +149,24 @@ class AIReconciliationService:
             prompt = self._build_matching_prompt_a_vs_c(a_data, c_data)
 
             try:
-                response = _get_openai_client().chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert accountant specializing in Indonesian tax document reconciliation. Analyze and match Faktur Pajak Keluaran (Point A) with Bukti Potong (Point C) based on NPWP, vendor names, amounts, and dates. Return matches in JSON format."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.1,
-                    max_tokens=4000
-                )
+                with get_llm_scheduler().reserve(estimate_tokens(prompt, self.model) + 4000) as reservation:
+                    response = _get_openai_client().chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": "You are an expert accountant specializing in Indonesian tax document reconciliation. Analyze and match Faktur Pajak Keluaran (Point A) with Bukti Potong (Point C) based on NPWP, vendor names, amounts, and dates. Return matches in JSON format."
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        response_format={"type": "json_object"},
+                        temperature=0.1,
+                        max_tokens=4000
+                    )
+                    reservation.settle(usage_total_tokens(getattr(response, "usage", None)))
 
                 result = json.loads(response.choices[0].message.content)
                 batch_matches = result.get('matches', [])
@@ -272,22 +276,24 @@ class AIReconciliationService:
             prompt = self._build_matching_prompt_b_vs_e(b_data, e_data)
 
             try:
-                response = _get_openai_client().chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert accountant specializing in payment reconciliation. Match Faktur Pajak Masukan (Point B) with Rekening Koran (Point E) based on amounts, dates (±3 days tolerance), and vendor information. Return matches in JSON format with confidence scores."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.1,
-                    max_tokens=4000
-                )
+                with get_llm_scheduler().reserve(estimate_tokens(prompt, self.model) + 4000) as reservation:
+                    response = _get_openai_client().chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": "You are an expert accountant specializing in payment reconciliation. Match Faktur Pajak Masukan (Point B) with Rekening Koran (Point E) based on amounts, dates (±3 days tolerance), and vendor information. Return matches in JSON format with confidence scores."
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        response_format={"type": "json_object"},
+                        temperature=0.1,
+                        max_tokens=4000
+                    )
+                    reservation.settle(usage_total_tokens(getattr(response, "usage", None)))
 
                 result = json.loads(response.choices[0].message.content)
                 batch_matches = result.get('matches', [])
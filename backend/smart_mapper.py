@@ -8,27 +8,26 @@ import logging
 import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
 from typing import Any, Dict, Optional, List, Tuple
 
 from config import settings
+from docai_index import DocAIDocumentIndex
+from instrumentation import propagate, record_llm_usage, span
+from llm_response_cache import create_llm_response_cache
+from llm_scheduler import get_llm_scheduler, is_rate_limit_error, retry_after_seconds, usage_total_tokens
+from payload_compiler import create_payload_compiler, estimate_tokens
+from streaming_json import IncrementalJSONParser
+from template_registry import CompiledTemplate, get_template_registry
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_PROVIDERS = {"openai", "anthropic"}
 
+SYSTEM_ROLE = "You are a precise data-mapping assistant that outputs strict JSON."
+OUTPUT_REMINDER = "Keluarkan hanya JSON valid sesuai schema output."
 
-def _load_json_file(path: Path) -> Optional[Dict[str, Any]]:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.warning(f"⚠️ Smart Mapper template not found: {path}")
-    except json.JSONDecodeError as exc:
-        logger.error(f"❌ Invalid JSON in template {path}: {exc}")
-    except Exception as exc:  # pragma: no cover - defensive logging
-        logger.error(f"❌ Failed to load template {path}: {exc}")
-    return None
+# Rough completion cost of one mapped transaction row ({"tanggal", "keterangan", "debet", "kredit", "saldo"})
+_OUTPUT_TOKENS_PER_ROW = 60
 
 
 class SmartMapper:
@@ -55,6 +54,15 @@ class SmartMapper:
         self.max_parallel_pages = int(os.getenv("SMART_MAPPER_MAX_PARALLEL_PAGES", "3"))
         self.parallel_enabled = os.getenv("SMART_MAPPER_PARALLEL_ENABLED", "true").lower() in {"1", "true", "yes"}
 
+        # 📡 Truncated rekening koran completions are resumed instead of redone
+        self.max_continuations = int(os.getenv("SMART_MAPPER_MAX_CONTINUATIONS", "3"))
+
+        # 💾 Provider prompt caching - the template's static instructions are sent as a stable prefix
+        # (Anthropic: cache_control breakpoint; OpenAI caches identical prefixes automatically)
+        self.prompt_caching = os.getenv(
+            "SMART_MAPPER_PROMPT_CACHING", str(settings.smart_mapper_prompt_caching)
+        ).lower() in {"1", "true", "yes"}
+
         if self.provider not in SUPPORTED_PROVIDERS:
             logger.error(f"❌ Unsupported Smart Mapper provider: {self.provider}")
             self.enabled = False
@@ -70,8 +78,18 @@ class SmartMapper:
         self._client_initialized = False
         self._claude_client_initialized = False
 
-        template_dir_env = os.getenv("SMART_MAPPER_TEMPLATE_DIR")
-        self.template_dir = Path(template_dir_env) if template_dir_env else Path(__file__).resolve().parent / "templates"
+        # 🗄️ Persistent LLM response cache - identical (model, instructions, payload) skip the round trip
+        self.response_cache = create_llm_response_cache()
+        self._template_fingerprints: Dict[str, Optional[str]] = {}
+
+        # ✂️ Compact payload compiler - TSV tables, deduped text, per-request token budget
+        self.payload_compiler = create_payload_compiler(self.model)
+
+        # 📚 Templates are loaded and their static prompts compiled once; files are re-read only when they change
+        self.templates = get_template_registry()
+        self.template_dir = self.templates.template_dir
+        self.templates.set_prompt_compiler(self._build_instructions)
+        self.templates.add_reload_listener(self._on_template_loaded)
 
         logger.info(f"🤖 Smart Mapper configured: provider={self.provider}, model={self.model}, enabled={self.enabled}")
         if self.claude_api_key:
@@ -225,9 +243,23 @@ class SmartMapper:
     # Template helpers
     # ------------------------------------------------------------------
     def load_template(self, doc_type: str) -> Optional[Dict[str, Any]]:
-        """Load mapping template for the specified document type."""
-        template_path = self.template_dir / f"{doc_type}_template.json"
-        return _load_json_file(template_path)
+        """Mapping template for the specified document type (shared, read-only - served from the registry)."""
+        return self.templates.template(doc_type)
+
+    def _on_template_loaded(self, doc_type: str, compiled: CompiledTemplate) -> None:
+        """Invalidate cached LLM responses when a template file changes on disk."""
+        if self._template_fingerprints.get(doc_type, "") == compiled.fingerprint:
+            return
+        # First load also purges rows persisted under an older template version
+        self.response_cache.invalidate_template(doc_type, compiled.fingerprint)
+        self._template_fingerprints[doc_type] = compiled.fingerprint
+
+    def _instructions_for(self, doc_type: str, template: Dict[str, Any]) -> str:
+        """Static system prompt for template - precompiled unless the caller passed its own template dict"""
+        compiled = self.templates.get(doc_type)
+        if compiled is not None and compiled.template is template and compiled.system_prompt is not None:
+            return compiled.system_prompt
+        return self._build_instructions(doc_type, template)
 
     # ------------------------------------------------------------------
     # Public API
@@ -242,14 +274,38 @@ class SmartMapper:
         fallback_fields: Optional[Dict[str, Any]] = None,
     ) -> Optional[Dict[str, Any]]:
         """Send document JSON + template to the configured LLM and return structured output."""
+        with span("mapping", document_type=doc_type):
+            return self._map_document(
+                doc_type=doc_type,
+                document_json=document_json,
+                template=template,
+                extracted_fields=extracted_fields,
+                fallback_fields=fallback_fields,
+            )
+
+    def _map_document(
+        self,
+        *,
+        doc_type: str,
+        document_json: Dict[str, Any],
+        template: Dict[str, Any],
+        extracted_fields: Optional[Dict[str, Any]] = None,
+        fallback_fields: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
         # ✅ FIX: Use property instead of direct access - triggers lazy loading
         if not self.enabled or not self.client:
             logger.debug("Smart Mapper disabled or not initialized; skipping LLM mapping")
             return None
 
         try:
+            # Index the document and compile the payload once - its token estimate drives the per-page decision
+            index = DocAIDocumentIndex(document_json)
+            prompt_payload = self._build_payload(document_json, extracted_fields, fallback_fields, index=index)
+            instructions = self._instructions_for(doc_type, template)
+            payload_tokens = self.payload_compiler.count_tokens(prompt_payload, instructions)
+
             # ✅ NEW: Validate input size BEFORE processing
-            is_valid, reason = self._validate_input_size(document_json, doc_type)
+            is_valid, reason = self._validate_input_size(document_json, doc_type, payload_tokens)
             
             # ⚠️ PER-PAGE STRATEGY: Process rekening koran page by page
             if doc_type == "rekening_koran":
@@ -274,20 +330,16 @@ class SmartMapper:
                         document_json=document_json,
                         template=template,
                         extracted_fields=extracted_fields,
-                        fallback_fields=fallback_fields
+                        fallback_fields=fallback_fields,
+                        index=index,
                     )
 
             # Normal processing for small documents
-            prompt_payload = self._build_payload(document_json, extracted_fields, fallback_fields)
-            instructions = self._build_instructions(doc_type, template)
+            if not is_valid:
+                logger.warning(f"⚠️ {doc_type} payload exceeds budget ({reason}) - sending anyway")
 
-            raw_response = self._invoke_llm(prompt_payload, instructions, doc_type)
-            if not raw_response:
-                return None
-
-            parsed = self._safe_json_loads(raw_response)
+            parsed = self._invoke_llm_cached(prompt_payload, instructions, doc_type)
             if not parsed:
-                logger.error("❌ Smart Mapper returned non-JSON content. Check prompt alignment.")
                 return None
 
             # ⚠️ VALIDATION: Check transaction count for rekening_koran
@@ -299,7 +351,7 @@ class SmartMapper:
                     # Compare with input table rows if available
                     if "tables" in prompt_payload:
                         input_tables = prompt_payload.get("tables", [])
-                        total_input_rows = sum(len(table.get("rows", [])) for table in input_tables)
+                        total_input_rows = sum(table.get("row_count", 0) for table in input_tables)
                         if total_input_rows > 0:
                             logger.info(f"📊 Input had {total_input_rows} table rows from Document AI")
 
@@ -326,15 +378,17 @@ class SmartMapper:
         template: Dict[str, Any],
         extracted_fields: Optional[Dict[str, Any]] = None,
         fallback_fields: Optional[Dict[str, Any]] = None,
+        index: Optional[DocAIDocumentIndex] = None,
     ) -> Optional[Dict[str, Any]]:
         """
-        Process rekening koran PAGE BY PAGE to avoid token limits.
+        Process rekening koran in PAGE BATCHES to avoid token limits.
 
         Strategy:
-        1. Process each page separately with Smart Mapper
-        2. First page: Extract bank_info + saldo_info + transactions
-        3. Subsequent pages: Extract transactions only
-        4. Merge all transactions into single response
+        1. Page 1 request: Extract bank_info + saldo_info + page 1 transactions
+        2. Pages 2-N are packed into consecutive batches sized by table rows / token budget
+           (sparse summary pages share a request instead of costing one each)
+        3. Page 1 and all batches run concurrently
+        4. Merge transactions in page order into single response
         5. Export combines all pages into one Excel file
         """
         try:
@@ -342,160 +396,105 @@ class SmartMapper:
             total_pages = len(pages)
             logger.info(f"📄 Starting per-page processing for {total_pages} pages")
 
-            # Process first page (includes bank_info + saldo_info + transactions)
+            # Resolve every text anchor once; pages only look up their spans
+            if index is None:
+                index = DocAIDocumentIndex(document_json)
+
+            # Page 1 carries metadata. Only page 1 text (plus last page for closing saldo) is sent,
+            # not the full document text
+            first_text = self._page_text(index, 0)
+            if total_pages > 1:
+                first_text += f"\n\n--- Last page ({total_pages}) ---\n{index.page_text(total_pages - 1, include_tables=False)}"
             first_page_json = {
-                "text": document_json.get("text", ""),  # ✅ FIX: Include ALL text
-                "pages": [pages[0]],  # Only first page
+                "text": first_text,
+                "pages": [pages[0]],
                 "entities": document_json.get("entities", [])[:200]  # ✅ FIX: Increase from 50 to 200
             }
 
-            logger.info(f"📄 Processing page 1/{total_pages} (with metadata)...")
-            first_result = self._process_single_page(
-                page_json=first_page_json,
-                doc_type=doc_type,
-                template=template,
-                extracted_fields=extracted_fields,
-                fallback_fields=fallback_fields,
-                include_metadata=True,
-                page_number=1,
-                bank_context=None  # Will be detected from page 1
+            # Bank hint for continuation batches - page 1 result isn't available when they start
+            hints = {**(fallback_fields or {}), **(extracted_fields or {})}
+            bank_hint = hints.get("nama_bank") or hints.get("bank_name")
+            bank_hint = bank_hint if isinstance(bank_hint, str) and bank_hint else None
+
+            batches = self._pack_pages(index, doc_type)
+            logger.info(
+                f"📦 Packed {total_pages - 1} continuation pages into {len(batches)} requests "
+                f"(+1 metadata request for page 1)"
             )
 
+            def run_first_page() -> Optional[Dict[str, Any]]:
+                logger.info(f"📄 Processing page 1/{total_pages} (with metadata)...")
+                return self._process_single_page(
+                    page_json=first_page_json,
+                    doc_type=doc_type,
+                    template=template,
+                    extracted_fields=extracted_fields,
+                    fallback_fields=fallback_fields,
+                    include_metadata=True,
+                    page_number=1,
+                    bank_context=None,  # Will be detected from page 1
+                    index=index,
+                    page_indices=[0]
+                )
+
+            def run_batch(batch: List[int], bank_context: Optional[str]) -> Optional[Dict[str, Any]]:
+                return self.map_page_range(
+                    doc_type=doc_type,
+                    document_json=document_json,
+                    template=template,
+                    page_indices=batch,
+                    bank_context=bank_context,
+                    index=index,
+                )
+
+            # Results keyed by first page index - merged in page order
+            results: Dict[int, Optional[Dict[str, Any]]] = {}
+
+            if self.parallel_enabled and batches:
+                # 🚀 PARALLEL PROCESSING: page 1 metadata and all batches run concurrently
+                logger.info(f"🚀 PARALLEL MODE: {len(batches) + 1} requests with {self.max_parallel_pages} concurrent workers")
+                with ThreadPoolExecutor(max_workers=self.max_parallel_pages) as executor:
+                    future_to_page = {executor.submit(propagate(run_first_page)): 0}
+                    for batch in batches:
+                        future_to_page[executor.submit(propagate(run_batch), batch, bank_hint)] = batch[0]
+
+                    for future in as_completed(future_to_page):
+                        page_idx = future_to_page[future]
+                        try:
+                            results[page_idx] = future.result()
+                        except Exception as exc:
+                            logger.error(f"❌ Page {page_idx + 1} failed: {exc}")
+                            results[page_idx] = None
+            else:
+                # Sequential: page 1 first, so its detected bank name feeds the later batches
+                logger.info(f"📄 SEQUENTIAL MODE: Processing {len(batches) + 1} requests one by one")
+                results[0] = run_first_page()
+                first_bank_info = (results[0] or {}).get("bank_info")
+                bank_context = first_bank_info.get("nama_bank") if isinstance(first_bank_info, dict) else None
+                for batch in batches:
+                    results[batch[0]] = run_batch(batch, bank_context or bank_hint)
+
+            first_result = results.get(0)
             if not first_result:
                 logger.error("❌ First page processing failed")
                 return None
 
             # Initialize merged result with first page
             merged_result = first_result.copy()
-            all_transactions = merged_result.get("transactions", [])
             bank_info = merged_result.get("bank_info", {})
             bank_name = bank_info.get("nama_bank", "Unknown Bank") if isinstance(bank_info, dict) else "Unknown Bank"
-
-            logger.info(f"✅ Page 1: {len(all_transactions)} transactions extracted")
             logger.info(f"🏦 Detected bank: {bank_name}")
 
-            # Process remaining pages (transactions only)
-            full_document_text = document_json.get("text", "")
-            remaining_pages = total_pages - 1
-
-            if remaining_pages > 0:
-                # 🚀 PARALLEL PROCESSING: Process pages 2-N concurrently
-                if self.parallel_enabled and remaining_pages >= 2:
-                    logger.info(f"🚀 PARALLEL MODE: Processing {remaining_pages} remaining pages with {self.max_parallel_pages} concurrent workers")
-
-                    # Prepare page tasks
-                    page_tasks = []
-                    for page_idx in range(1, total_pages):
-                        page_num = page_idx + 1
-                        page_text = self._extract_text_for_page(
-                            full_document_text,
-                            pages[page_idx],
-                            document_json
-                        )
-                        context_text = f"Bank: {bank_name}\nContinuation page {page_num}\n\n{page_text}"
-                        page_json = {
-                            "text": context_text,
-                            "pages": [pages[page_idx]],
-                            "entities": []
-                        }
-                        page_tasks.append((page_idx, page_num, page_json))
-
-                    # Process with ThreadPoolExecutor
-                    page_results: Dict[int, Optional[Dict[str, Any]]] = {}
-
-                    with ThreadPoolExecutor(max_workers=self.max_parallel_pages) as executor:
-                        # Submit all tasks
-                        future_to_page = {
-                            executor.submit(
-                                self._process_single_page,
-                                page_json=task[2],
-                                doc_type=doc_type,
-                                template=template,
-                                extracted_fields=None,
-                                fallback_fields=None,
-                                include_metadata=False,
-                                page_number=task[1],
-                                bank_context=bank_name
-                            ): task[1]  # page_num as identifier
-                            for task in page_tasks
-                        }
-
-                        # Collect results as they complete
-                        for future in as_completed(future_to_page):
-                            page_num = future_to_page[future]
-                            try:
-                                result = future.result()
-                                page_results[page_num] = result
-                                if result and "transactions" in result:
-                                    tx_count = len(result.get("transactions", []))
-                                    logger.info(f"✅ Page {page_num}: {tx_count} transactions extracted (parallel)")
-                                else:
-                                    logger.warning(f"⚠️ Page {page_num} returned no transactions (parallel)")
-                            except Exception as exc:
-                                logger.error(f"❌ Page {page_num} failed: {exc}")
-                                page_results[page_num] = None
-
-                    # Merge results in page order (important for correct sequence)
-                    for page_num in sorted(page_results.keys()):
-                        page_result = page_results[page_num]
-                        if page_result and "transactions" in page_result:
-                            page_transactions = page_result["transactions"]
-                            if isinstance(page_transactions, list):
-                                all_transactions.extend(page_transactions)
-
-                    logger.info(f"🚀 Parallel processing complete: {len(all_transactions)} total transactions")
-
+            # Merge results in page order (important for correct sequence)
+            all_transactions: List[Dict[str, Any]] = []
+            for page_idx in sorted(results.keys()):
+                page_result = results[page_idx]
+                page_transactions = page_result.get("transactions") if page_result else None
+                if isinstance(page_transactions, list):
+                    all_transactions.extend(page_transactions)
+                    logger.info(f"✅ Page {page_idx + 1}: {len(page_transactions)} transactions extracted")
                 else:
-                    # Sequential processing for single remaining page or when parallel disabled
-                    logger.info(f"📄 SEQUENTIAL MODE: Processing {remaining_pages} remaining pages one by one")
-
-                    for page_idx in range(1, total_pages):
-                        page_num = page_idx + 1
-
-                        # ✅ FIX: Extract text segments that belong to this specific page
-                        # Google Document AI stores text with page references
-                        logger.info(f"📄 Processing page {page_num}/{total_pages} (transactions only) for {bank_name}...")
-
-                        page_text = self._extract_text_for_page(
-                            full_document_text,
-                            pages[page_idx],
-                            document_json
-                        )
-
-                        # Add bank context to text
-                        context_text = f"Bank: {bank_name}\nContinuation page {page_num}\n\n{page_text}"
-
-                        page_json = {
-                            "text": context_text,
-                            "pages": [pages[page_idx]],
-                            "entities": []  # No entities needed for continuation
-                        }
-
-                        # DEBUG: Check page structure
-                        page_tables = pages[page_idx].get("tables", []) if isinstance(pages[page_idx], dict) else []
-                        page_lines = pages[page_idx].get("lines", []) if isinstance(pages[page_idx], dict) else []
-                        page_paragraphs = pages[page_idx].get("paragraphs", []) if isinstance(pages[page_idx], dict) else []
-
-                        logger.info(f"   📊 Page {page_num} structure: {len(page_tables)} tables, {len(page_lines)} lines, {len(page_paragraphs)} paragraphs")
-                        logger.info(f"   📝 Context text length: {len(context_text)} characters")
-                        page_result = self._process_single_page(
-                            page_json=page_json,
-                            doc_type=doc_type,
-                            template=template,
-                            extracted_fields=None,
-                            fallback_fields=None,
-                            include_metadata=False,
-                            page_number=page_num,
-                            bank_context=bank_name  # Pass bank info
-                        )
-
-                        if page_result and "transactions" in page_result:
-                            page_transactions = page_result["transactions"]
-                            if isinstance(page_transactions, list):
-                                all_transactions.extend(page_transactions)
-                                logger.info(f"✅ Page {page_num}: {len(page_transactions)} transactions extracted")
-                        else:
-                            logger.warning(f"⚠️ Page {page_num} returned no transactions")
+                    logger.warning(f"⚠️ Page {page_idx + 1} returned no transactions")
 
             # Update merged result with all transactions
             merged_result["transactions"] = all_transactions
@@ -507,6 +506,99 @@ class SmartMapper:
             logger.error(f"❌ Per-page processing failed: {exc}", exc_info=True)
             return None
 
+    def map_page_range(
+        self,
+        *,
+        doc_type: str,
+        document_json: Dict[str, Any],
+        template: Dict[str, Any],
+        page_indices: List[int],
+        bank_context: Optional[str] = None,
+        index: Optional[DocAIDocumentIndex] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Extract transactions (no metadata) from consecutive pages of a rekening koran.
+
+        Used for continuation batches and by the tiered extractor for pages whose
+        deterministic saldo chain did not verify.
+        """
+        if index is None:
+            index = DocAIDocumentIndex(document_json)
+        pages = document_json.get("pages", [])
+        total_pages = len(pages)
+
+        first_num, last_num = page_indices[0] + 1, page_indices[-1] + 1
+        label = f"{first_num}" if first_num == last_num else f"{first_num}-{last_num}"
+        logger.info(f"📄 Processing pages {label}/{total_pages} (transactions only) for {bank_context or 'bank'}...")
+
+        page_texts = [
+            f"--- Page {page_idx + 1} ---\n{self._page_text(index, page_idx)}" for page_idx in page_indices
+        ]
+        context_text = f"Bank: {bank_context or 'Unknown Bank'}\nContinuation pages {label}\n\n" + "\n\n".join(page_texts)
+        page_json = {
+            "text": context_text,
+            "pages": [pages[page_idx] for page_idx in page_indices],
+            "entities": []  # No entities needed for continuation
+        }
+        logger.info(f"   📝 Context text length: {len(context_text)} characters")
+        return self._process_single_page(
+            page_json=page_json,
+            doc_type=doc_type,
+            template=template,
+            extracted_fields=None,
+            fallback_fields=None,
+            include_metadata=False,
+            page_number=first_num,
+            page_count=len(page_indices),
+            bank_context=bank_context,
+            index=index,
+            page_indices=page_indices
+        )
+
+    def _pack_pages(self, index: DocAIDocumentIndex, doc_type: str) -> List[List[int]]:
+        """
+        Group continuation pages (2-N) into consecutive batches.
+
+        A batch closes when adding the next page would exceed:
+        - the input token budget (page text + TSV table rows),
+        - the output budget (~_OUTPUT_TOKENS_PER_ROW per expected transaction row,
+          within 75% of the routed model's max_tokens),
+        - or smart_mapper_page_threshold pages.
+        """
+        _, model = self._resolve_route(doc_type)
+        max_output = self.claude_max_tokens if model == self.claude_model else self.max_tokens
+        output_budget = int(max_output * 0.75)
+        input_budget = self.payload_compiler.token_budget
+        max_pages = max(1, int(getattr(settings, "smart_mapper_page_threshold", 5) or 5))
+
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_input = current_output = 0
+
+        for page_idx in range(1, len(index.pages)):
+            page = index.pages[page_idx]
+            table_rows = sum(len(t.body_rows) for t in page.tables)
+            page_text = index.page_text(page_idx)
+            # No table detected - assume about one transaction per two text lines
+            expected_rows = table_rows or page_text.count("\n") // 2
+            input_tokens = estimate_tokens(page_text, self.model)
+            output_tokens = expected_rows * _OUTPUT_TOKENS_PER_ROW
+
+            if current and (
+                len(current) >= max_pages
+                or current_input + input_tokens > input_budget
+                or current_output + output_tokens > output_budget
+            ):
+                batches.append(current)
+                current, current_input, current_output = [], 0, 0
+
+            current.append(page_idx)
+            current_input += input_tokens
+            current_output += output_tokens
+
+        if current:
+            batches.append(current)
+        return batches
 
     def _process_single_page(
         self,
@@ -518,15 +610,21 @@ class SmartMapper:
         fallback_fields: Optional[Dict[str, Any]],
         include_metadata: bool,
         page_number: int,
-        bank_context: Optional[str] = None
+        page_count: int = 1,
+        bank_context: Optional[str] = None,
+        index: Optional[DocAIDocumentIndex] = None,
+        page_indices: Optional[List[int]] = None
     ) -> Optional[Dict[str, Any]]:
-        """Process a single page of rekening koran"""
+        """Process a single page (or a batch of consecutive pages) of rekening koran"""
+        page_label = f"{page_number}" if page_count == 1 else f"{page_number}-{page_number + page_count - 1}"
         try:
             # Build payload for this page
-            prompt_payload = self._build_payload(page_json, extracted_fields, fallback_fields)
+            prompt_payload = self._build_payload(
+                page_json, extracted_fields, fallback_fields, index=index, page_indices=page_indices
+            )
 
             # Build instructions (modify for transaction-only pages)
-            instructions = self._build_instructions(doc_type, template)
+            instructions = self._instructions_for(doc_type, template)
 
             if not include_metadata:
                 # For transaction-only pages, give very explicit instructions
@@ -539,7 +637,7 @@ class SmartMapper:
                     # Page has structured table data
                     instructions += (
                         f"\n\n" + "="*60 + "\n"
-                        f"📄 CONTINUATION PAGE MODE (Page {page_number}){bank_hint}\n"
+                        f"📄 CONTINUATION PAGE MODE (Page {page_label}){bank_hint}\n"
                         + "="*60 + "\n"
                         "⚠️ CRITICAL INSTRUCTIONS FOR THIS PAGE:\n\n"
                         f"1. This is a CONTINUATION page of a multi-page {bank_context or 'bank'} rekening koran\n"
@@ -561,15 +659,15 @@ class SmartMapper:
                     )
                 else:
                     # Page has NO table data - fallback to text extraction
-                    logger.warning(f"⚠️ Page {page_number} has NO table data! Using AGGRESSIVE text extraction fallback...")
+                    logger.warning(f"⚠️ Page {page_label} has NO table data! Using AGGRESSIVE text extraction fallback...")
                     instructions += (
                         f"\n\n" + "="*60 + "\n"
-                        f"📄 AGGRESSIVE TEXT PARSING MODE (Page {page_number}){bank_hint}\n"
+                        f"📄 AGGRESSIVE TEXT PARSING MODE (Page {page_label}){bank_hint}\n"
                         + "="*60 + "\n"
                         "⚠️ CRITICAL: This page has NO structured table data!\n"
                         "You MUST extract transactions from raw text!\n\n"
                         "CONTEXT:\n"
-                        f"- This is continuation page {page_number} of {bank_context or 'bank'} rekening koran\n"
+                        f"- This is continuation page(s) {page_label} of {bank_context or 'bank'} rekening koran\n"
                         "- Previous pages had transactions successfully extracted\n"
                         "- This page MUST have transaction data (it's a bank statement page!)\n"
                         "- The 'document_preview' contains raw OCR text from this page\n\n"
@@ -601,38 +699,54 @@ class SmartMapper:
                         "Extract: {\"tanggal\": \"15 JAN\", \"keterangan\": \"TRANSFER\", \"kredit\": \"1000000\", \"saldo\": \"5000000\"}\n\n"
                     )
 
-            # Invoke LLM (pass doc_type for routing)
-            raw_response = self._invoke_llm(prompt_payload, instructions, doc_type)
-            if not raw_response:
-                return None
+                if page_count > 1:
+                    instructions += (
+                        f"📦 This request covers {page_count} consecutive pages ({page_label}). "
+                        "Tables carry a 'page' field - output transactions page by page, in document order.\n\n"
+                    )
 
-            # Parse response
-            parsed = self._safe_json_loads(raw_response)
+            # Invoke LLM (pass doc_type for routing) - each page is cached individually
+            # ✂️ Pages over the token budget are split by table rows into several requests
+            payload_parts = self.payload_compiler.split_by_budget(prompt_payload, instructions)
+            parsed = None
+            for part_idx, part_payload in enumerate(payload_parts, 1):
+                part_parsed = self._invoke_llm_cached(part_payload, instructions, doc_type)
+                if not part_parsed:
+                    logger.error(f"❌ Page {page_label} part {part_idx}/{len(payload_parts)} returned no usable JSON")
+                    continue
+                if parsed is None:
+                    parsed = part_parsed
+                else:
+                    parsed.setdefault("transactions", []).extend(part_parsed.get("transactions", []) or [])
             if not parsed:
-                logger.error(f"❌ Page {page_number} returned non-JSON content")
-                logger.error(f"❌ Raw response: {raw_response[:200]}")
+                logger.error(f"❌ Page {page_label} returned no usable JSON")
                 return None
 
             # DEBUG: Log what we got
             if not include_metadata:
                 trans_count = len(parsed.get("transactions", []))
-                logger.info(f"🔍 Page {page_number} DEBUG: Received {trans_count} transactions")
+                logger.info(f"🔍 Page {page_label} DEBUG: Received {trans_count} transactions")
                 if trans_count == 0:
-                    logger.warning(f"⚠️ Page {page_number} WARNING: GPT-4o returned empty transactions")
-                    logger.warning(f"⚠️ Raw response: {raw_response}")
+                    logger.warning(f"⚠️ Page {page_label} WARNING: GPT-4o returned empty transactions")
+                    logger.warning(f"⚠️ Parsed response: {json.dumps(parsed, ensure_ascii=False)[:500]}")
                     logger.warning(f"⚠️ Payload had {len(prompt_payload.get('tables', []))} tables")
 
             return parsed
 
         except Exception as exc:
-            logger.error(f"❌ Page {page_number} processing failed: {exc}")
+            logger.error(f"❌ Page {page_label} processing failed: {exc}")
             return None
 
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
-    def _validate_input_size(self, document_json: Dict[str, Any], doc_type: str) -> tuple[bool, str]:
+    def _validate_input_size(
+        self,
+        document_json: Dict[str, Any],
+        doc_type: str,
+        payload_tokens: Optional[int] = None,
+    ) -> tuple[bool, str]:
         """
         ✅ NEW: Validate input size to prevent OOM and token limit issues
         
@@ -665,14 +779,11 @@ class SmartMapper:
                 logger.warning(f"⚠️ Triggering per-page processing fallback...")
                 return False, reason
             
-            # Estimate JSON size
-            import sys
-            json_size_bytes = sys.getsizeof(json.dumps(document_json))
-            json_size_mb = json_size_bytes / (1024 * 1024)
-            
-            # Check JSON size threshold (50MB limit for safety)
-            if json_size_mb > 50:
-                reason = f"JSON too large: {json_size_mb:.1f}MB (>50MB)"
+            # ✂️ Check compiled prompt size against the per-request token budget
+            # (measures what is actually sent, not a json.dumps of the whole DocAI document)
+            token_budget = self.payload_compiler.token_budget
+            if payload_tokens is not None and payload_tokens > token_budget:
+                reason = f"Payload too large: ~{payload_tokens} tokens (>{token_budget})"
                 logger.warning(f"⚠️ INPUT SIZE VALIDATION FAILED: {reason}")
                 logger.warning(f"⚠️ Triggering per-page processing fallback...")
                 return False, reason
@@ -681,7 +792,8 @@ class SmartMapper:
             logger.info(f"   Pages: {page_count}")
             if doc_type == "rekening_koran":
                 logger.info(f"   Est. transactions: {estimated_transactions}")
-            logger.info(f"   JSON size: {json_size_mb:.1f}MB")
+            if payload_tokens is not None:
+                logger.info(f"   Est. prompt tokens: {payload_tokens} (budget {token_budget})")
             
             return True, "OK"
             
@@ -695,236 +807,38 @@ class SmartMapper:
         document_json: Dict[str, Any],
         extracted_fields: Optional[Dict[str, Any]],
         fallback_fields: Optional[Dict[str, Any]],
+        index: Optional[DocAIDocumentIndex] = None,
+        page_indices: Optional[List[int]] = None,
     ) -> Dict[str, Any]:
-        """Cull Document AI JSON to a compact payload safe for prompting."""
-        payload: Dict[str, Any] = {}
-        # ✅ FIX: Remove text limit - GPT-4o has 128K context window
-        payload["document_preview"] = document_json.get("text", "")
-
-        entities = document_json.get("entities")
-        if isinstance(entities, list):
-            compact_entities = []
-            # ✅ FIX: Increase entity limit from 200 to 1000
-            for entity in entities[:1000]:
-                compact_entities.append(
-                    {
-                        "type": entity.get("type_", entity.get("type")),
-                        "mention": entity.get("mention_text", entity.get("mentionText")),
-                        "normalized": entity.get("normalized_value", {}).get("text"),
-                        "confidence": entity.get("confidence"),
-                    }
-                )
-            payload["entities"] = compact_entities
-
-        # ⚠️ CRITICAL FIX: Extract ALL TABLES from Document AI (no limits!)
-        pages = document_json.get("pages", [])
-        if isinstance(pages, list) and len(pages) > 0:
-            extracted_tables = []
-            table_count = 0
-
-            for page_idx, page in enumerate(pages):
-                if not isinstance(page, dict):
-                    continue
-
-                page_tables = page.get("tables", [])
-                if not isinstance(page_tables, list):
-                    continue
-
-                for table_idx, table in enumerate(page_tables):
-                    # ✅ FIX: Remove table limit - extract ALL tables
-                    # if table_count >= 50:  # REMOVED
-                    #     break
-
-                    if not isinstance(table, dict):
-                        continue
-
-                    # Extract header rows
-                    header_rows = table.get("header_rows", table.get("headerRows", []))
-                    body_rows = table.get("body_rows", table.get("bodyRows", []))
-
-                    table_data = {
-                        "page": page_idx + 1,
-                        "table_index": table_idx + 1,
-                        "headers": self._extract_table_rows(header_rows, document_json.get("text", "")),
-                        # ✅ FIX: Remove row limit - extract ALL rows!
-                        "rows": self._extract_table_rows(body_rows, document_json.get("text", ""), limit=None)
-                    }
-
-                    extracted_tables.append(table_data)
-                    table_count += 1
-
-            if extracted_tables:
-                payload["tables"] = extracted_tables
-                total_rows = sum(len(t.get("rows", [])) for t in extracted_tables)
-                logger.info(f"✅ Extracted {len(extracted_tables)} tables with {total_rows} total rows from Document AI")
-
-        if extracted_fields:
-            payload["document_ai_fields"] = extracted_fields
-
-        if fallback_fields:
-            payload["parser_fields"] = fallback_fields
-
-        return payload
-
-    def _extract_table_rows(self, rows: list, full_text: str, limit: int = None) -> list:
-        """Extract text from table rows using text anchors"""
-        extracted_rows = []
-
-        if not isinstance(rows, list):
-            return extracted_rows
-
-        for row_idx, row in enumerate(rows):
-            if limit and row_idx >= limit:
-                break
-
-            if not isinstance(row, dict):
-                continue
-
-            cells = row.get("cells", [])
-            if not isinstance(cells, list):
-                continue
-
-            row_cells = []
-            for cell in cells:
-                if not isinstance(cell, dict):
-                    continue
-
-                # Extract cell text using text anchor
-                cell_text = self._get_text_from_layout(cell.get("layout", {}), full_text)
-                row_cells.append(cell_text)
-
-            if row_cells:  # Only add non-empty rows
-                extracted_rows.append(row_cells)
-
-        return extracted_rows
-
-    def _extract_text_for_page(
-        self,
-        full_document_text: str,
-        page: Dict[str, Any],
-        document_json: Dict[str, Any]
-    ) -> str:
         """
-        ✅ FIX: Extract text content that belongs to a specific page from full document text.
+        Cull Document AI JSON to a compact payload safe for prompting.
 
-        Google Document AI provides text with layout anchors that reference positions
-        in the full document text. We use these anchors to extract page-specific text.
+        Tables are TSV-encoded and text already present in table cells is dropped
+        from document_preview (see payload_compiler.PayloadCompiler).
+        index/page_indices: full-document index and the pages this payload covers
+        when document_json["text"] is page context only.
         """
-        if not isinstance(page, dict):
-            return ""
-
-        if not full_document_text:
-            return ""
-
-        page_text_parts = []
-
-        # Strategy 1: Extract from all paragraphs on this page
-        paragraphs = page.get("paragraphs", [])
-        if isinstance(paragraphs, list):
-            for paragraph in paragraphs:
-                if isinstance(paragraph, dict):
-                    layout = paragraph.get("layout", {})
-                    if isinstance(layout, dict):
-                        para_text = self._get_text_from_layout(layout, full_document_text)
-                        if para_text:
-                            page_text_parts.append(para_text)
-
-        # Strategy 2: Extract from all lines on this page
-        lines = page.get("lines", [])
-        if isinstance(lines, list):
-            for line in lines:
-                if isinstance(line, dict):
-                    layout = line.get("layout", {})
-                    if isinstance(layout, dict):
-                        line_text = self._get_text_from_layout(layout, full_document_text)
-                        if line_text:
-                            page_text_parts.append(line_text)
-
-        # Strategy 3: Extract from table cells if available
-        tables = page.get("tables", [])
-        if isinstance(tables, list):
-            for table in tables:
-                if isinstance(table, dict):
-                    # Extract from header rows
-                    header_rows = table.get("header_rows", table.get("headerRows", []))
-                    if isinstance(header_rows, list):
-                        for row in header_rows:
-                            if isinstance(row, dict):
-                                cells = row.get("cells", [])
-                                if isinstance(cells, list):
-                                    row_text = []
-                                    for cell in cells:
-                                        if isinstance(cell, dict):
-                                            layout = cell.get("layout", {})
-                                            if isinstance(layout, dict):
-                                                cell_text = self._get_text_from_layout(layout, full_document_text)
-                                                if cell_text:
-                                                    row_text.append(cell_text)
-                                    if row_text:
-                                        page_text_parts.append(" | ".join(row_text))
-
-                    # Extract from body rows
-                    body_rows = table.get("body_rows", table.get("bodyRows", []))
-                    if isinstance(body_rows, list):
-                        for row in body_rows:
-                            if isinstance(row, dict):
-                                cells = row.get("cells", [])
-                                if isinstance(cells, list):
-                                    row_text = []
-                                    for cell in cells:
-                                        if isinstance(cell, dict):
-                                            layout = cell.get("layout", {})
-                                            if isinstance(layout, dict):
-                                                cell_text = self._get_text_from_layout(layout, full_document_text)
-                                                if cell_text:
-                                                    row_text.append(cell_text)
-                                    if row_text:
-                                        page_text_parts.append(" | ".join(row_text))
-
-        # Combine all extracted text
-        if page_text_parts:
-            extracted_text = "\n".join(page_text_parts)
-            logger.info(f"   ✅ Extracted {len(extracted_text)} characters of text for this page")
-            return extracted_text
+        return self.payload_compiler.build(
+            document_json,
+            index=index,
+            page_indices=page_indices,
+            extracted_fields=extracted_fields,
+            fallback_fields=fallback_fields,
+        )
+
+    @staticmethod
+    def _page_text(index: DocAIDocumentIndex, page_idx: int) -> str:
+        """Text belonging to one page, looked up from the document index"""
+        page_text = index.page_text(page_idx)
+        if page_text:
+            logger.info(f"   ✅ Extracted {len(page_text)} characters of text for this page")
+            return page_text
 
         # Fallback: If no text extracted, return a helpful message
         logger.warning(f"   ⚠️ Could not extract text for this page using layout anchors")
         return "No text extracted. Please analyze any visible data in the page structure."
 
 
-    def _get_text_from_layout(self, layout: dict, full_text: str) -> str:
-        """Extract text from layout using text anchor segments"""
-        if not isinstance(layout, dict):
-            return ""
-
-        text_anchor = layout.get("text_anchor", layout.get("textAnchor", {}))
-        if not isinstance(text_anchor, dict):
-            return ""
-
-        text_segments = text_anchor.get("text_segments", text_anchor.get("textSegments", []))
-        if not isinstance(text_segments, list) or not text_segments:
-            return ""
-
-        # Combine all segments
-        result_text = []
-        for segment in text_segments:
-            if not isinstance(segment, dict):
-                continue
-
-            start_index = segment.get("start_index", segment.get("startIndex", 0))
-            end_index = segment.get("end_index", segment.get("endIndex", 0))
-
-            if isinstance(start_index, (int, str)) and isinstance(end_index, (int, str)):
-                try:
-                    start = int(start_index)
-                    end = int(end_index)
-                    if 0 <= start < len(full_text) and start < end <= len(full_text):
-                        result_text.append(full_text[start:end])
-                except (ValueError, TypeError):
-                    pass
-
-        return "".join(result_text).strip()
-
     def _build_instructions(self, doc_type: str, template: Dict[str, Any]) -> str:
         sections = template.get("sections", [])
         output_schema = template.get("output_schema", {})
@@ -948,6 +862,26 @@ class SmartMapper:
             "4. Be FLEXIBLE - every bank has different format\n\n"
         )
 
+        # Describe the table encoding produced by the payload compiler
+        if self.payload_compiler.table_encoding == "tsv":
+            base_instructions += (
+                "📊 TABLE FORMAT: each entry in 'tables' has 'headers' and 'rows' as TSV text - "
+                "one line per table row, cells separated by TAB characters, 'row_count' = number of rows. "
+                "Text inside table cells is NOT repeated in 'document_preview'.\n\n"
+            )
+            table_example = (
+                "  tables: [{\"page\": 1, \"table_index\": 1, \"row_count\": 2,\n"
+                "    \"headers\": \"TANGGAL\\tKETERANGAN\\tMUTASI\\tSALDO\",\n"
+                "    \"rows\": \"01/01\\tTRANSFER\\tCR\\t5000000\\t15000000\\n02/01\\tBIAYA ADM\\tDB\\t15000\\t14985000\"}]"
+            )
+        else:
+            table_example = (
+                "  tables: [{\"page\": 1, \"table_index\": 1, \"row_count\": 2,\n"
+                "    \"headers\": [[\"TANGGAL\", \"KETERANGAN\", \"MUTASI\", \"SALDO\"]],\n"
+                "    \"rows\": [[\"01/01\", \"TRANSFER\", \"CR\", \"5000000\", \"15000000\"],\n"
+                "             [\"02/01\", \"BIAYA ADM\", \"DB\", \"15000\", \"14985000\"]]}]"
+            )
+
         # Add document type specific instructions
         if doc_type == "rekening_koran":
             base_instructions += (
@@ -959,16 +893,7 @@ class SmartMapper:
                 "4. Extract bank info (account number, name, period) and balance info\n\n"
                 "🎯 HOW TO USE TABLE DATA:\n"
                 "The payload includes a 'tables' field with structured data like this:\n"
-                "  tables: [\n"
-                "    {\n"
-                "      page: 1,\n"
-                "      headers: [[\"TANGGAL\", \"KETERANGAN\", \"MUTASI\", \"SALDO\"]],\n"
-                "      rows: [\n"
-                "        [\"01/01\", \"TRANSFER\", \"CR\", \"5000000\", \"15000000\"],\n"
-                "        [\"02/01\", \"BIAYA ADM\", \"DB\", \"15000\", \"14985000\"]\n"
-                "      ]\n"
-                "    }\n"
-                "  ]\n\n"
+                f"{table_example}\n\n"
                 "⚠️ CRITICAL: Use the 'tables' data as your PRIMARY source for transactions!\n"
                 "The table data is already structured with rows and cells - much more accurate than parsing text.\n\n"
                 "🏦 BANK FORMAT DETECTION:\n"
@@ -1014,24 +939,263 @@ class SmartMapper:
 
         return instructions
 
-    def _invoke_llm(self, payload: Dict[str, Any], instructions: str, doc_type: str = "") -> Optional[str]:
-        payload_text = json.dumps(payload, ensure_ascii=False, indent=2)
+    def _resolve_route(self, doc_type: str) -> Tuple[str, str]:
+        """Return (provider, model) that _invoke_llm will use for this doc_type."""
+        if doc_type == "rekening_koran" and self.claude_client:
+            return "anthropic", self.claude_model
+        return self.provider, self.model
+
+    def _invoke_llm_cached(
+        self,
+        payload: Dict[str, Any],
+        instructions: str,
+        doc_type: str = "",
+    ) -> Optional[Dict[str, Any]]:
+        """Invoke LLM and parse JSON, serving identical requests from the response cache."""
+        provider, model = self._resolve_route(doc_type)
+        cache_key = self.response_cache.build_key(
+            provider=provider,
+            model=model,
+            temperature=self.temperature,
+            instructions=instructions,
+            payload=payload,
+        )
+
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if doc_type == "rekening_koran":
+            parsed, complete = self._invoke_llm_streaming(payload, instructions, doc_type)
+            if not parsed:
+                return None
+            if not complete:
+                # Rows recovered from a truncated response - usable, but never pinned in the cache
+                return parsed
+        else:
+            raw_response = self._invoke_llm(payload, instructions, doc_type)
+            if not raw_response:
+                return None
+
+            parsed = self._safe_json_loads(raw_response)
+            if not parsed:
+                logger.error("❌ Smart Mapper returned non-JSON content. Check prompt alignment.")
+                logger.error(f"❌ Raw response: {raw_response[:200]}")
+                return None
+
+        # Don't pin an empty page result - a retry should get a fresh LLM attempt
+        if doc_type == "rekening_koran" and isinstance(parsed, dict) and parsed.get("transactions") == [] and not parsed.get("bank_info"):
+            return parsed
+
+        self.response_cache.set(
+            cache_key,
+            parsed,
+            doc_type=doc_type,
+            template_fingerprint=self._template_fingerprints.get(doc_type),
+            provider=provider,
+            model=model,
+        )
+        return parsed
+
+    def _invoke_llm_streaming(
+        self,
+        payload: Dict[str, Any],
+        instructions: str,
+        doc_type: str,
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Stream a rekening koran completion through the incremental JSON parser.
+
+        Transactions are decoded as each object closes. When the completion is cut
+        off by max_tokens, the complete transactions are kept and a follow-up request
+        asks for the rows after the last one (up to max_continuations times).
+
+        Returns (parsed, complete) - complete is False when rows may still be missing.
+        """
+        started = time.monotonic()
+
+        def log_first_row(_item: Dict[str, Any]) -> None:
+            if len(parser.items) == 1:
+                logger.info(f"⏱️ First transaction streamed after {time.monotonic() - started:.2f}s")
+
+        parser = IncrementalJSONParser(on_item=log_first_row)
+        raw_response = self._invoke_llm(payload, instructions, doc_type, stream_parser=parser)
+        if not raw_response:
+            return None, False
+
+        if not parser.truncated:
+            parsed = parser.result() or self._safe_json_loads(raw_response)
+            if not parsed:
+                logger.error("❌ Smart Mapper returned non-JSON content. Check prompt alignment.")
+                logger.error(f"❌ Raw response: {raw_response[:200]}")
+            return parsed, bool(parsed)
+
+        parsed = parser.partial_result()
+        if not parsed:
+            logger.error("🚨 Response truncated before the first complete transaction - nothing to resume")
+            return None, False
+
+        transactions: List[Dict[str, Any]] = parsed["transactions"]
+        logger.warning(f"✂️ Response truncated - kept {len(transactions)} complete transactions, continuing")
+
+        for continuation in range(1, self.max_continuations + 1):
+            follow_up = IncrementalJSONParser()
+            raw_response = self._invoke_llm(
+                payload,
+                instructions + self._continuation_note(transactions),
+                doc_type,
+                stream_parser=follow_up,
+            )
+            if not raw_response:
+                break
+
+            if follow_up.truncated:
+                new_rows = follow_up.items
+            else:
+                follow_parsed = follow_up.result() or self._safe_json_loads(raw_response) or {}
+                new_rows = follow_parsed.get("transactions") or []
+
+            # The model sometimes repeats the anchor row before continuing
+            if new_rows and transactions and new_rows[0] == transactions[-1]:
+                new_rows = new_rows[1:]
+
+            transactions.extend(new_rows)
+            logger.info(f"📡 Continuation {continuation}: +{len(new_rows)} transactions (total {len(transactions)})")
+
+            if not follow_up.truncated:
+                return parsed, True
+            if not new_rows:
+                break
+
+        logger.error(f"🚨 Response still truncated after {self.max_continuations} continuations - transactions may be missing")
+        return parsed, False
+
+    @staticmethod
+    def _continuation_note(transactions: List[Dict[str, Any]]) -> str:
+        """Instructions suffix asking for the rows after the last received transaction"""
+        last = json.dumps(transactions[-1], ensure_ascii=False, separators=(",", ":"))
+        return (
+            "\n\n" + "=" * 60 + "\n"
+            "📡 CONTINUATION REQUEST\n"
+            + "=" * 60 + "\n"
+            f"Your previous response was cut off after {len(transactions)} transactions.\n"
+            f"The LAST transaction already received was:\n{last}\n\n"
+            "Continue from the row AFTER that transaction, in document order.\n"
+            "Do NOT repeat transactions already received. Do NOT include bank_info or saldo_info.\n"
+            'OUTPUT FORMAT (STRICT): {"transactions": [...]}\n'
+        )
+
+    def _invoke_llm(
+        self,
+        payload: Dict[str, Any],
+        instructions: str,
+        doc_type: str = "",
+        stream_parser: Optional[IncrementalJSONParser] = None,
+    ) -> Optional[str]:
+        payload_text = self.payload_compiler.serialize(payload)
+        static_prefix, instructions = self._split_instructions(doc_type, instructions)
 
         # 🧠 ROUTING LOGIC: Use Claude for Rekening Koran, GPT-4o for others
         # ✅ FIX: Use property instead of direct access - triggers lazy loading
         if doc_type == "rekening_koran" and self.claude_client:
             logger.info("🧠 Using Claude AI for Rekening Koran processing")
-            return self._invoke_claude_direct(payload_text, instructions)
+            with span("llm", provider="anthropic", model=self.claude_model):
+                return self._invoke_claude_direct(
+                    payload_text, instructions, stream_parser=stream_parser, static_prefix=static_prefix
+                )
 
         # Default: Use configured provider (GPT-4o for other documents)
         if self.provider == "openai":
-            return self._invoke_openai(payload_text, instructions)
+            with span("llm", provider="openai", model=self.model):
+                return self._invoke_openai(payload_text, instructions, stream_parser=stream_parser, static_prefix=static_prefix)
         if self.provider == "anthropic":
-            return self._invoke_anthropic(payload_text, instructions)
+            with span("llm", provider="anthropic", model=self.model):
+                content = self._invoke_anthropic(payload_text, instructions, static_prefix=static_prefix)
+            if content and stream_parser is not None:
+                stream_parser.feed(content)
+            return content
         return None
 
-    def _invoke_openai(self, payload_text: str, instructions: str) -> Optional[str]:
-        """Invoke OpenAI API with automatic retry on rate limits"""
+    # ------------------------------------------------------------------
+    # Prompt layout: static prefix first (provider-cacheable), document content last
+    # ------------------------------------------------------------------
+    def _split_instructions(self, doc_type: str, instructions: str) -> Tuple[str, str]:
+        """
+        (static prefix, per-request instructions)
+        The prefix is the template's precompiled system prompt - byte-identical for every document
+        and page of a type. Page-mode and continuation notes stay in the per-request part.
+        """
+        compiled = self.templates.get(doc_type) if doc_type else None
+        static_prefix = compiled.system_prompt if compiled is not None else None
+        if static_prefix and instructions.startswith(static_prefix):
+            return static_prefix, instructions[len(static_prefix):].strip()
+        return "", instructions
+
+    @staticmethod
+    def _user_prompt(instructions: str, payload_text: str) -> str:
+        prompt = f"Document payload:\n{payload_text}\n\n{OUTPUT_REMINDER}"
+        return f"{instructions}\n\n{prompt}" if instructions else prompt
+
+    def _openai_messages(self, static_prefix: str, instructions: str, payload_text: str) -> List[Dict[str, Any]]:
+        system = f"{SYSTEM_ROLE}\n\n{static_prefix.rstrip()}" if static_prefix else SYSTEM_ROLE
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": self._user_prompt(instructions, payload_text)},
+        ]
+
+    def _anthropic_prompt(self, static_prefix: str, instructions: str, payload_text: str) -> Tuple[Any, List[Dict[str, Any]]]:
+        """(system, messages) for messages.create/stream - the system block carries the cache breakpoint"""
+        if static_prefix:
+            system_block: Dict[str, Any] = {"type": "text", "text": f"{SYSTEM_ROLE}\n\n{static_prefix.rstrip()}"}
+            if self.prompt_caching:
+                system_block["cache_control"] = {"type": "ephemeral"}
+            system: Any = [system_block]
+        else:
+            system = SYSTEM_ROLE
+        content = [{"type": "text", "text": instructions}] if instructions else []
+        content.append({"type": "text", "text": f"Document payload:\n{payload_text}"})
+        content.append({"type": "text", "text": OUTPUT_REMINDER})
+        return system, [{"role": "user", "content": content}]
+
+    @staticmethod
+    def _record_usage(provider: str, model: str, usage: Any) -> Optional[int]:
+        """Forward provider-reported token usage (OpenAI or Anthropic naming) to the document trace
+
+        Prompt-cache hits are recorded too: OpenAI reports prompt_tokens_details.cached_tokens
+        (already part of prompt_tokens); Anthropic reports cache reads/writes next to input_tokens,
+        so they are added to the prompt total. Returns the total token count, used to settle the
+        LLM budget reservation.
+        """
+        if usage is None:
+            return None
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) if details is not None else None
+        cache_write_tokens = None
+        cache_read = getattr(usage, "cache_read_input_tokens", None)
+        cache_write = getattr(usage, "cache_creation_input_tokens", None)
+        if cache_read or cache_write:
+            cached_tokens = cache_read or 0
+            cache_write_tokens = cache_write or 0
+            prompt_tokens = (prompt_tokens or 0) + cached_tokens + cache_write_tokens
+        record_llm_usage(provider, model, prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens)
+        if cached_tokens:
+            logger.info(f"💾 Prompt cache hit: {cached_tokens}/{prompt_tokens} prompt tokens served from cache ({provider})")
+        return usage_total_tokens(usage)
+
+    def _invoke_openai(
+        self,
+        payload_text: str,
+        instructions: str,
+        stream_parser: Optional[IncrementalJSONParser] = None,
+        static_prefix: str = "",
+    ) -> Optional[str]:
+        """Invoke OpenAI API with automatic retry on rate limits
+
+        With stream_parser the completion is streamed into the parser and a
+        length-truncated response is returned (parser.truncated set) instead of None.
+        """
         # ✅ FIX: Use property instead of direct access - triggers lazy loading
         if not self.client:
             return None
@@ -1045,19 +1209,56 @@ class SmartMapper:
                     logger.info(f"🔄 Retry attempt {attempt + 1}/{max_retries}")
 
                 logger.info(f"🤖 Calling OpenAI API with model: {self.model}")
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a precise data-mapping assistant that outputs strict JSON."},
-                        {
-                            "role": "user",
-                            "content": f"{instructions}\n\nDocument payload:\n{payload_text}\n\nKeluarkan hanya JSON valid sesuai schema output."
-                        },
-                    ],
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    timeout=self.timeout,
-                )
+                reserved_tokens = estimate_tokens(static_prefix + instructions + payload_text, self.model) + self.max_tokens
+                messages = self._openai_messages(static_prefix, instructions, payload_text)
+
+                if stream_parser is not None:
+                    stream_parser.reset()
+                    content_parts = []
+                    finish_reason = None
+                    with get_llm_scheduler().reserve(reserved_tokens) as reservation:
+                        stream = self.client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            temperature=self.temperature,
+                            max_tokens=self.max_tokens,
+                            timeout=self.timeout,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                        )
+                        for chunk in stream:
+                            # Usage arrives on a final chunk with no choices
+                            if getattr(chunk, "usage", None) is not None:
+                                reservation.settle(self._record_usage("openai", self.model, chunk.usage))
+                            if not chunk.choices:
+                                continue
+                            choice = chunk.choices[0]
+                            text = getattr(choice.delta, "content", None)
+                            if text:
+                                content_parts.append(text)
+                                stream_parser.feed(text)
+                            if choice.finish_reason:
+                                finish_reason = choice.finish_reason
+
+                    content = "".join(content_parts) if content_parts else None
+                    logger.info(f"✅ OpenAI STREAMING response received: {len(content) if content else 0} characters")
+                    logger.info(f"🏁 Finish reason: {finish_reason}")
+                    if finish_reason == "length":
+                        logger.warning(f"✂️ GPT-4o hit max_tokens ({self.max_tokens}) - {len(stream_parser.items)} complete transactions kept")
+                        stream_parser.truncated = True
+                    elif finish_reason != "stop":
+                        logger.warning(f"⚠️ Unusual finish reason: {finish_reason}")
+                    return content
+
+                with get_llm_scheduler().reserve(reserved_tokens) as reservation:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        timeout=self.timeout,
+                    )
+                    reservation.settle(self._record_usage("openai", self.model, getattr(response, "usage", None)))
 
                 if response.choices and len(response.choices) > 0:
                     choice = response.choices[0]
@@ -1087,15 +1288,14 @@ class SmartMapper:
                 return None
 
             except Exception as exc:
-                error_str = str(exc)
-
-                # Check if it's a rate limit error (429)
-                if "rate_limit" in error_str.lower() or "429" in error_str:
+                # Check if it's a rate limit error (429 / overloaded)
+                if is_rate_limit_error(exc):
                     if attempt < max_retries - 1:
-                        # Exponential backoff: 2s, 4s, 8s, 16s, 32s
-                        delay = base_delay * (2 ** attempt)
-                        logger.warning(f"⚠️ Rate limit hit! Retrying in {delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(delay)
+                        # Pause the shared LLM budget (Retry-After, else 2s, 4s, 8s, 16s); the retry
+                        # and every other caller queue behind the pause instead of hammering the provider
+                        delay = retry_after_seconds(exc, base_delay * (2 ** attempt))
+                        logger.warning(f"⚠️ Rate limit hit! Budget paused for {delay:.0f}s before retry (attempt {attempt + 1}/{max_retries})")
+                        get_llm_scheduler().throttle(delay)
                         continue
                     else:
                         logger.error(f"❌ Rate limit exceeded after {max_retries} retries")
@@ -1107,7 +1307,7 @@ class SmartMapper:
 
         return None
 
-    def _invoke_anthropic(self, payload_text: str, instructions: str) -> Optional[str]:
+    def _invoke_anthropic(self, payload_text: str, instructions: str, static_prefix: str = "") -> Optional[str]:
         """Invoke Anthropic (Claude) API with automatic retry on rate limits"""
         # ✅ FIX: Use property instead of direct access - triggers lazy loading
         if not self.client:
@@ -1121,22 +1321,17 @@ class SmartMapper:
                 if attempt > 0:
                     logger.info(f"🔄 Retry attempt {attempt + 1}/{max_retries}")
 
-                response = self.client.messages.create(  # type: ignore[attr-defined]
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    system="You are a precise data-mapping assistant that outputs strict JSON.",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": instructions},
-                                {"type": "text", "text": f"Document payload:\n{payload_text}"},
-                                {"type": "text", "text": "Keluarkan hanya JSON valid sesuai schema output."},
-                            ],
-                        }
-                    ],
-                )
+                reserved_tokens = estimate_tokens(static_prefix + instructions + payload_text, self.model) + self.max_tokens
+                system, messages = self._anthropic_prompt(static_prefix, instructions, payload_text)
+                with get_llm_scheduler().reserve(reserved_tokens) as reservation:
+                    response = self.client.messages.create(  # type: ignore[attr-defined]
+                        model=self.model,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        system=system,
+                        messages=messages,
+                    )
+                    reservation.settle(self._record_usage("anthropic", self.model, getattr(response, "usage", None)))
                 if response and getattr(response, "content", None):
                     # Check stop_reason for truncation
                     stop_reason = getattr(response, "stop_reason", None)
@@ -1164,15 +1359,14 @@ class SmartMapper:
                 return None
 
             except Exception as exc:
-                error_str = str(exc)
-
-                # Check if it's a rate limit error
-                if "rate_limit" in error_str.lower() or "429" in error_str or "overloaded" in error_str.lower():
+                # Check if it's a rate limit error (429 / overloaded)
+                if is_rate_limit_error(exc):
                     if attempt < max_retries - 1:
-                        # Exponential backoff: 2s, 4s, 8s, 16s, 32s
-                        delay = base_delay * (2 ** attempt)
-                        logger.warning(f"⚠️ Rate limit hit! Retrying in {delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(delay)
+                        # Pause the shared LLM budget (Retry-After, else 2s, 4s, 8s, 16s); the retry
+                        # and every other caller queue behind the pause instead of hammering the provider
+                        delay = retry_after_seconds(exc, base_delay * (2 ** attempt))
+                        logger.warning(f"⚠️ Rate limit hit! Budget paused for {delay:.0f}s before retry (attempt {attempt + 1}/{max_retries})")
+                        get_llm_scheduler().throttle(delay)
                         continue
                     else:
                         logger.error(f"❌ Rate limit exceeded after {max_retries} retries")
@@ -1184,10 +1378,18 @@ class SmartMapper:
 
         return None
 
-    def _invoke_claude_direct(self, payload_text: str, instructions: str) -> Optional[str]:
+    def _invoke_claude_direct(
+        self,
+        payload_text: str,
+        instructions: str,
+        stream_parser: Optional[IncrementalJSONParser] = None,
+        static_prefix: str = "",
+    ) -> Optional[str]:
         """Invoke Claude API directly (dedicated for Rekening Koran) - WITH STREAMING
 
         Uses streaming to handle long-running operations (>10 min) required by Anthropic SDK.
+        With stream_parser each text delta is decoded incrementally and a max_tokens
+        truncated response is returned (parser.truncated set) instead of None.
         """
         # ✅ FIX: Use property instead of direct access - triggers lazy loading
         if not self.claude_client:
@@ -1207,35 +1409,41 @@ class SmartMapper:
                 # ✅ FIX: Use streaming to avoid "Streaming is required for operations > 10 min" error
                 content_parts = []
                 stop_reason = None
-
-                with self.claude_client.messages.stream(
-                    model=self.claude_model,
-                    max_tokens=self.claude_max_tokens,
-                    temperature=self.temperature,
-                    system="You are a precise data-mapping assistant that outputs strict JSON.",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": instructions},
-                                {"type": "text", "text": f"Document payload:\n{payload_text}"},
-                                {"type": "text", "text": "Keluarkan hanya JSON valid sesuai schema output."},
-                            ],
-                        }
-                    ],
-                ) as stream:
-                    for text in stream.text_stream:
-                        content_parts.append(text)
-
-                    # Get final message for stop_reason
-                    final_message = stream.get_final_message()
-                    stop_reason = getattr(final_message, "stop_reason", None)
+                if stream_parser is not None:
+                    stream_parser.reset()
+
+                reserved_tokens = estimate_tokens(static_prefix + instructions + payload_text, self.claude_model) + self.claude_max_tokens
+                # Template instructions are the cached system prefix; each page only pays for its own content
+                system, messages = self._anthropic_prompt(static_prefix, instructions, payload_text)
+                with get_llm_scheduler().reserve(reserved_tokens) as reservation:
+                    with self.claude_client.messages.stream(
+                        model=self.claude_model,
+                        max_tokens=self.claude_max_tokens,
+                        temperature=self.temperature,
+                        system=system,
+                        messages=messages,
+                    ) as stream:
+                        for text in stream.text_stream:
+                            content_parts.append(text)
+                            if stream_parser is not None:
+                                stream_parser.feed(text)
+
+                        # Get final message for stop_reason
+                        final_message = stream.get_final_message()
+                        stop_reason = getattr(final_message, "stop_reason", None)
+                        reservation.settle(self._record_usage("anthropic", self.claude_model, getattr(final_message, "usage", None)))
 
                 content = "".join(content_parts) if content_parts else None
 
                 if content:
                     logger.info(f"🏁 Stop reason: {stop_reason}")
 
+                    if stop_reason == "max_tokens" and stream_parser is not None:
+                        # Complete transactions are already decoded - caller continues from the last one
+                        logger.warning(f"✂️ Claude hit max_tokens ({self.claude_max_tokens}) - {len(stream_parser.items)} complete transactions kept")
+                        stream_parser.truncated = True
+                        return content
+
                     # ✅ FIX: Check if response was truncated - return None instead of partial
                     if stop_reason == "max_tokens":
                         logger.error("🚨 RESPONSE TRUNCATED! Claude hit max_tokens limit!")
@@ -1252,15 +1460,14 @@ class SmartMapper:
                 return None
 
             except Exception as exc:
-                error_str = str(exc)
-
-                # Check if it's a rate limit error
-                if "rate_limit" in error_str.lower() or "429" in error_str or "overloaded" in error_str.lower():
+                # Check if it's a rate limit error (429 / overloaded)
+                if is_rate_limit_error(exc):
                     if attempt < max_retries - 1:
-                        # Exponential backoff: 2s, 4s, 8s, 16s, 32s
-                        delay = base_delay * (2 ** attempt)
-                        logger.warning(f"⚠️ Rate limit hit! Retrying in {delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(delay)
+                        # Pause the shared LLM budget (Retry-After, else 2s, 4s, 8s, 16s); the retry
+                        # and every other caller queue behind the pause instead of hammering the provider
+                        delay = retry_after_seconds(exc, base_delay * (2 ** attempt))
+                        logger.warning(f"⚠️ Rate limit hit! Budget paused for {delay:.0f}s before retry (attempt {attempt + 1}/{max_retries})")
+                        get_llm_scheduler().throttle(delay)
                         continue
                     else:
                         logger.error(f"❌ Rate limit exceeded after {max_retries} retries")
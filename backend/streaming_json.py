@@ -0,0 +1,167 @@
+"""
+Incremental JSON Decoder for Streamed LLM Output
+Parses a JSON object as text chunks arrive and emits array items the moment they close
+
+Used by Smart Mapper for rekening koran:
+- transactions are available as soon as each `{...}` closes (time-to-first-row)
+- a truncated completion (max_tokens / length) still yields every complete transaction
+- partial_result() closes the open containers so the prefix parses as valid JSON
+
+The scanner keeps only a container stack and string/escape flags - each character
+is visited once, no re-parsing of the growing buffer.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """Streaming scanner for one top-level JSON object with an item array (default: transactions)"""
+
+    def __init__(
+        self,
+        array_key: str = "transactions",
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.array_key = array_key
+        self.on_item = on_item
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything (used before a retry of the same request)"""
+        self.items: List[Dict[str, Any]] = []
+        self.truncated = False
+        self._text = ""
+        self._pos = 0
+        self._start: Optional[int] = None  # Offset of top-level '{' (skips ```json fences / prose)
+        self._end: Optional[int] = None  # Offset just past the closing top-level '}'
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None  # Most recent complete string (candidate object key)
+        self._array_depth: Optional[int] = None  # Stack depth of the target array when inside it
+        self._item_start: Optional[int] = None
+        self._last_item_end: Optional[int] = None
+        self._stack_at_last_item: List[str] = []
+
+    # ------------------------------------------------------------------
+    # Feeding
+    # ------------------------------------------------------------------
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk, return items completed by it"""
+        if not chunk or self._end is not None:
+            return []
+
+        self._text += chunk
+        text = self._text
+        completed: List[Dict[str, Any]] = []
+        stack = self._stack
+
+        i = self._pos
+        length = len(text)
+        while i < length:
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:i]
+                i += 1
+                continue
+
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    stack.append("{")
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif ch in "{[":
+                if (
+                    ch == "["
+                    and self._array_depth is None
+                    and len(stack) == 1
+                    and self._last_string == self.array_key
+                ):
+                    self._array_depth = len(stack) + 1
+                elif ch == "{" and self._array_depth is not None and len(stack) == self._array_depth:
+                    self._item_start = i
+                stack.append(ch)
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                if self._array_depth is not None:
+                    if ch == "}" and len(stack) == self._array_depth and self._item_start is not None:
+                        item = self._decode(text[self._item_start:i + 1])
+                        self._item_start = None
+                        if isinstance(item, dict):
+                            self.items.append(item)
+                            completed.append(item)
+                            self._last_item_end = i + 1
+                            self._stack_at_last_item = list(stack)
+                            if self.on_item:
+                                self.on_item(item)
+                    elif ch == "]" and len(stack) == self._array_depth - 1:
+                        self._array_depth = None
+                if not stack:
+                    self._end = i + 1
+                    i += 1
+                    break
+            i += 1
+
+        self._pos = i
+        return completed
+
+    @staticmethod
+    def _decode(fragment: str) -> Optional[Any]:
+        try:
+            return json.loads(fragment, strict=False)
+        except json.JSONDecodeError:
+            return None
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Full object once the top-level '}' has been seen"""
+        if self._start is None or self._end is None:
+            return None
+        parsed = self._decode(self._text[self._start:self._end])
+        return parsed if isinstance(parsed, dict) else None
+
+    def partial_result(self) -> Optional[Dict[str, Any]]:
+        """
+        Object truncated right after the last complete item
+
+        Everything before that point (e.g. bank_info, saldo_info) is kept; open
+        containers are closed in stack order so the prefix is valid JSON.
+        """
+        if self._start is None or self._last_item_end is None:
+            return None
+        closers = "".join(_CLOSERS[c] for c in reversed(self._stack_at_last_item))
+        parsed = self._decode(self._text[self._start:self._last_item_end] + closers)
+        if isinstance(parsed, dict):
+            parsed[self.array_key] = list(self.items)
+            return parsed
+        return {self.array_key: list(self.items)}
+
+
+__all__ = ["IncrementalJSONParser"]
@@ -123,8 +123,6 @@ class SuryaProcessor:
 
     def _process_document_sync(self, file_path: str) -> SuryaOCRResult:
         """Synchronous document processing (CPU-bound, runs in thread pool)"""
-        self._ensure_core_models()
-
         start_time = time.time()
         file_ext = Path(file_path).suffix.lower()
 
@@ -134,7 +132,19 @@ class SuryaProcessor:
         else:
             images = self._image_to_pil(file_path)
 
-        logger.info(f"Surya OCR processing {len(images)} pages from {file_ext} file...")
+        return self._process_images_sync(images, f"{file_ext} file", start_time)
+
+    def _process_page_range_sync(self, page_range) -> SuryaOCRResult:
+        """Rasterize a PDFPageRange straight from the opened source document (no chunk file)"""
+        start_time = time.time()
+        images = page_range.render(dpi=300)
+        return self._process_images_sync(images, page_range.label, start_time)
+
+    def _process_images_sync(self, images: list, source_label: str, start_time: float) -> SuryaOCRResult:
+        """OCR + layout + table recognition over already loaded page images"""
+        self._ensure_core_models()
+
+        logger.info(f"Surya OCR processing {len(images)} pages from {source_label}...")
 
         # Step 1: Text Recognition (OCR)
         ocr_predictions = self._recognition(images, det_predictor=self._detection)
@@ -221,6 +231,11 @@ class SuryaProcessor:
         import asyncio
         return await asyncio.to_thread(self._process_document_sync, file_path)
 
+    async def process_page_range(self, page_range) -> SuryaOCRResult:
+        """Process a pdf_chunker.PDFPageRange (async wrapper using thread pool)"""
+        import asyncio
+        return await asyncio.to_thread(self._process_page_range_sync, page_range)
+
     def _build_google_compatible_response(
         self,
         all_page_texts: List[str],
@@ -0,0 +1,290 @@
+"""
+Template Registry
+Loads, validates and precompiles the Smart Mapper templates once per process
+
+- Every <doc_type>_template.json is parsed at startup into a CompiledTemplate:
+  the template dict, its static system prompt (built by the registered prompt
+  compiler), a flattened field schema and an exporter column plan
+- Per-document lookups are dict reads; template files are only stat()ed, at most
+  once per reload interval, and recompiled when mtime/size change (hot reload)
+- A template that fails to parse or validate on reload keeps the last good version
+- Reload listeners are told about every (re)compiled template, e.g. so the LLM
+  response cache can drop entries produced with an older version
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llm_response_cache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Templates shipped in backend/templates
+TEMPLATE_TYPES: Tuple[str, ...] = ("faktur_pajak", "pph21", "pph23", "rekening_koran", "invoice")
+
+PromptCompiler = Callable[[str, Dict[str, Any]], str]
+ReloadListener = Callable[[str, "CompiledTemplate"], None]
+
+
+class TemplateValidationError(ValueError):
+    """Template JSON is missing the structure the mapper and exporters rely on"""
+
+
+@dataclass(frozen=True)
+class TemplateColumn:
+    """One exportable field, in template order"""
+    section: str
+    field: str
+    label: str
+    required: bool = False
+    repeated: bool = False  # Field of an array section (items, transactions)
+
+    @property
+    def path(self) -> str:
+        return f"{self.section}[].{self.field}" if self.repeated else f"{self.section}.{self.field}"
+
+
+@dataclass
+class CompiledTemplate:
+    doc_type: str
+    path: Path
+    mtime_ns: int
+    size: int
+    fingerprint: Optional[str]
+    template: Dict[str, Any]  # Shared between callers - treat as read-only
+    field_schema: Dict[str, Any]  # Dotted output path -> declared type ("items[].qty": "number")
+    column_plan: Tuple[TemplateColumn, ...]
+    system_prompt: Optional[str] = None
+    loaded_at: float = field(default_factory=time.time)
+
+
+def validate_template(doc_type: str, template: Any) -> None:
+    """Raise TemplateValidationError unless template has sections[].fields[] and an output_schema"""
+    if not isinstance(template, dict):
+        raise TemplateValidationError(f"{doc_type}: template root must be an object")
+    sections = template.get("sections")
+    if not isinstance(sections, list) or not sections:
+        raise TemplateValidationError(f"{doc_type}: 'sections' must be a non-empty list")
+    for idx, section in enumerate(sections):
+        if not isinstance(section, dict) or not section.get("name"):
+            raise TemplateValidationError(f"{doc_type}: sections[{idx}] has no name")
+        fields = section.get("fields")
+        if not isinstance(fields, list) or not all(isinstance(f, dict) and f.get("name") for f in fields):
+            raise TemplateValidationError(f"{doc_type}: section '{section['name']}' needs a list of named fields")
+    if not isinstance(template.get("output_schema"), dict):
+        raise TemplateValidationError(f"{doc_type}: 'output_schema' must be an object")
+
+
+def flatten_schema(schema: Any, prefix: str = "") -> Dict[str, Any]:
+    """{"items": [{"qty": "number"}]} -> {"items[].qty": "number"}"""
+    flat: Dict[str, Any] = {}
+    if isinstance(schema, dict):
+        for key, value in schema.items():
+            flat.update(flatten_schema(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(schema, list) and schema:
+        flat.update(flatten_schema(schema[0], f"{prefix}[]"))
+    else:
+        flat[prefix] = schema
+    return flat
+
+
+def build_column_plan(template: Dict[str, Any]) -> Tuple[TemplateColumn, ...]:
+    output_schema = template.get("output_schema", {})
+    columns: List[TemplateColumn] = []
+    for section in template.get("sections", []):
+        name = section["name"]
+        repeated = bool(section.get("is_array")) or isinstance(output_schema.get(name), list)
+        for f in section.get("fields", []):
+            columns.append(TemplateColumn(
+                section=name,
+                field=f["name"],
+                label=f.get("label") or f["name"],
+                required=bool(f.get("required")),
+                repeated=repeated,
+            ))
+    return tuple(columns)
+
+
+class TemplateRegistry:
+    """Process-wide cache of compiled templates with mtime-based hot reload"""
+
+    def __init__(self, template_dir: Path, doc_types: Tuple[str, ...] = TEMPLATE_TYPES,
+                 reload_interval: float = 2.0):
+        self.template_dir = Path(template_dir)
+        self.doc_types = tuple(doc_types)
+        # Seconds between mtime checks; 0 disables hot reload
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._missing: Dict[str, float] = {}  # doc_type -> last lookup of a non-existent file
+        self._rejected: Dict[str, Tuple[int, int]] = {}  # doc_type -> (mtime_ns, size) that failed to load
+        self._prompt_compiler: Optional[PromptCompiler] = None
+        self._listeners: List[ReloadListener] = []
+        self._lock = threading.RLock()
+        self._last_check = time.monotonic()
+
+    def template_path(self, doc_type: str) -> Path:
+        return self.template_dir / f"{doc_type}_template.json"
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def load_all(self) -> int:
+        """Load every known template; returns how many are available"""
+        with self._lock:
+            for doc_type in self.doc_types:
+                self._load(doc_type)
+            self._last_check = time.monotonic()
+            loaded = len(self._templates)
+        logger.info(f"📚 Template registry: {loaded}/{len(self.doc_types)} templates compiled from {self.template_dir}")
+        return loaded
+
+    def _load(self, doc_type: str) -> Optional[CompiledTemplate]:
+        path = self.template_path(doc_type)
+        previous = self._templates.get(doc_type)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if previous is not None:
+                logger.warning(f"⚠️ Template removed from disk, keeping last loaded version: {path}")
+            else:
+                logger.warning(f"⚠️ Smart Mapper template not found: {path}")
+            return previous
+
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                template = json.load(f)
+            validate_template(doc_type, template)
+            compiled = CompiledTemplate(
+                doc_type=doc_type,
+                path=path,
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                fingerprint=file_fingerprint(path),
+                template=template,
+                field_schema=flatten_schema(template["output_schema"]),
+                column_plan=build_column_plan(template),
+            )
+            if self._prompt_compiler is not None:
+                compiled.system_prompt = self._prompt_compiler(doc_type, template)
+        except (json.JSONDecodeError, TemplateValidationError) as exc:
+            logger.error(f"❌ Invalid template {path}: {exc}")
+            self._rejected[doc_type] = (stat.st_mtime_ns, stat.st_size)
+            return previous
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.error(f"❌ Failed to load template {path}: {exc}")
+            self._rejected[doc_type] = (stat.st_mtime_ns, stat.st_size)
+            return previous
+
+        self._templates[doc_type] = compiled
+        self._missing.pop(doc_type, None)
+        self._rejected.pop(doc_type, None)
+        if previous is not None:
+            logger.info(f"♻️ Template reloaded: {doc_type} ({compiled.fingerprint})")
+        self._notify(doc_type, compiled)
+        return compiled
+
+    def _notify(self, doc_type: str, compiled: CompiledTemplate) -> None:
+        for listener in self._listeners:
+            try:
+                listener(doc_type, compiled)
+            except Exception as exc:
+                logger.warning(f"⚠️ Template reload listener failed for {doc_type}: {exc}")
+
+    def _maybe_reload(self) -> None:
+        if self.reload_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            for doc_type, compiled in list(self._templates.items()):
+                try:
+                    stat = compiled.path.stat()
+                except OSError:
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if signature != (compiled.mtime_ns, compiled.size) and signature != self._rejected.get(doc_type):
+                    self._load(doc_type)
+
+    # ------------------------------------------------------------------
+    # Hooks
+    # ------------------------------------------------------------------
+    def set_prompt_compiler(self, compiler: PromptCompiler) -> None:
+        """Install the static system prompt builder and compile it for every loaded template"""
+        with self._lock:
+            self._prompt_compiler = compiler
+            for doc_type, compiled in self._templates.items():
+                compiled.system_prompt = compiler(doc_type, compiled.template)
+
+    def add_reload_listener(self, listener: ReloadListener) -> None:
+        """Call listener(doc_type, compiled) for every loaded template now and on each reload"""
+        with self._lock:
+            self._listeners.append(listener)
+            for doc_type, compiled in self._templates.items():
+                listener(doc_type, compiled)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def get(self, doc_type: str) -> Optional[CompiledTemplate]:
+        self._maybe_reload()
+        compiled = self._templates.get(doc_type)
+        if compiled is not None:
+            return compiled
+        # Not loaded at startup (missing file or extra type) - retry at most once per interval
+        last_miss = self._missing.get(doc_type)
+        if last_miss is not None and time.monotonic() - last_miss < max(self.reload_interval, 1.0):
+            return None
+        with self._lock:
+            compiled = self._load(doc_type)
+            if compiled is None:
+                self._missing[doc_type] = time.monotonic()
+            return compiled
+
+    def template(self, doc_type: str) -> Optional[Dict[str, Any]]:
+        compiled = self.get(doc_type)
+        return compiled.template if compiled else None
+
+    def column_plan(self, doc_type: str) -> Tuple[TemplateColumn, ...]:
+        compiled = self.get(doc_type)
+        return compiled.column_plan if compiled else ()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "template_dir": str(self.template_dir),
+            "reload_interval": self.reload_interval,
+            "templates": {
+                doc_type: {"fingerprint": c.fingerprint, "fields": len(c.field_schema), "loaded_at": c.loaded_at}
+                for doc_type, c in self._templates.items()
+            },
+        }
+
+
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Process-wide registry for SMART_MAPPER_TEMPLATE_DIR (default backend/templates)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            try:
+                from config import settings
+                interval = settings.template_reload_interval
+            except Exception:
+                interval = 2.0
+            template_dir_env = os.getenv("SMART_MAPPER_TEMPLATE_DIR")
+            template_dir = Path(template_dir_env) if template_dir_env else Path(__file__).resolve().parent / "templates"
+            _registry = TemplateRegistry(template_dir, reload_interval=interval)
+            _registry.load_all()
+        return _registry
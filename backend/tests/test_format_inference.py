@@ -0,0 +1,43 @@
+"""A locked FormatLock must return what the in-order candidate scan would"""
+
+import re
+import unittest
+
+from format_inference import FormatLock, date_format_lock
+
+
+def _search(pattern):
+    regex = re.compile(pattern)
+
+    def parse(text):
+        match = regex.search(text)
+        return match.group(0) if match else None
+    return parse
+
+
+class FormatLockOrderTest(unittest.TestCase):
+    def test_earlier_search_pattern_keeps_precedence(self):
+        lock = FormatLock(
+            [("numeric", _search(r"\d{2}/\d{2}/\d{4}")), ("month", _search(r"\d{1,2} [A-Za-z]{3} \d{4}"))],
+            sample_size=2,
+        )
+        lock.lock("month")
+        self.assertEqual(lock.parse("01 Jan 2024 - 15/02/2024"), "15/02/2024")
+        self.assertEqual(lock.parse("01 Jan 2024"), "01 Jan 2024")
+
+    def test_ambiguous_date_formats_follow_candidate_order(self):
+        lock = date_format_lock(["%d/%m/%Y", "%m/%d/%Y"], sample_size=2)
+        for text in ("12/31/2024", "11/30/2024"):
+            lock.parse(text)
+        self.assertEqual(lock.locked, "%m/%d/%Y")
+        self.assertEqual(lock.parse("01/02/2024").month, 2)
+
+    def test_locked_miss_falls_back_to_later_candidates(self):
+        lock = date_format_lock(["%d/%m/%Y", "%d %b %Y"], sample_size=2)
+        lock.lock("%d/%m/%Y")
+        self.assertEqual(lock.parse(" 5 Mar 2024").day, 5)
+        self.assertIsNone(lock.parse("not a date"))
+
+
+if __name__ == "__main__":
+    unittest.main()
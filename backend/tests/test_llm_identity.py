@@ -0,0 +1,31 @@
+"""LLM scheduler identity must follow work handed to thread pools via instrumentation.propagate"""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import current_trace, propagate, trace_document
+from llm_scheduler import current_identity, llm_identity
+
+
+class PropagateIdentityTest(unittest.TestCase):
+    def test_pool_thread_keeps_caller_identity(self):
+        with llm_identity("user-42", priority="interactive"):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                identities = list(executor.map(propagate(lambda _: current_identity()), range(6)))
+        self.assertEqual(identities, [("user-42", "interactive")] * 6)
+
+    def test_pool_thread_without_propagate_is_anonymous(self):
+        with llm_identity("user-42", priority="interactive"):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                identity = executor.submit(current_identity).result()
+        self.assertEqual(identity[0], "anonymous")
+
+    def test_trace_still_propagates(self):
+        with trace_document("rekening_koran", "statement.pdf") as trace:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                traces = [f.result() for f in [executor.submit(propagate(current_trace)) for _ in range(2)]]
+        self.assertEqual(traces, [trace, trace])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,8 @@ Utility modules for document processing
 
 from .zip_handler import (
     ZipHandler,
+    ZipMember,
+    ExtractedMember,
     extract_zip,
     validate_zip,
     get_zip_info,
@@ -13,6 +15,8 @@ from .zip_handler import (
 
 __all__ = [
     'ZipHandler',
+    'ZipMember',
+    'ExtractedMember',
     'extract_zip',
     'validate_zip',
     'get_zip_info',
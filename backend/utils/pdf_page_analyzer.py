@@ -9,6 +9,8 @@ from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import fitz  # PyMuPDF - memory efficient PDF library
 
+from pdf_probe import get_pdf_probe
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,14 +44,11 @@ class PDFPageAnalyzer:
         Returns:
             int: Total number of pages
         """
-        try:
-            doc = fitz.open(pdf_path)
-            page_count = len(doc)
-            doc.close()
-            return page_count
-        except Exception as e:
-            logger.error(f"Failed to get page count for {pdf_path}: {e}")
+        probe = get_pdf_probe(pdf_path)
+        if probe is None or probe.error:
+            logger.error(f"Failed to get page count for {pdf_path}: {probe.error if probe else 'unreadable'}")
             return 0
+        return probe.page_count
 
     def analyze_pdf(self, pdf_path: str) -> Dict:
         """
@@ -62,13 +61,12 @@ class PDFPageAnalyzer:
             Dict with PDF metadata
         """
         try:
-            doc = fitz.open(pdf_path)
-
-            page_count = len(doc)
-            file_size = Path(pdf_path).stat().st_size
+            probe = get_pdf_probe(pdf_path)
+            if probe is None or probe.error:
+                raise ValueError(probe.error if probe else "file not readable")
 
-            # Get metadata
-            metadata = doc.metadata or {}
+            page_count = probe.page_count
+            file_size = probe.size_bytes
 
             # Calculate chunks
             num_chunks = (page_count + self.max_pages_per_chunk - 1) // self.max_pages_per_chunk
@@ -82,16 +80,17 @@ class PDFPageAnalyzer:
                 "needs_chunking": page_count > self.max_pages_per_chunk,
                 "num_chunks": num_chunks,
                 "pages_per_chunk": self.max_pages_per_chunk,
+                "encrypted": probe.encrypted,
+                "text_layer_pages": probe.text_layer_pages if probe.text_layer_sampled else None,
+                "file_hash": probe.file_hash,
                 "metadata": {
-                    "title": metadata.get("title", ""),
-                    "author": metadata.get("author", ""),
-                    "creator": metadata.get("creator", ""),
-                    "producer": metadata.get("producer", "")
+                    "title": probe.title,
+                    "author": probe.author,
+                    "creator": probe.creator,
+                    "producer": probe.producer
                 }
             }
 
-            doc.close()
-
             logger.info(f"📄 PDF Analysis: {Path(pdf_path).name} - {page_count} pages, {num_chunks} chunks")
 
             return analysis
@@ -6,9 +6,15 @@ Utility for handling ZIP file uploads and extraction for batch document processi
 import os
 import zipfile
 import shutil
+import hashlib
 import logging
+import asyncio
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 import tempfile
 
 logger = logging.getLogger(__name__)
@@ -17,14 +23,106 @@ logger = logging.getLogger(__name__)
 MAX_ZIP_SIZE_MB = 200  # Maximum ZIP file size in MB (increased for large batches)
 MAX_FILES_IN_ZIP = 100  # Maximum number of files in ZIP (increased from 50)
 ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.tif'}
+MAX_EXTRACT_WORKERS = 4  # Members decompressed concurrently (zlib releases the GIL)
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes expected for each allowed extension
+MAGIC_SIGNATURES = {
+    '.pdf': (b'%PDF',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.tiff': (b'II*\x00', b'MM\x00*'),
+    '.tif': (b'II*\x00', b'MM\x00*'),
+}
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.tiff': 'image/tiff',
+    '.tif': 'image/tiff',
+}
+
+
+@dataclass
+class ZipMember:
+    """A document inside the archive, with its de-duplicated flat filename"""
+    index: int  # Position in the central directory (arcnames may repeat)
+    arcname: str
+    filename: str
+    extension: str
+    declared_size: int
+
+
+@dataclass
+class ExtractedMember:
+    """Result of streaming one member to disk"""
+    member: ZipMember
+    path: str
+    size: int = 0
+    md5: Optional[str] = None
+    sha256: Optional[str] = None  # Lets the PDF probe skip re-reading the member to hash it
+    mime_type: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _matches_signature(head: bytes, extension: str) -> bool:
+    signatures = MAGIC_SIGNATURES.get(extension)
+    if not signatures:
+        return False
+    if extension == '.pdf':
+        # Readers accept a %PDF header anywhere in the first KB
+        return b'%PDF' in head[:1024]
+    return any(head.startswith(signature) for signature in signatures)
+
+
+class _ThreadZipHandles:
+    """
+    One ZipFile handle per worker thread for a single extraction run
+    (a shared handle serializes every read on its lock); close() releases them all
+    """
+
+    def __init__(self, zip_path: str):
+        self.zip_path = zip_path
+        self._local = threading.local()
+        self._opened: List[zipfile.ZipFile] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> zipfile.ZipFile:
+        zip_ref = getattr(self._local, 'zip_ref', None)
+        if zip_ref is None:
+            zip_ref = self._local.zip_ref = zipfile.ZipFile(self.zip_path, 'r')
+            with self._lock:
+                self._opened.append(zip_ref)
+        return zip_ref
+
+    def close(self) -> None:
+        """Call once no worker is reading any more"""
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for zip_ref in opened:
+            zip_ref.close()
+
+
+def _release_when_idle(pool: ThreadPoolExecutor, handles: _ThreadZipHandles) -> None:
+    pool.shutdown(wait=True)
+    handles.close()
 
 
 class ZipHandler:
     """Handle ZIP file extraction and validation for document uploads"""
 
-    def __init__(self, max_size_mb: int = MAX_ZIP_SIZE_MB, max_files: int = MAX_FILES_IN_ZIP):
+    def __init__(self, max_size_mb: int = MAX_ZIP_SIZE_MB, max_files: int = MAX_FILES_IN_ZIP,
+                 max_workers: int = MAX_EXTRACT_WORKERS, max_member_mb: Optional[int] = None):
         self.max_size_bytes = max_size_mb * 1024 * 1024
         self.max_files = max_files
+        self.max_workers = max(1, max_workers)
+        self.max_member_bytes = max_member_mb * 1024 * 1024 if max_member_mb else None
         self.allowed_extensions = ALLOWED_EXTENSIONS
 
     def validate_zip_file(self, zip_path: str) -> Tuple[bool, str]:
@@ -103,49 +201,19 @@ class ZipHandler:
             else:
                 os.makedirs(extract_to, exist_ok=True)
 
-            extracted_files = []
+            members = self.plan_members(zip_path)
+            logger.info(f"📦 Extracting {len(members)} files to: {extract_to}")
 
-            # Extract ZIP
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                logger.info(f"📦 Extracting ZIP to: {extract_to}")
-
-                for file_info in zip_ref.infolist():
-                    file_name = file_info.filename
-
-                    # Skip directories, macOS metadata, and hidden files
-                    if (file_info.is_dir() or
-                        file_name.startswith('__MACOSX') or
-                        file_name.startswith('.') or
-                        '/' in file_name and file_name.split('/')[-1].startswith('.')):
-                        continue
+            landed = {}
+            for extracted in self.iter_extract(zip_path, members, lambda m: os.path.join(extract_to, m.filename)):
+                if extracted.ok:
+                    landed[extracted.member.filename] = extracted.path
+                    logger.info(f"  ✅ Extracted: {extracted.member.filename}")
+                else:
+                    logger.warning(f"  🚫 Rejected {extracted.member.arcname}: {extracted.error}")
 
-                    # Get file extension
-                    file_ext = Path(file_name).suffix.lower()
-
-                    # Only extract allowed file types
-                    if file_ext in self.allowed_extensions:
-                        # Extract to flat directory (no subdirectories)
-                        # This prevents nested folder issues
-                        file_basename = os.path.basename(file_name)
-                        extract_path = os.path.join(extract_to, file_basename)
-
-                        # Handle duplicate filenames
-                        if os.path.exists(extract_path):
-                            name, ext = os.path.splitext(file_basename)
-                            counter = 1
-                            while os.path.exists(extract_path):
-                                file_basename = f"{name}_{counter}{ext}"
-                                extract_path = os.path.join(extract_to, file_basename)
-                                counter += 1
-
-                        # Extract file
-                        with zip_ref.open(file_info) as source, open(extract_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-
-                        extracted_files.append(extract_path)
-                        logger.info(f"  ✅ Extracted: {file_basename}")
-                    else:
-                        logger.info(f"  ⏭️  Skipped (unsupported): {file_name}")
+            # Workers finish out of order; callers get archive order
+            extracted_files = [landed[m.filename] for m in members if m.filename in landed]
 
             if not extracted_files:
                 return False, [], "No valid document files found in ZIP"
@@ -157,6 +225,143 @@ class ZipHandler:
             logger.error(f"❌ ZIP extraction error: {e}", exc_info=True)
             return False, [], f"Extraction error: {str(e)}"
 
+    def plan_members(self, zip_path: str) -> List[ZipMember]:
+        """
+        List the document members to extract, in archive order, from the central directory.
+        Duplicate basenames get a _1, _2 ... suffix (resolved in memory, not against the disk).
+        """
+        members = []
+        used_names = set()
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for index, file_info in enumerate(zip_ref.infolist()):
+                file_name = file_info.filename
+
+                # Skip directories, macOS metadata, and hidden files
+                if (file_info.is_dir() or
+                    file_name.startswith('__MACOSX') or
+                    file_name.startswith('.') or
+                    '/' in file_name and file_name.split('/')[-1].startswith('.')):
+                    continue
+
+                file_ext = Path(file_name).suffix.lower()
+                if file_ext not in self.allowed_extensions:
+                    logger.info(f"  ⏭️  Skipped (unsupported): {file_name}")
+                    continue
+
+                # Flat layout (no subdirectories) prevents nested folder issues
+                file_basename = os.path.basename(file_name)
+                name, ext = os.path.splitext(file_basename)
+                counter = 1
+                while file_basename.lower() in used_names:
+                    file_basename = f"{name}_{counter}{ext}"
+                    counter += 1
+                used_names.add(file_basename.lower())
+
+                members.append(ZipMember(
+                    index=index,
+                    arcname=file_name,
+                    filename=file_basename,
+                    extension=file_ext,
+                    declared_size=file_info.file_size
+                ))
+        return members
+
+    def extract_member(self, zip_path: str, member: ZipMember, target_path: str,
+                       handles: Optional[_ThreadZipHandles] = None) -> ExtractedMember:
+        """
+        Stream one member to target_path, hashing and checking its magic bytes in the same pass.
+        Rejected members (signature mismatch, oversized, corrupt) are removed from disk.
+        Without `handles` the archive is opened and closed for this member alone.
+        """
+        result = ExtractedMember(member=member, path=target_path)
+        md5, sha256 = hashlib.md5(), hashlib.sha256()
+        try:
+            archive = nullcontext(handles.get()) if handles else zipfile.ZipFile(zip_path, 'r')
+            with archive as zip_ref, \
+                    zip_ref.open(zip_ref.infolist()[member.index]) as source, \
+                    open(target_path, 'wb') as target:
+                first_chunk = True
+                while True:
+                    chunk = source.read(EXTRACT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if first_chunk:
+                        first_chunk = False
+                        if not _matches_signature(chunk, member.extension):
+                            result.error = f"Content does not match {member.extension} file signature"
+                            break
+                    result.size += len(chunk)
+                    if self.max_member_bytes and result.size > self.max_member_bytes:
+                        result.error = f"File exceeds {self.max_member_bytes // (1024 * 1024)}MB limit"
+                        break
+                    md5.update(chunk)
+                    sha256.update(chunk)
+                    target.write(chunk)
+            if result.ok and result.size == 0:
+                result.error = "Empty file"
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, EOFError) as e:
+            # BadZipFile covers CRC mismatches, raised on the final read
+            result.error = f"Extraction failed: {e}"
+
+        if result.ok:
+            result.md5 = md5.hexdigest()
+            result.sha256 = sha256.hexdigest()
+            result.mime_type = MIME_TYPES.get(member.extension)
+        elif os.path.exists(target_path):
+            os.remove(target_path)
+        return result
+
+    def iter_extract(self, zip_path: str, members: List[ZipMember],
+                     target_for: Callable[[ZipMember], str]) -> Iterator[ExtractedMember]:
+        """Extract members on a bounded thread pool, yielding each one as soon as it is written"""
+        handles = _ThreadZipHandles(zip_path)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="zip_extract") as pool:
+                futures = [
+                    pool.submit(self.extract_member, zip_path, member, target_for(member), handles)
+                    for member in members
+                ]
+                try:
+                    for future in as_completed(futures):
+                        yield future.result()
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            # The with-block waited for running members, so no thread still reads
+            handles.close()
+
+    async def extract_members_async(self, zip_path: str, members: List[ZipMember],
+                                    target_for: Callable[[ZipMember], str]) -> AsyncIterator[ExtractedMember]:
+        """
+        Async variant of iter_extract: decompression runs on worker threads while the
+        consumer (e.g. OCR of the members already landed) keeps the event loop busy
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="zip_extract")
+        handles = _ThreadZipHandles(zip_path)
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(pool, self.extract_member, zip_path, member, target_for(member), handles)
+            for member in members
+        ]
+        drained = False
+        try:
+            for next_done in asyncio.as_completed(futures):
+                yield await next_done
+            drained = True
+        finally:
+            for future in futures:
+                future.cancel()
+            if drained:
+                _release_when_idle(pool, handles)
+            else:
+                # Consumer stopped early: members already running can't be cancelled,
+                # so close the handles off the event loop once they finish
+                pool.shutdown(wait=False, cancel_futures=True)
+                threading.Thread(
+                    target=_release_when_idle, args=(pool, handles), name="zip_extract_release", daemon=True
+                ).start()
+
     def get_zip_info(self, zip_path: str) -> Dict:
         """
         Get information about ZIP file contents without extracting.
@@ -130,6 +130,7 @@ User=$APP_USER
 Group=$APP_USER
 WorkingDirectory=$APP_DIR/backend
 Environment="PATH=$APP_DIR/venv/bin"
+Environment="WEB_CONCURRENCY=4"
 ExecStart=$APP_DIR/venv/bin/uvicorn main:app --host 127.0.0.1 --port 8000 --workers 4
 Restart=always
 RestartSec=10
@@ -144,6 +145,19 @@ EOF
 mkdir -p /var/log/docscan
 chown -R $APP_USER:$APP_USER /var/log/docscan
 
+# Audit log is appended by every uvicorn worker - rotate it here, not in the app
+cat > /etc/logrotate.d/docscan-audit <<EOF
+$APP_DIR/backend/logs/audit.log {
+    size 10M
+    rotate 5
+    missingok
+    notifempty
+    compress
+    delaycompress
+    su $APP_USER $APP_USER
+}
+EOF
+
 # Enable and start service
 systemctl daemon-reload
 systemctl enable docscan-backend